@@ -16,6 +16,8 @@ security = HTTPBearer()
 
 # Import shared dependencies
 from .deps import get_db
+from services.user_context import invalidate_user
+from services.entitlements import invalidate_entitlements, invalidate_all_entitlements
 
 JWT_SECRET = os.environ.get("JWT_SECRET", "suri-rentals-secure-jwt-secret-2024")
 
@@ -231,6 +233,7 @@ async def update_user_status(
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Gebruiker niet gevonden")
+    await invalidate_user(user_id)
     
     return {"message": f"Gebruiker {'geactiveerd' if is_active else 'gedeactiveerd'}"}
 
@@ -255,6 +258,8 @@ async def delete_user(user_id: str, current_user: dict = Depends(get_superadmin)
     await db.users.delete_one({"_id": user["_id"]})
     await db.user_addons.delete_many({"user_id": user_id})
     await db.workspaces.delete_many({"owner_id": user_id})
+    await invalidate_user(user_id, user.get("id"))
+    await invalidate_entitlements(user_id, user.get("id"))
     
     return {"message": "Gebruiker en gerelateerde data verwijderd"}
 
@@ -309,6 +314,7 @@ async def update_addon(addon_id: str, addon_data: AddonUpdate, current_user: dic
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Addon niet gevonden")
+    await invalidate_all_entitlements()
     
     return {"message": "Addon bijgewerkt"}
 
@@ -322,6 +328,7 @@ async def delete_addon(addon_id: str, current_user: dict = Depends(get_superadmi
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Addon niet gevonden")
+    await invalidate_all_entitlements()
     
     return {"message": "Addon verwijderd"}
 
@@ -387,6 +394,7 @@ async def approve_addon_request(
     }
     
     await db.user_addons.insert_one(user_addon)
+    await invalidate_entitlements(request["user_id"])
     
     # Update request status
     await db.addon_requests.update_one(
@@ -11,6 +11,7 @@ import uuid
 
 # Import shared dependencies
 from .deps import get_current_user, db
+from services.entitlements import has_addon
 
 router = APIRouter(prefix="/autodealer", tags=["Auto Dealer"])
 
@@ -184,25 +185,7 @@ async def check_autodealer_access(user: dict):
     if user.get("role") == "superadmin":
         return True
     
-    # Check if user has autodealer addon
-    user_addon = await db.user_addons.find_one({
-        "user_id": user["id"],
-        "status": "active"
-    })
-    
-    if user_addon:
-        addon = await db.addons.find_one({"id": user_addon["addon_id"]}, {"_id": 0})
-        if addon and addon.get("slug") == "autodealer":
-            return True
-    
-    # Check all user addons
-    user_addons = await db.user_addons.find({"user_id": user["id"], "status": "active"}).to_list(100)
-    for ua in user_addons:
-        addon = await db.addons.find_one({"id": ua["addon_id"]}, {"_id": 0})
-        if addon and addon.get("slug") == "autodealer":
-            return True
-    
-    return False
+    return await has_addon(db, user["id"], "autodealer")
 
 def get_workspace_filter(user: dict) -> dict:
     """Get filter for workspace-scoped queries"""
@@ -13,8 +13,32 @@ import logging
 
 # Import shared dependencies
 from .deps import get_current_user, db
+from services.indexes import register_indexes, register_query
 
 router = APIRouter(prefix="/beautyspa", tags=["Beauty Spa"])
+
+# ==================== INDEXES ====================
+# Created at startup, see services/indexes.py
+
+register_indexes("spa_clients", [("user_id", 1), ("name", 1)], "id")
+register_indexes("spa_treatments", [("user_id", 1), ("category", 1)], [("user_id", 1), ("is_active", 1)], "id")
+register_indexes("spa_staff", [("user_id", 1), ("name", 1)], [("user_id", 1), ("is_active", 1)], "id")
+register_indexes("spa_appointments", [("user_id", 1), ("appointment_date", 1), ("appointment_time", 1)],
+                 [("user_id", 1), ("client_id", 1)], "id")
+register_indexes("spa_products", [("user_id", 1), ("name", 1)])
+register_indexes("spa_sales", [("user_id", 1), ("created_at", -1)], [("user_id", 1), ("client_id", 1)])
+register_indexes("spa_queue", [("user_id", 1), ("date", 1), ("queue_number", 1)])
+register_indexes("spa_schedules", [("user_id", 1), ("staff_id", 1)])
+register_indexes("spa_vouchers", [("user_id", 1), ("code", 1)])
+register_indexes("spa_branches", "user_id")
+register_indexes("spa_intake_forms", [("user_id", 1), ("created_at", -1)])
+
+register_query("spa afspraken per dag", "spa_appointments",
+               {"user_id": "x", "appointment_date": "2024-01-01", "status": {"$ne": "cancelled"}},
+               sort=[("appointment_date", 1), ("appointment_time", 1)])
+register_query("spa verkopen per periode", "spa_sales",
+               {"user_id": "x", "created_at": {"$gte": "2024-01-01"}}, sort=[("created_at", -1)])
+register_query("spa klanten", "spa_clients", {"user_id": "x"}, sort=[("name", 1)])
 logger = logging.getLogger(__name__)
 
 # ==================== PYDANTIC MODELS ====================
@@ -16,7 +16,6 @@ import io
 import re
 import base64
 import hashlib
-from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 from pymongo import ReturnDocument
 import smtplib
@@ -25,9 +24,7 @@ from email.mime.multipart import MIMEMultipart
 import jwt
 
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME', 'surirentals')]
+from services.database import db
 
 # JWT Secret
 JWT_SECRET = os.environ.get('JWT_SECRET') or os.environ.get('SECRET_KEY') or 'suri-rentals-default-secret-change-in-production'
@@ -63,6 +60,8 @@ try:
 except ImportError:
     EXCEL_ENABLED = False
 
+from services.user_context import get_cached_user
+
 # Import grootboek service
 from services.grootboek_service import (
     set_database as set_grootboek_db,
@@ -96,8 +95,7 @@ async def get_user_from_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
         user_id = payload.get('user_id')
-        user = await db.users.find_one({"id": user_id})
-        return clean_doc(user)
+        return await get_cached_user(db, user_id)
     except:
         return None
 
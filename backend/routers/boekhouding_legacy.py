@@ -16,23 +16,33 @@ import io
 import re
 import base64
 import hashlib
-from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
-from pymongo import ReturnDocument
+from pymongo import ReturnDocument, UpdateOne
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
 # Import PDF generator and MT940 parser
 try:
-    from services.pdf_generator import generate_invoice_pdf, generate_reminder_pdf
-    from services.mt940_parser import parse_mt940_file, suggest_reconciliation, MT940Transaction
+    from services.pdf_generator import generate_invoice_pdf, generate_reminder_pdf, stream_invoice_pdf_zip, PdfBatchBusy
+    from services.mt940_parser import iter_mt940_statements
     PDF_ENABLED = True
     MT940_ENABLED = True
 except ImportError:
     PDF_ENABLED = False
     MT940_ENABLED = False
 
+from services.grootboek_saldi import (
+    boek_saldo_mutaties, boek_rekening_saldi, verwerk_geboekte_journaalpost, in_boekings_transactie,
+    herbouw_saldo_aggregaat, get_saldi_per_rekening, saldo_voor_type
+)
+from services.nummer_reeksen import volgend_nummer, volgend_volgnummer, reserveer_volgnummers
+from services.rekeningschema import get_rekeningschema, invalideer_rekeningschema
+from services.bank_import import importeer_banktransacties, csv_transacties, upload_regels
+from services.reconciliatie import FactuurIndex, match_transacties
+from services.user_context import get_cached_user
+from services.indexes import register_indexes, register_query
+
 # Import email service
 try:
     from services.unified_email_service import email_service
@@ -43,9 +53,10 @@ except ImportError:
 # Import Excel export
 try:
     from services.excel_export import (
-        export_grootboek_excel, export_debiteuren_excel, export_crediteuren_excel,
         export_btw_aangifte_excel, export_winst_verlies_excel, export_balans_excel,
-        export_ouderdom_excel
+        export_ouderdom_excel, ExportSheet, stream_excel_export, excel_streaming_response,
+        columns_projection, REKENING_COLUMNS, JOURNAALPOST_COLUMNS, RELATIE_COLUMNS,
+        VERKOOPFACTUUR_COLUMNS, INKOOPFACTUUR_COLUMNS
     )
     EXCEL_ENABLED = True
 except ImportError:
@@ -53,10 +64,40 @@ except ImportError:
 
 router = APIRouter(prefix="/boekhouding", tags=["Boekhouding"])
 
+# ==================== INDEXES ====================
+# Aangemaakt bij startup, zie services/indexes.py
+
+register_indexes("boekhouding_journaalposten", [("user_id", 1), ("datum", -1)],
+                 [("user_id", 1), ("dagboek_code", 1), ("datum", -1)], [("user_id", 1), ("status", 1), ("datum", -1)],
+                 [("user_id", 1), ("id", 1)])
+register_indexes("boekhouding_verkoopfacturen", [("user_id", 1), ("factuurdatum", -1)],
+                 [("user_id", 1), ("status", 1), ("factuurdatum", -1)], [("user_id", 1), ("debiteur_id", 1)],
+                 [("user_id", 1), ("id", 1)])
+register_indexes("boekhouding_inkoopfacturen", [("user_id", 1), ("factuurdatum", -1)],
+                 [("user_id", 1), ("status", 1), ("factuurdatum", -1)], [("user_id", 1), ("crediteur_id", 1)],
+                 [("user_id", 1), ("id", 1)])
+register_indexes("boekhouding_rekeningen", [("user_id", 1), ("code", 1)], [("user_id", 1), ("type", 1), ("code", 1)],
+                 [("user_id", 1), ("id", 1)])
+register_indexes("boekhouding_debiteuren", [("user_id", 1), ("naam", 1)], [("user_id", 1), ("id", 1)])
+register_indexes("boekhouding_crediteuren", [("user_id", 1), ("naam", 1)], [("user_id", 1), ("id", 1)])
+
+register_query("boekhouding journaalposten per periode", "boekhouding_journaalposten",
+               {"user_id": "x", "datum": {"$gte": "2024-01-01", "$lte": "2024-12-31"}}, sort=[("datum", -1)])
+register_query("boekhouding journaalposten per dagboek", "boekhouding_journaalposten",
+               {"user_id": "x", "dagboek_code": "VK"}, sort=[("datum", -1)])
+register_query("boekhouding verkoopfacturen per status", "boekhouding_verkoopfacturen",
+               {"user_id": "x", "status": "verzonden"}, sort=[("factuurdatum", -1)])
+register_query("boekhouding openstaande verkoopfacturen", "boekhouding_verkoopfacturen",
+               {"user_id": "x", "status": {"$in": ["verzonden", "herinnering", "gedeeltelijk_betaald"]}})
+register_query("boekhouding inkoopfacturen per status", "boekhouding_inkoopfacturen",
+               {"user_id": "x", "status": "nieuw"}, sort=[("factuurdatum", -1)])
+register_query("boekhouding rekeningschema", "boekhouding_rekeningen", {"user_id": "x"}, sort=[("code", 1)])
+register_query("boekhouding rekening op code", "boekhouding_rekeningen", {"user_id": "x", "code": "1000"})
+register_query("boekhouding debiteuren", "boekhouding_debiteuren", {"user_id": "x"}, sort=[("naam", 1)])
+register_query("boekhouding crediteuren", "boekhouding_crediteuren", {"user_id": "x"}, sort=[("naam", 1)])
+
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME', 'surirentals')]
+from services.database import db, reporting_db
 
 # Upload settings
 UPLOAD_DIR = "/app/uploads/documenten"
@@ -80,8 +121,7 @@ async def get_user_from_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
         user_id = payload.get('user_id')
-        user = await db.users.find_one({"id": user_id})
-        return clean_doc(user)
+        return await get_cached_user(db, user_id)
     except:
         return None
 
@@ -144,67 +184,9 @@ async def get_rekening_by_code(user_id: str, code: str) -> dict:
     return rekening
 
 async def get_rekening_voor_type(user_id: str, rekening_type: str) -> str:
-    """Zoek een geschikte rekeningcode voor een bepaald type boeking"""
-    
-    # Type mapping met verwacht grootboek type en zoektermen
-    type_mapping = {
-        "debiteuren": ("activa", ["debiteur"]),
-        "crediteuren": ("passiva", ["crediteur"]),
-        "btw_verkoop": ("passiva", ["btw te betalen", "btw af te dragen"]),
-        "btw_inkoop": ("activa", ["btw te vorderen", "voorbelasting", "btw voorheffing"]),
-        "omzet": ("omzet", ["omzet verkop", "omzet dienst", "omzet export"]),  # Type moet 'omzet' zijn (niet 'opbrengsten')
-        "inkoop": ("kosten", ["inkoop", "inkoopwaarde"]),
-        "bank": ("activa", ["bank"]),
-        "kas": ("activa", ["kas"]),
-        "voorraad": ("activa", ["voorraad"])
-    }
-    
-    # STAP 1: Zoek eerst op basis van naam EN type (meest nauwkeurig)
-    if rekening_type in type_mapping:
-        verwacht_type, zoekterms = type_mapping[rekening_type]
-        for term in zoekterms:
-            rekening = await db.boekhouding_rekeningen.find_one({
-                "user_id": user_id, 
-                "naam": {"$regex": term, "$options": "i"},
-                "type": verwacht_type
-            })
-            if rekening:
-                return rekening.get("code")
-    
-    # STAP 2: Probeer de standaard code (werkt alleen als rekening bestaat)
-    standaard_code = DEFAULT_REKENINGEN.get(rekening_type)
-    if standaard_code:
-        rekening = await get_rekening_by_code(user_id, standaard_code)
-        if rekening:
-            # Controleer of het type klopt
-            if rekening_type in type_mapping:
-                verwacht_type = type_mapping[rekening_type][0]
-                if rekening.get("type") == verwacht_type:
-                    return standaard_code
-    
-    # STAP 3: Probeer alternatieve codes
-    alternatieven = ALTERNATIEVE_CODES.get(rekening_type, [])
-    for code in alternatieven:
-        rekening = await get_rekening_by_code(user_id, code)
-        if rekening:
-            # Controleer of het type klopt
-            if rekening_type in type_mapping:
-                verwacht_type = type_mapping[rekening_type][0]
-                if rekening.get("type") == verwacht_type:
-                    return code
-    
-    # STAP 4: Fallback - zoek op type alleen
-    if rekening_type in type_mapping:
-        verwacht_type = type_mapping[rekening_type][0]
-        rekening = await db.boekhouding_rekeningen.find_one({
-            "user_id": user_id, 
-            "type": verwacht_type
-        })
-        if rekening:
-            return rekening.get("code")
-    
-    # Laatste fallback
-    return standaard_code
+    """Zoek een geschikte rekeningcode voor een bepaald type boeking (via het gecachte rekeningschema)"""
+    schema = await get_rekeningschema(db, user_id)
+    return schema.voor_type(rekening_type, DEFAULT_REKENINGEN, ALTERNATIEVE_CODES)
 
 async def update_rekening_saldo(user_id: str, code: str, bedrag: float, is_debet: bool = True):
     """Update het saldo van een grootboekrekening"""
@@ -234,7 +216,8 @@ async def create_auto_journaalpost(
     omschrijving: str,
     regels: list,
     document_ref: str = None,
-    auto_boeken: bool = True
+    auto_boeken: bool = True,
+    volgnummer: str = None
 ):
     """
     Maak automatisch een journaalpost aan
@@ -252,9 +235,9 @@ async def create_auto_journaalpost(
     if abs(totaal_debet - totaal_credit) > 0.01:
         raise HTTPException(status_code=400, detail=f"Journaalpost niet in balans: debet={totaal_debet}, credit={totaal_credit}")
     
-    # Genereer volgnummer
-    count = await db.boekhouding_journaalposten.count_documents({"user_id": user_id, "dagboek_code": dagboek_code})
-    volgnummer = f"{dagboek_code}{datetime.now().year}-{count + 1:05d}"
+    # Genereer volgnummer (tenzij vooraf gereserveerd, zie boek-alle-verzonden)
+    if not volgnummer:
+        volgnummer = await volgend_volgnummer(db, user_id, dagboek_code)
     
     journaalpost = {
         "id": str(uuid.uuid4()),
@@ -272,22 +255,16 @@ async def create_auto_journaalpost(
         "auto_generated": True
     }
     
-    await db.boekhouding_journaalposten.insert_one(journaalpost)
-    
-    # Update rekening saldi als auto_boeken
-    if auto_boeken:
-        for regel in regels:
-            code = regel.get("rekening_code")
-            debet = regel.get("debet", 0)
-            credit = regel.get("credit", 0)
-            if debet > 0:
-                await update_rekening_saldo(user_id, code, debet, is_debet=True)
-            if credit > 0:
-                await update_rekening_saldo(user_id, code, credit, is_debet=False)
+    # Journaalpost + saldi in één transactie (indien ondersteund), saldi met één bulk_write
+    async def boek(session):
+        await db.boekhouding_journaalposten.insert_one(journaalpost, session=session)
+        if auto_boeken:
+            await verwerk_geboekte_journaalpost(db, user_id, journaalpost, session=session)
+    await in_boekings_transactie(db, boek)
     
     return journaalpost
 
-async def boek_verkoopfactuur(user_id: str, factuur: dict):
+async def boek_verkoopfactuur(user_id: str, factuur: dict, volgnummer: str = None):
     """
     Boek een verkoopfactuur naar het grootboek
     
@@ -331,7 +308,8 @@ async def boek_verkoopfactuur(user_id: str, factuur: dict):
         datum=factuur.get("factuurdatum", date.today()),
         omschrijving=f"Verkoopfactuur {factuur.get('factuurnummer', '')} - {factuur.get('debiteur_naam', '')}",
         regels=regels,
-        document_ref=factuur.get("id")
+        document_ref=factuur.get("id"),
+        volgnummer=volgnummer
     )
 
 async def boek_betaling_ontvangen(user_id: str, factuur: dict, betaling: dict, bankrekening_code: str = None):
@@ -368,7 +346,7 @@ async def boek_betaling_ontvangen(user_id: str, factuur: dict, betaling: dict, b
         document_ref=factuur.get("id")
     )
 
-async def boek_inkoopfactuur(user_id: str, factuur: dict):
+async def boek_inkoopfactuur(user_id: str, factuur: dict, volgnummer: str = None):
     """
     Boek een inkoopfactuur naar het grootboek
     
@@ -412,7 +390,8 @@ async def boek_inkoopfactuur(user_id: str, factuur: dict):
         datum=factuur.get("factuurdatum", date.today()),
         omschrijving=f"Inkoopfactuur {factuur.get('factuurnummer', '')} - {factuur.get('crediteur_naam', '')}",
         regels=regels,
-        document_ref=factuur.get("id")
+        document_ref=factuur.get("id"),
+        volgnummer=volgnummer
     )
 
 async def boek_betaling_uitgaand(user_id: str, factuur: dict, betaling: dict, bankrekening_code: str = None):
@@ -1317,6 +1296,7 @@ async def create_rekening(data: RekeningCreate, authorization: str = Header(None
         "created_at": datetime.now(timezone.utc)
     }
     await db.boekhouding_rekeningen.insert_one(rekening)
+    invalideer_rekeningschema(user_id)
     return clean_doc(rekening)
 
 @router.put("/rekeningen/{rekening_id}")
@@ -1331,6 +1311,7 @@ async def update_rekening(rekening_id: str, data: RekeningCreate, authorization:
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Rekening niet gevonden")
+    invalideer_rekeningschema(user_id)
     return {"message": "Rekening bijgewerkt"}
 
 @router.delete("/rekeningen/{rekening_id}")
@@ -1342,6 +1323,7 @@ async def delete_rekening(rekening_id: str, authorization: str = Header(None)):
     result = await db.boekhouding_rekeningen.delete_one({"id": rekening_id, "user_id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Rekening niet gevonden")
+    invalideer_rekeningschema(user_id)
     return {"message": "Rekening verwijderd"}
 
 
@@ -1483,6 +1465,7 @@ async def init_standaard_rekeningschema(authorization: str = Header(None)):
             "created_at": datetime.now(timezone.utc)
         }
         await db.boekhouding_rekeningen.insert_one(rekening)
+    invalideer_rekeningschema(user_id)
     
     return {"message": f"{len(standaard_rekeningen)} standaard rekeningen aangemaakt", "count": len(standaard_rekeningen)}
 
@@ -1548,70 +1531,38 @@ async def herbereken_alle_saldi(authorization: str = Header(None)):
         {"$set": {"status": "geboekt"}}
     )
     
-    # Reset alle saldi naar 0
-    await db.boekhouding_rekeningen.update_many(
-        {"user_id": user_id},
-        {"$set": {"saldo": 0}}
-    )
-    
-    # Haal alle geboekte journaalposten op
-    journaalposten = await db.boekhouding_journaalposten.find({
-        "user_id": user_id,
-        "status": "geboekt"
-    }).to_list(10000)
-    
-    # Bereken saldi per rekening
-    saldi = {}
-    for post in journaalposten:
-        for regel in post.get("regels", []):
-            # Ondersteun zowel rekening_code als grootboek_code
-            code = regel.get("rekening_code") or regel.get("grootboek_code")
-            if not code:
-                continue
-            
-            debet = float(regel.get("debet", 0) or 0)
-            credit = float(regel.get("credit", 0) or 0)
-            
-            if code not in saldi:
-                saldi[code] = {"debet": 0, "credit": 0}
-            
-            saldi[code]["debet"] += debet
-            saldi[code]["credit"] += credit
+    # Bouw de periode-aggregaten opnieuw op (geen limiet op aantal journaalposten)
+    rijen = await herbouw_saldo_aggregaat(db, user_id)
+    saldi = await get_saldi_per_rekening(db, user_id)
     
-    # Update saldi in database
+    # Zet rekening saldi vanuit de aggregaten (rekeningen zonder boekingen -> 0)
+    rekeningen = await db.boekhouding_rekeningen.find(
+        {"user_id": user_id}, {"_id": 0, "code": 1, "type": 1}
+    ).to_list(None)
+    ops = []
     updated = 0
-    for code, bedragen in saldi.items():
-        rekening = await db.boekhouding_rekeningen.find_one({"user_id": user_id, "code": code})
-        if not rekening:
-            continue
-        
-        rekening_type = rekening.get("type", "")
-        
-        # Bij activa en kosten: saldo = debet - credit
-        # Bij passiva en opbrengsten: saldo = credit - debet
-        if rekening_type.lower() in ["activa", "kosten"]:
-            saldo = bedragen["debet"] - bedragen["credit"]
-        else:
-            saldo = bedragen["credit"] - bedragen["debet"]
-        
-        await db.boekhouding_rekeningen.update_one(
-            {"user_id": user_id, "code": code},
-            {"$set": {"saldo": saldo}}
-        )
-        updated += 1
+    for rekening in rekeningen:
+        bedragen = saldi.get(rekening.get("code"), {"debet": 0, "credit": 0})
+        saldo = saldo_voor_type(rekening.get("type", ""), bedragen["debet"], bedragen["credit"])
+        ops.append(UpdateOne({"user_id": user_id, "code": rekening.get("code")}, {"$set": {"saldo": saldo}}))
+        if rekening.get("code") in saldi:
+            updated += 1
+    if ops:
+        await db.boekhouding_rekeningen.bulk_write(ops, ordered=False)
     
     return {
         "message": f"Saldi herberekend voor {updated} rekeningen",
-        "journaalposten_verwerkt": len(journaalposten),
+        "journaalposten_verwerkt": await db.boekhouding_journaalposten.count_documents({"user_id": user_id, "status": "geboekt"}),
+        "aggregaat_rijen": rijen,
         "rekeningen_bijgewerkt": updated
     }
 
 
 @router.get("/rekeningen/met-saldi")
-async def get_rekeningen_met_berekende_saldi(type: str = None, authorization: str = Header(None)):
+async def get_rekeningen_met_berekende_saldi(type: str = None, van: str = None, tot: str = None, authorization: str = Header(None)):
     """
-    Haal alle grootboekrekeningen op met saldi berekend uit journaalposten.
-    Dit geeft altijd accurate saldi, ongeacht de cached waarden.
+    Haal alle grootboekrekeningen op met saldi berekend uit de periode-aggregaten
+    van de geboekte journaalposten. Optioneel beperkt tot periodes van..tot (YYYY-MM).
     """
     user = await get_current_user(authorization)
     user_id = user.get('id')
@@ -1622,50 +1573,13 @@ async def get_rekeningen_met_berekende_saldi(type: str = None, authorization: st
         query["type"] = type
     
     rekeningen = await db.boekhouding_rekeningen.find(query).sort("code", 1).to_list(500)
-    
-    # Haal alle geboekte journaalposten op (inclusief die zonder status)
-    journaalposten = await db.boekhouding_journaalposten.find({
-        "user_id": user_id,
-        "$or": [
-            {"status": "geboekt"},
-            {"status": {"$exists": False}}  # Oude entries zonder status
-        ]
-    }).to_list(10000)
-    
-    # Bereken saldi per rekening
-    saldi = {}
-    for post in journaalposten:
-        for regel in post.get("regels", []):
-            # Ondersteun zowel rekening_code als grootboek_code
-            code = regel.get("rekening_code") or regel.get("grootboek_code")
-            if not code:
-                continue
-            
-            debet = float(regel.get("debet", 0) or 0)
-            credit = float(regel.get("credit", 0) or 0)
-            
-            if code not in saldi:
-                saldi[code] = {"debet": 0, "credit": 0}
-            
-            saldi[code]["debet"] += debet
-            saldi[code]["credit"] += credit
+    saldi = await get_saldi_per_rekening(db, user_id, van, tot)
     
     # Voeg berekende saldi toe aan rekeningen
     result = []
     for rekening in rekeningen:
-        code = rekening.get("code")
-        rekening_type = rekening.get("type", "")
-        
-        bedragen = saldi.get(code, {"debet": 0, "credit": 0})
-        
-        # Bij activa en kosten: saldo = debet - credit
-        # Bij passiva en opbrengsten: saldo = credit - debet
-        if rekening_type.lower() in ["activa", "kosten"]:
-            berekend_saldo = bedragen["debet"] - bedragen["credit"]
-        else:
-            berekend_saldo = bedragen["credit"] - bedragen["debet"]
-        
-        rekening["saldo"] = berekend_saldo
+        bedragen = saldi.get(rekening.get("code"), {"debet": 0, "credit": 0})
+        rekening["saldo"] = saldo_voor_type(rekening.get("type", ""), bedragen["debet"], bedragen["credit"])
         rekening["totaal_debet"] = bedragen["debet"]
         rekening["totaal_credit"] = bedragen["credit"]
         result.append(clean_doc(rekening))
@@ -1673,6 +1587,47 @@ async def get_rekeningen_met_berekende_saldi(type: str = None, authorization: st
     return result
 
 
+@router.get("/rapportages/proefbalans")
+async def get_proefbalans(van: str = None, tot: str = None, authorization: str = Header(None)):
+    """Proefbalans (debet/credit totalen per rekening) over periodes van..tot (YYYY-MM)"""
+    user = await get_current_user(authorization)
+    user_id = user.get('id')
+    
+    # Rekeningen en saldi uit dezelfde bron (primary): een achterlopende secondary zou
+    # rekeningen missen waarvoor get_saldi_per_rekening al boekingen teruggeeft
+    rekeningen = await db.boekhouding_rekeningen.find(
+        {"user_id": user_id}, {"_id": 0, "code": 1, "naam": 1, "type": 1}
+    ).sort("code", 1).to_list(None)
+    saldi = await get_saldi_per_rekening(db, user_id, van, tot)
+    
+    regels = []
+    totaal_debet = 0
+    totaal_credit = 0
+    for rekening in rekeningen:
+        bedragen = saldi.get(rekening.get("code"))
+        if not bedragen:
+            continue
+        regels.append({
+            "code": rekening.get("code"),
+            "naam": rekening.get("naam", ""),
+            "type": rekening.get("type", ""),
+            "debet": round(bedragen["debet"], 2),
+            "credit": round(bedragen["credit"], 2),
+            "saldo": round(saldo_voor_type(rekening.get("type", ""), bedragen["debet"], bedragen["credit"]), 2),
+        })
+        totaal_debet += bedragen["debet"]
+        totaal_credit += bedragen["credit"]
+    
+    return {
+        "van": van,
+        "tot": tot,
+        "regels": regels,
+        "totaal_debet": round(totaal_debet, 2),
+        "totaal_credit": round(totaal_credit, 2),
+        "in_balans": abs(totaal_debet - totaal_credit) < 0.01
+    }
+
+
 
 # ==================== JOURNAALPOSTEN ====================
 
@@ -1708,8 +1663,7 @@ async def create_journaalpost(data: JournaalpostCreate, authorization: str = Hea
     if abs(totaal_debet - totaal_credit) > 0.01:
         raise HTTPException(status_code=400, detail=f"Journaalpost niet in balans")
     
-    count = await db.boekhouding_journaalposten.count_documents({"user_id": user_id, "dagboek_code": data.dagboek_code})
-    volgnummer = f"{data.dagboek_code}{datetime.now().year}-{count + 1:05d}"
+    volgnummer = await volgend_volgnummer(db, user_id, data.dagboek_code)
     
     journaalpost = {
         "id": str(uuid.uuid4()),
@@ -1734,11 +1688,14 @@ async def boek_journaalpost(post_id: str, authorization: str = Header(None)):
     user = await get_current_user(authorization)
     user_id = user.get('id')
     
-    result = await db.boekhouding_journaalposten.update_one(
-        {"id": post_id, "user_id": user_id},
+    # Alleen de overgang naar "geboekt" telt mee in de saldo-aggregaten
+    post = await db.boekhouding_journaalposten.find_one_and_update(
+        {"id": post_id, "user_id": user_id, "status": {"$ne": "geboekt"}},
         {"$set": {"status": "geboekt", "geboekt_op": datetime.now(timezone.utc)}}
     )
-    if result.matched_count == 0:
+    if post:
+        await boek_saldo_mutaties(db, user_id, post)
+    elif not await db.boekhouding_journaalposten.find_one({"id": post_id, "user_id": user_id}, {"_id": 1}):
         raise HTTPException(status_code=404, detail="Journaalpost niet gevonden")
     return {"message": "Journaalpost geboekt"}
 
@@ -1801,8 +1758,7 @@ async def create_debiteur(data: DebiteurCreate, authorization: str = Header(None
     user = await get_current_user(authorization)
     user_id = user.get('id')
     
-    count = await db.boekhouding_debiteuren.count_documents({"user_id": user_id})
-    debiteur_nummer = f"DEB{count + 1:05d}"
+    debiteur_nummer = await volgend_nummer(db, user_id, "DEB", "boekhouding_debiteuren", "nummer")
     
     debiteur = {
         "id": str(uuid.uuid4()),
@@ -1899,8 +1855,7 @@ async def create_crediteur(data: CrediteurCreate, authorization: str = Header(No
     user = await get_current_user(authorization)
     user_id = user.get('id')
     
-    count = await db.boekhouding_crediteuren.count_documents({"user_id": user_id})
-    crediteur_nummer = f"CRE{count + 1:05d}"
+    crediteur_nummer = await volgend_nummer(db, user_id, "CRE", "boekhouding_crediteuren", "nummer")
     
     crediteur = {
         "id": str(uuid.uuid4()),
@@ -2077,18 +2032,7 @@ async def create_banktransactie(data: BanktransactieCreate, authorization: str =
         dagboek = "BK"  # Bank dagboek
     
     # Genereer volgnummer
-    laatste = await db.boekhouding_journaalposten.find_one(
-        {"user_id": user_id, "dagboek_code": dagboek},
-        sort=[("volgnummer", -1)]
-    )
-    if laatste and laatste.get("volgnummer"):
-        try:
-            num = int(laatste["volgnummer"].split("-")[-1]) + 1
-        except:
-            num = 1
-    else:
-        num = 1
-    volgnummer = f"{dagboek}{data.datum.year}-{num:05d}"
+    volgnummer = await volgend_volgnummer(db, user_id, dagboek, jaar=data.datum.year)
     
     journaalpost = {
         "id": str(uuid.uuid4()),
@@ -2103,6 +2047,7 @@ async def create_banktransactie(data: BanktransactieCreate, authorization: str =
         "created_at": datetime.now(timezone.utc)
     }
     await db.boekhouding_journaalposten.insert_one(journaalpost)
+    await boek_saldo_mutaties(db, user_id, journaalpost)
     
     # Update transactie met journaalpost referentie
     await db.boekhouding_banktransacties.update_one(
@@ -2111,17 +2056,7 @@ async def create_banktransactie(data: BanktransactieCreate, authorization: str =
     )
     
     # Update rekening saldi
-    for regel in regels:
-        if regel["debet"] > 0:
-            await db.boekhouding_rekeningen.update_one(
-                {"user_id": user_id, "code": regel["rekening_code"]},
-                {"$inc": {"saldo": regel["debet"]}}
-            )
-        if regel["credit"] > 0:
-            await db.boekhouding_rekeningen.update_one(
-                {"user_id": user_id, "code": regel["rekening_code"]},
-                {"$inc": {"saldo": -regel["credit"]}}
-            )
+    await boek_rekening_saldi(db, user_id, regels)
     
     # Return updated transactie
     transactie["geboekt"] = True
@@ -2132,158 +2067,83 @@ async def create_banktransactie(data: BanktransactieCreate, authorization: str =
 
 @router.post("/bank/import/csv")
 async def import_bank_csv(bank_id: str, file: UploadFile = File(...), authorization: str = Header(None)):
-    """Importeer banktransacties uit CSV"""
+    """Importeer banktransacties uit CSV (regel voor regel, met duplicaatdetectie)"""
     user = await get_current_user(authorization)
     user_id = user.get('id')
     
-    content = await file.read()
-    try:
-        content_str = content.decode('utf-8')
-    except:
-        content_str = content.decode('latin-1')
-    
-    lines = content_str.strip().split('\n')
-    imported = 0
-    
-    for line in lines[1:]:  # Skip header
-        try:
-            parts = line.split(';')
-            if len(parts) >= 3:
-                transactie = {
-                    "id": str(uuid.uuid4()),
-                    "user_id": user_id,
-                    "bankrekening_id": bank_id,
-                    "datum": parts[0].strip(),
-                    "omschrijving": parts[1].strip(),
-                    "bedrag": float(parts[2].strip().replace(',', '.')),
-                    "status": "nieuw",
-                    "import_bron": "csv",
-                    "created_at": datetime.now(timezone.utc)
-                }
-                await db.boekhouding_banktransacties.insert_one(transactie)
-                imported += 1
-        except:
-            pass
-    
-    return {"message": f"{imported} transacties geïmporteerd", "imported": imported}
+    rapport = await importeer_banktransacties(
+        db, user_id, bank_id, csv_transacties(upload_regels(file.file)), bron="csv"
+    )
+    return rapport
+
+def _mt940_transacties(statements, eindsaldi: list):
+    """Transacties uit de afschriften; het eindsaldo van elk afschrift komt in `eindsaldi`."""
+    for statement in statements:
+        eindsaldi.append(statement.eindsaldo)
+        for tx in statement.transacties:
+            yield {
+                "datum": tx.datum.isoformat() if tx.datum else datetime.now().strftime('%Y-%m-%d'),
+                "valutadatum": tx.valutadatum.isoformat() if tx.valutadatum else None,
+                "omschrijving": tx.omschrijving,
+                "bedrag": tx.bedrag,
+                "tegenrekening": tx.tegenrekening,
+                "tegenpartij": tx.tegenpartij,
+                "referentie": tx.referentie,
+                "raw_data": tx.raw_data,
+            }
 
 @router.post("/bank/import/mt940")
 async def import_mt940(bank_id: str, file: UploadFile = File(...), authorization: str = Header(None)):
-    """Importeer banktransacties uit MT940 bestand met verbeterde parsing"""
+    """Importeer banktransacties uit MT940 bestand (regel voor regel, met duplicaatdetectie)"""
     user = await get_current_user(authorization)
     user_id = user.get('id')
     
-    content = await file.read()
+    if not MT940_ENABLED:
+        raise HTTPException(status_code=501, detail="MT940 import niet beschikbaar")
     
-    # Gebruik de verbeterde MT940 parser indien beschikbaar
-    if MT940_ENABLED:
-        try:
-            statements = parse_mt940_file(content)
-            
-            imported = 0
-            for statement in statements:
-                for tx in statement.transacties:
-                    transactie = {
-                        "id": str(uuid.uuid4()),
-                        "user_id": user_id,
-                        "bankrekening_id": bank_id,
-                        "datum": tx.datum.isoformat() if tx.datum else datetime.now().strftime('%Y-%m-%d'),
-                        "valutadatum": tx.valutadatum.isoformat() if tx.valutadatum else None,
-                        "omschrijving": tx.omschrijving,
-                        "bedrag": tx.bedrag,
-                        "tegenrekening": tx.tegenrekening,
-                        "tegenpartij": tx.tegenpartij,
-                        "referentie": tx.referentie,
-                        "status": "nieuw",
-                        "import_bron": "mt940",
-                        "raw_data": tx.raw_data,
-                        "created_at": datetime.now(timezone.utc)
-                    }
-                    await db.boekhouding_banktransacties.insert_one(transactie)
-                    imported += 1
-                
-                # Update bankrekening saldo
-                if statement.eindsaldo != 0:
-                    await db.boekhouding_bankrekeningen.update_one(
-                        {"id": bank_id, "user_id": user_id},
-                        {"$set": {
-                            "huidig_saldo": statement.eindsaldo,
-                            "laatste_import": datetime.now(timezone.utc)
-                        }}
-                    )
-            
-            return {
-                "message": f"{imported} transacties geïmporteerd",
-                "imported": imported,
-                "statements_processed": len(statements)
-            }
-            
-        except Exception as e:
-            # Fallback naar basic parsing
-            pass
-    
-    # Fallback: Basic MT940 parsing
-    try:
-        content_str = content.decode('utf-8')
-    except:
-        content_str = content.decode('latin-1')
-    
-    transactions = []
-    lines = content_str.split('\n')
-    current_tx = {}
-    
-    for line in lines:
-        line = line.strip()
-        if line.startswith(':61:'):
-            if current_tx:
-                transactions.append(current_tx)
-            current_tx = {"raw": line[4:]}
-            try:
-                date_str = line[4:10]
-                current_tx["datum"] = f"20{date_str[:2]}-{date_str[2:4]}-{date_str[4:6]}"
-                
-                # Parse bedrag
-                tx_data = line[4:]
-                cd_pos = 6
-                if len(tx_data) > 12 and tx_data[6:12].isdigit():
-                    cd_pos = 12
-                
-                sign = 1 if tx_data[cd_pos] == 'C' else -1
-                import re
-                bedrag_match = re.search(r'[CD](\d+[,.]?\d*)', tx_data[cd_pos:])
-                if bedrag_match:
-                    current_tx["bedrag"] = sign * float(bedrag_match.group(1).replace(',', '.'))
-                else:
-                    current_tx["bedrag"] = 0
-            except:
-                current_tx["datum"] = datetime.now().strftime('%Y-%m-%d')
-                current_tx["bedrag"] = 0
-        elif line.startswith(':86:') and current_tx:
-            current_tx["omschrijving"] = line[4:]
-    
-    if current_tx:
-        transactions.append(current_tx)
+    # Eén parser voor elk bestand, zodat een herhaalde import dezelfde vingerafdrukken oplevert
+    eindsaldi = []
+    rapport = await importeer_banktransacties(
+        db, user_id, bank_id,
+        _mt940_transacties(iter_mt940_statements(upload_regels(file.file)), eindsaldi),
+        bron="mt940",
+    )
     
-    imported = 0
-    for tx in transactions:
-        transactie = {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "bankrekening_id": bank_id,
-            "datum": tx.get("datum", datetime.now().strftime('%Y-%m-%d')),
-            "omschrijving": tx.get("omschrijving", ""),
-            "bedrag": tx.get("bedrag", 0),
-            "status": "nieuw",
-            "import_bron": "mt940",
-            "created_at": datetime.now(timezone.utc)
-        }
-        await db.boekhouding_banktransacties.insert_one(transactie)
-        imported += 1
+    # Update bankrekening saldo met het laatste eindsaldo
+    bekende_saldi = [saldo for saldo in eindsaldi if saldo != 0]
+    if bekende_saldi:
+        await db.boekhouding_bankrekeningen.update_one(
+            {"id": bank_id, "user_id": user_id},
+            {"$set": {
+                "huidig_saldo": bekende_saldi[-1],
+                "laatste_import": datetime.now(timezone.utc)
+            }}
+        )
     
-    return {"message": f"{imported} transacties geïmporteerd", "imported": imported}
+    return {**rapport, "statements_processed": len(eindsaldi)}
 
 # ==================== RECONCILIATIE ====================
 
+async def _laad_open_facturen(user_id: str):
+    """Alle openstaande verkoop- en inkoopfacturen als reconciliatie-index (zonder limiet)"""
+    velden = {"_id": 0, "id": 1, "factuurnummer": 1, "intern_nummer": 1, "openstaand_bedrag": 1,
+              "debiteur_naam": 1, "crediteur_naam": 1}
+    verkoop = await db.boekhouding_verkoopfacturen.find({
+        "user_id": user_id,
+        "status": {"$in": ["verzonden", "herinnering", "gedeeltelijk_betaald"]},
+        "openstaand_bedrag": {"$gt": 0}
+    }, velden).to_list(None)
+    for f in verkoop:
+        f['type'] = 'verkoop'
+    inkoop = await db.boekhouding_inkoopfacturen.find({
+        "user_id": user_id,
+        "status": {"$in": ["geboekt", "gedeeltelijk_betaald"]},
+        "openstaand_bedrag": {"$gt": 0}
+    }, velden).to_list(None)
+    for f in inkoop:
+        f['type'] = 'inkoop'
+    return FactuurIndex(verkoop), FactuurIndex(inkoop)
+
 @router.get("/banktransacties/{transactie_id}/reconciliatie-suggesties")
 async def get_reconciliatie_suggesties(transactie_id: str, authorization: str = Header(None)):
     """Haal automatische reconciliatie suggesties op voor een banktransactie"""
@@ -2295,53 +2155,58 @@ async def get_reconciliatie_suggesties(transactie_id: str, authorization: str =
     if not transactie:
         raise HTTPException(status_code=404, detail="Transactie niet gevonden")
     
-    suggesties = []
-    
-    if MT940_ENABLED:
-        # Maak MT940Transaction object
-        tx = MT940Transaction(
-            datum=datetime.fromisoformat(transactie['datum']).date() if transactie.get('datum') else date.today(),
-            valutadatum=None,
-            bedrag=transactie.get('bedrag', 0),
-            omschrijving=transactie.get('omschrijving', ''),
-            tegenrekening=transactie.get('tegenrekening'),
-            tegenpartij=transactie.get('tegenpartij'),
-            referentie=transactie.get('referentie'),
-            boekcode=None,
-            raw_data=transactie.get('raw_data', '')
-        )
-        
-        # Haal openstaande facturen afhankelijk van credit/debet
-        if transactie.get('bedrag', 0) > 0:
-            # Inkomende betaling -> match met verkoopfacturen
-            facturen = await db.boekhouding_verkoopfacturen.find({
-                "user_id": user_id,
-                "status": {"$in": ["verzonden", "herinnering", "gedeeltelijk_betaald"]},
-                "openstaand_bedrag": {"$gt": 0}
-            }).to_list(100)
-            for f in facturen:
-                f['type'] = 'verkoop'
-        else:
-            # Uitgaande betaling -> match met inkoopfacturen
-            facturen = await db.boekhouding_inkoopfacturen.find({
-                "user_id": user_id,
-                "status": {"$in": ["geboekt", "gedeeltelijk_betaald"]},
-                "openstaand_bedrag": {"$gt": 0}
-            }).to_list(100)
-            for f in facturen:
-                f['type'] = 'inkoop'
-        
-        # Genereer suggesties
-        suggesties = suggest_reconciliation(tx, [clean_doc(f) for f in facturen])
+    # Inkomende betaling -> verkoopfacturen, uitgaande betaling -> inkoopfacturen
+    verkoop_index, inkoop_index = await _laad_open_facturen(user_id)
+    resultaat = match_transacties([transactie], verkoop_index, inkoop_index)[0]
     
     return {
         "transactie_id": transactie_id,
-        "suggesties": suggesties,
+        "suggesties": resultaat["suggesties"],
         "transactie_bedrag": transactie.get('bedrag', 0),
         "transactie_omschrijving": transactie.get('omschrijving', '')
     }
 
 
+@router.post("/bankrekeningen/{rekening_id}/auto-reconciliatie")
+async def auto_reconciliatie(
+    rekening_id: str,
+    auto_koppelen: bool = False,
+    drempel: int = 80,
+    authorization: str = Header(None)
+):
+    """Match alle nieuwe transacties van een bankrekening in één run met openstaande facturen.
+    Met auto_koppelen worden eenduidige matches vanaf `drempel` direct gereconcilieerd."""
+    user = await get_current_user(authorization)
+    user_id = user.get('id')
+    
+    transacties = await db.boekhouding_banktransacties.find(
+        {"user_id": user_id, "bankrekening_id": rekening_id, "status": "nieuw"},
+        {"_id": 0, "id": 1, "bedrag": 1, "omschrijving": 1, "tegenpartij": 1}
+    ).to_list(None)
+    verkoop_index, inkoop_index = await _laad_open_facturen(user_id)
+    resultaten = match_transacties(
+        transacties, verkoop_index, inkoop_index, drempel=drempel if auto_koppelen else None
+    )
+    
+    gekoppeld = 0
+    for r in resultaten:
+        koppeling = r["koppeling"]
+        if not koppeling:
+            continue
+        try:
+            await _reconcilieer(user_id, r["transactie_id"], koppeling["factuur_id"], koppeling["type"])
+            gekoppeld += 1
+        except HTTPException:
+            r["koppeling"] = None
+    
+    return {
+        "transacties": len(transacties),
+        "met_suggesties": sum(1 for r in resultaten if r["suggesties"]),
+        "gekoppeld": gekoppeld,
+        "resultaten": resultaten
+    }
+
+
 @router.post("/banktransacties/{transactie_id}/reconcilieer")
 async def reconcilieer_transactie(
     transactie_id: str,
@@ -2351,8 +2216,11 @@ async def reconcilieer_transactie(
 ):
     """Koppel banktransactie aan factuur (reconciliatie)"""
     user = await get_current_user(authorization)
-    user_id = user.get('id')
-    
+    return await _reconcilieer(user.get('id'), transactie_id, factuur_id, factuur_type)
+
+
+async def _reconcilieer(user_id: str, transactie_id: str, factuur_id: str, factuur_type: str) -> dict:
+    """Koppel banktransactie aan factuur en werk openstaand bedrag + relatiesaldo bij"""
     # Haal transactie
     transactie = await db.boekhouding_banktransacties.find_one({"id": transactie_id, "user_id": user_id})
     if not transactie:
@@ -2465,6 +2333,89 @@ async def get_verkoopfacturen(status: str = None, debiteur_id: str = None, autho
     
     return result
 
+def factuur_template_settings(instellingen: dict) -> dict:
+    """Template settings (huisstijl) voor de factuur PDF uit de bedrijfsinstellingen"""
+    return {
+        'factuur_primaire_kleur': instellingen.get('factuur_primaire_kleur', '#1e293b'),
+        'factuur_secundaire_kleur': instellingen.get('factuur_secundaire_kleur', '#f1f5f9'),
+        'factuur_template': instellingen.get('factuur_template', 'standaard'),
+        'factuur_voorwaarden': instellingen.get('factuur_voorwaarden', '')
+    }
+
+@router.get("/verkoopfacturen/pdf-zip")
+async def get_verkoopfacturen_pdf_zip(
+    van: str = None,
+    tot: str = None,
+    status: str = None,
+    debiteur_id: str = None,
+    authorization: str = Header(None)
+):
+    """Download alle verkoopfacturen van een periode (factuurdatum van/tot) als ZIP met PDFs.
+    De PDFs worden parallel gerenderd en het archief wordt gestreamd."""
+    user = await get_current_user(authorization)
+    user_id = user.get('id')
+    
+    if not PDF_ENABLED:
+        raise HTTPException(status_code=501, detail="PDF generatie niet beschikbaar")
+    
+    query = {"user_id": user_id}
+    if van or tot:
+        query["factuurdatum"] = {}
+        if van:
+            query["factuurdatum"]["$gte"] = van
+        if tot:
+            query["factuurdatum"]["$lte"] = tot
+    if status:
+        query["status"] = status
+    if debiteur_id:
+        query["debiteur_id"] = debiteur_id
+    
+    if not await db.boekhouding_verkoopfacturen.count_documents(query, limit=1):
+        raise HTTPException(status_code=404, detail="Geen facturen gevonden voor deze selectie")
+    
+    instellingen = await db.boekhouding_instellingen.find_one({"user_id": user_id}, {"_id": 0})
+    if not instellingen:
+        instellingen = {
+            "bedrijfsnaam": user.get('company_name', 'Uw Bedrijf'),
+            "adres": user.get('address', ''),
+            "email": user.get('email', ''),
+            "telefoon": user.get('phone', '')
+        }
+    template_settings = factuur_template_settings(instellingen)
+    
+    # Debiteuren in een query i.p.v. een lookup per factuur
+    debiteur_ids = await db.boekhouding_verkoopfacturen.distinct("debiteur_id", query)
+    debiteuren = {
+        d["id"]: d async for d in db.boekhouding_debiteuren.find(
+            {"user_id": user_id, "id": {"$in": [d for d in debiteur_ids if d]}}, {"_id": 0}
+        )
+    }
+    
+    async def jobs():
+        async for factuur in db.boekhouding_verkoopfacturen.find(query, {"_id": 0}).sort("factuurdatum", 1):
+            yield {
+                "factuur": factuur,
+                "bedrijf": instellingen,
+                "debiteur": debiteuren.get(factuur.get("debiteur_id")),
+                "template_settings": template_settings,
+            }
+    
+    try:
+        zip_stream = stream_invoice_pdf_zip(jobs())
+    except PdfBatchBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Er worden al te veel PDF-batches tegelijk gemaakt. Probeer het over enkele seconden opnieuw.",
+            headers={"Retry-After": "10"},
+        )
+    
+    periode = re.sub(r'[^0-9A-Za-z_-]', '', "_".join(p for p in (van, tot) if p)) or datetime.now().strftime('%Y%m%d')
+    return StreamingResponse(
+        zip_stream,
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=facturen_{periode}.zip"}
+    )
+
 @router.get("/verkoopfacturen/{factuur_id}")
 async def get_verkoopfactuur(factuur_id: str, authorization: str = Header(None)):
     """Haal specifieke verkoopfactuur op"""
@@ -2527,8 +2478,7 @@ async def create_verkoopfactuur(data: VerkoopfactuurCreate, authorization: str =
     
     # Genereer factuurnummer
     year = datetime.now().year
-    count = await db.boekhouding_verkoopfacturen.count_documents({"user_id": user_id})
-    factuurnummer = f"VF{year}-{count + 1:05d}"
+    factuurnummer = await volgend_nummer(db, user_id, f"VF{year}-", "boekhouding_verkoopfacturen", "factuurnummer")
     
     # Haal debiteur
     debiteur = await db.boekhouding_debiteuren.find_one({"id": data.debiteur_id, "user_id": user_id})
@@ -2948,22 +2898,24 @@ async def boek_alle_verzonden_facturen(authorization: str = Header(None)):
     geboekt = 0
     overgeslagen = 0
     
-    for factuur in facturen:
-        # Controleer of er al een boeking bestaat
-        bestaande_boeking = await db.boekhouding_journaalposten.find_one({
-            "user_id": user_id,
-            "document_ref": factuur["id"],
-            "dagboek_code": "VK"
-        })
-        
-        if not bestaande_boeking:
-            try:
-                await boek_verkoopfactuur(user_id, factuur)
-                geboekt += 1
-            except Exception as e:
-                print(f"Fout bij boeken factuur {factuur.get('factuurnummer')}: {e}")
-                overgeslagen += 1
-        else:
+    # Controleer in één query welke facturen al een boeking hebben
+    al_geboekt = set(await db.boekhouding_journaalposten.distinct("document_ref", {
+        "user_id": user_id,
+        "dagboek_code": "VK",
+        "document_ref": {"$in": [f["id"] for f in facturen]}
+    }))
+    te_boeken = [f for f in facturen if f["id"] not in al_geboekt]
+    overgeslagen += len(facturen) - len(te_boeken)
+    
+    # Reserveer het hele blok volgnummers in één keer
+    volgnummers = await reserveer_volgnummers(db, user_id, "VK", len(te_boeken))
+    
+    for factuur, volgnummer in zip(te_boeken, volgnummers):
+        try:
+            await boek_verkoopfactuur(user_id, factuur, volgnummer=volgnummer)
+            geboekt += 1
+        except Exception as e:
+            print(f"Fout bij boeken factuur {factuur.get('factuurnummer')}: {e}")
             overgeslagen += 1
     
     return {
@@ -3013,19 +2965,11 @@ async def get_verkoopfactuur_pdf(factuur_id: str, authorization: str = Header(No
     # Genereer PDF
     if PDF_ENABLED:
         try:
-            # Extract template settings from instellingen
-            template_settings = {
-                'factuur_primaire_kleur': instellingen.get('factuur_primaire_kleur', '#1e293b'),
-                'factuur_secundaire_kleur': instellingen.get('factuur_secundaire_kleur', '#f1f5f9'),
-                'factuur_template': instellingen.get('factuur_template', 'standaard'),
-                'factuur_voorwaarden': instellingen.get('factuur_voorwaarden', '')
-            }
-            
             pdf_bytes = generate_invoice_pdf(
                 factuur=factuur_clean,
                 bedrijf=clean_doc(instellingen) if instellingen else {},
                 debiteur=debiteur,
-                template_settings=template_settings
+                template_settings=factuur_template_settings(instellingen)
             )
             
             return Response(
@@ -3151,8 +3095,7 @@ async def create_inkoopfactuur(data: InkoopfactuurCreate, authorization: str = H
     
     # Genereer intern nummer
     year = datetime.now().year
-    count = await db.boekhouding_inkoopfacturen.count_documents({"user_id": user_id})
-    intern_nummer = f"IF{year}-{count + 1:05d}"
+    intern_nummer = await volgend_nummer(db, user_id, f"IF{year}-", "boekhouding_inkoopfacturen", "intern_nummer")
     
     # Haal crediteur
     crediteur = await db.boekhouding_crediteuren.find_one({"id": data.crediteur_id, "user_id": user_id})
@@ -3316,22 +3259,23 @@ async def boek_alle_geboekte_inkoopfacturen(authorization: str = Header(None)):
     geboekt = 0
     overgeslagen = 0
     
-    for factuur in facturen:
-        # Controleer of er al een boeking bestaat
-        bestaande_boeking = await db.boekhouding_journaalposten.find_one({
-            "user_id": user_id,
-            "document_ref": factuur["id"],
-            "dagboek_code": "IK"
-        })
-        
-        if not bestaande_boeking:
-            try:
-                await boek_inkoopfactuur(user_id, factuur)
-                geboekt += 1
-            except Exception as e:
-                print(f"Fout bij boeken factuur {factuur.get('factuurnummer')}: {e}")
-                overgeslagen += 1
-        else:
+    # Controleer in één query welke facturen al een boeking hebben
+    al_geboekt = set(await db.boekhouding_journaalposten.distinct("document_ref", {
+        "user_id": user_id,
+        "dagboek_code": "IK",
+        "document_ref": {"$in": [f["id"] for f in facturen]}
+    }))
+    te_boeken = [f for f in facturen if f["id"] not in al_geboekt]
+    overgeslagen += len(facturen) - len(te_boeken)
+    
+    volgnummers = await reserveer_volgnummers(db, user_id, "IK", len(te_boeken))
+    
+    for factuur, volgnummer in zip(te_boeken, volgnummers):
+        try:
+            await boek_inkoopfactuur(user_id, factuur, volgnummer=volgnummer)
+            geboekt += 1
+        except Exception as e:
+            print(f"Fout bij boeken factuur {factuur.get('factuurnummer')}: {e}")
             overgeslagen += 1
     
     return {
@@ -3486,8 +3430,7 @@ async def create_vast_activum(data: VastActivumCreate, authorization: str = Head
     user = await get_current_user(authorization)
     user_id = user.get('id')
     
-    count = await db.boekhouding_vaste_activa.count_documents({"user_id": user_id})
-    activum_nummer = f"ACT{count + 1:05d}"
+    activum_nummer = await volgend_nummer(db, user_id, "ACT", "boekhouding_vaste_activa", "activum_nummer")
     
     jaarlijkse_afschrijving = (data.aanschafwaarde - data.restwaarde) / data.levensduur_jaren
     
@@ -3579,11 +3522,7 @@ async def afschrijven_activum(activum_id: str, create_journal: bool = True, auth
         accounts = account_mapping.get(categorie, account_mapping["inventaris"])
         
         # Get next journal number
-        count = await db.boekhouding_journaalposten.count_documents({
-            "user_id": user_id,
-            "dagboek_code": "AFR"
-        })
-        volgnummer = f"AFR{datetime.now().year}-{count + 1:05d}"
+        volgnummer = await volgend_volgnummer(db, user_id, "AFR")
         
         activum_naam = activum.get("naam", "Onbekend")
         periode = datetime.now().strftime("%Y-%m")
@@ -3621,6 +3560,7 @@ async def afschrijven_activum(activum_id: str, create_journal: bool = True, auth
         }
         
         await db.boekhouding_journaalposten.insert_one(journal_entry)
+        await boek_saldo_mutaties(db, user_id, journal_entry)
         
         # Clean for response
         if "_id" in journal_entry:
@@ -3889,8 +3829,7 @@ async def create_inkooporder(data: InkooporderCreate, authorization: str = Heade
     user = await get_current_user(authorization)
     user_id = user.get('id')
     
-    count = await db.boekhouding_inkooporders.count_documents({"user_id": user_id})
-    ordernummer = f"IO{datetime.now().year}-{count + 1:05d}"
+    ordernummer = await volgend_nummer(db, user_id, f"IO{datetime.now().year}-", "boekhouding_inkooporders", "ordernummer")
     
     order = {
         "id": str(uuid.uuid4()),
@@ -3928,8 +3867,7 @@ async def create_offerte(data: OfferteCreate, authorization: str = Header(None))
     user = await get_current_user(authorization)
     user_id = user.get('id')
     
-    count = await db.boekhouding_offertes.count_documents({"user_id": user_id})
-    offertenummer = f"OF{datetime.now().year}-{count + 1:05d}"
+    offertenummer = await volgend_nummer(db, user_id, f"OF{datetime.now().year}-", "boekhouding_offertes", "offertenummer")
     
     debiteur = await db.boekhouding_debiteuren.find_one({"id": data.debiteur_id, "user_id": user_id})
     
@@ -3990,8 +3928,7 @@ async def create_verkooporder(data: VerkooporderCreate, authorization: str = Hea
     user = await get_current_user(authorization)
     user_id = user.get('id')
     
-    count = await db.boekhouding_verkooporders.count_documents({"user_id": user_id})
-    ordernummer = f"VO{datetime.now().year}-{count + 1:05d}"
+    ordernummer = await volgend_nummer(db, user_id, f"VO{datetime.now().year}-", "boekhouding_verkooporders", "ordernummer")
     
     debiteur = await db.boekhouding_debiteuren.find_one({"id": data.debiteur_id, "user_id": user_id})
     
@@ -4019,7 +3956,7 @@ async def get_winst_verlies(jaar: int = None, authorization: str = Header(None))
     jaar = jaar or datetime.now().year
     
     # Haal alle rekeningen op met saldi (alleen niet-nul)
-    rekeningen = await db.boekhouding_rekeningen.find({
+    rekeningen = await reporting_db.boekhouding_rekeningen.find({
         "user_id": user_id,
         "saldo": {"$ne": 0}
     }).to_list(500)
@@ -4054,7 +3991,7 @@ async def get_winst_verlies(jaar: int = None, authorization: str = Header(None))
     
     # Fallback naar facturen als geen grootboek saldi
     if totaal_omzet == 0:
-        omzet = await db.boekhouding_verkoopfacturen.aggregate([
+        omzet = await reporting_db.boekhouding_verkoopfacturen.aggregate([
             {"$match": {"user_id": user_id, "status": {"$nin": ["concept", "geannuleerd"]}}},
             {"$group": {"_id": None, "totaal": {"$sum": "$subtotaal"}}}
         ]).to_list(1)
@@ -4064,7 +4001,7 @@ async def get_winst_verlies(jaar: int = None, authorization: str = Header(None))
             totaal_omzet = fallback_omzet
     
     if totaal_kosten == 0:
-        kosten = await db.boekhouding_inkoopfacturen.aggregate([
+        kosten = await reporting_db.boekhouding_inkoopfacturen.aggregate([
             {"$match": {"user_id": user_id, "status": {"$nin": ["nieuw", "geannuleerd"]}}},
             {"$group": {"_id": None, "totaal": {"$sum": "$subtotaal"}}}
         ]).to_list(1)
@@ -4092,7 +4029,7 @@ async def get_balans(authorization: str = Header(None)):
     user_id = user.get('id')
     
     # Haal alle rekeningen met saldi op, gegroepeerd per type
-    rekeningen = await db.boekhouding_rekeningen.find({
+    rekeningen = await reporting_db.boekhouding_rekeningen.find({
         "user_id": user_id,
         "saldo": {"$ne": 0}
     }).to_list(500)
@@ -4130,14 +4067,14 @@ async def get_balans(authorization: str = Header(None)):
     # Fallback: Haal ook data uit facturen (voor backward compatibility)
     if not activa:
         # Bank saldi
-        bank_saldo = await db.boekhouding_bankrekeningen.aggregate([
+        bank_saldo = await reporting_db.boekhouding_bankrekeningen.aggregate([
             {"$match": {"user_id": user_id}},
             {"$group": {"_id": None, "totaal": {"$sum": "$huidig_saldo"}}}
         ]).to_list(1)
         liquide_middelen = bank_saldo[0]["totaal"] if bank_saldo else 0
         
         # Debiteuren
-        debiteuren = await db.boekhouding_verkoopfacturen.aggregate([
+        debiteuren = await reporting_db.boekhouding_verkoopfacturen.aggregate([
             {"$match": {"user_id": user_id, "status": {"$nin": ["betaald", "geannuleerd", "concept"]}}},
             {"$group": {"_id": None, "totaal": {"$sum": "$openstaand_bedrag"}}}
         ]).to_list(1)
@@ -4152,14 +4089,14 @@ async def get_balans(authorization: str = Header(None)):
     
     if not passiva:
         # Crediteuren
-        crediteuren = await db.boekhouding_inkoopfacturen.aggregate([
+        crediteuren = await reporting_db.boekhouding_inkoopfacturen.aggregate([
             {"$match": {"user_id": user_id, "status": {"$in": ["geboekt", "gedeeltelijk_betaald"]}}},
             {"$group": {"_id": None, "totaal": {"$sum": "$openstaand_bedrag"}}}
         ]).to_list(1)
         crediteuren_totaal = crediteuren[0]["totaal"] if crediteuren else 0
         
         # BTW te betalen
-        btw_passiva = await db.boekhouding_rekeningen.find_one({
+        btw_passiva = await reporting_db.boekhouding_rekeningen.find_one({
             "user_id": user_id,
             "code": {"$in": ["2210", "2350"]},
             "saldo": {"$gt": 0}
@@ -4188,14 +4125,14 @@ async def get_btw_rapport(jaar: int = None, kwartaal: int = None, authorization:
     user_id = user.get('id')
     
     # BTW verkoop
-    btw_verkoop = await db.boekhouding_verkoopfacturen.aggregate([
+    btw_verkoop = await reporting_db.boekhouding_verkoopfacturen.aggregate([
         {"$match": {"user_id": user_id, "status": {"$ne": "concept"}}},
         {"$group": {"_id": None, "totaal": {"$sum": "$btw_bedrag"}}}
     ]).to_list(1)
     btw_verkoop_totaal = btw_verkoop[0]["totaal"] if btw_verkoop else 0
     
     # BTW inkoop
-    btw_inkoop = await db.boekhouding_inkoopfacturen.aggregate([
+    btw_inkoop = await reporting_db.boekhouding_inkoopfacturen.aggregate([
         {"$match": {"user_id": user_id, "status": {"$ne": "nieuw"}}},
         {"$group": {"_id": None, "totaal": {"$sum": "$btw_bedrag"}}}
     ]).to_list(1)
@@ -4231,7 +4168,7 @@ async def get_suriname_btw_aangifte(jaar: int = None, maand: int = None, authori
         end_date = f"{jaar}-{maand + 1:02d}-01"
     
     # BTW Verkopen per tarief
-    btw_verkoop_25 = await db.boekhouding_verkoopfacturen.aggregate([
+    btw_verkoop_25 = await reporting_db.boekhouding_verkoopfacturen.aggregate([
         {"$match": {"user_id": user_id, "status": {"$ne": "concept"}}},
         {"$unwind": "$regels"},
         {"$match": {"regels.btw_percentage": 25}},
@@ -4242,7 +4179,7 @@ async def get_suriname_btw_aangifte(jaar: int = None, maand: int = None, authori
         }}
     ]).to_list(1)
     
-    btw_verkoop_10 = await db.boekhouding_verkoopfacturen.aggregate([
+    btw_verkoop_10 = await reporting_db.boekhouding_verkoopfacturen.aggregate([
         {"$match": {"user_id": user_id, "status": {"$ne": "concept"}}},
         {"$unwind": "$regels"},
         {"$match": {"regels.btw_percentage": 10}},
@@ -4253,7 +4190,7 @@ async def get_suriname_btw_aangifte(jaar: int = None, maand: int = None, authori
         }}
     ]).to_list(1)
     
-    btw_verkoop_0 = await db.boekhouding_verkoopfacturen.aggregate([
+    btw_verkoop_0 = await reporting_db.boekhouding_verkoopfacturen.aggregate([
         {"$match": {"user_id": user_id, "status": {"$ne": "concept"}}},
         {"$unwind": "$regels"},
         {"$match": {"regels.btw_percentage": 0}},
@@ -4264,7 +4201,7 @@ async def get_suriname_btw_aangifte(jaar: int = None, maand: int = None, authori
     ]).to_list(1)
     
     # BTW Inkoop (voorbelasting)
-    btw_inkoop = await db.boekhouding_inkoopfacturen.aggregate([
+    btw_inkoop = await reporting_db.boekhouding_inkoopfacturen.aggregate([
         {"$match": {"user_id": user_id, "status": {"$ne": "nieuw"}}},
         {"$group": {"_id": None, "totaal": {"$sum": "$btw_bedrag"}}}
     ]).to_list(1)
@@ -4314,7 +4251,7 @@ async def get_suriname_loonbelasting(jaar: int = None, maand: int = None, author
     maand = maand or datetime.now().month
     
     # Haal uren/loongegevens
-    uren = await db.boekhouding_uren.find({
+    uren = await reporting_db.boekhouding_uren.find({
         "user_id": user_id,
         "factureerbaar": True
     }).to_list(1000)
@@ -4367,19 +4304,19 @@ async def get_suriname_inkomstenbelasting(jaar: int = None, authorization: str =
     jaar = jaar or datetime.now().year
     
     # Omzet
-    omzet = await db.boekhouding_verkoopfacturen.aggregate([
+    omzet = await reporting_db.boekhouding_verkoopfacturen.aggregate([
         {"$match": {"user_id": user_id, "status": {"$ne": "concept"}}},
         {"$group": {"_id": None, "totaal": {"$sum": "$subtotaal"}}}
     ]).to_list(1)
     
     # Kosten
-    kosten = await db.boekhouding_inkoopfacturen.aggregate([
+    kosten = await reporting_db.boekhouding_inkoopfacturen.aggregate([
         {"$match": {"user_id": user_id, "status": {"$ne": "nieuw"}}},
         {"$group": {"_id": None, "totaal": {"$sum": "$subtotaal"}}}
     ]).to_list(1)
     
     # Afschrijvingen
-    afschrijvingen = await db.boekhouding_vaste_activa.aggregate([
+    afschrijvingen = await reporting_db.boekhouding_vaste_activa.aggregate([
         {"$match": {"user_id": user_id, "status": "actief"}},
         {"$group": {"_id": None, "totaal": {"$sum": "$jaarlijkse_afschrijving"}}}
     ]).to_list(1)
@@ -4436,20 +4373,22 @@ async def get_ouderdom_rapport(type: str = "debiteuren", authorization: str = He
     user_id = user.get('id')
     today = datetime.now().date()
     
+    # Cursor doorlopen i.p.v. to_list(1000): geen facturen afkappen
+    ouderdom_projection = {"_id": 0, "vervaldatum": 1, "openstaand_bedrag": 1}
     if type == "debiteuren":
-        facturen = await db.boekhouding_verkoopfacturen.find({
+        facturen = reporting_db.boekhouding_verkoopfacturen.find({
             "user_id": user_id,
             "status": {"$in": ["verzonden", "herinnering", "gedeeltelijk_betaald"]}
-        }).to_list(1000)
+        }, ouderdom_projection)
     else:
-        facturen = await db.boekhouding_inkoopfacturen.find({
+        facturen = reporting_db.boekhouding_inkoopfacturen.find({
             "user_id": user_id,
             "status": {"$in": ["geboekt", "gedeeltelijk_betaald"]}
-        }).to_list(1000)
+        }, ouderdom_projection)
     
     analyse = {"0_30": 0, "31_60": 0, "61_90": 0, "90_plus": 0, "totaal": 0}
     
-    for f in facturen:
+    async for f in facturen:
         try:
             verval = datetime.fromisoformat(f["vervaldatum"]).date()
             dagen = (today - verval).days
@@ -4474,74 +4413,65 @@ async def get_ouderdom_rapport(type: str = "debiteuren", authorization: str = He
 
 @router.get("/export/grootboek")
 async def export_grootboek(authorization: str = Header(None)):
-    """Export grootboek naar Excel"""
+    """Export grootboek naar Excel (gestreamd, zonder limiet op het aantal regels)"""
     user = await get_current_user(authorization)
     user_id = user.get('id')
     
     if not EXCEL_ENABLED:
         raise HTTPException(status_code=501, detail="Excel export niet beschikbaar")
     
-    rekeningen = await db.boekhouding_rekeningen.find({"user_id": user_id}).sort("code", 1).to_list(500)
-    journaalposten = await db.boekhouding_journaalposten.find({"user_id": user_id}).sort("datum", -1).to_list(500)
-    
-    excel_bytes = export_grootboek_excel(
-        [clean_doc(r) for r in rekeningen],
-        [clean_doc(j) for j in journaalposten]
-    )
+    output = await stream_excel_export([
+        ExportSheet("Rekeningschema", REKENING_COLUMNS, reporting_db.boekhouding_rekeningen.find(
+            {"user_id": user_id}, columns_projection(REKENING_COLUMNS)
+        ).sort("code", 1)),
+        ExportSheet("Journaalposten", JOURNAALPOST_COLUMNS, reporting_db.boekhouding_journaalposten.find(
+            {"user_id": user_id}, columns_projection(JOURNAALPOST_COLUMNS)
+        ).sort("datum", -1)),
+    ])
     
-    return Response(
-        content=excel_bytes,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename=grootboek_{datetime.now().strftime('%Y%m%d')}.xlsx"}
-    )
+    return excel_streaming_response(output, f"grootboek_{datetime.now().strftime('%Y%m%d')}.xlsx")
 
 
 @router.get("/export/debiteuren")
 async def export_debiteuren(authorization: str = Header(None)):
-    """Export debiteuren en facturen naar Excel"""
+    """Export debiteuren en facturen naar Excel (gestreamd, zonder limiet op het aantal regels)"""
     user = await get_current_user(authorization)
     user_id = user.get('id')
     
     if not EXCEL_ENABLED:
         raise HTTPException(status_code=501, detail="Excel export niet beschikbaar")
     
-    debiteuren = await db.boekhouding_debiteuren.find({"user_id": user_id}).sort("naam", 1).to_list(500)
-    facturen = await db.boekhouding_verkoopfacturen.find({"user_id": user_id}).sort("factuurdatum", -1).to_list(500)
-    
-    excel_bytes = export_debiteuren_excel(
-        [clean_doc(d) for d in debiteuren],
-        [clean_doc(f) for f in facturen]
-    )
+    output = await stream_excel_export([
+        ExportSheet("Debiteuren", RELATIE_COLUMNS, reporting_db.boekhouding_debiteuren.find(
+            {"user_id": user_id}, columns_projection(RELATIE_COLUMNS)
+        ).sort("naam", 1)),
+        ExportSheet("Verkoopfacturen", VERKOOPFACTUUR_COLUMNS, reporting_db.boekhouding_verkoopfacturen.find(
+            {"user_id": user_id}, columns_projection(VERKOOPFACTUUR_COLUMNS)
+        ).sort("factuurdatum", -1)),
+    ])
     
-    return Response(
-        content=excel_bytes,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename=debiteuren_{datetime.now().strftime('%Y%m%d')}.xlsx"}
-    )
+    return excel_streaming_response(output, f"debiteuren_{datetime.now().strftime('%Y%m%d')}.xlsx")
 
 
 @router.get("/export/crediteuren")
 async def export_crediteuren(authorization: str = Header(None)):
-    """Export crediteuren en facturen naar Excel"""
+    """Export crediteuren en facturen naar Excel (gestreamd, zonder limiet op het aantal regels)"""
     user = await get_current_user(authorization)
     user_id = user.get('id')
     
     if not EXCEL_ENABLED:
         raise HTTPException(status_code=501, detail="Excel export niet beschikbaar")
     
-    crediteuren = await db.boekhouding_crediteuren.find({"user_id": user_id}).sort("naam", 1).to_list(500)
-    facturen = await db.boekhouding_inkoopfacturen.find({"user_id": user_id}).sort("factuurdatum", -1).to_list(500)
-    
-    excel_bytes = export_crediteuren_excel(
-        [clean_doc(c) for c in crediteuren],
-        [clean_doc(f) for f in facturen]
-    )
+    output = await stream_excel_export([
+        ExportSheet("Crediteuren", RELATIE_COLUMNS, reporting_db.boekhouding_crediteuren.find(
+            {"user_id": user_id}, columns_projection(RELATIE_COLUMNS)
+        ).sort("naam", 1)),
+        ExportSheet("Inkoopfacturen", INKOOPFACTUUR_COLUMNS, reporting_db.boekhouding_inkoopfacturen.find(
+            {"user_id": user_id}, columns_projection(INKOOPFACTUUR_COLUMNS)
+        ).sort("factuurdatum", -1)),
+    ])
     
-    return Response(
-        content=excel_bytes,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename=crediteuren_{datetime.now().strftime('%Y%m%d')}.xlsx"}
-    )
+    return excel_streaming_response(output, f"crediteuren_{datetime.now().strftime('%Y%m%d')}.xlsx")
 
 
 @router.get("/export/btw-aangifte")
@@ -4556,13 +4486,13 @@ async def export_btw_aangifte(jaar: int = None, kwartaal: int = 1, authorization
     jaar = jaar or datetime.now().year
     
     # BTW verkoop
-    btw_verkoop = await db.boekhouding_verkoopfacturen.aggregate([
+    btw_verkoop = await reporting_db.boekhouding_verkoopfacturen.aggregate([
         {"$match": {"user_id": user_id, "status": {"$ne": "concept"}}},
         {"$group": {"_id": None, "totaal": {"$sum": "$btw_bedrag"}}}
     ]).to_list(1)
     
     # BTW inkoop
-    btw_inkoop = await db.boekhouding_inkoopfacturen.aggregate([
+    btw_inkoop = await reporting_db.boekhouding_inkoopfacturen.aggregate([
         {"$match": {"user_id": user_id, "status": {"$ne": "nieuw"}}},
         {"$group": {"_id": None, "totaal": {"$sum": "$btw_bedrag"}}}
     ]).to_list(1)
@@ -4594,12 +4524,12 @@ async def export_winst_verlies(jaar: int = None, authorization: str = Header(Non
     
     jaar = jaar or datetime.now().year
     
-    omzet = await db.boekhouding_verkoopfacturen.aggregate([
+    omzet = await reporting_db.boekhouding_verkoopfacturen.aggregate([
         {"$match": {"user_id": user_id, "status": {"$ne": "concept"}}},
         {"$group": {"_id": None, "totaal": {"$sum": "$subtotaal"}}}
     ]).to_list(1)
     
-    kosten = await db.boekhouding_inkoopfacturen.aggregate([
+    kosten = await reporting_db.boekhouding_inkoopfacturen.aggregate([
         {"$match": {"user_id": user_id, "status": {"$ne": "nieuw"}}},
         {"$group": {"_id": None, "totaal": {"$sum": "$subtotaal"}}}
     ]).to_list(1)
@@ -4635,19 +4565,19 @@ async def export_balans(authorization: str = Header(None)):
         raise HTTPException(status_code=501, detail="Excel export niet beschikbaar")
     
     # Bank saldi
-    bank_saldo = await db.boekhouding_bankrekeningen.aggregate([
+    bank_saldo = await reporting_db.boekhouding_bankrekeningen.aggregate([
         {"$match": {"user_id": user_id}},
         {"$group": {"_id": None, "totaal": {"$sum": "$huidig_saldo"}}}
     ]).to_list(1)
     
     # Debiteuren
-    debiteuren = await db.boekhouding_verkoopfacturen.aggregate([
+    debiteuren = await reporting_db.boekhouding_verkoopfacturen.aggregate([
         {"$match": {"user_id": user_id, "status": {"$in": ["verzonden", "herinnering"]}}},
         {"$group": {"_id": None, "totaal": {"$sum": "$openstaand_bedrag"}}}
     ]).to_list(1)
     
     # Crediteuren
-    crediteuren = await db.boekhouding_inkoopfacturen.aggregate([
+    crediteuren = await reporting_db.boekhouding_inkoopfacturen.aggregate([
         {"$match": {"user_id": user_id, "status": {"$in": ["geboekt", "gedeeltelijk_betaald"]}}},
         {"$group": {"_id": None, "totaal": {"$sum": "$openstaand_bedrag"}}}
     ]).to_list(1)
@@ -4689,20 +4619,22 @@ async def export_ouderdom(type: str = "debiteuren", authorization: str = Header(
     
     today = datetime.now().date()
     
+    # Cursor doorlopen i.p.v. to_list(1000): geen facturen afkappen
+    ouderdom_projection = {"_id": 0, "vervaldatum": 1, "openstaand_bedrag": 1}
     if type == "debiteuren":
-        facturen = await db.boekhouding_verkoopfacturen.find({
+        facturen = reporting_db.boekhouding_verkoopfacturen.find({
             "user_id": user_id,
             "status": {"$in": ["verzonden", "herinnering", "gedeeltelijk_betaald"]}
-        }).to_list(1000)
+        }, ouderdom_projection)
     else:
-        facturen = await db.boekhouding_inkoopfacturen.find({
+        facturen = reporting_db.boekhouding_inkoopfacturen.find({
             "user_id": user_id,
             "status": {"$in": ["geboekt", "gedeeltelijk_betaald"]}
-        }).to_list(1000)
+        }, ouderdom_projection)
     
     analyse = {"0_30": 0, "31_60": 0, "61_90": 0, "90_plus": 0, "totaal": 0}
     
-    for f in facturen:
+    async for f in facturen:
         try:
             verval = datetime.fromisoformat(f["vervaldatum"]).date()
             dagen = (today - verval).days
@@ -5419,6 +5351,7 @@ async def initialiseer_boekhouding(authorization: str = Header(None)):
         rek["valuta"] = "SRD"
         rek["created_at"] = datetime.now(timezone.utc)
         await db.boekhouding_rekeningen.insert_one(rek)
+    invalideer_rekeningschema(user_id)
     
     # BTW codes
     btw_codes = [
@@ -5460,8 +5393,7 @@ async def _create_journal_entry(user_id: str, dagboek_code: str, regels: list, d
         print(f"Warning: Journal entry not balanced: debet={totaal_debet}, credit={totaal_credit}")
         return None
     
-    count = await db.boekhouding_journaalposten.count_documents({"user_id": user_id, "dagboek_code": dagboek_code})
-    volgnummer = f"{dagboek_code}{datetime.now().year}-{count + 1:05d}"
+    volgnummer = await volgend_volgnummer(db, user_id, dagboek_code)
     
     journaalpost = {
         "id": str(uuid.uuid4()),
@@ -5480,6 +5412,7 @@ async def _create_journal_entry(user_id: str, dagboek_code: str, regels: list, d
     }
     
     await db.boekhouding_journaalposten.insert_one(journaalpost)
+    await boek_saldo_mutaties(db, user_id, journaalpost)
     return journaalpost
 
 
@@ -5521,8 +5454,9 @@ async def create_pos_sale(data: POSVerkoopCreate, authorization: str = Header(No
     user_id = user.get('id')
     
     # Genereer bonnummer
-    count = await db.boekhouding_pos_verkopen.count_documents({"user_id": user_id})
-    bonnummer = f"POS-{datetime.now().year}{datetime.now().month:02d}-{count + 1:05d}"
+    bonnummer = await volgend_nummer(
+        db, user_id, f"POS-{datetime.now().year}{datetime.now().month:02d}-", "boekhouding_pos_verkopen", "bonnummer"
+    )
     
     # Maak verkoop record
     sale = {
@@ -1,7 +1,6 @@
 # Shared dependencies for all routers
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 import os
@@ -11,14 +10,14 @@ import uuid
 import logging
 from pathlib import Path
 from dotenv import load_dotenv
+from services.user_context import get_cached_user, invalidate_user
+from services.entitlements import has_any_entitlement
 
 ROOT_DIR = Path(__file__).parent.parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME', 'erp_db')]
+from services.database import db
 
 def clean_doc(doc: dict) -> dict:
     """Remove MongoDB _id from document to prevent ObjectId serialization errors"""
@@ -84,7 +83,7 @@ def decode_token(token: str) -> dict:
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current authenticated user"""
     payload = decode_token(credentials.credentials)
-    user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
+    user = await get_cached_user(db, payload["user_id"])
     if not user:
         raise HTTPException(status_code=401, detail="Gebruiker niet gevonden")
     
@@ -105,14 +104,7 @@ async def get_current_active_user(current_user: dict = Depends(get_current_user)
         return current_user
     
     # Check if user has any active addon (including free boekhouding)
-    user_id = current_user.get("id")
-    active_addons = await db.user_addons.find({
-        "user_id": user_id,
-        "status": {"$in": ["active", "trial"]}
-    }).to_list(100)
-    
-    # If user has active addons (like free boekhouding), allow access
-    if active_addons and len(active_addons) > 0:
+    if await has_any_entitlement(db, current_user.get("id")):
         return current_user
     
     status = current_user.get("subscription_status")
@@ -245,6 +237,7 @@ async def create_workspace_for_user(user_id: str, user_name: str, company_name:
     await db.workspaces.insert_one(workspace)
     workspace.pop("_id", None)
     await db.users.update_one({"id": user_id}, {"$set": {"workspace_id": workspace_id}})
+    await invalidate_user(user_id)
     
     return workspace
 
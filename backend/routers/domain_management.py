@@ -10,6 +10,7 @@ import logging
 import uuid
 
 from .deps import db, get_superadmin, get_current_user, SERVER_IP, MAIN_DOMAIN
+from services.user_context import invalidate_user, invalidate_workspace
 
 router = APIRouter(prefix="/domains", tags=["domain-management"])
 logger = logging.getLogger(__name__)
@@ -497,6 +498,7 @@ async def provision_nginx_config(
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }}
         )
+        await invalidate_workspace(workspace_id)
         
         return NginxConfigResponse(
             success=True,
@@ -560,6 +562,7 @@ async def provision_ssl(
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }}
         )
+        await invalidate_workspace(workspace_id)
         
         # Regenerate nginx config with SSL
         nginx_config = generate_nginx_config(custom_domain, workspace["slug"], ssl_enabled=True)
@@ -689,6 +692,7 @@ async def full_domain_provision(
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await invalidate_workspace(workspace_id)
     
     all_success = all(step["success"] for step in results["steps"])
     results["overall_success"] = all_success
@@ -742,6 +746,7 @@ async def remove_domain_config(workspace_id: str, current_user: dict = Depends(g
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await invalidate_workspace(workspace_id)
     
     results["success"] = True
     results["message"] = "Domein configuratie verwijderd"
@@ -876,6 +881,7 @@ async def automated_domain_setup(
             {"id": request.user_id},
             {"$set": {"workspace_id": workspace_id}}
         )
+        await invalidate_user(request.user_id)
         steps_completed.append(f"Nieuwe workspace aangemaakt: {slug}")
     else:
         workspace_id = workspace["id"]
@@ -891,6 +897,7 @@ async def automated_domain_setup(
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }}
         )
+        await invalidate_workspace(workspace_id)
         steps_completed.append(f"Workspace bijgewerkt: {workspace.get('slug')}")
     
     # Step 5: Check DNS (optional - don't fail if DNS not ready)
@@ -901,6 +908,7 @@ async def automated_domain_setup(
             {"id": workspace_id},
             {"$set": {"domain.dns_verified": True}}
         )
+        await invalidate_workspace(workspace_id)
     else:
         steps_completed.append(f"DNS nog niet geconfigureerd: {dns_result['message']}")
     
@@ -940,6 +948,7 @@ async def automated_domain_setup(
                         "updated_at": datetime.now(timezone.utc).isoformat()
                     }}
                 )
+                await invalidate_workspace(workspace_id)
             else:
                 steps_completed.append(f"Setup script fout: {result.stderr[:200] if result.stderr else 'Onbekende fout'}")
                 await db.workspaces.update_one(
@@ -949,6 +958,7 @@ async def automated_domain_setup(
                         "error_message": result.stderr[:500] if result.stderr else "Script mislukt"
                     }}
                 )
+                await invalidate_workspace(workspace_id)
                 
         except subprocess.TimeoutExpired:
             steps_completed.append("Setup script timeout - proces duurt langer dan verwacht")
@@ -974,6 +984,7 @@ async def automated_domain_setup(
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }}
         )
+        await invalidate_workspace(workspace_id)
     
     # Step 7: Add to custom_domains collection for tracking
     domain_record = await db.custom_domains.find_one({"domain": domain})
@@ -1032,6 +1043,7 @@ async def verify_workspace_dns(workspace_id: str, current_user: dict = Depends(g
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await invalidate_workspace(workspace_id)
     
     return {
         "domain": custom_domain,
@@ -12,6 +12,27 @@ router = APIRouter(prefix="/hrm", tags=["HRM"])
 
 # Import shared dependencies
 from .deps import get_db, get_current_user, workspace_filter
+from services.indexes import register_indexes, register_query
+from services.grootboek_saldi import boek_saldo_mutaties
+from services.nummer_reeksen import volgend_volgnummer
+
+# ==================== INDEXES ====================
+# HRM data is scoped per workspace (workspace_filter); created at startup, see services/indexes.py
+
+register_indexes("hrm_employees", [("workspace_id", 1), ("created_at", -1)], [("workspace_id", 1), ("status", 1)])
+register_indexes("hrm_departments", [("workspace_id", 1)])
+register_indexes("hrm_leave_requests", [("workspace_id", 1), ("created_at", -1)], [("workspace_id", 1), ("status", 1)])
+register_indexes("hrm_contracts", [("workspace_id", 1), ("created_at", -1)])
+register_indexes("hrm_vacancies", [("workspace_id", 1), ("created_at", -1)], [("workspace_id", 1), ("status", 1)])
+register_indexes("hrm_applications", [("workspace_id", 1), ("created_at", -1)], [("workspace_id", 1), ("status", 1)])
+register_indexes("hrm_documents", [("workspace_id", 1), ("created_at", -1)], [("workspace_id", 1), ("employee_id", 1)])
+register_indexes("hrm_attendance", [("workspace_id", 1), ("date", -1)], [("employee_id", 1), ("date", -1)])
+register_indexes("hrm_payroll", [("workspace_id", 1), ("created_at", -1)], [("employee_id", 1), ("period", 1)])
+
+register_query("hrm medewerkers", "hrm_employees", {"workspace_id": "x"}, sort=[("created_at", -1)])
+register_query("hrm aanwezigheid per dag", "hrm_attendance", {"workspace_id": "x", "date": "2024-01-01"}, sort=[("date", -1)])
+register_query("hrm verlofaanvragen per status", "hrm_leave_requests", {"workspace_id": "x", "status": "pending"})
+register_query("hrm salarisrun per periode", "hrm_payroll", {"employee_id": "x", "period": "2024-01"})
 
 # ==================== PYDANTIC MODELS ====================
 
@@ -711,11 +732,7 @@ async def pay_hrm_payroll(payroll_id: str, create_journal: bool = True, current_
         workspace_id = current_user.get("workspace_id")
         
         # Get next journal number
-        count = await db.boekhouding_journaalposten.count_documents({
-            "user_id": user_id,
-            "dagboek_code": "SAL"
-        })
-        volgnummer = f"SAL{datetime.now().year}-{count + 1:05d}"
+        volgnummer = await volgend_volgnummer(db, user_id, "SAL")
         
         employee_name = payroll.get("employee_name", "Medewerker")
         periode = payroll.get("period", datetime.now().strftime("%Y-%m"))
@@ -767,6 +784,7 @@ async def pay_hrm_payroll(payroll_id: str, create_journal: bool = True, current_
         }
         
         await db.boekhouding_journaalposten.insert_one(journal_entry)
+        await boek_saldo_mutaties(db, journal_entry["user_id"], journal_entry)
         
         # Clean for response
         if "_id" in journal_entry:
@@ -1133,11 +1151,7 @@ async def process_payroll_payment(
         period = payroll.get("period", "")
         
         # Get next journal number
-        count = await db.boekhouding_journaalposten.count_documents({
-            "user_id": current_user.get("id"),
-            "dagboek_code": "SAL"
-        })
-        volgnummer = f"SAL{datetime.now().year}-{count + 1:05d}"
+        volgnummer = await volgend_volgnummer(db, current_user.get("id"), "SAL")
         
         # Journal entry lines - correct grootboek codes
         journal_lines = [
@@ -1201,6 +1215,7 @@ async def process_payroll_payment(
         }
         
         await db.boekhouding_journaalposten.insert_one(journal_entry)
+        await boek_saldo_mutaties(db, journal_entry["user_id"], journal_entry)
         
         # Remove _id from response
         if "_id" in journal_entry:
@@ -8,6 +8,7 @@ from . import auth
 from . import payment_gateways
 from . import public
 from . import admin
+from . import billing
 from . import loans
 from . import admin_operations
 from . import kas_accounts  # noqa: F401
@@ -18,6 +19,7 @@ from . import superadmin_domains  # noqa: F401
 from . import ocr  # noqa: F401
 from . import faceid
 from . import scheduler
+from . import outbox
 from . import suribet_balance  # noqa: F401
 
 # Push notifications are optional: if pywebpush / py-vapid / http-ece are not
@@ -37,5 +39,7 @@ from . import subscription  # noqa: F401
 
 # Re-export for server.py
 from .scheduler import _kiosk_daily_scheduler
+from .billing import _kiosk_billing_scheduler
+from .outbox import _kiosk_outbox_worker
 
-__all__ = ['router', 'set_database', '_kiosk_daily_scheduler', 'ensure_indexes']
+__all__ = ['router', 'set_database', '_kiosk_daily_scheduler', '_kiosk_billing_scheduler', '_kiosk_outbox_worker', 'ensure_indexes']
@@ -9,6 +9,8 @@ import base64 as _b64
 import hashlib as _hashlib
 import secrets as _secrets
 import dns.resolver
+from .face_index import invalidate_tenant_faces
+from .receipt_cache import receipt_cache_key, get_cached_receipt, store_receipt, invalidate_receipts
 
 # ============== CUSTOM DOMAIN ==============
 
@@ -230,6 +232,7 @@ async def reorder_apartments(data: ApartmentReorder, company: dict = Depends(get
             {"apartment_id": item["apartment_id"], "company_id": company_id},
             {"$set": {"sort_order": item["sort_order"]}}
         )
+    await _invalidate_public_cache(company_id, "apartments")
     return {"message": "Volgorde bijgewerkt"}
 
 
@@ -259,6 +262,7 @@ async def create_apartment(data: ApartmentCreate, company: dict = Depends(get_cu
     }
     
     await db.kiosk_apartments.insert_one(apartment)
+    await _invalidate_public_cache(company["company_id"], "apartments")
     return {"apartment_id": apartment_id, "message": "Appartement aangemaakt"}
 
 @router.put("/admin/apartments/{apartment_id}")
@@ -288,6 +292,7 @@ async def update_apartment(apartment_id: str, data: ApartmentUpdate, company: di
         {"apartment_id": apartment_id},
         {"$set": update_data}
     )
+    await _invalidate_public_cache(company["company_id"], "apartments")
 
     # Sync monthly_rent to linked tenant if rent changed
     if "monthly_rent" in update_data:
@@ -295,12 +300,14 @@ async def update_apartment(apartment_id: str, data: ApartmentUpdate, company: di
             {"apartment_id": apartment_id, "company_id": company["company_id"], "status": "active"},
             {"$set": {"monthly_rent": update_data["monthly_rent"], "updated_at": datetime.now(timezone.utc)}}
         )
+        await _invalidate_public_cache(company["company_id"], "tenants")
     # Sync currency to linked tenants if currency changed
     if "currency" in update_data:
         await db.kiosk_tenants.update_many(
             {"apartment_id": apartment_id, "company_id": company["company_id"], "status": "active"},
             {"$set": {"currency": update_data["currency"], "updated_at": datetime.now(timezone.utc)}}
         )
+        await _invalidate_public_cache(company["company_id"], "tenants")
     if "monthly_rent" in update_data:
         # === AUTO WHATSAPP: Huurprijs gewijzigd notificatie ===
         try:
@@ -334,6 +341,7 @@ async def delete_apartment(apartment_id: str, company: dict = Depends(get_curren
         "apartment_id": apartment_id,
         "company_id": company["company_id"]
     })
+    await _invalidate_public_cache(company["company_id"], "apartments")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Appartement niet gevonden")
     return {"message": "Appartement verwijderd"}
@@ -361,6 +369,7 @@ async def create_location(data: LocationCreate, company: dict = Depends(get_curr
         "updated_at": now
     }
     await db.kiosk_locations.insert_one(location)
+    await _invalidate_public_cache(company["company_id"], "locations")
     return {"location_id": location["location_id"], "message": "Locatie aangemaakt"}
 
 @router.put("/admin/locations/{location_id}")
@@ -377,18 +386,21 @@ async def update_location(location_id: str, data: LocationUpdate, company: dict
         {"location_id": location_id},
         {"$set": update_data}
     )
+    await _invalidate_public_cache(company["company_id"], "locations")
     # Propagate name change to all apartments linked to this location
     if "name" in update_data:
         await db.kiosk_apartments.update_many(
             {"company_id": company["company_id"], "location_id": location_id},
             {"$set": {"location_name": update_data["name"]}}
         )
+        await _invalidate_public_cache(company["company_id"], "apartments")
     return {"message": "Locatie bijgewerkt"}
 
 @router.delete("/admin/locations/{location_id}")
 async def delete_location(location_id: str, company: dict = Depends(get_current_company)):
     """Delete a location. Apartments linked to this location are unlinked (not deleted)."""
     result = await db.kiosk_locations.delete_one({"location_id": location_id, "company_id": company["company_id"]})
+    await _invalidate_public_cache(company["company_id"], "locations")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Locatie niet gevonden")
     # Unlink apartments
@@ -396,6 +408,7 @@ async def delete_location(location_id: str, company: dict = Depends(get_current_
         {"company_id": company["company_id"], "location_id": location_id},
         {"$set": {"location_id": None, "location_name": None}}
     )
+    await _invalidate_public_cache(company["company_id"], "apartments")
     return {"message": "Locatie verwijderd"}
 
 
@@ -418,37 +431,49 @@ def _parse_dutch_month_label(label: str):
         return None
 
 
-async def _compute_unpaid_months(company_id: str, tenant_id: str, billed_through: str, monthly_rent: float, outstanding: float):
-    """Compute the list of unpaid months for a tenant, oldest first.
-    Uses past payment history (covered_months entries) to identify partially-paid months
-    and stops at the most recent FULLY-paid month so we never go further back than necessary.
-    Returns list of dicts: [{ym, label, already_paid, remaining}, ...]
-    """
-    if not billed_through or monthly_rent <= 0 or outstanding <= 0:
-        return []
+_RENT_PAYMENT_MATCH = {
+    "payment_type": {"$in": ["rent", "partial_rent", "monthly_rent"]},
+    "$or": [
+        {"status": {"$in": ["approved", "completed"]}},
+        {"status": {"$exists": False}},
+        {"status": None},
+    ],
+}
 
-    past_payments = await db.kiosk_payments.find({
-        "company_id": company_id,
-        "tenant_id": tenant_id,
-        "payment_type": {"$in": ["rent", "partial_rent", "monthly_rent"]},
-        "$or": [
-            {"status": {"$in": ["approved", "completed"]}},
-            {"status": {"$exists": False}},
-            {"status": None},
-        ],
-    }, {"_id": 0, "amount": 1, "covered_months": 1}).to_list(2000)
 
-    paid_per_month: dict = {}
-    for pp in past_payments:
-        cms = pp.get("covered_months") or []
-        if not cms:
+async def _load_paid_per_month(company_id: str, tenant_ids: list) -> dict:
+    """Aggregate paid rent per (tenant, month) for many tenants in ONE pipeline.
+    Each payment's amount is split evenly over its covered_months labels; labels are grouped
+    server-side so every distinct label is parsed only once.
+    Returns {tenant_id: {(year, month): amount}}.
+    """
+    if not tenant_ids:
+        return {}
+    pipeline = [
+        {"$match": {"company_id": company_id, "tenant_id": {"$in": list(tenant_ids)},
+                    "covered_months.0": {"$exists": True}, **_RENT_PAYMENT_MATCH}},
+        {"$project": {
+            "tenant_id": 1, "covered_months": 1,
+            "per": {"$divide": [{"$toDouble": {"$ifNull": ["$amount", 0]}}, {"$size": "$covered_months"}]},
+        }},
+        {"$unwind": "$covered_months"},
+        {"$group": {"_id": {"t": "$tenant_id", "label": "$covered_months"}, "paid": {"$sum": "$per"}}},
+    ]
+    result: dict = {}
+    async for row in db.kiosk_payments.aggregate(pipeline):
+        ym = _parse_dutch_month_label(row["_id"]["label"])
+        if ym is None:
             continue
-        per = float(pp.get("amount", 0) or 0) / len(cms)
-        for cm in cms:
-            ym = _parse_dutch_month_label(cm)
-            if ym is None:
-                continue
-            paid_per_month[ym] = paid_per_month.get(ym, 0.0) + per
+        per_tenant = result.setdefault(row["_id"]["t"], {})
+        per_tenant[ym] = per_tenant.get(ym, 0.0) + row["paid"]
+    return result
+
+
+def _unpaid_months_from_paid(paid_per_month: dict, billed_through: str, monthly_rent: float, outstanding: float) -> list:
+    """Walk back from billed_through until the outstanding amount is explained, stopping at the
+    most recent FULLY-paid month. Returns [{ym, label, already_paid, remaining}, ...] oldest first."""
+    if not billed_through or monthly_rent <= 0 or outstanding <= 0:
+        return []
 
     bt_date = datetime.strptime(billed_through + "-01", "%Y-%m-%d")
     months_owed_est = int(outstanding / monthly_rent) if monthly_rent > 0 else 0
@@ -456,43 +481,65 @@ async def _compute_unpaid_months(company_id: str, tenant_id: str, billed_through
         months_owed_est += 1
 
     months_backward: list = []
-    i = 0
+    total_remaining = 0.0
     max_lookback = max(months_owed_est + 6, 24)
-    while i < max_lookback:
+    for i in range(max_lookback):
         m_date = bt_date - relativedelta(months=i)
         ym = (m_date.year, m_date.month)
         already_paid = paid_per_month.get(ym, 0.0)
         if already_paid >= monthly_rent - 0.01:
             break
+        remaining = max(0.0, monthly_rent - already_paid)
         months_backward.append({
             "ym": ym,
             "label": f"{_MONTH_NAMES_NL[m_date.month - 1]} {m_date.year}",
             "already_paid": already_paid,
-            "remaining": max(0.0, monthly_rent - already_paid),
+            "remaining": remaining,
         })
-        total_remaining = sum(m["remaining"] for m in months_backward)
+        total_remaining += remaining
         if total_remaining >= outstanding - 0.01:
             break
-        i += 1
     months_backward.reverse()  # oldest first
     return months_backward
 
 
+async def _compute_unpaid_months(company_id: str, tenant_id: str, billed_through: str, monthly_rent: float, outstanding: float):
+    """Compute the list of unpaid months for a tenant, oldest first.
+    Uses past payment history (covered_months entries) to identify partially-paid months
+    and stops at the most recent FULLY-paid month so we never go further back than necessary.
+    Returns list of dicts: [{ym, label, already_paid, remaining}, ...]
+    """
+    if not billed_through or monthly_rent <= 0 or outstanding <= 0:
+        return []
+    paid = await _load_paid_per_month(company_id, [tenant_id])
+    return _unpaid_months_from_paid(paid.get(tenant_id, {}), billed_through, monthly_rent, outstanding)
+
+
+async def _compute_unpaid_months_batch(company_id: str, tenants: list) -> dict:
+    """Batched variant of _compute_unpaid_months for a list of tenant docs.
+    One aggregation for all tenants in arrears instead of one query per tenant.
+    Returns {tenant_id: [unpaid month dicts]} (only tenants with arrears are present).
+    """
+    in_arrears = [
+        t for t in tenants
+        if t.get("rent_billed_through") and t.get("monthly_rent", 0) > 0 and t.get("outstanding_rent", 0) > 0
+    ]
+    paid = await _load_paid_per_month(company_id, [t["tenant_id"] for t in in_arrears])
+    return {
+        t["tenant_id"]: _unpaid_months_from_paid(
+            paid.get(t["tenant_id"], {}), t["rent_billed_through"], t["monthly_rent"], t["outstanding_rent"]
+        )
+        for t in in_arrears
+    }
+
+
 @router.get("/admin/tenants")
 async def list_tenants(company: dict = Depends(get_current_company)):
-    """List all tenants - auto-bills new months based on billing_day setting"""
+    """List all tenants. Pure read — auto-billing runs in the billing engine (billing.py)."""
     company_id = company["company_id"]
     tenants = await db.kiosk_tenants.find({"company_id": company_id}).to_list(1000)
-    
-    # Get company billing settings
-    comp = await db.kiosk_companies.find_one({"company_id": company_id})
-    billing_day = comp.get("billing_day", 1) if comp else 1
-    billing_next_month = comp.get("billing_next_month", True) if comp else True
-    fine_amount = comp.get("fine_amount", 0) if comp else 0
-    
-    now = datetime.now(timezone.utc)
-    engine_now = now
-    current_month = now.strftime("%Y-%m")
+    # Same payment-history-aware logic as register_manual_payment, batched for all tenants
+    unpaid_by_tenant = await _compute_unpaid_months_batch(company_id, tenants)
     
     result = []
     for t in tenants:
@@ -500,178 +547,13 @@ async def list_tenants(company: dict = Depends(get_current_company)):
         monthly_rent = t.get("monthly_rent", 0)
         outstanding = t.get("outstanding_rent", 0)
         current_fines = t.get("fines", 0)
-        updates = {}
-        
-        # Alleen auto-billing voor huurders met EXPLICIETE status="active" — anders niet aanraken
-        # om bestaande achterstand-data niet dubbel te tellen
-        is_active_status = t.get("status") == "active"
-        # Handmatige pauze: als de beheerder historische data aan het corrigeren is, voorkom
-        # dat de auto-billing engine nieuwe maanden erbij telt tijdens de Huurders-fetch.
-        auto_billing_paused = bool(t.get("pause_auto_billing", False))
-
-        if is_active_status and not auto_billing_paused and monthly_rent > 0:
-            if not billed_through:
-                billed_through = current_month
-                updates["rent_billed_through"] = current_month
-            else:
-                # Auto-billing engine
-                # How it works:
-                #   billed_through = last month whose rent was added to outstanding
-                #   check_month = next month to potentially bill (billed_through + 1)
-                #   The due date determines WHEN the next month's rent gets added:
-                #     billing_next_month=True  ("Volgende maand"): due_date = check_month's billing_day
-                #       -> Feb rent due March 24. After March 24: bill March.
-                #     billing_next_month=False ("Dezelfde maand"): due_date = prev_month's billing_day
-                #       -> Feb rent due Feb 24. After Feb 24: bill March.
-                billed_date = datetime.strptime(billed_through + "-01", "%Y-%m-%d")
-                
-                months_billed = 0
-                check_month = billed_date + relativedelta(months=1)
-                
-                # Helper: clamp billing_day to the actual last day of the target month.
-                # This ensures billing_day=30 works in April (30 days), May (31), but clamps
-                # to 28/29 in February automatically.
-                import calendar as _cal
-                def _safe_due(dt, day):
-                    last_day = _cal.monthrange(dt.year, dt.month)[1]
-                    return dt.replace(day=min(day, last_day))
-
-                while True:
-                    prev_month = check_month - relativedelta(months=1)
-                    if billing_next_month:
-                        due_date = _safe_due(check_month, billing_day)
-                    else:
-                        due_date = _safe_due(prev_month, billing_day)
-                    
-                    if engine_now >= due_date.replace(tzinfo=timezone.utc):
-                        months_billed += 1
-                        check_month += relativedelta(months=1)
-                    else:
-                        break
-                
-                if months_billed > 0:
-                    # Apply fine for existing outstanding BEFORE adding new rent
-                    if outstanding > 0 and fine_amount > 0:
-                        last_fine_month = t.get("last_fine_month", "")
-                        fine_due_month = billed_through  # The period they failed to pay
-                        if last_fine_month != fine_due_month:
-                            current_fines += fine_amount
-                            updates["fines"] = current_fines
-                            updates["last_fine_month"] = fine_due_month
-                    
-                    outstanding += monthly_rent * months_billed
-                    billed_through = (billed_date + relativedelta(months=months_billed)).strftime("%Y-%m")
-                    updates["outstanding_rent"] = outstanding
-                    updates["rent_billed_through"] = billed_through
-                    
-                    # Add internet costs for billed months
-                    internet_cost = t.get("internet_cost", 0)
-                    if internet_cost > 0:
-                        current_internet = t.get("internet_outstanding", 0)
-                        updates["internet_outstanding"] = current_internet + (internet_cost * months_billed)
-            
-            # Catch-up fine: apply fine when no new billing happened but rent is overdue
-            if outstanding > 0 and fine_amount > 0 and not updates.get("last_fine_month"):
-                billed_dt = datetime.strptime(billed_through + "-01", "%Y-%m-%d")
-                if billing_next_month:
-                    current_due = _safe_due(billed_dt + relativedelta(months=1), billing_day)
-                else:
-                    current_due = _safe_due(billed_dt, billing_day)
-                
-                if now >= current_due.replace(tzinfo=timezone.utc):
-                    last_fine_month = t.get("last_fine_month", "")
-                    if last_fine_month != billed_through:
-                        current_fines += fine_amount
-                        updates["fines"] = current_fines
-                        updates["last_fine_month"] = billed_through
-        
-        if updates:
-            updates["updated_at"] = now
-            await db.kiosk_tenants.update_one(
-                {"tenant_id": t["tenant_id"]},
-                {"$set": updates}
-            )
-            
-            # === AUTO WHATSAPP: Billing notifications ===
-            if (t.get("phone") or t.get("telefoon")) and is_active_status:
-                company_name_for_wa = comp.get("stamp_company_name") or comp.get("name", "") if comp else ""
-                months_nl = ['januari','februari','maart','april','mei','juni','juli','augustus','september','oktober','november','december']
-                t_phone = t.get("phone") or t.get("telefoon", "")
-                
-                # New rent month billed
-                if "outstanding_rent" in updates and updates["outstanding_rent"] > t.get("outstanding_rent", 0):
-                    new_bt = updates.get("rent_billed_through", billed_through)
-                    try:
-                        bt_d = datetime.strptime(new_bt + "-01", "%Y-%m-%d")
-                        month_label = f"{months_nl[bt_d.month - 1]} {bt_d.year}"
-                    except Exception:
-                        month_label = new_bt
-                    wa_rent_msg = (f"Beste {t['name']},\n\n"
-                                   f"De huur voor {month_label} is gefactureerd bij {company_name_for_wa}.\n"
-                                   f"Bedrag: SRD {monthly_rent:,.2f}\n"
-                                   f"Totaal openstaand: SRD {updates['outstanding_rent']:,.2f}\n\n"
-                                   f"Gelieve voor de vervaldatum te betalen.\n\n"
-                                   f"Met vriendelijke groet,\n{company_name_for_wa}")
-                    await _send_message_auto(company_id, t_phone, wa_rent_msg, t["tenant_id"], t["name"], "new_invoice")
-                
-                # Fine applied
-                if "fines" in updates and updates["fines"] > t.get("fines", 0):
-                    added_fine = updates["fines"] - t.get("fines", 0)
-                    wa_fine_msg = (f"Beste {t['name']},\n\n"
-                                   f"Er is een boete van SRD {added_fine:,.2f} toegepast op uw account bij {company_name_for_wa}.\n"
-                                   f"Reden: Achterstallige huur niet tijdig betaald.\n"
-                                   f"Totaal boetes: SRD {updates['fines']:,.2f}\n"
-                                   f"Totaal openstaand: SRD {(updates.get('outstanding_rent', outstanding) + updates.get('service_costs', t.get('service_costs', 0)) + updates['fines']):,.2f}\n\n"
-                                   f"Gelieve zo spoedig mogelijk te betalen.\n\n"
-                                   f"Met vriendelijke groet,\n{company_name_for_wa}")
-                    await _send_message_auto(company_id, t_phone, wa_fine_msg, t["tenant_id"], t["name"], "fine_applied")
-        
-        # === AUTO POWER CUTOFF: Turn off Shelly when overdue past cutoff days ===
-        power_cutoff_days = comp.get("power_cutoff_days", 0) if comp else 0
-        if power_cutoff_days > 0 and is_active_status:
-            total_debt = (updates.get("outstanding_rent", outstanding) + 
-                         t.get("service_costs", 0) + 
-                         (updates.get("fines", current_fines)))
-            if total_debt > 0 and billed_through:
-                try:
-                    bt_dt = datetime.strptime(billed_through + "-01", "%Y-%m-%d")
-                    if billing_next_month:
-                        due_dt = _safe_due(bt_dt + relativedelta(months=1), billing_day)
-                    else:
-                        due_dt = _safe_due(bt_dt, billing_day)
-                    cutoff_dt = due_dt + timedelta(days=power_cutoff_days)
-                    if now >= cutoff_dt.replace(tzinfo=timezone.utc):
-                        shelly = await db.kiosk_shelly_devices.find_one(
-                            {"company_id": company_id, "apartment_id": t.get("apartment_id")}, {"_id": 0}
-                        )
-                        if shelly and shelly.get("last_status") != "off":
-                            ip = shelly["device_ip"]
-                            ch = shelly.get("channel", 0)
-                            dtype = shelly.get("device_type", "gen1")
-                            try:
-                                async with httpx.AsyncClient(timeout=5.0) as client:
-                                    if dtype == "gen2":
-                                        await client.get(f"http://{ip}/rpc/switch.set?id={ch}&on=false")
-                                    else:
-                                        await client.get(f"http://{ip}/relay/{ch}?turn=off")
-                                await db.kiosk_shelly_devices.update_one(
-                                    {"device_id": shelly["device_id"]},
-                                    {"$set": {"last_status": "off", "last_check": now, "auto_cutoff": True}}
-                                )
-                            except Exception:
-                                pass
-                except Exception:
-                    pass
         
         # Calculate billing details for display
         overdue_months = []
         current_billing_month = ""
         if billed_through and monthly_rent > 0:
             current_billing_month = billed_through
-            if outstanding > 0:
-                # Use the same payment-history-aware logic as register_manual_payment
-                unpaid_list = await _compute_unpaid_months(company_id, t["tenant_id"], billed_through, monthly_rent, outstanding)
-                overdue_months = [m["label"] for m in unpaid_list]
+            overdue_months = [m["label"] for m in unpaid_by_tenant.get(t["tenant_id"], [])]
 
         result.append({
             "tenant_id": t["tenant_id"],
@@ -696,7 +578,7 @@ async def list_tenants(company: dict = Depends(get_current_company)):
             "created_at": t.get("created_at"),
             "face_id_enabled": bool(t.get("face_id_enabled") and t.get("face_descriptor")),
             "internet_cost": t.get("internet_cost", 0),
-            "internet_outstanding": updates.get("internet_outstanding", t.get("internet_outstanding", 0)),
+            "internet_outstanding": t.get("internet_outstanding", 0),
             "internet_plan_id": t.get("internet_plan_id"),
             "internet_plan_name": t.get("internet_plan_name", ""),
             "id_card_number": t.get("id_card_number"),
@@ -720,10 +602,14 @@ async def sync_billing_for_all_tenants(company: dict = Depends(get_current_compa
         {"company_id": company_id, "$or": [{"status": {"$exists": False}}, {"status": None}, {"status": ""}, {"status": "Active"}]},
         {"$set": {"status": "active"}}
     )
+    await _invalidate_public_cache(company_id, "tenants")
     total = await db.kiosk_tenants.count_documents({"company_id": company_id})
+    from .billing import run_company_billing
+    billing = await run_company_billing(company_id, now)
     return {
-        "message": "Status genormaliseerd. Vernieuw de pagina om de auto-billing te laten draaien.",
+        "message": "Status genormaliseerd en auto-billing uitgevoerd.",
         "status_normalized": res1.modified_count,
+        "tenants_billed": billing["tenants_billed"],
         "total_tenants": total,
         "synced_at": now.isoformat(),
     }
@@ -946,6 +832,7 @@ async def update_tenant_billed_through(tenant_id: str, data: TenantBilledThrough
         {"tenant_id": tenant_id, "company_id": company["company_id"]},
         {"$set": {"rent_billed_through": val}}
     )
+    await _invalidate_public_cache(company["company_id"], "tenants")
     if res.matched_count == 0:
         raise HTTPException(status_code=404, detail="Huurder niet gevonden")
     return {"message": "Gefactureerd t/m bijgewerkt", "rent_billed_through": val}
@@ -972,6 +859,7 @@ async def update_tenant_pause_auto_billing(tenant_id: str, data: TenantPauseAuto
         {"tenant_id": tenant_id, "company_id": company["company_id"]},
         {"$set": {"pause_auto_billing": bool(data.pause_auto_billing)}}
     )
+    await _invalidate_public_cache(company["company_id"], "tenants")
     if res.matched_count == 0:
         raise HTTPException(status_code=404, detail="Huurder niet gevonden")
     return {"message": "Auto-billing pauze bijgewerkt", "pause_auto_billing": bool(data.pause_auto_billing)}
@@ -986,6 +874,7 @@ async def bulk_pause_auto_billing(data: TenantPauseAutoBillingUpdate, company: d
         {"company_id": company["company_id"]},
         {"$set": {"pause_auto_billing": bool(data.pause_auto_billing)}}
     )
+    await _invalidate_public_cache(company["company_id"], "tenants")
     return {
         "message": "Auto-billing pauze bijgewerkt voor alle huurders",
         "pause_auto_billing": bool(data.pause_auto_billing),
@@ -1014,6 +903,7 @@ async def update_tenant_manual_balance(tenant_id: str, data: TenantManualBalance
         {"tenant_id": tenant_id, "company_id": company["company_id"]},
         {"$set": updates}
     )
+    await _invalidate_public_cache(company["company_id"], "tenants")
     if res.matched_count == 0:
         raise HTTPException(status_code=404, detail="Huurder niet gevonden")
     return {"message": "Saldi bijgewerkt", "updated": updates}
@@ -1131,6 +1021,7 @@ async def create_tenant(data: TenantCreate, company: dict = Depends(get_current_
         {"apartment_id": data.apartment_id},
         {"$set": {"status": "occupied", "updated_at": now}}
     )
+    await _invalidate_public_cache(company["company_id"], "tenants", "apartments")
     
     # Auto-create lease if dates provided
     lease_id = None
@@ -1186,11 +1077,15 @@ async def update_tenant(tenant_id: str, data: TenantUpdate, company: dict = Depe
             {"apartment_id": tenant["apartment_id"]},
             {"$set": {"status": "available", "updated_at": datetime.now(timezone.utc)}}
         )
+        await _invalidate_public_cache(company["company_id"], "apartments")
     
     await db.kiosk_tenants.update_one(
         {"tenant_id": tenant_id},
         {"$set": update_data}
     )
+    await _invalidate_public_cache(company["company_id"], "tenants")
+    if "status" in update_data:
+        invalidate_tenant_faces(company["company_id"])
     return {"message": "Huurder bijgewerkt"}
 
 @router.delete("/admin/tenants/{tenant_id}")
@@ -1208,12 +1103,14 @@ async def delete_tenant(tenant_id: str, company: dict = Depends(get_current_comp
         {"tenant_id": tenant_id},
         {"$set": {"status": "inactive", "updated_at": datetime.now(timezone.utc)}}
     )
+    invalidate_tenant_faces(company["company_id"])
     
     # Update apartment status
     await db.kiosk_apartments.update_one(
         {"apartment_id": tenant["apartment_id"]},
         {"$set": {"status": "available", "updated_at": datetime.now(timezone.utc)}}
     )
+    await _invalidate_public_cache(company["company_id"], "tenants", "apartments")
     
     # Delete linked leases
     await db.kiosk_leases.delete_many({"tenant_id": tenant_id, "company_id": company["company_id"]})
@@ -1358,11 +1255,27 @@ async def public_receipt(payment_id: str, request: Request, autoprint: Optional[
 
 
 async def _render_receipt_pdf_bytes(payment: dict, company_id: str, public_view: bool = False, request=None) -> bytes:
-    """Render the kwitantie as a tamper-protected, encrypted PDF (A5 compact)."""
-    html_resp = await _render_receipt_html(payment, company_id, noprint=True, autoprint=False, public_view=public_view, request=request)
+    """Render the kwitantie as a tamper-protected, encrypted PDF (A5 compact).
+    Served from the receipt cache when payment and stamp settings are unchanged."""
+    comp = await db.kiosk_companies.find_one({"company_id": company_id}, {"_id": 0})
+    cache_key = None
+    if _receipt_cacheable(payment):
+        cache_key = receipt_cache_key("pdf", payment, comp, _get_request_base_url(request), public_view=public_view)
+        cached = get_cached_receipt(cache_key)
+        if cached is not None:
+            return cached
+    html_resp = await _render_receipt_html(payment, company_id, noprint=True, autoprint=False, public_view=public_view, request=request, comp=comp)
     html_bytes = html_resp.body if hasattr(html_resp, "body") else html_resp
     html_str = html_bytes.decode("utf-8", errors="ignore") if isinstance(html_bytes, bytes) else str(html_bytes)
-    return await _encrypt_receipt_pdf(html_str)
+    pdf_bytes = await _encrypt_receipt_pdf(html_str, company_id)
+    if cache_key:
+        await store_receipt(cache_key, pdf_bytes)
+    return pdf_bytes
+
+
+def _receipt_cacheable(payment: dict) -> bool:
+    # Receipts without stored remaining balances show LIVE tenant balances: never cache those
+    return payment.get("remaining_rent") is not None
 
 
 @router.get("/admin/payments/{payment_id}/receipt/pdf")
@@ -1422,11 +1335,25 @@ def _get_request_base_url(request) -> str:
     return _os.environ.get("APP_URL", "https://facturatie.sr").rstrip("/")
 
 
-async def _render_receipt_html(payment: dict, company_id: str, noprint: bool = False, autoprint: bool = False, public_view: bool = False, public_pdf_url: bool = False, request=None):
+async def _render_receipt_html(payment: dict, company_id: str, noprint: bool = False, autoprint: bool = False, public_view: bool = False, public_pdf_url: bool = False, request=None, comp: dict = None):
     """Render the kwitantie HTML. Shared between /admin/.../receipt and /public/receipt/..."""
 
+    if comp is None:
+        comp = await db.kiosk_companies.find_one({"company_id": company_id}, {"_id": 0})
+
     # Build public QR URL (authentic kwitantie link) for this payment
     app_url = _get_request_base_url(request)
+
+    cache_key = None
+    if _receipt_cacheable(payment):
+        cache_key = receipt_cache_key(
+            "html", payment, comp, app_url,
+            noprint=noprint, autoprint=autoprint, public_view=public_view, public_pdf_url=public_pdf_url,
+        )
+        cached = get_cached_receipt(cache_key)
+        if cached is not None:
+            return Response(content=cached, media_type="text/html")
+
     qr_url = f"{app_url}/api/kiosk/public/receipt/{payment['payment_id']}"
     qr_data_url = ""
     try:
@@ -1440,8 +1367,6 @@ async def _render_receipt_html(payment: dict, company_id: str, noprint: bool = F
         qr_data_url = "data:image/png;base64," + _b64.b64encode(buf.getvalue()).decode("ascii")
     except Exception:
         qr_data_url = ""
-
-    comp = await db.kiosk_companies.find_one({"company_id": company_id}, {"_id": 0})
     
     # Use stamp settings from Instellingen, fallback to company name
     stamp_name = comp.get("stamp_company_name") or comp.get("name", "Onbekend")
@@ -2088,6 +2013,8 @@ window.addEventListener('load', function() {
 </body>
 </html>"""
     
+    if cache_key:
+        await store_receipt(cache_key, html.encode("utf-8"))
     return Response(content=html, media_type="text/html")
 
 
@@ -2096,6 +2023,7 @@ async def delete_payment(payment_id: str, company: dict = Depends(get_current_co
     result = await db.kiosk_payments.delete_one({"payment_id": payment_id, "company_id": company["company_id"]})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Betaling niet gevonden")
+    invalidate_receipts(payment_id)
     return {"message": "Betaling verwijderd"}
 
 
@@ -2297,6 +2225,7 @@ async def register_manual_payment(data: PaymentCreate, company: dict = Depends(g
     if update_fields:
         update_fields["updated_at"] = now
         await db.kiosk_tenants.update_one({"tenant_id": data.tenant_id}, {"$set": update_fields})
+        await _invalidate_public_cache(company_id, "tenants")
 
     updated_tenant = await db.kiosk_tenants.find_one({"tenant_id": data.tenant_id})
     payment["remaining_rent"] = updated_tenant.get("outstanding_rent", 0) if updated_tenant else 0
@@ -2389,6 +2318,7 @@ async def approve_payment(payment_id: str, data: ApprovePaymentData = None, comp
     if update_fields:
         update_fields["updated_at"] = now
         await db.kiosk_tenants.update_one({"tenant_id": payment["tenant_id"]}, {"$set": update_fields})
+        await _invalidate_public_cache(company_id, "tenants")
 
     # Get updated balances
     updated_tenant = await db.kiosk_tenants.find_one({"tenant_id": payment["tenant_id"]})
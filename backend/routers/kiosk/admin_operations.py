@@ -61,6 +61,8 @@ async def apply_fines(company: dict = Depends(get_current_company)):
                 )
         except Exception:
             pass  # Notificatie mag hoofdflow niet breken
+    if updated_count:
+        await _invalidate_public_cache(company_id, "tenants")
     
     # Single summary push to staff
     try:
@@ -120,6 +122,7 @@ async def advance_tenant_month(tenant_id: str, company: dict = Depends(get_curre
             "updated_at": datetime.now(timezone.utc)
         }}
     )
+    await _invalidate_public_cache(company_id, "tenants")
     
     # Format month name
     month_names_nl = ["jan", "feb", "mrt", "apr", "mei", "jun", "jul", "aug", "sep", "okt", "nov", "dec"]
@@ -179,6 +182,7 @@ async def reset_tenant_to_current_month(tenant_id: str, company: dict = Depends(
             "updated_at": datetime.now(timezone.utc),
         }},
     )
+    await _invalidate_public_cache(company_id, "tenants")
 
     month_names_nl = ["jan", "feb", "mrt", "apr", "mei", "jun", "jul", "aug", "sep", "okt", "nov", "dec"]
     cur_label = f"{month_names_nl[current_date.month - 1]} {current_date.year}"
@@ -261,6 +265,8 @@ async def reset_all_tenants_to_previous_month(company: dict = Depends(get_curren
             }},
         )
         adjusted += 1
+    if adjusted:
+        await _invalidate_public_cache(company_id, "tenants")
 
     month_names_nl = ["januari", "februari", "maart", "april", "mei", "juni",
                       "juli", "augustus", "september", "oktober", "november", "december"]
@@ -1728,7 +1734,7 @@ async def get_freelancer_receipt_pdf(payment_id: str, company: dict = Depends(ge
         include_sig_line=True,
         doc_hash=doc_hash,
     )
-    pdf_bytes = await _encrypt_receipt_pdf(html)
+    pdf_bytes = await _encrypt_receipt_pdf(html, company["company_id"])
     filename = f"Kwitantie_{p['kwitantie_nummer']}.pdf"
     return Response(content=pdf_bytes, media_type="application/pdf",
                     headers={"Content-Disposition": f'inline; filename="{filename}"'})
@@ -2038,7 +2044,7 @@ async def get_loonstrook_receipt_pdf(loonstrook_id: str, company: dict = Depends
         include_sig_line=True,
         doc_hash=doc_hash,
     )
-    pdf_bytes = await _encrypt_receipt_pdf(html)
+    pdf_bytes = await _encrypt_receipt_pdf(html, company["company_id"])
     filename = f"Loonstrook_{p['strook_nummer']}.pdf"
     return Response(content=pdf_bytes, media_type="application/pdf",
                     headers={"Content-Disposition": f'inline; filename="{filename}"'})
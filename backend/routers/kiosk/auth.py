@@ -248,7 +248,7 @@ async def update_company_settings(data: CompanyUpdate, company: dict = Depends(g
                 db.kiosk_leases, db.kiosk_kas, db.kiosk_employees,
                 db.kiosk_loans, db.kiosk_loan_payments, db.kiosk_internet_plans,
                 db.kiosk_rekeninghouders, db.kiosk_messages, db.kiosk_wa_messages,
-                db.kiosk_shelly_devices, db.kiosk_tenda_routers,
+                db.kiosk_shelly_devices, db.kiosk_tenda_routers, db.kiosk_outbox,
             ]
             await asyncio.gather(*[
                 col.update_many(
@@ -260,14 +260,13 @@ async def update_company_settings(data: CompanyUpdate, company: dict = Depends(g
             new_token = create_token(new_company_id)
             
             # Invalidate caches for old company_id
-            _cache_invalidate(f"pub_company_{old_company_id}")
-            _cache_invalidate(f"pub_apt_{old_company_id}")
-            _cache_invalidate(f"pub_ten_{old_company_id}")
+            await _invalidate_public_cache(old_company_id)
     
     await db.kiosk_companies.update_one(
         {"company_id": old_company_id},
         {"$set": update_data}
     )
+    await _invalidate_public_cache(old_company_id, "company")
     
     result = {"message": "Instellingen bijgewerkt"}
     if new_company_id:
@@ -15,6 +15,9 @@ import uuid
 import re
 import httpx
 import asyncio
+import logging
+from pymongo.errors import BulkWriteError
+from services.cache import Cache
 
 router = APIRouter(prefix="/kiosk", tags=["Kiosk System"])
 security = HTTPBearer(auto_error=False)
@@ -29,11 +32,14 @@ __all__ = [
     "jwt", "bcrypt", "os", "uuid", "re", "httpx", "asyncio",
     # Core objects
     "router", "security", "db", "set_database", "ensure_indexes",
-    "_cache_get", "_cache_set", "_cache_invalidate",
+    "kiosk_cache", "_invalidate_public_cache", "_cached_public", "_get_public_company",
+    "COMPANY_HEAVY_FIELDS", "_load_company_fields",
     "JWT_SECRET", "JWT_ALGORITHM", "JWT_EXPIRATION_HOURS",
     # Helpers
     "generate_uuid", "slugify_company_name",
     "_send_wa_auto", "_send_twilio_auto", "_send_message_auto", "_send_email_auto",
+    "get_http_client", "_outbox_job", "_enqueue_outbound", "_outbox_wakeup",
+    "_smtp_configured", "_deliver_email", "_log_email",
     "hash_password", "verify_password", "create_token", "decode_token",
     "get_current_company",
     # Models
@@ -75,44 +81,78 @@ def set_database(database):
     db._db = database
 
 # ============== PERFORMANCE: MongoDB Indexes ==============
+KIOSK_INDEXES = [
+    ("kiosk_companies", "company_id", {"unique": True}),
+    ("kiosk_companies", "custom_domain", {}),
+    ("kiosk_tenants", [("company_id", 1), ("status", 1)], {}),
+    ("kiosk_tenants", [("company_id", 1), ("apartment_id", 1)], {}),
+    ("kiosk_apartments", [("company_id", 1), ("order", 1)], {}),
+    ("kiosk_payments", [("company_id", 1), ("created_at", -1)], {}),
+    ("kiosk_payments", [("company_id", 1), ("tenant_id", 1)], {}),
+    ("kiosk_leases", [("company_id", 1)], {}),
+    ("kiosk_kas", [("company_id", 1), ("created_at", -1)], {}),
+    ("kiosk_employees", [("company_id", 1)], {}),
+    ("kiosk_rekeninghouders", [("company_id", 1)], {}),
+    # Unique effect_id / job_id / dedup_key make the billing effects and outbox idempotent
+    ("kiosk_billing_effects", "effect_id", {"unique": True}),
+    ("kiosk_billing_effects", [("status", 1), ("created_at", 1)], {}),
+    ("kiosk_billing_effects", [("status", 1), ("next_attempt_at", 1)], {}),
+    ("kiosk_outbox", "job_id", {"unique": True}),
+    ("kiosk_outbox", [("status", 1), ("next_attempt_at", 1)], {}),
+    ("kiosk_outbox", [("company_id", 1), ("dedup_key", 1)],
+     {"unique": True, "partialFilterExpression": {"dedup_key": {"$type": "string"}}}),
+    ("kiosk_outbox", "expires_at", {"expireAfterSeconds": 0}),
+]
+
+
 async def ensure_indexes():
-    """Create indexes for frequently queried collections"""
-    try:
-        await db.kiosk_companies.create_index("company_id", unique=True)
-        await db.kiosk_companies.create_index("custom_domain")
-        await db.kiosk_tenants.create_index([("company_id", 1), ("status", 1)])
-        await db.kiosk_tenants.create_index([("company_id", 1), ("apartment_id", 1)])
-        await db.kiosk_apartments.create_index([("company_id", 1), ("order", 1)])
-        await db.kiosk_payments.create_index([("company_id", 1), ("created_at", -1)])
-        await db.kiosk_payments.create_index([("company_id", 1), ("tenant_id", 1)])
-        await db.kiosk_leases.create_index([("company_id", 1)])
-        await db.kiosk_kas.create_index([("company_id", 1), ("created_at", -1)])
-        await db.kiosk_employees.create_index([("company_id", 1)])
-        await db.kiosk_rekeninghouders.create_index([("company_id", 1)])
-    except Exception:
-        pass  # Indexes may already exist
-
-# ============== PERFORMANCE: In-memory cache ==============
-_cache = {}
-_cache_ttl = {}
-CACHE_DURATION = 30  # seconds
-
-def _cache_get(key):
-    import time
-    if key in _cache and _cache_ttl.get(key, 0) > time.time():
-        return _cache[key]
-    return None
-
-def _cache_set(key, value, ttl=CACHE_DURATION):
-    import time
-    _cache[key] = value
-    _cache_ttl[key] = time.time() + ttl
-
-def _cache_invalidate(prefix):
-    keys_to_remove = [k for k in _cache if k.startswith(prefix)]
-    for k in keys_to_remove:
-        _cache.pop(k, None)
-        _cache_ttl.pop(k, None)
+    """Create indexes for frequently queried collections. Each index is created on its own,
+    so one failure (e.g. an existing index with other options) does not skip the others.
+    Must run before the billing, outbox and daily schedulers start."""
+    log = logging.getLogger("kiosk.indexes")
+    for collection, keys, options in KIOSK_INDEXES:
+        try:
+            await getattr(db, collection).create_index(keys, **options)
+        except Exception as e:
+            log.error(f"Index {collection} {keys} not created: {e}")
+
+# ============== PERFORMANCE: Public kiosk read cache ==============
+# Kiosk screens poll the public endpoints. Their results are cached per company and tagged
+# "<kind>:<company_id>"; every write to the underlying collection invalidates the tag via
+# _invalidate_public_cache. With several workers and the in-process backend, the TTL bounds
+# how long another worker can serve a stale copy (CACHE_BACKEND=mongo shares one cache).
+PUBLIC_CACHE_KINDS = ("company", "apartments", "locations", "tenants")
+PUBLIC_CACHE_TTL = {"company": 60, "apartments": 300, "locations": 300, "tenants": 30}
+PUBLIC_COMPANY_FIELDS = (
+    "company_id", "name", "status", "kiosk_pin", "subscription_status", "start_screen",
+    "stamp_company_name", "stamp_address", "stamp_phone", "stamp_whatsapp",
+)
+
+kiosk_cache = Cache(
+    "kiosk", default_ttl=60,
+    max_entries=int(os.environ.get("KIOSK_CACHE_MAX_ENTRIES", "2000")),
+    db_getter=lambda: db._db,
+)
+
+
+async def _invalidate_public_cache(company_id: str, *kinds: str):
+    """Drop cached public reads of a company; without kinds, all of them. The "company" kind
+    also drops the authenticated company context of get_current_company."""
+    await kiosk_cache.invalidate(*(f"{kind}:{company_id}" for kind in (kinds or PUBLIC_CACHE_KINDS)))
+
+
+async def _cached_public(kind: str, company_id: str, loader, variant: str = ""):
+    """Cache the result of `loader()` under the company's tag for `kind`."""
+    return await kiosk_cache.get_or_load(
+        f"{kind}{variant}:{company_id}", loader, PUBLIC_CACHE_TTL[kind], (f"{kind}:{company_id}",)
+    )
+
+
+async def _get_public_company(company_id: str) -> Optional[dict]:
+    """Company fields needed by the public kiosk endpoints (cached). None if it does not exist."""
+    return await _cached_public("company", company_id, lambda: db.kiosk_companies.find_one(
+        {"company_id": company_id}, {"_id": 0, **{f: 1 for f in PUBLIC_COMPANY_FIELDS}}
+    ), variant="_doc")
 
 # ============== HELPER FUNCTIONS ==============
 
@@ -127,182 +167,105 @@ def slugify_company_name(name: str) -> str:
     slug = re.sub(r'-+', '-', slug).strip('-')
     return slug or generate_uuid()
 
-async def _send_wa_auto(company_id: str, phone: str, message: str, tenant_id: str = "", tenant_name: str = "", msg_type: str = "auto"):
-    """Internal helper: send WhatsApp message if enabled for this company"""
+# ============== OUTBOUND MESSAGES ==============
+# Handlers and schedulers do not call WhatsApp/Twilio/SMTP inline: they enqueue a job in
+# `kiosk_outbox` and the outbox worker (outbox.py) delivers it with per-provider rate
+# limiting, retries with backoff and dedup keys. Only explicit "send now" endpoints
+# (SMTP test, manual email) call `_send_email_auto` directly.
+
+_http_client: Optional[httpx.AsyncClient] = None
+_outbox_wakeup = asyncio.Event()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared pooled HTTP client for outbound provider calls (WhatsApp Cloud API, Twilio)"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
+    return _http_client
+
+
+def _outbox_job(company_id: str, phone: str, message: str, tenant_id: str = "", tenant_name: str = "",
+                msg_type: str = "auto", channels=("whatsapp", "twilio", "email"), dedup_key: Optional[str] = None) -> dict:
+    now = datetime.now(timezone.utc)
+    job = {
+        "job_id": generate_uuid(),
+        "company_id": company_id,
+        "tenant_id": tenant_id or "",
+        "tenant_name": tenant_name or "",
+        "phone": phone or "",
+        "message": message,
+        "msg_type": msg_type,
+        "channels": list(channels),
+        "status": "queued",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+    if dedup_key:
+        job["dedup_key"] = dedup_key
+    return job
+
+
+async def _enqueue_outbound(jobs: list) -> int:
+    """Queue outbox jobs. Jobs whose (company_id, dedup_key) was queued before are skipped.
+    Returns the number of jobs actually queued."""
+    if not jobs:
+        return 0
     try:
-        comp = await db.kiosk_companies.find_one({"company_id": company_id}, {"_id": 0})
-        if not comp or not comp.get("wa_enabled") or not comp.get("wa_api_token") or not comp.get("wa_phone_id"):
-            return  # WhatsApp not configured, skip silently
-        
-        phone_clean = phone.replace(" ", "").replace("-", "").replace("+", "")
-        if not phone_clean.startswith("597"):
-            phone_clean = "597" + phone_clean
-        
-        # Append bank info if available
-        bank_name = comp.get("bank_name")
-        bank_account = comp.get("bank_account_number")
-        bank_holder = comp.get("bank_account_name")
-        if bank_name and bank_account:
-            message += f"\n\n--- Bankgegevens ---\nBank: {bank_name}\nRekening: {bank_account}"
-            if bank_holder:
-                message += f"\nT.n.v.: {bank_holder}"
-        
-        wa_url = comp.get("wa_api_url", "https://graph.facebook.com/v21.0")
-        wa_token = comp["wa_api_token"]
-        wa_phone_id = comp["wa_phone_id"]
-        
-        send_status = "pending"
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                resp = await client.post(
-                    f"{wa_url}/{wa_phone_id}/messages",
-                    headers={"Authorization": f"Bearer {wa_token}", "Content-Type": "application/json"},
-                    json={"messaging_product": "whatsapp", "to": phone_clean, "type": "text", "text": {"body": message}}
-                )
-            send_status = "sent" if resp.status_code == 200 else "failed"
-        except Exception:
-            send_status = "failed"
-        
-        await db.kiosk_wa_messages.insert_one({
-            "message_id": generate_uuid(),
-            "company_id": company_id,
-            "tenant_id": tenant_id,
-            "tenant_name": tenant_name,
-            "phone": phone_clean,
-            "message_type": msg_type,
-            "message": message,
-            "status": send_status,
-            "created_at": datetime.now(timezone.utc)
-        })
+        result = await db.kiosk_outbox.insert_many(jobs, ordered=False)
+        queued = len(result.inserted_ids)
+    except BulkWriteError as e:
+        details = e.details or {}
+        if any(err.get("code") != 11000 for err in details.get("writeErrors", [])):
+            raise
+        queued = details.get("nInserted", 0)
+    _outbox_wakeup.set()
+    return queued
+
+
+async def _send_wa_auto(company_id: str, phone: str, message: str, tenant_id: str = "", tenant_name: str = "", msg_type: str = "auto", dedup_key: Optional[str] = None):
+    """Queue a WhatsApp Business message (delivered only if enabled for this company)"""
+    try:
+        await _enqueue_outbound([_outbox_job(company_id, phone, message, tenant_id, tenant_name, msg_type, ("whatsapp",), dedup_key)])
     except Exception:
         pass  # Auto messages should never break the main flow
 
 
-async def _send_twilio_auto(company_id: str, phone: str, message: str, tenant_id: str = "", tenant_name: str = "", msg_type: str = "auto"):
-    """Internal helper: send WhatsApp and/or SMS via Twilio if enabled for this company.
-    Respects `twilio_mode` setting: 'whatsapp' (default), 'sms', or 'both'.
+async def _send_twilio_auto(company_id: str, phone: str, message: str, tenant_id: str = "", tenant_name: str = "", msg_type: str = "auto", dedup_key: Optional[str] = None):
+    """Queue a Twilio WhatsApp/SMS message (delivered only if enabled for this company).
+    The company's `twilio_mode` ('whatsapp', 'sms' or 'both') is applied at delivery time.
     """
-    import logging
-    log = logging.getLogger("twilio_auto")
     try:
-        comp = await db.kiosk_companies.find_one({"company_id": company_id}, {"_id": 0})
-        if not comp or not comp.get("twilio_enabled") or not comp.get("twilio_account_sid") or not comp.get("twilio_auth_token") or not comp.get("twilio_phone_number"):
-            return  # Twilio not configured, skip silently
-
-        phone_clean = phone.replace(" ", "").replace("-", "")
-        if not phone_clean.startswith("+"):
-            if phone_clean.startswith("597"):
-                phone_clean = "+" + phone_clean
-            else:
-                phone_clean = "+597" + phone_clean
-
-        # Append bank info if available
-        bank_name = comp.get("bank_name")
-        bank_account = comp.get("bank_account_number")
-        bank_holder = comp.get("bank_account_name")
-        if bank_name and bank_account:
-            message += f"\n\n--- Bankgegevens ---\nBank: {bank_name}\nRekening: {bank_account}"
-            if bank_holder:
-                message += f"\nT.n.v.: {bank_holder}"
-
-        from twilio.rest import Client as TwilioClient
-        twilio_client = TwilioClient(comp["twilio_account_sid"], comp["twilio_auth_token"])
-
-        raw_from = comp["twilio_phone_number"].strip()
-        # Separate numbers for SMS vs WhatsApp when provided
-        sms_from = (comp.get("twilio_sms_number") or raw_from).strip()
-        wa_from = raw_from if raw_from.startswith("whatsapp:") else f"whatsapp:{raw_from}"
-
-        mode = (comp.get("twilio_mode") or "whatsapp").lower()
-        channels = []
-        if mode in ("whatsapp", "both"):
-            channels.append(("twilio_whatsapp", wa_from, f"whatsapp:{phone_clean}"))
-        if mode in ("sms", "both"):
-            channels.append(("twilio_sms", sms_from, phone_clean))
-
-        for channel, from_addr, to_addr in channels:
-            send_status = "pending"
-            error_detail = ""
-            try:
-                twilio_client.messages.create(
-                    body=message,
-                    from_=from_addr,
-                    to=to_addr,
-                )
-                send_status = "sent"
-            except Exception as e:
-                send_status = "failed"
-                error_detail = str(e)[:500]  # Store real error
-                log.warning(f"Twilio {channel} send failed for {to_addr}: {error_detail}")
-
-            await db.kiosk_wa_messages.insert_one({
-                "message_id": generate_uuid(),
-                "company_id": company_id,
-                "tenant_id": tenant_id,
-                "tenant_name": tenant_name,
-                "phone": phone_clean,
-                "message_type": msg_type,
-                "channel": channel,
-                "message": message,
-                "status": send_status,
-                "error": error_detail,
-                "created_at": datetime.now(timezone.utc)
-            })
-    except Exception as e:
-        log.error(f"Twilio helper outer error: {e}")
-        # Auto messages should never break the main flow
-
-
-async def _send_message_auto(company_id: str, phone: str, message: str, tenant_id: str = "", tenant_name: str = "", msg_type: str = "auto"):
-    """Send message via all enabled channels (WhatsApp + Twilio + Email)"""
-    await _send_wa_auto(company_id, phone, message, tenant_id, tenant_name, msg_type)
-    await _send_twilio_auto(company_id, phone, message, tenant_id, tenant_name, msg_type)
-    # Also send via email if tenant has email
-    if tenant_id:
-        tenant = await db.kiosk_tenants.find_one({"tenant_id": tenant_id}, {"_id": 0, "email": 1})
-        if tenant and tenant.get("email"):
-            subject_map = {
-                "payment_confirmation": "Betalingsbevestiging",
-                "rent_reminder": "Huurherinnering",
-                "overdue_warning": "Achterstallige Huur",
-                "fine_applied": "Boete Toegepast",
-                "new_invoice": "Nieuwe Factuur",
-                "loan_created": "Lening Aangemaakt",
-                "loan_payment": "Leningbetaling",
-                "lease_created": "Huurovereenkomst",
-                "internet_assigned": "Internet Toegewezen",
-            }
-            subject = subject_map.get(msg_type, "Bericht van uw verhuurder")
-            await _send_email_auto(company_id, tenant["email"], subject, message, tenant_id, tenant_name, msg_type)
+        await _enqueue_outbound([_outbox_job(company_id, phone, message, tenant_id, tenant_name, msg_type, ("twilio",), dedup_key)])
+    except Exception:
+        pass  # Auto messages should never break the main flow
 
 
-async def _send_email_auto(company_id: str, to_email: str, subject: str, message: str, tenant_id: str = "", tenant_name: str = "", msg_type: str = "auto"):
-    """Send email via SMTP if configured"""
-    if not to_email:
-        return
+async def _send_message_auto(company_id: str, phone: str, message: str, tenant_id: str = "", tenant_name: str = "", msg_type: str = "auto", dedup_key: Optional[str] = None):
+    """Queue a message for all enabled channels (WhatsApp + Twilio + Email to the tenant's address).
+    Pass a `dedup_key` for notifications that must go out at most once (e.g. 'rent_reminder:<tenant>:<date>')."""
     try:
-        company = await db.kiosk_companies.find_one({"company_id": company_id}, {"_id": 0})
-        if not company or not company.get("smtp_enabled"):
-            return
-        smtp_host = company.get("smtp_host", "")
-        smtp_port = company.get("smtp_port", 587)
-        smtp_email = company.get("smtp_email", "")
-        smtp_password = company.get("smtp_password", "")
-        if not smtp_host or not smtp_email or not smtp_password:
-            return
-        
-        import smtplib
-        from email.mime.text import MIMEText
-        from email.mime.multipart import MIMEMultipart
-        
-        msg = MIMEMultipart()
-        msg['From'] = smtp_email
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        html_body = message.replace('\n', '<br>')
-        comp_name = company.get("stamp_company_name") or company.get("name", "")
-        html = f"""<div style="font-family:Arial,sans-serif;max-width:600px;margin:0 auto;padding:20px;">
+        await _enqueue_outbound([_outbox_job(company_id, phone, message, tenant_id, tenant_name, msg_type, dedup_key=dedup_key)])
+    except Exception:
+        pass  # Auto messages should never break the main flow
+
+
+def _build_email(company: dict, to_email: str, subject: str, message: str):
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+
+    msg = MIMEMultipart()
+    msg['From'] = company.get("smtp_email", "")
+    msg['To'] = to_email
+    msg['Subject'] = subject
+
+    html_body = message.replace('\n', '<br>')
+    comp_name = company.get("stamp_company_name") or company.get("name", "")
+    html = f"""<div style="font-family:Arial,sans-serif;max-width:600px;margin:0 auto;padding:20px;">
             <div style="background:#f97316;color:white;padding:15px 20px;border-radius:8px 8px 0 0;">
                 <h2 style="margin:0;font-size:18px;">{comp_name}</h2>
             </div>
@@ -311,46 +274,63 @@ async def _send_email_auto(company_id: str, to_email: str, subject: str, message
             </div>
             <p style="text-align:center;color:#94a3b8;font-size:12px;margin-top:15px;">Verzonden via {comp_name}</p>
         </div>"""
-        msg.attach(MIMEText(html, 'html'))
-        
-        import asyncio
-        loop = asyncio.get_event_loop()
-        def send():
-            with smtplib.SMTP(smtp_host, smtp_port, timeout=10) as server:
-                server.starttls()
-                server.login(smtp_email, smtp_password)
-                server.send_message(msg)
-        await asyncio.wait_for(loop.run_in_executor(None, send), timeout=15)
-        
-        # Log email
-        await db.kiosk_messages.insert_one({
-            "message_id": str(uuid.uuid4()),
-            "company_id": company_id,
-            "tenant_id": tenant_id,
-            "tenant_name": tenant_name,
-            "channel": "email",
-            "to": to_email,
-            "subject": subject,
-            "message": message,
-            "msg_type": msg_type,
-            "status": "sent",
-            "created_at": datetime.now(timezone.utc)
-        })
+    msg.attach(MIMEText(html, 'html'))
+    return msg
+
+
+def _smtp_configured(company: dict) -> bool:
+    return bool(company and company.get("smtp_enabled") and company.get("smtp_host")
+                and company.get("smtp_email") and company.get("smtp_password"))
+
+
+async def _deliver_email(company: dict, to_email: str, subject: str, message: str):
+    """Send one email via the company's SMTP server. Raises on failure."""
+    import smtplib
+
+    msg = _build_email(company, to_email, subject, message)
+    smtp_host = company.get("smtp_host", "")
+    smtp_port = company.get("smtp_port", 587)
+
+    def send():
+        with smtplib.SMTP(smtp_host, smtp_port, timeout=10) as server:
+            server.starttls()
+            server.login(company["smtp_email"], company["smtp_password"])
+            server.send_message(msg)
+    await asyncio.wait_for(asyncio.to_thread(send), timeout=15)
+
+
+async def _log_email(company_id: str, to_email: str, subject: str, message: str, tenant_id: str, tenant_name: str, msg_type: str, error: Optional[str] = None):
+    entry = {
+        "message_id": str(uuid.uuid4()),
+        "company_id": company_id,
+        "tenant_id": tenant_id,
+        "tenant_name": tenant_name,
+        "channel": "email",
+        "to": to_email,
+        "subject": subject,
+        "message": message,
+        "msg_type": msg_type,
+        "status": "failed" if error else "sent",
+        "created_at": datetime.now(timezone.utc)
+    }
+    if error:
+        entry["error"] = error
+    await db.kiosk_messages.insert_one(entry)
+
+
+async def _send_email_auto(company_id: str, to_email: str, subject: str, message: str, tenant_id: str = "", tenant_name: str = "", msg_type: str = "auto"):
+    """Send email via SMTP right away if configured (for explicit send actions; automatic
+    notifications go through the outbox)"""
+    if not to_email:
+        return
+    company = await db.kiosk_companies.find_one({"company_id": company_id}, {"_id": 0})
+    if not _smtp_configured(company):
+        return
+    try:
+        await _deliver_email(company, to_email, subject, message)
+        await _log_email(company_id, to_email, subject, message, tenant_id, tenant_name, msg_type)
     except Exception as e:
-        await db.kiosk_messages.insert_one({
-            "message_id": str(uuid.uuid4()),
-            "company_id": company_id,
-            "tenant_id": tenant_id,
-            "tenant_name": tenant_name,
-            "channel": "email",
-            "to": to_email,
-            "subject": subject,
-            "message": message,
-            "msg_type": msg_type,
-            "status": "failed",
-            "error": str(e),
-            "created_at": datetime.now(timezone.utc)
-        })
+        await _log_email(company_id, to_email, subject, message, tenant_id, tenant_name, msg_type, error=str(e))
 
 
 def hash_password(password: str) -> str:
@@ -375,14 +355,35 @@ def decode_token(token: str) -> dict:
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Ongeldig token")
 
+# ============== PERFORMANCE: Authenticated company context ==============
+# Every admin request resolves the company from the token. The document is cached for a
+# short time under the "company:<company_id>" tag, so every write that invalidates the
+# public company cache also drops this context. Face descriptors and the password hash are
+# large or sensitive and never needed by admin endpoints: they are left out of the context.
+# Handlers that do need them (the Face ID endpoints) load them with _load_company_fields.
+COMPANY_CONTEXT_TTL = int(os.environ.get("KIOSK_COMPANY_CONTEXT_TTL", "30"))
+COMPANY_HEAVY_FIELDS = ("face_descriptors", "face_descriptor", "password_hash")
+COMPANY_CONTEXT_PROJECTION = {"_id": 0, **{f: 0 for f in COMPANY_HEAVY_FIELDS}}
+
 async def get_current_company(credentials: HTTPAuthorizationCredentials = Depends(security)):
     if not credentials:
         raise HTTPException(status_code=401, detail="Authenticatie vereist")
     payload = decode_token(credentials.credentials)
-    company = await db.kiosk_companies.find_one({"company_id": payload["company_id"]})
+    company_id = payload["company_id"]
+    company = await kiosk_cache.get_or_load(
+        f"ctx:{company_id}",
+        lambda: db.kiosk_companies.find_one({"company_id": company_id}, COMPANY_CONTEXT_PROJECTION),
+        COMPANY_CONTEXT_TTL, (f"company:{company_id}",),
+    )
     if not company:
         raise HTTPException(status_code=401, detail="Bedrijf niet gevonden")
-    return company
+    return dict(company)  # own copy per request; the cached document stays untouched
+
+async def _load_company_fields(company_id: str, *fields: str) -> dict:
+    """Load fields that are not part of the company context (COMPANY_HEAVY_FIELDS) on demand."""
+    return await db.kiosk_companies.find_one(
+        {"company_id": company_id}, {"_id": 0, **{f: 1 for f in fields}}
+    ) or {}
 
 # ============== MODELS ==============
 
@@ -820,26 +821,46 @@ def _build_a4_receipt_html(
 
 
 # ============ SHARED PDF HELPER: HTML -> TAMPER-PROOF ENCRYPTED PDF ============
-async def _encrypt_receipt_pdf(html_str: str) -> bytes:
+async def _encrypt_receipt_pdf(html_str: str, company_id: Optional[str] = None) -> bytes:
     """Render HTML to PDF via WeasyPrint and encrypt with pikepdf.
     Uses a random owner password to block edit/copy/assemble. User password is empty
     so anyone can view. Returns PDF bytes.
 
+    Rendering runs in the shared PDF render pool (services.pdf_render_pool): a bounded
+    process pool with per-company queues, so `company_id` is the fairness key.
+
     Graceful degradation:
     - If WeasyPrint is not installed/usable (missing system libs like libpango),
       raise a clear HTTP 500 with install instructions.
     - If pikepdf is not installed, return the un-encrypted PDF and log a warning
       (document is still a valid A4 PDF, just not tamper-proof).
+    - If the render queue is full, raise HTTP 503 so the client retries later.
+    - If the render times out, raise HTTP 504 so the client retries later.
     """
-    import io as _io
     import logging as _logging
+    from services.pdf_render_pool import render_pdf, RenderQueueFull, RenderTimeout, RenderUnavailable
 
     _log = _logging.getLogger("kiosk.pdf")
 
-    # --- 1. Render HTML -> PDF (WeasyPrint) ---
     try:
-        from weasyprint import HTML as _WHTML
-    except Exception as e:  # ImportError or libpango missing
+        pdf_bytes, encrypted = await render_pdf(
+            html_str,
+            base_url=os.environ.get("APP_URL", ""),
+            fairness_key=company_id or "-",
+        )
+    except RenderQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Te veel PDF's tegelijk in behandeling. Probeer het over enkele seconden opnieuw.",
+            headers={"Retry-After": "5"},
+        )
+    except RenderTimeout:
+        raise HTTPException(
+            status_code=504,
+            detail="Het genereren van de PDF duurde te lang. Probeer het later opnieuw.",
+            headers={"Retry-After": "30"},
+        )
+    except RenderUnavailable as e:
         raise HTTPException(
             status_code=500,
             detail=(
@@ -849,46 +870,9 @@ async def _encrypt_receipt_pdf(html_str: str) -> bytes:
                 f"Originele fout: {e}"
             ),
         )
-
-    def _make_pdf():
-        return _WHTML(string=html_str, base_url=os.environ.get("APP_URL", "")).write_pdf()
-
-    pdf_bytes = await asyncio.to_thread(_make_pdf)
-
-    # --- 2. Encrypt PDF (pikepdf) — optional ---
-    try:
-        import secrets as _secrets
-        import pikepdf as _pikepdf
-    except ImportError:
+    if not encrypted:
         _log.warning(
-            "pikepdf niet geïnstalleerd — PDF wordt niet gecodeerd. "
+            "PDF niet gecodeerd (pikepdf ontbreekt of encryptie mislukt). "
             "Installeer met: pip install pikepdf==10.5.1"
         )
-        return pdf_bytes
-
-    owner_pw = _secrets.token_urlsafe(32)
-    in_buf = _io.BytesIO(pdf_bytes)
-    out_buf = _io.BytesIO()
-    try:
-        with _pikepdf.open(in_buf) as pdf:
-            with pdf.open_metadata() as meta:
-                meta["dc:creator"] = "Vastgoed Kiosk ERP"
-                meta["pdf:Producer"] = "facturatie.sr"
-            perms = _pikepdf.Permissions(
-                extract=False,
-                modify_annotation=False,
-                modify_assembly=False,
-                modify_form=False,
-                modify_other=False,
-                print_lowres=True,
-                print_highres=True,
-            )
-            pdf.save(
-                out_buf,
-                encryption=_pikepdf.Encryption(owner=owner_pw, user="", R=6, allow=perms),
-                linearize=True,
-            )
-        return out_buf.getvalue()
-    except Exception as e:
-        _log.warning(f"pikepdf encryptie mislukt, val terug op un-encrypted PDF: {e}")
-        return pdf_bytes
+    return pdf_bytes
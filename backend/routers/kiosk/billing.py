@@ -0,0 +1,335 @@
+from .base import *
+
+import calendar as _cal
+import logging
+
+from pymongo.errors import DuplicateKeyError
+
+# ============== AUTO-BILLING ENGINE ==============
+# Runs per company on a schedule (not on GET /admin/tenants). Tenant updates are
+# compare-and-set on (rent_billed_through, last_fine_month) so two runs can never
+# bill the same month twice; balances are changed with $inc so a payment that lands
+# between the read and the write is kept. Side effects (WhatsApp/SMS/email, Shelly cutoffs)
+# are written to `kiosk_billing_effects` with a deterministic effect_id per
+# (tenant, kind, month) and drained separately by `_process_billing_effects`.
+
+logger = logging.getLogger("kiosk.billing")
+
+BILLING_INTERVAL_SECONDS = int(os.environ.get("KIOSK_BILLING_INTERVAL", "900"))  # 15 min
+EFFECT_MAX_ATTEMPTS = 5
+EFFECT_BACKOFF_SECONDS = 60  # 1, 2, 4, 8 min between attempts
+EFFECT_BATCH_SIZE = 200
+BALANCE_FIELDS = ("outstanding_rent", "fines", "internet_outstanding")  # written as $inc
+
+_MONTHS_NL = ['januari','februari','maart','april','mei','juni','juli','augustus','september','oktober','november','december']
+
+
+def _safe_due(dt, day):
+    """Clamp billing_day to the last day of the target month (billing_day=30 in februari → 28/29)."""
+    last_day = _cal.monthrange(dt.year, dt.month)[1]
+    return dt.replace(day=min(day, last_day))
+
+
+def _current_due_date(billed_through: str, billing_day: int, billing_next_month: bool) -> datetime:
+    """Due date (UTC) for the period `billed_through` (YYYY-MM)."""
+    billed_dt = datetime.strptime(billed_through + "-01", "%Y-%m-%d")
+    if billing_next_month:
+        due = _safe_due(billed_dt + relativedelta(months=1), billing_day)
+    else:
+        due = _safe_due(billed_dt, billing_day)
+    return due.replace(tzinfo=timezone.utc)
+
+
+def _compute_billing_updates(t: dict, comp: dict, now: datetime) -> dict:
+    """Pure billing step for one tenant. Returns the $set updates (empty = nothing to do).
+
+    How it works:
+      billed_through = last month whose rent was added to outstanding
+      check_month = next month to potentially bill (billed_through + 1)
+      The due date determines WHEN the next month's rent gets added:
+        billing_next_month=True  ("Volgende maand"): due_date = check_month's billing_day
+          -> Feb rent due March 24. After March 24: bill March.
+        billing_next_month=False ("Dezelfde maand"): due_date = prev_month's billing_day
+          -> Feb rent due Feb 24. After Feb 24: bill March.
+    """
+    billing_day = comp.get("billing_day", 1)
+    billing_next_month = comp.get("billing_next_month", True)
+    fine_amount = comp.get("fine_amount", 0)
+
+    billed_through = t.get("rent_billed_through", "")
+    monthly_rent = t.get("monthly_rent", 0)
+    outstanding = t.get("outstanding_rent", 0)
+    current_fines = t.get("fines", 0)
+    updates = {}
+
+    # Alleen auto-billing voor huurders met EXPLICIETE status="active" — anders niet aanraken
+    # om bestaande achterstand-data niet dubbel te tellen. Handmatige pauze: de beheerder is
+    # historische data aan het corrigeren.
+    if t.get("status") != "active" or t.get("pause_auto_billing", False) or monthly_rent <= 0:
+        return updates
+
+    if not billed_through:
+        updates["rent_billed_through"] = now.strftime("%Y-%m")
+        return updates
+
+    billed_date = datetime.strptime(billed_through + "-01", "%Y-%m-%d")
+    months_billed = 0
+    check_month = billed_date + relativedelta(months=1)
+    while True:
+        prev_month = check_month - relativedelta(months=1)
+        if billing_next_month:
+            due_date = _safe_due(check_month, billing_day)
+        else:
+            due_date = _safe_due(prev_month, billing_day)
+        if now >= due_date.replace(tzinfo=timezone.utc):
+            months_billed += 1
+            check_month += relativedelta(months=1)
+        else:
+            break
+
+    if months_billed > 0:
+        # Apply fine for existing outstanding BEFORE adding new rent
+        if outstanding > 0 and fine_amount > 0:
+            fine_due_month = billed_through  # The period they failed to pay
+            if t.get("last_fine_month", "") != fine_due_month:
+                current_fines += fine_amount
+                updates["fines"] = current_fines
+                updates["last_fine_month"] = fine_due_month
+
+        outstanding += monthly_rent * months_billed
+        billed_through = (billed_date + relativedelta(months=months_billed)).strftime("%Y-%m")
+        updates["outstanding_rent"] = outstanding
+        updates["rent_billed_through"] = billed_through
+
+        internet_cost = t.get("internet_cost", 0)
+        if internet_cost > 0:
+            updates["internet_outstanding"] = t.get("internet_outstanding", 0) + (internet_cost * months_billed)
+
+    # Catch-up fine: apply fine when no new billing happened but rent is overdue
+    if outstanding > 0 and fine_amount > 0 and not updates.get("last_fine_month"):
+        if now >= _current_due_date(billed_through, billing_day, billing_next_month):
+            if t.get("last_fine_month", "") != billed_through:
+                current_fines += fine_amount
+                updates["fines"] = current_fines
+                updates["last_fine_month"] = billed_through
+
+    return updates
+
+
+async def _queue_billing_effect(company_id: str, tenant: dict, kind: str, period: str, payload: dict) -> bool:
+    """Queue one side effect. Idempotent per (tenant, kind, period) via the unique effect_id."""
+    try:
+        await db.kiosk_billing_effects.insert_one({
+            "effect_id": f"{tenant['tenant_id']}:{kind}:{period}",
+            "company_id": company_id,
+            "tenant_id": tenant["tenant_id"],
+            "tenant_name": tenant.get("name", ""),
+            "kind": kind,
+            "period": period,
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": datetime.now(timezone.utc),
+            "created_at": datetime.now(timezone.utc),
+        })
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def _queue_effects_for_tenant(company_id: str, comp: dict, t: dict, updates: dict, now: datetime) -> int:
+    """Translate a billing step into queued notifications / power cutoffs."""
+    queued = 0
+    company_name = comp.get("stamp_company_name") or comp.get("name", "")
+    t_phone = t.get("phone") or t.get("telefoon", "")
+
+    if updates and t_phone:
+        # New rent month billed
+        if "outstanding_rent" in updates and updates["outstanding_rent"] > t.get("outstanding_rent", 0):
+            new_bt = updates["rent_billed_through"]
+            bt_d = datetime.strptime(new_bt + "-01", "%Y-%m-%d")
+            month_label = f"{_MONTHS_NL[bt_d.month - 1]} {bt_d.year}"
+            msg = (f"Beste {t['name']},\n\n"
+                   f"De huur voor {month_label} is gefactureerd bij {company_name}.\n"
+                   f"Bedrag: SRD {t.get('monthly_rent', 0):,.2f}\n"
+                   f"Totaal openstaand: SRD {updates['outstanding_rent']:,.2f}\n\n"
+                   f"Gelieve voor de vervaldatum te betalen.\n\n"
+                   f"Met vriendelijke groet,\n{company_name}")
+            queued += await _queue_billing_effect(company_id, t, "new_invoice", new_bt, {"phone": t_phone, "message": msg})
+
+        # Fine applied
+        if "fines" in updates and updates["fines"] > t.get("fines", 0):
+            added_fine = updates["fines"] - t.get("fines", 0)
+            total = (updates.get("outstanding_rent", t.get("outstanding_rent", 0))
+                     + t.get("service_costs", 0) + updates["fines"])
+            msg = (f"Beste {t['name']},\n\n"
+                   f"Er is een boete van SRD {added_fine:,.2f} toegepast op uw account bij {company_name}.\n"
+                   f"Reden: Achterstallige huur niet tijdig betaald.\n"
+                   f"Totaal boetes: SRD {updates['fines']:,.2f}\n"
+                   f"Totaal openstaand: SRD {total:,.2f}\n\n"
+                   f"Gelieve zo spoedig mogelijk te betalen.\n\n"
+                   f"Met vriendelijke groet,\n{company_name}")
+            queued += await _queue_billing_effect(company_id, t, "fine_applied", updates["last_fine_month"], {"phone": t_phone, "message": msg})
+
+    # === AUTO POWER CUTOFF: Turn off Shelly when overdue past cutoff days ===
+    power_cutoff_days = comp.get("power_cutoff_days", 0)
+    billed_through = updates.get("rent_billed_through", t.get("rent_billed_through", ""))
+    if power_cutoff_days > 0 and t.get("status") == "active" and billed_through:
+        total_debt = (updates.get("outstanding_rent", t.get("outstanding_rent", 0))
+                      + t.get("service_costs", 0)
+                      + updates.get("fines", t.get("fines", 0)))
+        if total_debt > 0:
+            due_dt = _current_due_date(billed_through, comp.get("billing_day", 1), comp.get("billing_next_month", True))
+            if now >= due_dt + timedelta(days=power_cutoff_days):
+                queued += await _queue_billing_effect(company_id, t, "power_cutoff", billed_through, {"apartment_id": t.get("apartment_id")})
+
+    return queued
+
+
+async def run_company_billing(company_id: str, now: Optional[datetime] = None) -> dict:
+    """Run the auto-billing engine for one company. Safe to call repeatedly."""
+    now = now or datetime.now(timezone.utc)
+    comp = await db.kiosk_companies.find_one(
+        {"company_id": company_id},
+        {"_id": 0, "company_id": 1, "name": 1, "stamp_company_name": 1, "billing_day": 1,
+         "billing_next_month": 1, "fine_amount": 1, "power_cutoff_days": 1}
+    )
+    report = {"company_id": company_id, "tenants_checked": 0, "tenants_billed": 0, "effects_queued": 0}
+    if not comp:
+        return report
+
+    cursor = db.kiosk_tenants.find({"company_id": company_id, "status": "active"}, {"_id": 0})
+    async for t in cursor:
+        report["tenants_checked"] += 1
+        updates = _compute_billing_updates(t, comp, now)
+        if updates:
+            # Balances as deltas: payments between our read and this write must not be overwritten
+            inc = {f: updates[f] - (t.get(f, 0) or 0) for f in BALANCE_FIELDS if f in updates}
+            update = {"$set": {**{k: v for k, v in updates.items() if k not in inc}, "updated_at": now}}
+            if inc:
+                update["$inc"] = inc
+            # Compare-and-set: only apply if nobody billed this tenant since we read it
+            voor = await db.kiosk_tenants.find_one_and_update(
+                {
+                    "tenant_id": t["tenant_id"],
+                    "rent_billed_through": t.get("rent_billed_through") or {"$in": [None, ""]},
+                    "last_fine_month": t.get("last_fine_month") or {"$in": [None, ""]},
+                },
+                update,
+                projection={"_id": 0},
+            )
+            if voor is None:
+                continue
+            report["tenants_billed"] += 1
+            # Messages show the balances as written (including payments since the read)
+            t = voor
+            updates.update({f: (voor.get(f, 0) or 0) + d for f, d in inc.items()})
+        report["effects_queued"] += await _queue_effects_for_tenant(company_id, comp, t, updates, now)
+
+    if report["tenants_billed"]:
+        await _invalidate_public_cache(company_id, "tenants")
+    return report
+
+
+async def _apply_power_cutoff(effect: dict) -> bool:
+    shelly = await db.kiosk_shelly_devices.find_one(
+        {"company_id": effect["company_id"], "apartment_id": effect["payload"].get("apartment_id")}, {"_id": 0}
+    )
+    if not shelly or shelly.get("last_status") == "off":
+        return True
+    ip = shelly["device_ip"]
+    ch = shelly.get("channel", 0)
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        if shelly.get("device_type", "gen1") == "gen2":
+            await client.get(f"http://{ip}/rpc/switch.set?id={ch}&on=false")
+        else:
+            await client.get(f"http://{ip}/relay/{ch}?turn=off")
+    await db.kiosk_shelly_devices.update_one(
+        {"device_id": shelly["device_id"]},
+        {"$set": {"last_status": "off", "last_check": datetime.now(timezone.utc), "auto_cutoff": True}}
+    )
+    return True
+
+
+async def _process_billing_effects(company_id: Optional[str] = None, limit: int = EFFECT_BATCH_SIZE) -> dict:
+    """Drain due billing side effects. Each effect is claimed atomically before it runs;
+    a failing effect is rescheduled with backoff so it never blocks the rest of the queue."""
+    results = {"done": 0, "failed": 0}
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(minutes=10)
+    query = {"$or": [
+        # Effects queued before next_attempt_at existed have no such field and are due
+        {"status": "pending", "next_attempt_at": {"$not": {"$gt": now}}},
+        {"status": "processing", "claimed_at": {"$lt": stale}},
+    ]}
+    if company_id:
+        query["company_id"] = company_id
+    for _ in range(limit):
+        effect = await db.kiosk_billing_effects.find_one_and_update(
+            query,
+            {"$set": {"status": "processing", "claimed_at": datetime.now(timezone.utc)}, "$inc": {"attempts": 1}},
+            sort=[("created_at", 1)],
+        )
+        if not effect:
+            break
+        try:
+            if effect["kind"] == "power_cutoff":
+                await _apply_power_cutoff(effect)
+            else:
+                p = effect["payload"]
+                await _enqueue_outbound([_outbox_job(
+                    effect["company_id"], p["phone"], p["message"], effect["tenant_id"],
+                    effect.get("tenant_name", ""), effect["kind"], dedup_key=f"effect:{effect['effect_id']}",
+                )])
+            await db.kiosk_billing_effects.update_one(
+                {"effect_id": effect["effect_id"]},
+                {"$set": {"status": "done", "done_at": datetime.now(timezone.utc)}}
+            )
+            results["done"] += 1
+        except Exception as e:
+            attempts = effect.get("attempts", 0) + 1
+            retry = attempts < EFFECT_MAX_ATTEMPTS
+            update = {"status": "pending" if retry else "failed", "error": str(e)[:500]}
+            if retry:
+                update["next_attempt_at"] = datetime.now(timezone.utc) + timedelta(
+                    seconds=EFFECT_BACKOFF_SECONDS * 2 ** (attempts - 1)
+                )
+            await db.kiosk_billing_effects.update_one({"effect_id": effect["effect_id"]}, {"$set": update})
+            results["failed"] += 1
+    return results
+
+
+async def _run_billing_for_all_companies() -> dict:
+    totals = {"companies": 0, "tenants_billed": 0, "effects_queued": 0}
+    companies = await db.kiosk_companies.find({"status": {"$ne": "inactive"}}, {"_id": 0, "company_id": 1}).to_list(None)
+    for comp in companies:
+        try:
+            report = await run_company_billing(comp["company_id"])
+            totals["companies"] += 1
+            totals["tenants_billed"] += report["tenants_billed"]
+            totals["effects_queued"] += report["effects_queued"]
+        except Exception as e:
+            logger.error(f"Billing run failed for {comp['company_id']}: {e}")
+    return totals
+
+
+async def _kiosk_billing_scheduler():
+    """Background loop: bill all companies, then drain the side-effect queue."""
+    while True:
+        try:
+            totals = await _run_billing_for_all_companies()
+            effects = await _process_billing_effects()
+            if totals["tenants_billed"] or effects["done"] or effects["failed"]:
+                logger.info(f"Kiosk billing run: {totals}, effects: {effects}")
+        except Exception as e:
+            logger.error(f"Kiosk billing scheduler error: {e}")
+        await asyncio.sleep(BILLING_INTERVAL_SECONDS)
+
+
+@router.post("/admin/billing/run")
+async def trigger_company_billing(company: dict = Depends(get_current_company)):
+    """Run the auto-billing engine for this company now (e.g. after changing billing settings)."""
+    company_id = company["company_id"]
+    report = await run_company_billing(company_id)
+    report["effects"] = await _process_billing_effects(company_id)
+    return report
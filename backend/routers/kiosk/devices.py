@@ -250,6 +250,7 @@ async def update_internet_plan(plan_id: str, data: InternetPlanUpdate, company:
             {"internet_plan_id": plan_id, "company_id": company["company_id"]},
             {"$set": {"internet_cost": updates["price"]}}
         )
+        await _invalidate_public_cache(company["company_id"], "tenants")
     return {"message": "Plan bijgewerkt"}
 
 @router.delete("/admin/internet/plans/{plan_id}")
@@ -265,6 +266,7 @@ async def delete_internet_plan(plan_id: str, company: dict = Depends(get_current
         {"internet_plan_id": plan_id, "company_id": company["company_id"]},
         {"$set": {"internet_plan_id": None, "internet_cost": 0, "internet_plan_name": ""}}
     )
+    await _invalidate_public_cache(company["company_id"], "tenants")
     return {"message": "Plan verwijderd"}
 
 @router.get("/admin/internet/connections")
@@ -292,6 +294,7 @@ async def assign_internet_plan(tenant_id: str = None, plan_id: str = None, compa
             {"tenant_id": tenant_id},
             {"$set": {"internet_plan_id": None, "internet_cost": 0, "internet_outstanding": 0, "internet_plan_name": "", "updated_at": datetime.now(timezone.utc)}}
         )
+        await _invalidate_public_cache(company_id, "tenants")
         return {"message": "Internet verwijderd"}
     
     plan = await db.kiosk_internet_plans.find_one({"plan_id": plan_id, "company_id": company_id})
@@ -308,6 +311,7 @@ async def assign_internet_plan(tenant_id: str = None, plan_id: str = None, compa
             "updated_at": datetime.now(timezone.utc),
         }}
     )
+    await _invalidate_public_cache(company_id, "tenants")
     
     # WhatsApp notification
     try:
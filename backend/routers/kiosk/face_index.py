@@ -0,0 +1,181 @@
+"""
+In-process Face ID descriptor index.
+
+Keeps a NumPy matrix of 128-float face descriptors per company (tenants and admins)
+plus one global admin matrix for the /vastgoed Face ID login, so a scan is a single
+vectorized distance computation instead of loading every descriptor from Mongo.
+Indexes are rebuilt lazily after invalidation (register/delete/status changes) and
+expire after INDEX_TTL seconds so other workers pick up changes as well.
+"""
+import time
+
+import numpy as np
+
+from .base import db, os
+
+MATCH_THRESHOLD = float(os.environ.get("FACE_MATCH_THRESHOLD", "0.6"))
+# Reject a match when the runner-up identity is within this distance of the best one (0 = off)
+AMBIGUITY_MARGIN = float(os.environ.get("FACE_AMBIGUITY_MARGIN", "0"))
+INDEX_TTL = 300  # seconds
+
+
+class FaceDescriptorIndex:
+    """Immutable matrix of descriptors with per-row metadata (owner key + extra fields)."""
+
+    def __init__(self, rows: list):
+        rows = [(meta, vec) for meta, vec in rows if vec]
+        self.meta = [meta for meta, _ in rows]
+        self.built_at = time.time()
+        if rows:
+            dim = max(len(vec) for _, vec in rows)
+            self.matrix = np.zeros((len(rows), dim), dtype=np.float32)
+            for i, (_, vec) in enumerate(rows):
+                self.matrix[i, :len(vec)] = vec
+        else:
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.meta)
+
+    def knn(self, descriptor: list, k: int = 1) -> list:
+        """Return up to k nearest rows as [(distance, meta), ...], closest first."""
+        if not len(self) or not descriptor:
+            return []
+        query = np.zeros(self.matrix.shape[1], dtype=np.float32)
+        n = min(len(descriptor), self.matrix.shape[1])
+        query[:n] = descriptor[:n]
+        dists = np.sqrt(((self.matrix - query) ** 2).sum(axis=1))
+        k = min(k, len(dists))
+        nearest = np.argpartition(dists, k - 1)[:k]
+        nearest = nearest[np.argsort(dists[nearest])]
+        return [(float(dists[i]), self.meta[i]) for i in nearest]
+
+    def match(self, descriptor: list, key: str, threshold: float = None, margin: float = None):
+        """Best match below threshold, or None. With a margin, the closest row of a DIFFERENT
+        owner (meta[key]) must be at least `margin` further away, otherwise the scan is ambiguous."""
+        threshold = MATCH_THRESHOLD if threshold is None else threshold
+        margin = AMBIGUITY_MARGIN if margin is None else margin
+        candidates = self.knn(descriptor, k=8 if margin > 0 else 1)
+        if not candidates or candidates[0][0] >= threshold:
+            return None
+        best_dist, best_meta = candidates[0]
+        if margin > 0:
+            for dist, meta in candidates[1:]:
+                if meta[key] != best_meta[key]:
+                    if dist - best_dist < margin:
+                        return None
+                    break
+        return best_dist, best_meta
+
+
+_indexes: dict = {}
+
+
+def _fresh(key):
+    idx = _indexes.get(key)
+    if idx is not None and time.time() - idx.built_at < INDEX_TTL:
+        return idx
+    return None
+
+
+def _admin_rows(company: dict) -> list:
+    descriptors = company.get("face_descriptors", [])
+    # Backwards compat: old single descriptor
+    if not descriptors and company.get("face_descriptor"):
+        descriptors = [{"label": "Beheerder", "descriptor": company["face_descriptor"]}]
+    return [
+        ({"company_id": company["company_id"], "name": company.get("name", ""), "label": d.get("label", ""),
+          "descriptor": d.get("descriptor") or []},
+         d.get("descriptor") or [])
+        for d in descriptors
+    ]
+
+
+async def get_tenant_index(company_id: str) -> FaceDescriptorIndex:
+    key = ("tenants", company_id)
+    idx = _fresh(key)
+    if idx is None:
+        cursor = db.kiosk_tenants.find(
+            {"company_id": company_id, "face_id_enabled": True, "face_descriptor": {"$exists": True}, "status": "active"},
+            {"_id": 0, "tenant_id": 1, "face_descriptor": 1}
+        )
+        idx = FaceDescriptorIndex([
+            ({"tenant_id": t["tenant_id"], "descriptor": t.get("face_descriptor") or []}, t.get("face_descriptor") or [])
+            async for t in cursor
+        ])
+        _indexes[key] = idx
+    return idx
+
+
+async def get_admin_index(company_id: str) -> FaceDescriptorIndex:
+    key = ("admins", company_id)
+    idx = _fresh(key)
+    if idx is None:
+        company = await db.kiosk_companies.find_one(
+            {"company_id": company_id},
+            {"_id": 0, "company_id": 1, "name": 1, "face_descriptors": 1, "face_descriptor": 1}
+        )
+        idx = FaceDescriptorIndex(_admin_rows(company) if company else [])
+        _indexes[key] = idx
+    return idx
+
+
+async def get_global_admin_index() -> FaceDescriptorIndex:
+    key = ("admins", "*")
+    idx = _fresh(key)
+    if idx is None:
+        cursor = db.kiosk_companies.find(
+            {"face_id_enabled": True, "status": "active"},
+            {"_id": 0, "company_id": 1, "name": 1, "face_descriptors": 1, "face_descriptor": 1}
+        )
+        rows = []
+        async for c in cursor:
+            rows.extend(_admin_rows(c))
+        idx = FaceDescriptorIndex(rows)
+        _indexes[key] = idx
+    return idx
+
+
+async def admin_match_is_current(entry: dict) -> bool:
+    """Re-check an admin index match against Mongo before issuing a token: the company must
+    still be active and the matched descriptor still registered. Indexes of other workers
+    only expire after INDEX_TTL; this single indexed find_one closes that window."""
+    descriptor = entry.get("descriptor")
+    if not descriptor:
+        return False
+    company = await db.kiosk_companies.find_one(
+        {
+            "company_id": entry["company_id"],
+            "status": "active",
+            "$or": [{"face_descriptors.descriptor": descriptor}, {"face_descriptor": descriptor}],
+        },
+        {"_id": 1}
+    )
+    if company is None:
+        invalidate_admin_faces(entry["company_id"])  # Stale index entry
+        return False
+    return True
+
+
+def current_tenant_query(company_id: str, entry: dict) -> dict:
+    """Filter that only matches the tenant of a tenant index match if it is still active, Face ID
+    is still enabled and the matched descriptor is still the registered one (see
+    admin_match_is_current: indexes of other workers only expire after INDEX_TTL)."""
+    return {
+        "tenant_id": entry["tenant_id"],
+        "company_id": company_id,
+        "status": "active",
+        "face_id_enabled": True,
+        "face_descriptor": entry["descriptor"],
+    }
+
+
+def invalidate_tenant_faces(company_id: str):
+    _indexes.pop(("tenants", company_id), None)
+
+
+def invalidate_admin_faces(company_id: str = None):
+    """Drop the company's admin index and the global one (which contains it)."""
+    if company_id:
+        _indexes.pop(("admins", company_id), None)
+    _indexes.pop(("admins", "*"), None)
@@ -52,45 +52,26 @@ class WhatsAppMessage(BaseModel):
     message_type: str  # reminder, fine, overdue, custom
     custom_message: Optional[str] = None
 
-@router.post("/admin/whatsapp/send")
-async def send_whatsapp_message(data: WhatsAppMessage, company: dict = Depends(get_current_company)):
-    """Send WhatsApp message to tenant via Business API"""
-    comp = await db.kiosk_companies.find_one({"company_id": company["company_id"]}, {"_id": 0})
-    
-    if not comp.get("wa_enabled") and not comp.get("twilio_enabled"):
-        raise HTTPException(status_code=400, detail="Geen berichtenkanaal geconfigureerd. Schakel WhatsApp of Twilio in bij Instellingen.")
-    
-    tenant = await db.kiosk_tenants.find_one({"tenant_id": data.tenant_id, "company_id": company["company_id"]}, {"_id": 0})
-    if not tenant:
-        raise HTTPException(status_code=404, detail="Huurder niet gevonden")
-    
-    phone = tenant.get("phone") or tenant.get("telefoon", "")
-    if not phone:
-        raise HTTPException(status_code=400, detail="Huurder heeft geen telefoonnummer")
-    
-    # Clean phone number
-    phone_clean = phone.replace(" ", "").replace("-", "").replace("+", "")
-    if not phone_clean.startswith("597"):
-        phone_clean = "597" + phone_clean
-    
+def _tenant_message(comp: dict, tenant: dict, message_type: str, custom_message: Optional[str] = None) -> Optional[str]:
+    """Build the WhatsApp text for a tenant (without bank details). None for an unknown type."""
     company_name = comp.get("stamp_company_name") or comp.get("name", "")
     tenant_name = tenant.get("name", "")
     outstanding = tenant.get("outstanding_rent", 0) + tenant.get("service_costs", 0) + tenant.get("fines", 0)
     
     # Build message based on type
-    if data.message_type == "reminder":
+    if message_type == "reminder":
         message = (f"Beste {tenant_name},\n\n"
                    f"Dit is een herinnering van {company_name}.\n"
                    f"Uw openstaand saldo is SRD {outstanding:,.2f}.\n"
                    f"Gelieve zo spoedig mogelijk te betalen.\n\n"
                    f"Met vriendelijke groet,\n{company_name}")
-    elif data.message_type == "fine":
+    elif message_type == "fine":
         message = (f"Beste {tenant_name},\n\n"
                    f"Er is een boete toegepast op uw account bij {company_name}.\n"
                    f"Uw totaal openstaand saldo is nu SRD {outstanding:,.2f}.\n"
                    f"Neem contact op voor vragen.\n\n"
                    f"Met vriendelijke groet,\n{company_name}")
-    elif data.message_type == "overdue":
+    elif message_type == "overdue":
         overdue_months = tenant.get("overdue_months", [])
         months_str = ", ".join(overdue_months) if overdue_months else "onbekend"
         message = (f"Beste {tenant_name},\n\n"
@@ -99,9 +80,37 @@ async def send_whatsapp_message(data: WhatsAppMessage, company: dict = Depends(g
                    f"Totaal openstaand: SRD {outstanding:,.2f}\n\n"
                    f"Gelieve zo spoedig mogelijk te betalen om verdere maatregelen te voorkomen.\n\n"
                    f"Met vriendelijke groet,\n{company_name}")
-    elif data.message_type == "custom" and data.custom_message:
-        message = data.custom_message
+    elif message_type == "custom" and custom_message:
+        message = custom_message
     else:
+        return None
+    return message
+
+
+@router.post("/admin/whatsapp/send")
+async def send_whatsapp_message(data: WhatsAppMessage, company: dict = Depends(get_current_company)):
+    """Send WhatsApp message to tenant via Business API"""
+    comp = await db.kiosk_companies.find_one({"company_id": company["company_id"]}, {"_id": 0})
+    
+    if not comp.get("wa_enabled") and not comp.get("twilio_enabled"):
+        raise HTTPException(status_code=400, detail="Geen berichtenkanaal geconfigureerd. Schakel WhatsApp of Twilio in bij Instellingen.")
+    
+    tenant = await db.kiosk_tenants.find_one({"tenant_id": data.tenant_id, "company_id": company["company_id"]}, {"_id": 0})
+    if not tenant:
+        raise HTTPException(status_code=404, detail="Huurder niet gevonden")
+    
+    phone = tenant.get("phone") or tenant.get("telefoon", "")
+    if not phone:
+        raise HTTPException(status_code=400, detail="Huurder heeft geen telefoonnummer")
+    
+    # Clean phone number
+    phone_clean = phone.replace(" ", "").replace("-", "").replace("+", "")
+    if not phone_clean.startswith("597"):
+        phone_clean = "597" + phone_clean
+    
+    tenant_name = tenant.get("name", "")
+    message = _tenant_message(comp, tenant, data.message_type, data.custom_message)
+    if message is None:
         raise HTTPException(status_code=400, detail="Ongeldig berichttype")
     
     # Add bank info if available
@@ -124,21 +133,20 @@ async def send_whatsapp_message(data: WhatsAppMessage, company: dict = Depends(g
         wa_phone_id = comp["wa_phone_id"]
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                resp = await client.post(
-                    f"{wa_url}/{wa_phone_id}/messages",
-                    headers={
-                        "Authorization": f"Bearer {wa_token}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "messaging_product": "whatsapp",
-                        "to": phone_clean,
-                        "type": "text",
-                        "text": {"body": message}
-                    }
-                )
-                result = resp.json()
+            resp = await get_http_client().post(
+                f"{wa_url}/{wa_phone_id}/messages",
+                headers={
+                    "Authorization": f"Bearer {wa_token}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "messaging_product": "whatsapp",
+                    "to": phone_clean,
+                    "type": "text",
+                    "text": {"body": message}
+                }
+            )
+            result = resp.json()
             
             wa_sent = resp.status_code == 200
             await db.kiosk_wa_messages.insert_one({
@@ -202,28 +210,32 @@ async def send_whatsapp_message(data: WhatsAppMessage, company: dict = Depends(g
 
 @router.post("/admin/whatsapp/send-bulk")
 async def send_bulk_whatsapp(message_type: str = "overdue", company: dict = Depends(get_current_company)):
-    """Send WhatsApp to all tenants with outstanding balance"""
+    """Queue a WhatsApp message for all tenants with outstanding balance (delivered by the outbox worker)"""
     comp = await db.kiosk_companies.find_one({"company_id": company["company_id"]}, {"_id": 0})
     
     if not comp.get("wa_enabled") or not comp.get("wa_api_token"):
         raise HTTPException(status_code=400, detail="WhatsApp Business API is niet geconfigureerd")
+    if message_type not in ("reminder", "fine", "overdue"):
+        raise HTTPException(status_code=400, detail="Ongeldig berichttype")
     
-    tenants = await db.kiosk_tenants.find({"company_id": company["company_id"], "status": "active"}, {"_id": 0}).to_list(500)
+    tenants = await db.kiosk_tenants.find({"company_id": company["company_id"], "status": "active"}, {"_id": 0}).to_list(None)
     
-    sent = 0
-    failed = 0
+    # Same-minute key: a double click does not message everyone twice
+    minute = datetime.now(timezone.utc).strftime("%Y%m%d%H%M")
+    jobs = []
     for tenant in tenants:
         outstanding = (tenant.get("outstanding_rent", 0) + tenant.get("service_costs", 0) + tenant.get("fines", 0))
-        if outstanding <= 0 or not (tenant.get("phone") or tenant.get("telefoon")):
+        phone = tenant.get("phone") or tenant.get("telefoon")
+        if outstanding <= 0 or not phone:
             continue
-        try:
-            msg_data = WhatsAppMessage(tenant_id=tenant["tenant_id"], message_type=message_type)
-            await send_whatsapp_message(msg_data, company)
-            sent += 1
-        except Exception:
-            failed += 1
+        jobs.append(_outbox_job(
+            company["company_id"], phone, _tenant_message(comp, tenant, message_type),
+            tenant["tenant_id"], tenant.get("name", ""), message_type, ("whatsapp", "twilio"),
+            dedup_key=f"bulk:{message_type}:{tenant['tenant_id']}:{minute}",
+        ))
+    queued = await _enqueue_outbound(jobs)
     
-    return {"sent": sent, "failed": failed, "message": f"{sent} berichten verstuurd, {failed} mislukt"}
+    return {"queued": queued, "sent": queued, "failed": 0, "message": f"{queued} berichten in de wachtrij gezet"}
 
 @router.get("/admin/whatsapp/history")
 async def get_whatsapp_history(
@@ -0,0 +1,307 @@
+"""
+Outbound message queue (WhatsApp Business, Twilio WhatsApp/SMS, email).
+
+Jobs are written to `kiosk_outbox` by `_send_message_auto` & co. (base.py). The worker
+below claims due jobs, loads the company once per job and delivers every requested
+channel:
+- per-provider token buckets (per company, since each company has its own credentials);
+- transient failures (network errors, HTTP 429/5xx, SMTP errors) are retried with
+  exponential backoff, permanent ones (HTTP 4xx, bad credentials) are not;
+- only channels that still need delivery are retried;
+- finished jobs expire after OUTBOX_RETENTION_DAYS, which is also the dedup window.
+"""
+import logging
+import smtplib
+import time
+
+from pymongo import ReturnDocument
+
+from .base import *
+
+logger = logging.getLogger("kiosk.outbox")
+
+OUTBOX_CONCURRENCY = int(os.environ.get("OUTBOX_CONCURRENCY", "8"))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_RETENTION_DAYS = int(os.environ.get("OUTBOX_RETENTION_DAYS", "30"))
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+# Messages per second, per provider and company
+PROVIDER_RATES = {
+    "whatsapp": float(os.environ.get("OUTBOX_RATE_WHATSAPP", "20")),
+    "twilio": float(os.environ.get("OUTBOX_RATE_TWILIO", "10")),
+    "email": float(os.environ.get("OUTBOX_RATE_EMAIL", "2")),
+}
+
+EMAIL_SUBJECTS = {
+    "payment_confirmation": "Betalingsbevestiging",
+    "rent_reminder": "Huurherinnering",
+    "overdue_warning": "Achterstallige Huur",
+    "fine_applied": "Boete Toegepast",
+    "new_invoice": "Nieuwe Factuur",
+    "loan_created": "Lening Aangemaakt",
+    "loan_payment": "Leningbetaling",
+    "lease_created": "Huurovereenkomst",
+    "internet_assigned": "Internet Toegewezen",
+}
+
+
+class _TransientError(Exception):
+    """Delivery failed but may succeed on a later attempt."""
+
+
+class _TokenBucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+_buckets = {}
+
+
+async def _rate_limit(provider: str, company_id: str):
+    bucket = _buckets.get((provider, company_id))
+    if bucket is None:
+        bucket = _buckets[(provider, company_id)] = _TokenBucket(PROVIDER_RATES[provider])
+    await bucket.acquire()
+
+
+def _with_bank_info(comp: dict, message: str) -> str:
+    bank_name = comp.get("bank_name")
+    bank_account = comp.get("bank_account_number")
+    bank_holder = comp.get("bank_account_name")
+    if bank_name and bank_account:
+        message += f"\n\n--- Bankgegevens ---\nBank: {bank_name}\nRekening: {bank_account}"
+        if bank_holder:
+            message += f"\nT.n.v.: {bank_holder}"
+    return message
+
+
+def _raise_for_response(resp):
+    if resp.status_code == 429 or resp.status_code >= 500:
+        raise _TransientError(f"HTTP {resp.status_code}: {resp.text[:300]}")
+    if resp.status_code >= 400:
+        raise ValueError(f"HTTP {resp.status_code}: {resp.text[:300]}")
+
+
+async def _log_wa(job: dict, phone: str, message: str, status: str, channel: Optional[str] = None, error: str = ""):
+    entry = {
+        "message_id": generate_uuid(),
+        "company_id": job["company_id"],
+        "tenant_id": job["tenant_id"],
+        "tenant_name": job["tenant_name"],
+        "phone": phone,
+        "message_type": job["msg_type"],
+        "message": message,
+        "status": status,
+        "created_at": datetime.now(timezone.utc),
+    }
+    if channel:
+        entry["channel"] = channel
+        entry["error"] = error
+    await db.kiosk_wa_messages.insert_one(entry)
+
+
+# ============== CHANNELS ==============
+# Each returns normally when delivered (or when the channel is not configured) and raises
+# _TransientError for retryable failures; any other exception is a permanent failure.
+
+async def _channel_whatsapp(job: dict, comp: dict, final: bool):
+    if not comp.get("wa_enabled") or not comp.get("wa_api_token") or not comp.get("wa_phone_id"):
+        return  # WhatsApp not configured, skip silently
+    phone_clean = job["phone"].replace(" ", "").replace("-", "").replace("+", "")
+    if not phone_clean.startswith("597"):
+        phone_clean = "597" + phone_clean
+    message = _with_bank_info(comp, job["message"])
+    wa_url = comp.get("wa_api_url", "https://graph.facebook.com/v21.0")
+
+    await _rate_limit("whatsapp", job["company_id"])
+    try:
+        try:
+            resp = await get_http_client().post(
+                f"{wa_url}/{comp['wa_phone_id']}/messages",
+                headers={"Authorization": f"Bearer {comp['wa_api_token']}", "Content-Type": "application/json"},
+                json={"messaging_product": "whatsapp", "to": phone_clean, "type": "text", "text": {"body": message}},
+            )
+        except httpx.HTTPError as e:
+            raise _TransientError(str(e))
+        _raise_for_response(resp)
+    except _TransientError:
+        if final:
+            await _log_wa(job, phone_clean, message, "failed")
+        raise
+    except Exception:
+        await _log_wa(job, phone_clean, message, "failed")
+        raise
+    await _log_wa(job, phone_clean, message, "sent")
+
+
+async def _channel_twilio(job: dict, comp: dict, final: bool):
+    """Twilio WhatsApp and/or SMS, per the company's `twilio_mode` ('whatsapp', 'sms' or 'both')."""
+    if not comp.get("twilio_enabled") or not comp.get("twilio_account_sid") or not comp.get("twilio_auth_token") or not comp.get("twilio_phone_number"):
+        return  # Twilio not configured, skip silently
+    phone_clean = job["phone"].replace(" ", "").replace("-", "")
+    if not phone_clean.startswith("+"):
+        if phone_clean.startswith("597"):
+            phone_clean = "+" + phone_clean
+        else:
+            phone_clean = "+597" + phone_clean
+    message = _with_bank_info(comp, job["message"])
+
+    raw_from = comp["twilio_phone_number"].strip()
+    # Separate numbers for SMS vs WhatsApp when provided
+    sms_from = (comp.get("twilio_sms_number") or raw_from).strip()
+    wa_from = raw_from if raw_from.startswith("whatsapp:") else f"whatsapp:{raw_from}"
+    mode = (comp.get("twilio_mode") or "whatsapp").lower()
+    channels = []
+    if mode in ("whatsapp", "both"):
+        channels.append(("twilio_whatsapp", wa_from, f"whatsapp:{phone_clean}"))
+    if mode in ("sms", "both"):
+        channels.append(("twilio_sms", sms_from, phone_clean))
+
+    sid = comp["twilio_account_sid"]
+    done = set(job.get("twilio_done", []))
+    for channel, from_addr, to_addr in channels:
+        if channel in done:
+            continue  # delivered on an earlier attempt
+        await _rate_limit("twilio", job["company_id"])
+        try:
+            try:
+                resp = await get_http_client().post(
+                    f"https://api.twilio.com/2010-04-01/Accounts/{sid}/Messages.json",
+                    auth=(sid, comp["twilio_auth_token"]),
+                    data={"Body": message, "From": from_addr, "To": to_addr},
+                )
+            except httpx.HTTPError as e:
+                raise _TransientError(str(e))
+            _raise_for_response(resp)
+        except Exception as e:
+            logger.warning(f"Twilio {channel} send failed for {to_addr}: {e}")
+            if final or not isinstance(e, _TransientError):
+                await _log_wa(job, phone_clean, message, "failed", channel, str(e)[:500])
+            raise
+        await _log_wa(job, phone_clean, message, "sent", channel)
+        done.add(channel)
+        await db.kiosk_outbox.update_one({"job_id": job["job_id"]}, {"$addToSet": {"twilio_done": channel}})
+
+
+async def _channel_email(job: dict, comp: dict, final: bool):
+    if not job["tenant_id"] or not _smtp_configured(comp):
+        return
+    tenant = await db.kiosk_tenants.find_one({"tenant_id": job["tenant_id"]}, {"_id": 0, "email": 1})
+    to_email = (tenant or {}).get("email")
+    if not to_email:
+        return
+    subject = EMAIL_SUBJECTS.get(job["msg_type"], "Bericht van uw verhuurder")
+    await _rate_limit("email", job["company_id"])
+    try:
+        await _deliver_email(comp, to_email, subject, job["message"])
+    except (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused) as e:
+        await _log_email(job["company_id"], to_email, subject, job["message"], job["tenant_id"], job["tenant_name"], job["msg_type"], error=str(e))
+        raise
+    except Exception as e:
+        if final:
+            await _log_email(job["company_id"], to_email, subject, job["message"], job["tenant_id"], job["tenant_name"], job["msg_type"], error=str(e))
+        raise _TransientError(str(e))
+    await _log_email(job["company_id"], to_email, subject, job["message"], job["tenant_id"], job["tenant_name"], job["msg_type"])
+
+
+
+CHANNELS = {
+    "whatsapp": _channel_whatsapp,
+    "twilio": _channel_twilio,
+    "email": _channel_email,
+}
+
+
+# ============== WORKER ==============
+
+async def _claim_job():
+    now = datetime.now(timezone.utc)
+    return await db.kiosk_outbox.find_one_and_update(
+        {"$or": [
+            {"status": "queued", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "claimed_at": {"$lt": now - CLAIM_TIMEOUT}},
+        ]},
+        {"$set": {"status": "sending", "claimed_at": now}, "$inc": {"attempts": 1}},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _process_job(job: dict):
+    """Deliver all pending channels of a claimed job, then reschedule or finish it."""
+    now = datetime.now(timezone.utc)
+    final = job["attempts"] >= OUTBOX_MAX_ATTEMPTS
+    comp = await db.kiosk_companies.find_one({"company_id": job["company_id"]}, {"_id": 0})
+    pending, errors = [], []
+    for channel in job["channels"]:
+        if not comp:
+            break
+        try:
+            await CHANNELS[channel](job, comp, final)
+        except _TransientError as e:
+            pending.append(channel)
+            errors.append(f"{channel}: {e}")
+        except Exception as e:
+            errors.append(f"{channel}: {e}")
+
+    expires_at = now + timedelta(days=OUTBOX_RETENTION_DAYS)
+    if pending and not final:
+        delay = min(BACKOFF_BASE_SECONDS * 2 ** (job["attempts"] - 1), BACKOFF_MAX_SECONDS)
+        update = {"status": "queued", "channels": pending, "next_attempt_at": now + timedelta(seconds=delay)}
+    else:
+        update = {"status": "failed" if errors else "done", "finished_at": now, "expires_at": expires_at}
+    if errors:
+        update["last_error"] = "; ".join(errors)[:1000]
+    await db.kiosk_outbox.update_one({"job_id": job["job_id"]}, {"$set": update})
+
+
+async def process_outbox(limit: int = 500) -> int:
+    """Deliver up to `limit` due jobs with OUTBOX_CONCURRENCY parallel senders. Returns jobs handled."""
+    handled = 0
+
+    async def sender():
+        nonlocal handled
+        while handled < limit:
+            job = await _claim_job()
+            if not job:
+                return
+            handled += 1
+            try:
+                await _process_job(job)
+            except Exception as e:
+                logger.error(f"Outbox job {job.get('job_id')} crashed: {e}")
+
+    await asyncio.gather(*(sender() for _ in range(OUTBOX_CONCURRENCY)))
+    return handled
+
+
+async def _kiosk_outbox_worker():
+    """Background loop: deliver queued messages; wakes up immediately when something is enqueued."""
+    while True:
+        try:
+            _outbox_wakeup.clear()
+            handled = await process_outbox()
+            if handled:
+                continue
+        except Exception as e:
+            logger.error(f"Outbox worker error: {e}")
+        try:
+            await asyncio.wait_for(_outbox_wakeup.wait(), timeout=15)
+        except asyncio.TimeoutError:
+            pass
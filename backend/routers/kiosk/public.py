@@ -29,12 +29,7 @@ async def employee_pin_login(company_id: str, data: EmployeePinLogin):
 @router.get("/public/{company_id}/company")
 async def get_company_public(company_id: str):
     """Get company info for kiosk display (public) — cached"""
-    cache_key = f"pub_company_{company_id}"
-    cached = _cache_get(cache_key)
-    if cached:
-        return cached
-    
-    company = await db.kiosk_companies.find_one({"company_id": company_id})
+    company = await _get_public_company(company_id)
     if not company:
         raise HTTPException(status_code=404, detail="Bedrijf niet gevonden")
     
@@ -56,7 +51,6 @@ async def get_company_public(company_id: str):
             "start_screen": company.get("start_screen", "kiosk")
         }
     
-    _cache_set(cache_key, result, 60)
     return result
 
 @router.post("/public/{company_id}/verify-pin")
@@ -99,6 +93,7 @@ async def set_initial_pin(company_id: str, data: KioskPinVerify):
     if not data.pin or len(data.pin) != 4 or not data.pin.isdigit():
         raise HTTPException(status_code=400, detail="PIN moet 4 cijfers zijn")
     await db.kiosk_companies.update_one({"company_id": company_id}, {"$set": {"kiosk_pin": data.pin}})
+    await _invalidate_public_cache(company_id, "company")
     token = jwt.encode(
         {"company_id": company_id, "exp": datetime.now(timezone.utc) + timedelta(hours=8)},
         JWT_SECRET, algorithm="HS256"
@@ -108,7 +103,7 @@ async def set_initial_pin(company_id: str, data: KioskPinVerify):
 @router.get("/public/{company_id}/company/stamp")
 async def get_company_stamp(company_id: str):
     """Get company stamp info for receipts (public)"""
-    company = await db.kiosk_companies.find_one({"company_id": company_id})
+    company = await _get_public_company(company_id)
     if not company:
         raise HTTPException(status_code=404, detail="Bedrijf niet gevonden")
     
@@ -122,7 +117,7 @@ async def get_company_stamp(company_id: str):
 @router.get("/public/{company_id}/apartments")
 async def get_apartments_public(company_id: str):
     """Get all apartments for a company (public for kiosk)"""
-    company = await db.kiosk_companies.find_one({"company_id": company_id})
+    company = await _get_public_company(company_id)
     if not company:
         raise HTTPException(status_code=404, detail="Bedrijf niet gevonden")
     
@@ -130,35 +125,31 @@ async def get_apartments_public(company_id: str):
     if sub_status in ("blocked", "expired"):
         raise HTTPException(status_code=403, detail="Abonnement verlopen")
     
-    apartments = await db.kiosk_apartments.find({"company_id": company_id}).to_list(1000)
-    return [{
-        "apartment_id": apt["apartment_id"],
-        "number": apt["number"],
-        "description": apt.get("description", ""),
-        "status": apt.get("status", "available"),
-        "location_id": apt.get("location_id"),
-        "location_name": apt.get("location_name")
-    } for apt in apartments]
+    async def load():
+        apartments = await db.kiosk_apartments.find({"company_id": company_id}).to_list(1000)
+        return [{
+            "apartment_id": apt["apartment_id"],
+            "number": apt["number"],
+            "description": apt.get("description", ""),
+            "status": apt.get("status", "available"),
+            "location_id": apt.get("location_id"),
+            "location_name": apt.get("location_name")
+        } for apt in apartments]
+    return await _cached_public("apartments", company_id, load)
 
 @router.get("/public/{company_id}/locations")
 async def get_locations_public(company_id: str):
     """Get all locations for a company (public for kiosk)"""
-    company = await db.kiosk_companies.find_one({"company_id": company_id})
+    company = await _get_public_company(company_id)
     if not company:
         raise HTTPException(status_code=404, detail="Bedrijf niet gevonden")
-    locations = await db.kiosk_locations.find(
+    return await _cached_public("locations", company_id, lambda: db.kiosk_locations.find(
         {"company_id": company_id},
         {"_id": 0}
-    ).sort("created_at", 1).to_list(500)
-    return locations
+    ).sort("created_at", 1).to_list(500))
 
-@router.get("/public/{company_id}/tenants")
-async def get_tenants_public(company_id: str):
-    """Get all active tenants for kiosk display (public)"""
-    company = await db.kiosk_companies.find_one({"company_id": company_id})
-    if not company:
-        raise HTTPException(status_code=404, detail="Bedrijf niet gevonden")
-    
+async def _load_public_tenants(company_id: str) -> list:
+    """Active tenants with balances and overdue months, as shown on the kiosk"""
     tenants = await db.kiosk_tenants.find({
         "company_id": company_id,
         "status": "active"
@@ -207,10 +198,18 @@ async def get_tenants_public(company_id: str):
     
     return result
 
+@router.get("/public/{company_id}/tenants")
+async def get_tenants_public(company_id: str):
+    """Get all active tenants for kiosk display (public) — cached"""
+    company = await _get_public_company(company_id)
+    if not company:
+        raise HTTPException(status_code=404, detail="Bedrijf niet gevonden")
+    return await _cached_public("tenants", company_id, lambda: _load_public_tenants(company_id))
+
 @router.get("/public/{company_id}/tenants/lookup/{code}")
 async def lookup_tenant_by_code(company_id: str, code: str):
     """Lookup tenant by code or apartment number (public)"""
-    company = await db.kiosk_companies.find_one({"company_id": company_id})
+    company = await _get_public_company(company_id)
     if not company:
         raise HTTPException(status_code=404, detail="Bedrijf niet gevonden")
     
@@ -353,6 +352,7 @@ async def create_payment_public(company_id: str, data: PaymentCreate):
         if update_fields:
             update_fields["updated_at"] = now
             await db.kiosk_tenants.update_one({"tenant_id": data.tenant_id}, {"$set": update_fields})
+            await _invalidate_public_cache(company_id, "tenants")
 
         updated_tenant = await db.kiosk_tenants.find_one({"tenant_id": data.tenant_id})
         payment["status"] = "approved"
@@ -484,6 +484,7 @@ async def approve_payment_with_pin(company_id: str, payment_id: str, data: Appro
     if update_fields:
         update_fields["updated_at"] = now
         await db.kiosk_tenants.update_one({"tenant_id": payment["tenant_id"]}, {"$set": update_fields})
+        await _invalidate_public_cache(company_id, "tenants")
 
     updated_tenant = await db.kiosk_tenants.find_one({"tenant_id": payment["tenant_id"]})
     remaining_rent = updated_tenant.get("outstanding_rent", 0) if updated_tenant else 0
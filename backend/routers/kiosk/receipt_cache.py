@@ -0,0 +1,112 @@
+"""
+Content-addressed cache for rendered kwitantie artifacts (HTML and encrypted PDF).
+
+The key is the payment id plus a SHA-256 over everything that ends up on the receipt:
+the payment document, the company's stamp/branding fields, the public base URL (QR
+target) and the render flags. Any change to the payment or the stamp settings therefore
+produces a new key, so stale artifacts are never served; they simply age out.
+
+Artifacts live on disk (RECEIPT_CACHE_DIR, default: system temp dir) and the directory
+is kept under RECEIPT_CACHE_MAX_MB by evicting the least recently used files.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger("kiosk.receipts")
+
+CACHE_DIR = os.environ.get("RECEIPT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "kiosk-receipt-cache")
+MAX_BYTES = int(float(os.environ.get("RECEIPT_CACHE_MAX_MB", "256")) * 1024 * 1024)
+# Bump when the receipt template changes so old artifacts are no longer matched
+TEMPLATE_VERSION = "1"
+
+# Company fields that are rendered on the receipt
+COMPANY_FIELDS = (
+    "name", "email", "adres", "telefoon",
+    "stamp_company_name", "stamp_address", "stamp_phone", "stamp_whatsapp",
+)
+
+_total_bytes = None  # lazily measured directory size
+
+
+def receipt_cache_key(kind: str, payment: dict, company: dict, base_url: str, **flags) -> str:
+    payload = {
+        "v": TEMPLATE_VERSION,
+        "kind": kind,
+        "payment": {k: v for k, v in payment.items() if k != "_id"},
+        "company": {k: (company or {}).get(k) for k in COMPANY_FIELDS},
+        "base_url": base_url,
+        "flags": flags,
+    }
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return f"{payment.get('payment_id', 'x')}-{digest[:32]}.{kind}"
+
+
+def _path(key: str) -> str:
+    return os.path.join(CACHE_DIR, key)
+
+
+def get_cached_receipt(key: str):
+    """Return cached bytes or None. A hit refreshes the file's mtime (LRU order)."""
+    path = _path(key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path, None)
+        return data
+    except OSError:
+        return None
+
+
+def _write_and_evict(key: str, data: bytes):
+    global _total_bytes
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    if _total_bytes is None:
+        _total_bytes = sum(e.stat().st_size for e in os.scandir(CACHE_DIR) if e.is_file())
+    tmp = _path(key) + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, _path(key))
+    _total_bytes += len(data)
+    if _total_bytes <= MAX_BYTES:
+        return
+    # Evict least recently used until we are at 90% of the budget
+    entries = sorted(
+        (e for e in os.scandir(CACHE_DIR) if e.is_file()),
+        key=lambda e: e.stat().st_mtime,
+    )
+    _total_bytes = sum(e.stat().st_size for e in entries)
+    for e in entries:
+        if _total_bytes <= MAX_BYTES * 0.9:
+            break
+        try:
+            size = e.stat().st_size
+            os.remove(e.path)
+            _total_bytes -= size
+        except OSError:
+            pass
+
+
+async def store_receipt(key: str, data: bytes):
+    try:
+        await asyncio.to_thread(_write_and_evict, key, data)
+    except Exception as e:  # cache is best-effort
+        logger.warning(f"[receipt-cache] write failed for {key}: {e}")
+
+
+def invalidate_receipts(payment_id: str):
+    """Drop all cached artifacts of a payment (e.g. after deletion)."""
+    global _total_bytes
+    try:
+        for e in os.scandir(CACHE_DIR):
+            if e.name.startswith(f"{payment_id}-"):
+                try:
+                    os.remove(e.path)
+                except OSError:
+                    pass
+        _total_bytes = None
+    except OSError:
+        pass
@@ -1,180 +1,279 @@
 from .base import *
+import logging
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger("kiosk.scheduler")
 
 # ============== DAGELIJKSE NOTIFICATIE SCHEDULER ==============
+# Runs once per Suriname calendar day from 08:00 (UTC-3). Every API worker runs the loop,
+# but only the holder of the leader lock (kiosk_scheduler_locks) does the work. Each run
+# has a checkpoint document (kiosk_scheduler_runs) listing the companies already done,
+# so a crash or restart mid-run resumes with the remaining companies. Messages carry
+# outbox dedup keys, so a company that was interrupted halfway is not messaged twice.
 
-async def _run_daily_notifications():
-    """Run daily checks for rent reminders and expiring leases across all companies"""
-    import logging
-    logger = logging.getLogger("kiosk.scheduler")
-    
+SURINAME_TZ = timezone(timedelta(hours=-3))
+DAILY_RUN_HOUR = 8
+DAILY_CONCURRENCY = int(os.environ.get("KIOSK_DAILY_CONCURRENCY", "8"))
+SCHEDULER_POLL_SECONDS = 60
+LOCK_TTL = timedelta(minutes=5)
+_INSTANCE_ID = generate_uuid()
+
+DAILY_MAX_ATTEMPTS = 3  # runs with failed companies are retried on the next poll, up to this many times
+MONTHS_NL = ['januari', 'februari', 'maart', 'april', 'mei', 'juni', 'juli', 'augustus', 'september', 'oktober', 'november', 'december']
+
+
+async def _acquire_lock(name: str) -> bool:
+    """Take or renew the named lock for this process. False if another process holds it."""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.kiosk_scheduler_locks.update_one(
+            {"_id": name, "$or": [{"owner": _INSTANCE_ID}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": _INSTANCE_ID, "expires_at": now + LOCK_TTL}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False  # Held by another process (the upsert collided with its document)
+
+
+async def _release_lock(name: str):
+    await db.kiosk_scheduler_locks.delete_one({"_id": name, "owner": _INSTANCE_ID})
+
+
+async def _keep_lock(name: str, interval: float = 60):
+    while True:
+        await asyncio.sleep(interval)
+        await _acquire_lock(name)
+
+
+async def _expiring_leases(company_id: str, now: datetime) -> list:
+    """Active leases ending within 30 days, with their tenant: [(lease, tenant)]. Tenants are loaded in one query."""
+    warning_date = (now + timedelta(days=30)).strftime("%Y-%m-%d")
+    today_str = now.strftime("%Y-%m-%d")
+    leases = await db.kiosk_leases.find({
+        "company_id": company_id,
+        "status": "active",
+        "end_date": {"$lte": warning_date, "$gte": today_str}
+    }).to_list(None)
+    tenant_ids = list({lease.get("tenant_id") for lease in leases if lease.get("tenant_id")})
+    tenants = {
+        t["tenant_id"]: t
+        for t in await db.kiosk_tenants.find({"tenant_id": {"$in": tenant_ids}}, {"_id": 0}).to_list(None)
+    } if tenant_ids else {}
+    return [(lease, tenants[lease["tenant_id"]]) for lease in leases if lease.get("tenant_id") in tenants]
+
+
+def _lease_expiring_message(lease: dict, tenant: dict, comp_name: str, now: datetime) -> str:
+    end_date = lease.get("end_date", "")
+    try:
+        end_dt = datetime.strptime(end_date, "%Y-%m-%d")
+        days_left = (end_dt - now.replace(tzinfo=None)).days
+        end_fmt = f"{end_dt.day} {MONTHS_NL[end_dt.month-1]} {end_dt.year}"
+    except Exception:
+        days_left = 30
+        end_fmt = end_date
+
+    apt_nr = lease.get("apartment_number", "")
+    return (f"Beste {tenant['name']},\n\n"
+            f"Uw huurcontract voor appartement {apt_nr} loopt af op {end_fmt} "
+            f"(nog {days_left} dagen).\n\n"
+            f"Neem contact op met de verhuurder om uw contract te verlengen.\n\n"
+            f"Met vriendelijke groet,\n{comp_name}")
+
+
+async def _daily_notifications_for_company(comp: dict, now: datetime) -> dict:
+    company_id = comp["company_id"]
+    comp_name = comp.get("stamp_company_name") or comp.get("name", "")
+    billing_day = comp.get("billing_day", 1)
+    today = now.day
+    results = {"rent_reminders": 0, "lease_warnings": 0}
+
+    # === 1. HUUR HERINNERING: 3 dagen voor vervaldatum ===
+    reminder_day = billing_day - 3
+    if reminder_day <= 0:
+        reminder_day += 28  # Wrap around for early-month billing days
+
+    if today == reminder_day or today == billing_day:
+        tenants_with_debt = await db.kiosk_tenants.find({
+            "company_id": company_id,
+            "status": "active",
+            "outstanding_rent": {"$gt": 0}
+        }).to_list(None)
+
+        # Push notification summary: huurders achterstand
+        try:
+            if tenants_with_debt:
+                from .push import send_push_to_company
+                total_achterstand = sum(
+                    (t.get("outstanding_rent", 0) + t.get("fines", 0) + t.get("service_costs", 0))
+                    for t in tenants_with_debt
+                )
+                label = "Vervaldatum vandaag" if today == billing_day else "Vervaldatum over 3 dagen"
+                await send_push_to_company(
+                    company_id,
+                    title="Achterstand huurders",
+                    body=f"{len(tenants_with_debt)} huurder(s) • Totaal SRD {total_achterstand:,.2f} • {label}",
+                    url="/vastgoed",
+                    tag=f"overdue-summary-{now.strftime('%Y%m%d')}",
+                )
+        except Exception:
+            pass
+
+        jobs = []
+        for t in tenants_with_debt:
+            t_phone = t.get("phone") or t.get("telefoon", "")
+            if not t_phone:
+                continue
+
+            outstanding = t.get("outstanding_rent", 0)
+            fines = t.get("fines", 0)
+            service = t.get("service_costs", 0)
+            total_debt = outstanding + fines + service
+            apt_nr = t.get("apartment_number", "")
+
+            if today == billing_day:
+                wa_reminder = (f"Beste {t['name']},\n\n"
+                               f"Vandaag is de vervaldatum voor uw huurbetaling.\n"
+                               f"Openstaande huur: SRD {outstanding:,.2f}\n"
+                               f"{('Boetes: SRD ' + f'{fines:,.2f}' + chr(10)) if fines > 0 else ''}"
+                               f"Totaal verschuldigd: SRD {total_debt:,.2f}\n"
+                               f"Appartement: {apt_nr}\n\n"
+                               f"Gelieve vandaag nog te betalen om boetes te voorkomen.\n\n"
+                               f"Met vriendelijke groet,\n{comp_name}")
+                msg_type = "rent_due_today"
+            else:
+                wa_reminder = (f"Beste {t['name']},\n\n"
+                               f"Herinnering: uw huurbetaling vervalt over enkele dagen (dag {billing_day}).\n"
+                               f"Openstaande huur: SRD {outstanding:,.2f}\n"
+                               f"Totaal verschuldigd: SRD {total_debt:,.2f}\n"
+                               f"Appartement: {apt_nr}\n\n"
+                               f"Gelieve tijdig te betalen.\n\n"
+                               f"Met vriendelijke groet,\n{comp_name}")
+                msg_type = "rent_reminder"
+
+            jobs.append(_outbox_job(company_id, t_phone, wa_reminder, t["tenant_id"], t["name"], msg_type,
+                                    dedup_key=f"{msg_type}:{t['tenant_id']}:{now.strftime('%Y-%m-%d')}"))
+        await _enqueue_outbound(jobs)
+        results["rent_reminders"] += len(jobs)
+
+    # === 2. HUURCONTRACT BIJNA VERLOPEN: 30 dagen van tevoren ===
+    expiring = await _expiring_leases(company_id, now)
+    if expiring:
+        # Only notify once per week: tenants already messaged in the last 7 days, in one query
+        recent = set(await db.kiosk_wa_messages.distinct("tenant_id", {
+            "company_id": company_id,
+            "tenant_id": {"$in": [lease["tenant_id"] for lease, _ in expiring]},
+            "message_type": "lease_expiring",
+            "created_at": {"$gte": now - timedelta(days=7)}
+        }))
+        # Dedup per ISO week as well: the log above only sees messages that were already delivered
+        iso_year, iso_week, _ = now.isocalendar()
+        jobs = []
+        for lease, tenant in expiring:
+            t_phone = tenant.get("phone") or tenant.get("telefoon", "")
+            if not t_phone or lease["tenant_id"] in recent:
+                continue
+            jobs.append(_outbox_job(
+                company_id, t_phone, _lease_expiring_message(lease, tenant, comp_name, now),
+                lease["tenant_id"], tenant["name"], "lease_expiring",
+                dedup_key=f"lease_expiring:{lease['tenant_id']}:{iso_year}-W{iso_week}",
+            ))
+        await _enqueue_outbound(jobs)
+        results["lease_warnings"] += len(jobs)
+
+    return results
+
+
+async def _run_daily_notifications(run_id: Optional[str] = None):
+    """Run daily checks for rent reminders and expiring leases across all companies.
+    With a `run_id` the run is checkpointed per company and resumes where it stopped."""
     try:
         companies = await db.kiosk_companies.find(
-            {"status": "active"},
-            {"_id": 0, "company_id": 1, "name": 1, "stamp_company_name": 1, 
-             "billing_day": 1, "billing_next_month": 1, 
+            {"status": "active", "$or": [{"wa_enabled": True}, {"twilio_enabled": True}]},  # Skip companies without messaging configured
+            {"_id": 0, "company_id": 1, "name": 1, "stamp_company_name": 1,
+             "billing_day": 1, "billing_next_month": 1,
              "wa_enabled": 1, "twilio_enabled": 1}
-        ).to_list(500)
-        
-        now = datetime.now(timezone.utc)
-        today = now.day
-        results = {"rent_reminders": 0, "lease_warnings": 0, "companies_checked": 0}
-        
-        for comp in companies:
-            company_id = comp["company_id"]
-            comp_name = comp.get("stamp_company_name") or comp.get("name", "")
-            billing_day = comp.get("billing_day", 1)
-            
-            # Skip companies without messaging configured
-            if not comp.get("wa_enabled") and not comp.get("twilio_enabled"):
-                continue
-            
-            results["companies_checked"] += 1
-            
-            # === 1. HUUR HERINNERING: 3 dagen voor vervaldatum ===
-            reminder_day = billing_day - 3
-            if reminder_day <= 0:
-                reminder_day += 28  # Wrap around for early-month billing days
-            
-            if today == reminder_day or today == billing_day:
-                tenants_with_debt = await db.kiosk_tenants.find({
-                    "company_id": company_id,
-                    "status": "active",
-                    "outstanding_rent": {"$gt": 0}
-                }).to_list(1000)
-
-                # Push notification summary: huurders achterstand
-                try:
-                    if tenants_with_debt:
-                        from .push import send_push_to_company
-                        total_achterstand = sum(
-                            (t.get("outstanding_rent", 0) + t.get("fines", 0) + t.get("service_costs", 0))
-                            for t in tenants_with_debt
-                        )
-                        label = "Vervaldatum vandaag" if today == billing_day else "Vervaldatum over 3 dagen"
-                        await send_push_to_company(
-                            company_id,
-                            title="Achterstand huurders",
-                            body=f"{len(tenants_with_debt)} huurder(s) • Totaal SRD {total_achterstand:,.2f} • {label}",
-                            url="/vastgoed",
-                            tag=f"overdue-summary-{now.strftime('%Y%m%d')}",
-                        )
-                except Exception:
-                    pass
-
-                for t in tenants_with_debt:
-                    t_phone = t.get("phone") or t.get("telefoon", "")
-                    if not t_phone:
-                        continue
-                    
-                    outstanding = t.get("outstanding_rent", 0)
-                    fines = t.get("fines", 0)
-                    service = t.get("service_costs", 0)
-                    total_debt = outstanding + fines + service
-                    apt_nr = t.get("apartment_number", "")
-                    
-                    if today == billing_day:
-                        wa_reminder = (f"Beste {t['name']},\n\n"
-                                       f"Vandaag is de vervaldatum voor uw huurbetaling.\n"
-                                       f"Openstaande huur: SRD {outstanding:,.2f}\n"
-                                       f"{('Boetes: SRD ' + f'{fines:,.2f}' + chr(10)) if fines > 0 else ''}"
-                                       f"Totaal verschuldigd: SRD {total_debt:,.2f}\n"
-                                       f"Appartement: {apt_nr}\n\n"
-                                       f"Gelieve vandaag nog te betalen om boetes te voorkomen.\n\n"
-                                       f"Met vriendelijke groet,\n{comp_name}")
-                        msg_type = "rent_due_today"
-                    else:
-                        wa_reminder = (f"Beste {t['name']},\n\n"
-                                       f"Herinnering: uw huurbetaling vervalt over enkele dagen (dag {billing_day}).\n"
-                                       f"Openstaande huur: SRD {outstanding:,.2f}\n"
-                                       f"Totaal verschuldigd: SRD {total_debt:,.2f}\n"
-                                       f"Appartement: {apt_nr}\n\n"
-                                       f"Gelieve tijdig te betalen.\n\n"
-                                       f"Met vriendelijke groet,\n{comp_name}")
-                        msg_type = "rent_reminder"
-                    
-                    await _send_message_auto(company_id, t_phone, wa_reminder, t["tenant_id"], t["name"], msg_type)
-                    results["rent_reminders"] += 1
-            
-            # === 2. HUURCONTRACT BIJNA VERLOPEN: 30 dagen van tevoren ===
-            warning_date = (now + timedelta(days=30)).strftime("%Y-%m-%d")
-            today_str = now.strftime("%Y-%m-%d")
-            
-            expiring_leases = await db.kiosk_leases.find({
-                "company_id": company_id,
-                "status": "active",
-                "end_date": {"$lte": warning_date, "$gte": today_str}
-            }).to_list(500)
-            
-            for lease in expiring_leases:
-                tenant = await db.kiosk_tenants.find_one({"tenant_id": lease.get("tenant_id")})
-                if not tenant:
-                    continue
-                t_phone = tenant.get("phone") or tenant.get("telefoon", "")
-                if not t_phone:
-                    continue
-                
-                # Only notify once per week (check if already sent in last 7 days)
-                recent_msg = await db.kiosk_wa_messages.find_one({
-                    "company_id": company_id,
-                    "tenant_id": lease.get("tenant_id"),
-                    "message_type": "lease_expiring",
-                    "created_at": {"$gte": now - timedelta(days=7)}
-                })
-                if recent_msg:
-                    continue
-                
-                end_date = lease.get("end_date", "")
-                months_nl = ['januari','februari','maart','april','mei','juni','juli','augustus','september','oktober','november','december']
+        ).to_list(None)
+
+        done = set()
+        if run_id:
+            run = await db.kiosk_scheduler_runs.find_one({"_id": run_id}) or {}
+            done = set(run.get("done_companies", []))
+
+        # Suriname time: billing days, dedup keys and lease dates are local calendar dates
+        now = datetime.now(SURINAME_TZ)
+        results = {"rent_reminders": 0, "lease_warnings": 0, "companies_checked": 0, "companies_failed": 0, "companies_resumed": len(done)}
+        semaphore = asyncio.Semaphore(DAILY_CONCURRENCY)
+
+        async def run_company(comp):
+            async with semaphore:
                 try:
-                    end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-                    days_left = (end_dt - now.replace(tzinfo=None)).days
-                    end_fmt = f"{end_dt.day} {months_nl[end_dt.month-1]} {end_dt.year}"
-                except Exception:
-                    days_left = 30
-                    end_fmt = end_date
-                
-                apt_nr = lease.get("apartment_number", "")
-                wa_lease_exp = (f"Beste {tenant['name']},\n\n"
-                                f"Uw huurcontract voor appartement {apt_nr} loopt af op {end_fmt} "
-                                f"(nog {days_left} dagen).\n\n"
-                                f"Neem contact op met de verhuurder om uw contract te verlengen.\n\n"
-                                f"Met vriendelijke groet,\n{comp_name}")
-                await _send_message_auto(company_id, t_phone, wa_lease_exp, lease.get("tenant_id"), tenant["name"], "lease_expiring")
-                results["lease_warnings"] += 1
-        
+                    company_results = await _daily_notifications_for_company(comp, now)
+                except Exception as e:
+                    logger.error(f"Daily notifications failed for {comp['company_id']}: {e}")
+                    results["companies_failed"] += 1
+                    return
+                results["companies_checked"] += 1
+                results["rent_reminders"] += company_results["rent_reminders"]
+                results["lease_warnings"] += company_results["lease_warnings"]
+                if run_id:
+                    await db.kiosk_scheduler_runs.update_one(
+                        {"_id": run_id}, {"$addToSet": {"done_companies": comp["company_id"]}}
+                    )
+
+        await asyncio.gather(*(run_company(c) for c in companies if c["company_id"] not in done))
+
         logger.info(f"Daily notifications complete: {results}")
         return results
-        
+
     except Exception as e:
         logger.error(f"Error in daily notifications: {e}")
         return {"error": str(e)}
 
 
+async def _run_daily_if_due():
+    """Start or resume today's run when it is past 08:00 Suriname time and today's run is not finished."""
+    local_now = datetime.now(SURINAME_TZ)
+    if local_now.hour < DAILY_RUN_HOUR:
+        return
+    run_id = f"daily_notifications:{local_now.strftime('%Y-%m-%d')}"
+    run = await db.kiosk_scheduler_runs.find_one({"_id": run_id}, {"status": 1, "attempts": 1})
+    if run and run.get("status") == "done":
+        return
+    if not await _acquire_lock("daily_notifications"):
+        return
+    keeper = asyncio.create_task(_keep_lock("daily_notifications"))
+    try:
+        await db.kiosk_scheduler_runs.update_one(
+            {"_id": run_id},
+            {"$set": {"status": "running", "owner": _INSTANCE_ID},
+             "$setOnInsert": {"started_at": datetime.now(timezone.utc), "done_companies": []},
+             "$inc": {"attempts": 1}},
+            upsert=True,
+        )
+        logger.info(f"Running daily kiosk notifications ({run_id})...")
+        results = await _run_daily_notifications(run_id)
+        attempts = (run or {}).get("attempts", 0) + 1
+        complete = "error" not in results and not results.get("companies_failed")
+        if complete or attempts >= DAILY_MAX_ATTEMPTS:
+            await db.kiosk_scheduler_runs.update_one(
+                {"_id": run_id},
+                {"$set": {"status": "done", "finished_at": datetime.now(timezone.utc), "results": results}}
+            )
+        logger.info(f"Daily kiosk notifications results: {results}")
+    finally:
+        keeper.cancel()
+        await _release_lock("daily_notifications")
+
+
 async def _kiosk_daily_scheduler():
-    """Background loop that runs daily notifications at 08:00 Suriname time (UTC-3)"""
-    import logging
-    logger = logging.getLogger("kiosk.scheduler")
-    
+    """Background loop that runs daily notifications from 08:00 Suriname time (UTC-3)"""
     while True:
         try:
-            now_utc = datetime.now(timezone.utc)
-            # Suriname is UTC-3
-            suriname_hour = (now_utc.hour - 3) % 24
-            suriname_minute = now_utc.minute
-            
-            # Run at 08:00 Suriname time (= 11:00 UTC)
-            if suriname_hour == 8 and suriname_minute < 5:
-                logger.info("Running daily kiosk notifications...")
-                results = await _run_daily_notifications()
-                logger.info(f"Daily kiosk notifications results: {results}")
-                # Sleep 6 hours to avoid re-running in the same window
-                await asyncio.sleep(6 * 3600)
-            else:
-                # Check every 5 minutes
-                await asyncio.sleep(300)
+            await _run_daily_if_due()
         except Exception as e:
             logger.error(f"Kiosk scheduler error: {e}")
-            await asyncio.sleep(300)
+        await asyncio.sleep(SCHEDULER_POLL_SECONDS)
 
 
 # Manual trigger endpoint for daily notifications
@@ -184,7 +283,7 @@ async def trigger_daily_notifications(company: dict = Depends(get_current_compan
     company_id = company["company_id"]
     comp_name = company.get("stamp_company_name") or company.get("name", "")
     billing_day = company.get("billing_day", 1)
-    now = datetime.now(timezone.utc)
+    now = datetime.now(SURINAME_TZ)
     results = {"rent_reminders": 0, "lease_warnings": 0}
     
     # === Rent reminders for this company ===
@@ -216,39 +315,11 @@ async def trigger_daily_notifications(company: dict = Depends(get_current_compan
         results["rent_reminders"] += 1
     
     # === Lease expiration warnings for this company ===
-    warning_date = (now + timedelta(days=30)).strftime("%Y-%m-%d")
-    today_str = now.strftime("%Y-%m-%d")
-    
-    expiring_leases = await db.kiosk_leases.find({
-        "company_id": company_id,
-        "status": "active",
-        "end_date": {"$lte": warning_date, "$gte": today_str}
-    }).to_list(500)
-    
-    months_nl = ['januari','februari','maart','april','mei','juni','juli','augustus','september','oktober','november','december']
-    for lease in expiring_leases:
-        tenant = await db.kiosk_tenants.find_one({"tenant_id": lease.get("tenant_id")})
-        if not tenant:
-            continue
+    for lease, tenant in await _expiring_leases(company_id, now):
         t_phone = tenant.get("phone") or tenant.get("telefoon", "")
         if not t_phone:
             continue
-        
-        end_date = lease.get("end_date", "")
-        try:
-            end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-            days_left = (end_dt - now.replace(tzinfo=None)).days
-            end_fmt = f"{end_dt.day} {months_nl[end_dt.month-1]} {end_dt.year}"
-        except Exception:
-            days_left = 30
-            end_fmt = end_date
-        
-        apt_nr = lease.get("apartment_number", "")
-        wa_lease_exp = (f"Beste {tenant['name']},\n\n"
-                        f"Uw huurcontract voor appartement {apt_nr} loopt af op {end_fmt} "
-                        f"(nog {days_left} dagen).\n\n"
-                        f"Neem contact op met de verhuurder om uw contract te verlengen.\n\n"
-                        f"Met vriendelijke groet,\n{comp_name}")
+        wa_lease_exp = _lease_expiring_message(lease, tenant, comp_name, now)
         await _send_message_auto(company_id, t_phone, wa_lease_exp, lease.get("tenant_id"), tenant["name"], "lease_expiring")
         results["lease_warnings"] += 1
     
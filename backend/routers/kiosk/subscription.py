@@ -8,7 +8,7 @@ SaaS Subscription Management for Kiosk ERP
 from .base import (
     router, APIRouter, HTTPException, Depends, BaseModel, Optional,
     datetime, timezone, timedelta,
-    db, generate_uuid, get_current_company,
+    db, generate_uuid, get_current_company, _invalidate_public_cache,
 )
 from fastapi import Request as _Request
 from .superadmin import get_superadmin
@@ -178,6 +178,7 @@ async def sa_toggle_lifetime(company_id: str, data: LifetimeToggle, admin=Depend
         # Recompute
         pass
     await db.kiosk_companies.update_one({"company_id": company_id}, {"$set": upd})
+    await _invalidate_public_cache(company_id, "company")
     if not data.lifetime:
         await _recompute_company_status(company_id)
     return {"lifetime": data.lifetime}
@@ -193,6 +194,7 @@ async def sa_update_price(company_id: str, data: PriceUpdate, admin=Depends(get_
     )
     if r.matched_count == 0:
         raise HTTPException(status_code=404, detail="Bedrijf niet gevonden")
+    await _invalidate_public_cache(company_id, "company")
     return {"monthly_price": data.monthly_price}
 
 
@@ -615,6 +617,7 @@ async def _recompute_company_status(company_id: str):
         await db.kiosk_companies.update_one(
             {"company_id": company_id}, {"$set": {"subscription_status": "lifetime"}}
         )
+        await _invalidate_public_cache(company_id, "company")
         return
     now = datetime.now(timezone.utc)
     # Any unpaid + overdue invoice?
@@ -651,6 +654,7 @@ async def _recompute_company_status(company_id: str):
     await db.kiosk_companies.update_one(
         {"company_id": company_id}, {"$set": {"subscription_status": new_status}}
     )
+    await _invalidate_public_cache(company_id, "company")
 
 
 @router.post("/superadmin/subscription/generate-monthly")
@@ -1,4 +1,7 @@
 from .base import *
+from .face_index import invalidate_admin_faces, invalidate_tenant_faces
+from services.pdf_render_pool import render_stats
+from services.cache import cache_stats
 
 # ============== SUPERADMIN ==============
 
@@ -66,6 +69,16 @@ async def superadmin_stats(admin=Depends(get_superadmin)):
         "pro_plan_price": PRO_PLAN_PRICE
     }
 
+@router.get("/superadmin/pdf-render/stats")
+async def superadmin_pdf_render_stats(admin=Depends(get_superadmin)):
+    """Queue depth and render/wait timings of the PDF render pool (since process start)."""
+    return render_stats()
+
+@router.get("/superadmin/cache/stats")
+async def superadmin_cache_stats(admin=Depends(get_superadmin)):
+    """Hit/miss/eviction counters of the in-process caches of this worker."""
+    return cache_stats()
+
 @router.get("/superadmin/companies")
 async def superadmin_companies(admin=Depends(get_superadmin)):
     companies = await db.kiosk_companies.find({}, {"_id": 0, "password_hash": 0}).to_list(500)
@@ -111,6 +124,7 @@ async def superadmin_toggle_feature(company_id: str, feature_key: str, body: dic
     )
     if res.matched_count == 0:
         raise HTTPException(status_code=404, detail="Bedrijf niet gevonden")
+    await _invalidate_public_cache(company_id, "company")
     return {"company_id": company_id, "feature": feature_key, "enabled": enabled}
 
 @router.put("/superadmin/companies/{company_id}/status")
@@ -123,6 +137,8 @@ async def superadmin_toggle_company(company_id: str, admin=Depends(get_superadmi
         {"company_id": company_id},
         {"$set": {"status": new_status, "updated_at": datetime.now(timezone.utc)}}
     )
+    await _invalidate_public_cache(company_id, "company")
+    invalidate_admin_faces(company_id)
     return {"status": new_status, "message": f"Bedrijf {'geactiveerd' if new_status == 'active' else 'gedeactiveerd'}"}
 
 class SuperAdminSubscriptionUpdate(BaseModel):
@@ -153,6 +169,7 @@ async def superadmin_update_subscription(company_id: str, data: SuperAdminSubscr
             "updated_at": datetime.now(timezone.utc)
         }}
     )
+    await _invalidate_public_cache(company_id, "company")
     return {"message": "Abonnement bijgewerkt", "subscription_status": data.subscription_status}
 
 @router.post("/superadmin/companies")
@@ -204,7 +221,7 @@ async def superadmin_delete_company(company_id: str, admin=Depends(get_superadmi
         db.kiosk_rekeninghouders, db.kiosk_messages, db.kiosk_wa_messages,
         db.kiosk_shelly_devices, db.kiosk_tenda_routers,
         db.kiosk_freelancer_payments, db.kiosk_loonstroken,
-        db.kiosk_push_subscriptions,
+        db.kiosk_push_subscriptions, db.kiosk_billing_effects, db.kiosk_outbox,
     ]
     total = 0
     for col in collections:
@@ -216,11 +233,11 @@ async def superadmin_delete_company(company_id: str, admin=Depends(get_superadmi
 
     # Invalidate caches
     try:
-        _cache_invalidate(f"pub_company_{company_id}")
-        _cache_invalidate(f"pub_apt_{company_id}")
-        _cache_invalidate(f"pub_ten_{company_id}")
+        await _invalidate_public_cache(company_id)
     except Exception:
         pass
+    invalidate_admin_faces(company_id)
+    invalidate_tenant_faces(company_id)
 
     return {"deleted": True, "company_id": company_id, "records_removed": total}
 
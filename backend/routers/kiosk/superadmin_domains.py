@@ -92,6 +92,7 @@ async def sa_assign_domain(data: DomainAssign, admin=Depends(get_superadmin)):
             "updated_at": datetime.now(timezone.utc),
         }}
     )
+    await _invalidate_public_cache(data.company_id, "company")
     return {"ok": True, "company_id": data.company_id, "custom_domain": cd}
 
 
@@ -105,6 +106,7 @@ async def sa_remove_domain(company_id: str, admin=Depends(get_superadmin)):
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Bedrijf niet gevonden")
+    await _invalidate_public_cache(company_id, "company")
     return {"ok": True}
 
 
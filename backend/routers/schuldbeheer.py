@@ -22,11 +22,32 @@ import aiofiles
 import sys
 sys.path.append(str(Path(__file__).parent.parent))
 from routers.deps import get_current_user, get_db
+from services.indexes import register_indexes, register_query
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/schuldbeheer", tags=["Schuldbeheer"])
 
+# ==================== INDEXES ====================
+# Aangemaakt bij startup, zie services/indexes.py
+
+register_indexes("schuldbeheer_rekeningen", [("user_id", 1), ("actief", 1)], "id")
+register_indexes("schuldbeheer_relaties", [("user_id", 1), ("actief", 1)], "id")
+register_indexes("schuldbeheer_schulden", [("user_id", 1), ("status", 1)], [("relatie_id", 1), ("status", 1)],
+                 [("user_id", 1), ("dossiernummer", 1)], "id")
+register_indexes("schuldbeheer_betalingen", [("user_id", 1), ("datum", -1)], [("schuld_id", 1), ("datum", -1)], "id")
+register_indexes("schuldbeheer_inkomsten", [("user_id", 1), ("datum", -1)], "id")
+register_indexes("schuldbeheer_uitgaven", [("user_id", 1), ("datum", -1)], [("user_id", 1), ("vast", 1)], "id")
+register_indexes("schuldbeheer_documenten", [("user_id", 1), ("gekoppeld_type", 1), ("gekoppeld_id", 1)], "id")
+
+register_query("schuldbeheer schulden per status", "schuldbeheer_schulden", {"user_id": "x", "status": "open"})
+register_query("schuldbeheer betalingen per periode", "schuldbeheer_betalingen",
+               {"user_id": "x", "datum": {"$gte": "2024-01-01", "$lte": "2024-12-31"}}, sort=[("datum", -1)])
+register_query("schuldbeheer inkomsten per jaar", "schuldbeheer_inkomsten",
+               {"user_id": "x", "datum": {"$gte": "2024-01-01", "$lt": "2025-01-01"}})
+register_query("schuldbeheer uitgaven per jaar", "schuldbeheer_uitgaven",
+               {"user_id": "x", "datum": {"$gte": "2024-01-01", "$lt": "2025-01-01"}})
+
 # ==================== PYDANTIC MODELS ====================
 
 # --- Bankrekeningen ---
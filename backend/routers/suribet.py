@@ -7,10 +7,6 @@ from typing import Optional, List
 from datetime import datetime, timezone
 from bson import ObjectId
 import uuid
-import base64
-import os
-import json
-import re
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -240,6 +236,33 @@ class WisselkoersUpdate(BaseModel):
 # DEPENDENCY - Get current user
 # ============================================
 from .deps import get_current_user, db
+from services.indexes import register_indexes, register_query
+from services.suribet_saldi import suribet_mutatie, get_suribet_saldi, herbouw_suribet_saldi, openstaand_totaal
+from services.bon_ocr import (
+    enqueue_bon, get_job as get_ocr_job_doc, create_upload_session, get_upload_session, UPLOAD_SESSION_TTL,
+)
+
+# ============================================
+# INDEXES (aangemaakt bij startup, zie services/indexes.py)
+# ============================================
+register_indexes("suribet_dagstaten", [("user_id", 1), ("date", -1)], [("user_id", 1), ("id", 1)])
+register_indexes("suribet_kasboek", [("user_id", 1), ("date", -1)], [("user_id", 1), ("category", 1)], [("user_id", 1), ("id", 1)])
+register_indexes("suribet_loonbetalingen", [("user_id", 1), ("date", -1)])
+register_indexes("suribet_machines", [("user_id", 1), ("machine_id", 1)], [("user_id", 1), ("status", 1)], "id")
+register_indexes("suribet_saldo_adjustments", [("user_id", 1), ("created_at", -1)], [("user_id", 1), ("type", 1)], [("user_id", 1), ("id", 1)])
+register_indexes("suribet_shifts", [("user_id", 1), ("employee_id", 1), ("end_time", 1)], [("user_id", 1), ("date", -1)])
+register_indexes("suribet_uitbetalingen", [("user_id", 1), ("payout_date", -1)])
+register_indexes("suribet_werknemers", [("user_id", 1), ("username", 1)], [("user_id", 1), ("status", 1)])
+register_indexes("suribet_wisselkoersen", "user_id")
+register_indexes("suribet_product_settings", "user_id")
+
+register_query("suribet dagstaten per periode", "suribet_dagstaten",
+               {"user_id": "x", "date": {"$gte": "2024-01-01", "$lt": "2025-01-01"}}, sort=[("date", -1)])
+register_query("suribet kasboek per periode", "suribet_kasboek",
+               {"user_id": "x", "date": {"$gte": "2024-01-01", "$lt": "2025-01-01"}}, sort=[("date", -1)])
+register_query("suribet open shift van werknemer", "suribet_shifts",
+               {"user_id": "x", "employee_id": "x", "end_time": None})
+register_query("suribet uitbetalingen", "suribet_uitbetalingen", {"user_id": "x"}, sort=[("payout_date", -1)])
 
 # ============================================
 # WISSELKOERSEN ENDPOINTS
@@ -496,7 +519,9 @@ async def create_dagstaat(
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.suribet_dagstaten.insert_one(dagstaat)
+    async def schrijf(session):
+        await db.suribet_dagstaten.insert_one(dagstaat, session=session)
+    await suribet_mutatie(db, user_id, schrijf, ("suribet_dagstaten", {"id": dagstaat["id"]}))
     if "_id" in dagstaat:
         del dagstaat["_id"]
     return dagstaat
@@ -557,10 +582,13 @@ async def update_dagstaat(
     
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
-    await db.suribet_dagstaten.update_one(
-        {"id": dagstaat_id, "user_id": user_id},
-        {"$set": update_data}
-    )
+    async def schrijf(session):
+        await db.suribet_dagstaten.update_one(
+            {"id": dagstaat_id, "user_id": user_id},
+            {"$set": update_data},
+            session=session
+        )
+    await suribet_mutatie(db, user_id, schrijf, ("suribet_dagstaten", {"id": dagstaat_id}))
     
     return {"message": "Dagstaat bijgewerkt"}
 
@@ -572,10 +600,12 @@ async def delete_dagstaat(
     """Delete a daily statement"""
     user_id = current_user["id"]
     
-    result = await db.suribet_dagstaten.delete_one({
-        "id": dagstaat_id,
-        "user_id": user_id
-    })
+    async def schrijf(session):
+        return await db.suribet_dagstaten.delete_one({
+            "id": dagstaat_id,
+            "user_id": user_id
+        }, session=session)
+    result = await suribet_mutatie(db, user_id, schrijf, ("suribet_dagstaten", {"id": dagstaat_id}))
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Dagstaat niet gevonden")
@@ -664,28 +694,36 @@ async def create_uitbetaling(
     
     await db.suribet_uitbetalingen.insert_one(uitbetaling)
     
-    # Mark dagstaten as paid
-    await db.suribet_dagstaten.update_many(
-        {"user_id": user_id, "id": {"$in": data.dagstaat_ids}},
-        {"$set": {
-            "is_paid": True,
-            "paid_date": datetime.now(timezone.utc).isoformat(),
-            "uitbetaling_id": uitbetaling["id"]
-        }}
+    async def schrijf(session):
+        # Mark dagstaten as paid
+        await db.suribet_dagstaten.update_many(
+            {"user_id": user_id, "id": {"$in": data.dagstaat_ids}},
+            {"$set": {
+                "is_paid": True,
+                "paid_date": datetime.now(timezone.utc).isoformat(),
+                "uitbetaling_id": uitbetaling["id"]
+            }},
+            session=session
+        )
+        
+        # Delete saldo adjustments (they are now paid out)
+        if saldo_adjustments:
+            await db.suribet_saldo_adjustments.delete_many({
+                "user_id": user_id,
+                "type": "saldo_naar_suribet"
+            }, session=session)
+            # Also delete related kasboek entries
+            await db.suribet_kasboek.delete_many({
+                "user_id": user_id,
+                "category": "suribet_saldo"
+            }, session=session)
+    await suribet_mutatie(
+        db, user_id, schrijf,
+        ("suribet_dagstaten", {"id": {"$in": data.dagstaat_ids}}),
+        ("suribet_saldo_adjustments", {"type": "saldo_naar_suribet"}),
+        ("suribet_kasboek", {"category": "suribet_saldo"}),
     )
     
-    # Delete saldo adjustments (they are now paid out)
-    if saldo_adjustments:
-        await db.suribet_saldo_adjustments.delete_many({
-            "user_id": user_id,
-            "type": "saldo_naar_suribet"
-        })
-        # Also delete related kasboek entries
-        await db.suribet_kasboek.delete_many({
-            "user_id": user_id,
-            "category": "suribet_saldo"
-        })
-    
     return {
         "id": uitbetaling["id"],
         "total_amount": total_suribet_amount,
@@ -738,10 +776,14 @@ async def delete_uitbetaling(uitbetaling_id: str, current_user: dict = Depends(g
         raise HTTPException(status_code=404, detail="Uitbetaling niet gevonden")
     
     # Unmark dagstaten
-    await db.suribet_dagstaten.update_many(
-        {"user_id": user_id, "id": {"$in": uitbetaling.get("dagstaat_ids", [])}},
-        {"$set": {"is_paid": False}, "$unset": {"paid_date": "", "uitbetaling_id": ""}}
-    )
+    dagstaat_ids = uitbetaling.get("dagstaat_ids", [])
+    async def schrijf(session):
+        await db.suribet_dagstaten.update_many(
+            {"user_id": user_id, "id": {"$in": dagstaat_ids}},
+            {"$set": {"is_paid": False}, "$unset": {"paid_date": "", "uitbetaling_id": ""}},
+            session=session
+        )
+    await suribet_mutatie(db, user_id, schrijf, ("suribet_dagstaten", {"id": {"$in": dagstaat_ids}}))
     
     # Delete uitbetaling
     await db.suribet_uitbetalingen.delete_one({"user_id": user_id, "id": uitbetaling_id})
@@ -751,75 +793,16 @@ async def delete_uitbetaling(uitbetaling_id: str, current_user: dict = Depends(g
 @router.get("/openstaand-totaal")
 async def get_openstaand_totaal(current_user: dict = Depends(get_current_user)):
     """Get total outstanding Suribet amount and available commission"""
-    user_id = current_user["id"]
-    
-    # Get all unpaid dagstaten (Suribet not yet paid) for Suribet totals
-    unpaid_dagstaten = await db.suribet_dagstaten.find({
-        "user_id": user_id,
-        "$or": [{"is_paid": False}, {"is_paid": {"$exists": False}}]
-    }).to_list(None)
-    
-    # Get ALL dagstaten for commission calculation (commission is earned regardless of payment status)
-    all_dagstaten = await db.suribet_dagstaten.find({
-        "user_id": user_id
-    }).to_list(None)
-    
-    # Get saldo adjustments that affect commission and suribet
-    saldo_adjustments = await db.suribet_saldo_adjustments.find({
-        "user_id": user_id
-    }).to_list(None)
-    
-    # Get kasboek entries (excluding commission entries which come from dagstaten)
-    kasboek_entries = await db.suribet_kasboek.find({
-        "user_id": user_id,
-        "category": {"$ne": "commissie"}  # Exclude commissie category to avoid double counting
-    }).to_list(None)
-    
-    total_balance = 0
-    total_suribet = 0
-    
-    # Calculate Suribet totals from unpaid reports
-    for dagstaat in unpaid_dagstaten:
-        bon_data = dagstaat.get("bon_data", {})
-        if bon_data:
-            balance = bon_data.get("balance", 0)
-            total_balance += balance
-            total_suribet += balance
-    
-    # Calculate commission from ALL dagrapporten (not just unpaid)
-    total_commission = 0
-    for dagstaat in all_dagstaten:
-        bon_data = dagstaat.get("bon_data", {})
-        if bon_data:
-            commission = bon_data.get("total_pos_commission", 0)
-            total_commission += commission
-    
-    # Add/subtract kasboek entries (income adds, expense subtracts)
-    for entry in kasboek_entries:
-        if entry.get("transaction_type") == "income":
-            total_commission += entry.get("amount", 0)
-        elif entry.get("transaction_type") == "expense":
-            total_commission -= entry.get("amount", 0)
-    
-    # Adjust based on saldo adjustments
-    for adjustment in saldo_adjustments:
-        if adjustment.get("type") == "saldo_naar_suribet":
-            # This reduces commission and INCREASES Suribet
-            total_commission -= adjustment.get("amount", 0)
-            total_suribet += adjustment.get("amount", 0)
-        elif adjustment.get("type") == "saldo_naar_commissie":
-            # This increases commission (money came from kasboek)
-            total_commission += adjustment.get("amount", 0)
-    
-    # Ensure values don't go negative
-    total_commission = max(0, total_commission)
-    total_suribet = max(0, total_suribet)
-    
+    # Lopende totalen (services/suribet_saldi.py): één document per gebruiker
+    return openstaand_totaal(await get_suribet_saldi(db, current_user["id"]))
+
+@router.post("/openstaand-totaal/herbouw")
+async def herbouw_openstaand_totaal(current_user: dict = Depends(get_current_user)):
+    """Herbouw de lopende totalen uit alle dagstaten, kasboek entries en saldo aanpassingen"""
+    saldi = await herbouw_suribet_saldi(db, current_user["id"])
     return {
-        "total_balance": total_balance,
-        "total_commission": total_commission,
-        "total_suribet": total_suribet,
-        "unpaid_count": len(unpaid_dagstaten)
+        **openstaand_totaal(saldi),
+        "message": "Openstaand totaal opnieuw berekend"
     }
 
 # ============================================
@@ -918,8 +901,6 @@ async def saldo_naar_suribet(
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.suribet_saldo_adjustments.insert_one(adjustment)
-    
     # Also create a kasboek entry to track the expense from commission
     kasboek_entry = {
         "id": str(uuid.uuid4()),
@@ -934,7 +915,14 @@ async def saldo_naar_suribet(
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.suribet_kasboek.insert_one(kasboek_entry)
+    async def schrijf(session):
+        await db.suribet_saldo_adjustments.insert_one(adjustment, session=session)
+        await db.suribet_kasboek.insert_one(kasboek_entry, session=session)
+    await suribet_mutatie(
+        db, user_id, schrijf,
+        ("suribet_saldo_adjustments", {"id": adjustment["id"]}),
+        ("suribet_kasboek", {"id": kasboek_entry["id"]}),
+    )
     
     return {
         "success": True,
@@ -963,8 +951,6 @@ async def saldo_naar_commissie(
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.suribet_saldo_adjustments.insert_one(adjustment)
-    
     # Create kasboek entry to track the expense
     kasboek_entry = {
         "id": str(uuid.uuid4()),
@@ -979,7 +965,14 @@ async def saldo_naar_commissie(
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.suribet_kasboek.insert_one(kasboek_entry)
+    async def schrijf(session):
+        await db.suribet_saldo_adjustments.insert_one(adjustment, session=session)
+        await db.suribet_kasboek.insert_one(kasboek_entry, session=session)
+    await suribet_mutatie(
+        db, user_id, schrijf,
+        ("suribet_saldo_adjustments", {"id": adjustment["id"]}),
+        ("suribet_kasboek", {"id": kasboek_entry["id"]}),
+    )
     
     return {
         "success": True,
@@ -1016,25 +1009,27 @@ async def delete_saldo_aanpassing(
     if not adjustment:
         raise HTTPException(status_code=404, detail="Aanpassing niet gevonden")
     
-    # Delete the adjustment
-    await db.suribet_saldo_adjustments.delete_one({
-        "id": adjustment_id,
-        "user_id": user_id
-    })
-    
-    # Also delete the related kasboek entry if exists
-    if adjustment.get("type") == "saldo_naar_suribet":
-        await db.suribet_kasboek.delete_one({
-            "user_id": user_id,
-            "category": "suribet_saldo",
-            "amount": adjustment.get("amount")
-        })
-    elif adjustment.get("type") == "saldo_naar_commissie":
-        await db.suribet_kasboek.delete_one({
-            "user_id": user_id,
-            "category": "commissie_toevoeging",
-            "amount": adjustment.get("amount")
-        })
+    kasboek_category = {
+        "saldo_naar_suribet": "suribet_saldo",
+        "saldo_naar_commissie": "commissie_toevoeging"
+    }.get(adjustment.get("type"))
+    kasboek_filter = {"category": kasboek_category, "amount": adjustment.get("amount")}
+    
+    async def schrijf(session):
+        # Delete the adjustment
+        await db.suribet_saldo_adjustments.delete_one({
+            "id": adjustment_id,
+            "user_id": user_id
+        }, session=session)
+        
+        # Also delete the related kasboek entry if exists
+        if kasboek_category:
+            await db.suribet_kasboek.delete_one({"user_id": user_id, **kasboek_filter}, session=session)
+    await suribet_mutatie(
+        db, user_id, schrijf,
+        ("suribet_saldo_adjustments", {"id": adjustment_id}),
+        ("suribet_kasboek", kasboek_filter),
+    )
     
     return {
         "success": True,
@@ -1053,23 +1048,29 @@ async def delete_all_saldo_aanpassingen(
         "user_id": user_id
     }).to_list(None)
     
-    # Delete related kasboek entries
-    for adjustment in adjustments:
-        if adjustment.get("type") == "saldo_naar_suribet":
-            await db.suribet_kasboek.delete_many({
-                "user_id": user_id,
-                "category": "suribet_saldo"
-            })
-        elif adjustment.get("type") == "saldo_naar_commissie":
-            await db.suribet_kasboek.delete_many({
-                "user_id": user_id,
-                "category": "commissie_toevoeging"
-            })
-    
-    # Delete all saldo adjustments
-    result = await db.suribet_saldo_adjustments.delete_many({
-        "user_id": user_id
-    })
+    async def schrijf(session):
+        # Delete related kasboek entries
+        for adjustment in adjustments:
+            if adjustment.get("type") == "saldo_naar_suribet":
+                await db.suribet_kasboek.delete_many({
+                    "user_id": user_id,
+                    "category": "suribet_saldo"
+                }, session=session)
+            elif adjustment.get("type") == "saldo_naar_commissie":
+                await db.suribet_kasboek.delete_many({
+                    "user_id": user_id,
+                    "category": "commissie_toevoeging"
+                }, session=session)
+        
+        # Delete all saldo adjustments
+        return await db.suribet_saldo_adjustments.delete_many({
+            "user_id": user_id
+        }, session=session)
+    result = await suribet_mutatie(
+        db, user_id, schrijf,
+        ("suribet_saldo_adjustments", {}),
+        ("suribet_kasboek", {"category": {"$in": ["suribet_saldo", "commissie_toevoeging"]}}),
+    )
     
     return {
         "success": True,
@@ -1084,16 +1085,23 @@ async def reset_saldo_data(
     """Force reset all saldo adjustments and related kasboek entries - use when data is stuck"""
     user_id = current_user["id"]
     
-    # Delete ALL saldo adjustments for this user
-    adj_result = await db.suribet_saldo_adjustments.delete_many({
-        "user_id": user_id
-    })
-    
-    # Delete saldo-related kasboek entries
-    kasboek_result = await db.suribet_kasboek.delete_many({
-        "user_id": user_id,
-        "category": {"$in": ["suribet_saldo", "commissie_toevoeging"]}
-    })
+    async def schrijf(session):
+        # Delete ALL saldo adjustments for this user
+        adj_result = await db.suribet_saldo_adjustments.delete_many({
+            "user_id": user_id
+        }, session=session)
+        
+        # Delete saldo-related kasboek entries
+        kasboek_result = await db.suribet_kasboek.delete_many({
+            "user_id": user_id,
+            "category": {"$in": ["suribet_saldo", "commissie_toevoeging"]}
+        }, session=session)
+        return adj_result, kasboek_result
+    adj_result, kasboek_result = await suribet_mutatie(
+        db, user_id, schrijf,
+        ("suribet_saldo_adjustments", {}),
+        ("suribet_kasboek", {"category": {"$in": ["suribet_saldo", "commissie_toevoeging"]}}),
+    )
     
     return {
         "success": True,
@@ -1415,7 +1423,9 @@ async def create_kasboek_entry(
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.suribet_kasboek.insert_one(entry)
+    async def schrijf(session):
+        await db.suribet_kasboek.insert_one(entry, session=session)
+    await suribet_mutatie(db, user_id, schrijf, ("suribet_kasboek", {"id": entry["id"]}))
     if "_id" in entry:
         del entry["_id"]
     return entry
@@ -1432,10 +1442,13 @@ async def update_kasboek_entry(
     update_data = {k: v for k, v in data.dict().items() if v is not None}
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
-    result = await db.suribet_kasboek.update_one(
-        {"id": entry_id, "user_id": user_id},
-        {"$set": update_data}
-    )
+    async def schrijf(session):
+        return await db.suribet_kasboek.update_one(
+            {"id": entry_id, "user_id": user_id},
+            {"$set": update_data},
+            session=session
+        )
+    result = await suribet_mutatie(db, user_id, schrijf, ("suribet_kasboek", {"id": entry_id}))
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Kasboek entry niet gevonden")
@@ -1450,10 +1463,12 @@ async def delete_kasboek_entry(
     """Delete a kasboek entry"""
     user_id = current_user["id"]
     
-    result = await db.suribet_kasboek.delete_one({
-        "id": entry_id,
-        "user_id": user_id
-    })
+    async def schrijf(session):
+        return await db.suribet_kasboek.delete_one({
+            "id": entry_id,
+            "user_id": user_id
+        }, session=session)
+    result = await suribet_mutatie(db, user_id, schrijf, ("suribet_kasboek", {"id": entry_id}))
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Kasboek entry niet gevonden")
@@ -1547,7 +1562,9 @@ async def create_loonbetaling(
         "created_at": datetime.now(timezone.utc).isoformat(),
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.suribet_kasboek.insert_one(kasboek_entry)
+    async def schrijf(session):
+        await db.suribet_kasboek.insert_one(kasboek_entry, session=session)
+    await suribet_mutatie(db, user_id, schrijf, ("suribet_kasboek", {"id": kasboek_entry["id"]}))
     
     return betaling
 
@@ -1878,146 +1895,39 @@ async def parse_bon_image(
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user)
 ):
-    """Parse a Suribet receipt image using AI vision"""
-    import logging
-    import aiohttp
-    
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-    
-    try:
-        # Read file contents
-        contents = await file.read()
-        logger.info(f"Received file: {file.filename}, size: {len(contents)} bytes")
-        
-        # Encode image to base64
-        base64_image = base64.b64encode(contents).decode('utf-8')
-        
-        # Determine mime type
-        mime_type = "image/png"
-        if base64_image.startswith('/9j/'):
-            mime_type = "image/jpeg"
-        
-        # Get API key
-        api_key = os.environ.get('EMERGENT_LLM_KEY')
-        if not api_key:
-            raise HTTPException(status_code=500, detail="EMERGENT_LLM_KEY not configured")
-        
-        prompt = """Extract ALL data from this Suribet receipt. Return ONLY valid JSON:
-{
-  "receipt_date": "YYYY-MM-DD",
-  "pos_sales": [{"product": "SB", "total_bets": 0.00, "comm_percentage": 0.00, "commission": 0.00}],
-  "pos_sales_total": 0.00,
-  "pos_sales_commission": 0.00,
-  "pos_payout": [{"product": "PT", "total_paid": 0.00, "comm_percentage": 0.00, "commission": 0.00}],
-  "pos_payout_total": 0.00,
-  "pos_payout_commission": 0.00,
-  "playable_ticket": [],
-  "playable_ticket_total": 0.00,
-  "playable_ticket_commission": 0.00,
-  "total_sales": 0.00,
-  "kiosk_cash_in": 0.00,
-  "kiosk_commission": 0.00,
-  "total_pc_sales": 0.00,
-  "total_payout": 0.00,
-  "total_pt_pos_cancel_bets": 0.00,
-  "total_pos_commission": 0.00,
-  "balance": 0.00
-}
-IMPORTANT: Extract the date from the receipt and put it in receipt_date field (format: YYYY-MM-DD).
-Product codes: SB, SF, VSF, Topup, PT, S2W, VSB, WDR, WDRNC. Return ONLY JSON."""
-
-        logger.info("Sending to Emergent proxy...")
-        
-        # Call Emergent integration proxy directly
-        async with aiohttp.ClientSession() as session:
-            payload = {
-                "model": "gemini/gemini-2.0-flash",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}
-                            }
-                        ]
-                    }
-                ]
-            }
-            
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            async with session.post(
-                "https://integrations.emergentagent.com/llm/chat/completions",
-                json=payload,
-                headers=headers,
-                timeout=aiohttp.ClientTimeout(total=120)
-            ) as resp:
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    logger.error(f"API error: {error_text}")
-                    raise HTTPException(status_code=500, detail=f"AI API error: {error_text[:200]}")
-                
-                result = await resp.json()
-        
-        response_text = result["choices"][0]["message"]["content"]
-        logger.info(f"Response: {response_text[:300]}...")
-        
-        # Parse JSON
-        json_str = response_text.strip()
-        if json_str.startswith("```"):
-            json_str = re.sub(r'^```(?:json)?\n?', '', json_str)
-            json_str = re.sub(r'\n?```$', '', json_str)
-        
-        try:
-            bon_data = json.loads(json_str)
-        except json.JSONDecodeError:
-            json_match = re.search(r'\{[\s\S]*\}', response_text)
-            if json_match:
-                bon_data = json.loads(json_match.group())
-            else:
-                raise HTTPException(status_code=400, detail="Could not parse receipt data")
-        
-        return {"success": True, "bon_data": bon_data}
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Bon parse error: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Error parsing receipt: {str(e)}")
+    """Queue a Suribet receipt image for AI scanning (services/bon_ocr.py).
+    Returns the OCR job; poll /ocr-jobs/{job_id} until its status is completed or failed.
+    A receipt that was scanned before is answered straight away (status completed)."""
+    contents = await file.read()
+    if not contents:
+        raise HTTPException(status_code=400, detail="Leeg bestand")
+    job = await enqueue_bon(db, current_user["id"], contents)
+    return {"success": True, "job_id": job["id"], "status": job["status"], "bon_data": job.get("bon_data")}
+
+
+@router.get("/ocr-jobs/{job_id}")
+async def get_ocr_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Status of a receipt scan: queued, processing, completed (with bon_data) or failed"""
+    job = await get_ocr_job_doc(db, current_user["id"], job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan niet gevonden")
+    return job
 
 
 # ============================================
 # MOBILE UPLOAD ENDPOINTS (QR Code Upload)
 # ============================================
-
-# In-memory storage for mobile upload sessions (in production use Redis)
-mobile_upload_sessions = {}
+# Sessions are stored in MongoDB with a TTL (services/bon_ocr.py), so create, upload and
+# status polling may each be handled by a different worker process.
 
 @router.post("/mobile-upload/create-session")
 async def create_mobile_upload_session(current_user: dict = Depends(get_current_user)):
     """Create a new mobile upload session for QR code"""
-    session_id = str(uuid.uuid4())
-    user_id = current_user["id"]
-    
-    # Store session with expiry (15 minutes)
-    mobile_upload_sessions[session_id] = {
-        "user_id": user_id,
-        "created_at": datetime.now(timezone.utc),
-        "status": "pending",
-        "bon_data": None
-    }
+    session = await create_upload_session(db, current_user["id"])
     
     return {
-        "session_id": session_id,
-        "expires_in": 900  # 15 minutes
+        "session_id": session["id"],
+        "expires_in": UPLOAD_SESSION_TTL
     }
 
 @router.get("/mobile-upload/status/{session_id}")
@@ -2025,8 +1935,8 @@ async def get_mobile_upload_status(
     session_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    """Check if mobile upload has been completed"""
-    session = mobile_upload_sessions.get(session_id)
+    """Check if mobile upload has been completed (pending, processing, completed, failed or expired)"""
+    session = await get_upload_session(db, session_id)
     
     if not session:
         return {"status": "expired", "bon_data": None}
@@ -2036,7 +1946,8 @@ async def get_mobile_upload_status(
     
     return {
         "status": session["status"],
-        "bon_data": session.get("bon_data")
+        "bon_data": session.get("bon_data"),
+        "error": session.get("error")
     }
 
 @router.post("/mobile-upload")
@@ -2045,129 +1956,18 @@ async def mobile_upload_bon(
     session_id: str = Query(..., description="Session ID from QR code"),
     current_user: dict = Depends(get_current_user)
 ):
-    """Handle mobile bon upload and process with AI"""
-    import logging
-    import aiohttp
-    
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-    
-    # Validate session
-    session = mobile_upload_sessions.get(session_id)
-    if not session:
+    """Handle mobile bon upload: the image is queued for AI scanning, the desktop picks
+    up the result by polling the session status"""
+    session = await get_upload_session(db, session_id)
+    if not session or session["user_id"] != current_user["id"]:
         raise HTTPException(status_code=400, detail="Invalid or expired session")
     
-    try:
-        # Read file contents
-        contents = await file.read()
-        logger.info(f"Mobile upload: {file.filename}, size: {len(contents)} bytes")
-        
-        # Encode image to base64
-        base64_image = base64.b64encode(contents).decode('utf-8')
-        
-        # Determine mime type
-        mime_type = "image/png"
-        if base64_image.startswith('/9j/'):
-            mime_type = "image/jpeg"
-        
-        # Get API key
-        api_key = os.environ.get('EMERGENT_LLM_KEY')
-        if not api_key:
-            raise HTTPException(status_code=500, detail="EMERGENT_LLM_KEY not configured")
-        
-        prompt = """Extract ALL data from this Suribet receipt. Return ONLY valid JSON:
-{
-  "receipt_date": "YYYY-MM-DD",
-  "pos_sales": [{"product": "SB", "total_bets": 0.00, "comm_percentage": 0.00, "commission": 0.00}],
-  "pos_sales_total": 0.00,
-  "pos_sales_commission": 0.00,
-  "pos_payout": [{"product": "PT", "total_paid": 0.00, "comm_percentage": 0.00, "commission": 0.00}],
-  "pos_payout_total": 0.00,
-  "pos_payout_commission": 0.00,
-  "playable_ticket": [],
-  "playable_ticket_total": 0.00,
-  "playable_ticket_commission": 0.00,
-  "total_sales": 0.00,
-  "kiosk_cash_in": 0.00,
-  "kiosk_commission": 0.00,
-  "total_pc_sales": 0.00,
-  "total_payout": 0.00,
-  "total_pt_pos_cancel_bets": 0.00,
-  "total_pos_commission": 0.00,
-  "balance": 0.00
-}
-IMPORTANT: Extract the date from the receipt and put it in receipt_date field (format: YYYY-MM-DD).
-Product codes: SB, SF, VSF, Topup, PT, S2W, VSB, WDR, WDRNC. Return ONLY JSON."""
-
-        logger.info("Processing mobile upload via Emergent proxy...")
-        
-        # Call Emergent integration proxy
-        async with aiohttp.ClientSession() as http_session:
-            payload = {
-                "model": "gemini/gemini-2.0-flash",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}
-                            }
-                        ]
-                    }
-                ]
-            }
-            
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            async with http_session.post(
-                "https://integrations.emergentagent.com/llm/chat/completions",
-                json=payload,
-                headers=headers,
-                timeout=aiohttp.ClientTimeout(total=120)
-            ) as resp:
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    logger.error(f"API error: {error_text}")
-                    raise HTTPException(status_code=500, detail=f"AI API error")
-                
-                result = await resp.json()
-        
-        response_text = result["choices"][0]["message"]["content"]
-        
-        # Parse JSON
-        json_str = response_text.strip()
-        if json_str.startswith("```"):
-            json_str = re.sub(r'^```(?:json)?\n?', '', json_str)
-            json_str = re.sub(r'\n?```$', '', json_str)
-        
-        try:
-            bon_data = json.loads(json_str)
-        except json.JSONDecodeError:
-            json_match = re.search(r'\{[\s\S]*\}', response_text)
-            if json_match:
-                bon_data = json.loads(json_match.group())
-            else:
-                raise HTTPException(status_code=400, detail="Could not parse receipt data")
-        
-        # Update session with bon data
-        mobile_upload_sessions[session_id] = {
-            **session,
-            "status": "completed",
-            "bon_data": bon_data
-        }
-        
-        return {"success": True, "bon_data": bon_data}
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Mobile upload error: {e}")
-        raise HTTPException(status_code=500, detail=f"Error processing upload: {str(e)}")
+    contents = await file.read()
+    if not contents:
+        raise HTTPException(status_code=400, detail="Leeg bestand")
+    job = await enqueue_bon(db, current_user["id"], contents, session_id=session_id)
+    
+    return {"success": True, "job_id": job["id"], "status": job["status"], "bon_data": job.get("bon_data")}
 
 
 # ============================================
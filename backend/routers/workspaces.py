@@ -10,6 +10,7 @@ from .deps import (
     db, get_superadmin, get_current_user, 
     SERVER_IP, MAIN_DOMAIN, create_workspace_for_user
 )
+from services.user_context import invalidate_user, invalidate_workspace
 
 router = APIRouter(prefix="/api", tags=["workspaces"])
 
@@ -212,6 +213,7 @@ async def update_workspace(workspace_id: str, workspace_data: WorkspaceUpdate, c
             update_data["status"] = "pending"
     
     await db.workspaces.update_one({"id": workspace_id}, {"$set": update_data})
+    await invalidate_workspace(workspace_id)
     
     updated = await db.workspaces.find_one({"id": workspace_id}, {"_id": 0})
     owner = await db.users.find_one({"id": updated.get("owner_id")}, {"_id": 0, "name": 1, "email": 1})
@@ -232,6 +234,7 @@ async def delete_workspace(workspace_id: str, current_user: dict = Depends(get_s
         raise HTTPException(status_code=404, detail="Workspace niet gevonden")
     
     await db.workspaces.delete_one({"id": workspace_id})
+    await invalidate_workspace(workspace_id)
     await db.workspace_users.delete_many({"workspace_id": workspace_id})
     await db.workspace_logs.delete_many({"workspace_id": workspace_id})
     
@@ -263,6 +266,7 @@ async def verify_workspace_dns(workspace_id: str, current_user: dict = Depends(g
                     "error_message": None
                 }}
             )
+            await invalidate_workspace(workspace_id)
             
             return {
                 "success": True,
@@ -425,6 +429,7 @@ async def update_workspace_branding(branding: WorkspaceBranding, current_user: d
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await invalidate_workspace(workspace_id)
     
     return {"message": "Branding bijgewerkt"}
 
@@ -519,6 +524,7 @@ async def invite_workspace_user(invite: WorkspaceUserInvite, current_user: dict
             {"id": existing_user["id"]},
             {"$set": {"workspace_id": workspace_id}}
         )
+        await invalidate_user(existing_user["id"])
     
     return WorkspaceUserResponse(**invitation)
 
@@ -552,6 +558,7 @@ async def remove_workspace_user(user_id: str, current_user: dict = Depends(get_c
         {"id": user_id, "workspace_id": workspace_id},
         {"$set": {"workspace_id": None}}
     )
+    await invalidate_user(user_id)
     
     return {"message": "Gebruiker verwijderd"}
 
@@ -3,7 +3,6 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import StreamingResponse, Response, JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 import os
 import logging
@@ -69,10 +68,13 @@ from routers.suribet import router as suribet_router
 from routers.boekhouding import router as boekhouding_router
 from routers.schuldbeheer import router as schuldbeheer_router
 from routers.gratis_factuur import router as gratis_factuur_router, set_database as set_gratis_factuur_db
-from routers.kiosk import router as kiosk_router, set_database as set_kiosk_db, _kiosk_daily_scheduler, ensure_indexes as ensure_kiosk_indexes
+from routers.kiosk import router as kiosk_router, set_database as set_kiosk_db, _kiosk_daily_scheduler, _kiosk_billing_scheduler, _kiosk_outbox_worker, ensure_indexes as ensure_kiosk_indexes
 from routers.live_chat import router as live_chat_router, set_database as set_live_chat_db, set_jwt_config as set_live_chat_jwt
 from services.unified_email_service import get_email_service, EMAIL_TEMPLATES
 from services.scheduled_tasks import get_scheduled_tasks
+from services.user_context import get_cached_user, get_cached_workspace, invalidate_user, invalidate_workspace
+from services.entitlements import get_active_addon_slugs, has_addon, invalidate_entitlements, invalidate_all_entitlements
+from services.ai_context import modules_for_message, get_module_contexts, invalidate_ai_context
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -84,10 +86,31 @@ def clean_mongo_doc(doc: dict) -> dict:
         doc.pop("_id", None)
     return doc
 
-# MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME', 'surirentals')]
+# MongoDB connection (one pooled client per process, see services/database.py)
+from services.database import db, pool_stats as mongo_pool_stats, get_sync_db, close as close_database
+from services.indexes import (
+    register_indexes, register_query, registered_indexes, ensure_registered_indexes, explain_registered_queries,
+)
+
+# Core indexes (module-specific indexes are declared next to their routers, see services/indexes.py)
+register_indexes("users", "id", "email", "workspace_id")
+register_indexes("workspaces", "id", "slug", "domain.subdomain", "domain.custom_domain")
+register_indexes("workspace_users", [("workspace_id", 1), ("user_id", 1)], "user_id")
+register_indexes("addons", "id", "slug")
+register_indexes("user_addons", [("user_id", 1), ("status", 1)], [("status", 1), ("end_date", 1)])
+register_indexes("tenants", [("user_id", 1), ("created_at", -1)], "id")
+register_indexes("apartments", [("user_id", 1), ("created_at", -1)], "id")
+register_indexes("payments", [("user_id", 1), ("payment_date", -1)], [("tenant_id", 1), ("payment_date", -1)], "id")
+register_indexes("loans", [("user_id", 1), ("created_at", -1)], "id")
+register_indexes("maintenance", [("user_id", 1), ("created_at", -1)])
+register_indexes("meter_readings", [("user_id", 1), ("apartment_id", 1), ("period_year", -1), ("period_month", -1)],
+                 [("user_id", 1), ("period_year", -1), ("period_month", -1)], "id")
+register_indexes("subscription_requests", [("status", 1), ("created_at", -1)], "user_id")
+register_indexes("notifications", [("user_id", 1), ("type", 1), ("created_at", -1)])
+
+register_query("huurders per gebruiker", "tenants", {"user_id": "x"}, sort=[("created_at", -1)])
+register_query("betalingen per gebruiker", "payments", {"user_id": "x"}, sort=[("payment_date", -1)])
+register_query("actieve add-ons", "user_addons", {"user_id": "x", "status": {"$in": ["active", "trial"]}})
 
 # JWT Configuration - use environment variable or generate a secure default
 JWT_SECRET = os.environ.get('JWT_SECRET') or os.environ.get('SECRET_KEY') or 'suri-rentals-default-secret-change-in-production'
@@ -583,12 +606,23 @@ async def start_demo_cleanup():
     # Start cleanup scheduler
     asyncio.create_task(demo_cleanup_scheduler())
     logger.info("Demo cleanup scheduler started - runs every hour")
+    # Kiosk indexes first: the unique effect_id/job_id/dedup_key indexes make the billing
+    # effects and the outbox idempotent, so the workers below must not run without them
+    await ensure_kiosk_indexes()
+    logger.info("Kiosk MongoDB indexes ensured")
     # Start kiosk daily notification scheduler
     asyncio.create_task(_kiosk_daily_scheduler())
     logger.info("Kiosk daily notification scheduler started")
-    # Create MongoDB indexes for performance
-    await ensure_kiosk_indexes()
-    logger.info("Kiosk MongoDB indexes ensured")
+    # Start kiosk auto-billing engine (billing + queued WhatsApp/Shelly side effects)
+    asyncio.create_task(_kiosk_billing_scheduler())
+    logger.info("Kiosk billing scheduler started")
+    # Start kiosk outbound message queue (WhatsApp/Twilio/email delivery)
+    asyncio.create_task(_kiosk_outbox_worker())
+    logger.info("Kiosk outbox worker started")
+    # Start Suribet receipt OCR queue (services/bon_ocr.py)
+    from services.bon_ocr import bon_ocr_worker
+    asyncio.create_task(bon_ocr_worker(db))
+    logger.info("Suribet bon OCR worker started")
 
 # ==================== GLOBAL EXCEPTION HANDLER ====================
 
@@ -1689,7 +1723,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         user_id = payload.get('user_id')
         if not user_id:
             raise HTTPException(status_code=401, detail="Ongeldige token")
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
+        user = await get_cached_user(db, user_id)
         if not user:
             raise HTTPException(status_code=401, detail="Gebruiker niet gevonden")
         
@@ -1731,41 +1765,12 @@ async def get_superadmin(credentials: HTTPAuthorizationCredentials = Depends(sec
     return user
 
 async def get_user_active_addons(user_id: str) -> List[str]:
-    """Get list of active addon slugs for a user"""
-    now = datetime.now(timezone.utc)
-    user_addons = await db.user_addons.find({
-        "user_id": user_id,
-        "status": "active"
-    }).to_list(length=100)
-    
-    active_slugs = []
-    for ua in user_addons:
-        # Check if addon is still valid (not expired)
-        end_date = ua.get("end_date")
-        if end_date:
-            try:
-                end_dt = datetime.fromisoformat(end_date.replace("Z", "+00:00"))
-                if end_dt < now:
-                    # Expired, update status
-                    await db.user_addons.update_one(
-                        {"id": ua["id"]},
-                        {"$set": {"status": "expired"}}
-                    )
-                    continue
-            except Exception:
-                pass
-        
-        # Get addon info
-        addon = await db.addons.find_one({"id": ua["addon_id"]}, {"_id": 0})
-        if addon and addon.get("is_active", True):
-            active_slugs.append(addon.get("slug", ""))
-    
-    return active_slugs
+    """Get list of active addon slugs for a user (cached, see services/entitlements.py)"""
+    return await get_active_addon_slugs(db, user_id)
 
 async def user_has_addon(user_id: str, addon_slug: str) -> bool:
     """Check if user has a specific addon active"""
-    active_addons = await get_user_active_addons(user_id)
-    return addon_slug in active_addons
+    return await has_addon(db, user_id, addon_slug)
 
 async def get_current_active_user_with_addon(addon_slug: str):
     """Dependency factory for checking addon access"""
@@ -1829,9 +1834,9 @@ async def get_workspace_from_host(host: str) -> Optional[dict]:
 
 async def get_user_workspace(user_id: str) -> Optional[dict]:
     """Get workspace for a user"""
-    user = await db.users.find_one({"id": user_id}, {"_id": 0, "workspace_id": 1})
+    user = await get_cached_user(db, user_id)
     if user and user.get("workspace_id"):
-        return await db.workspaces.find_one({"id": user["workspace_id"]}, {"_id": 0})
+        return await get_cached_workspace(db, user["workspace_id"])
     return None
 
 async def create_workspace_for_user(user_id: str, user_name: str, company_name: str = None) -> dict:
@@ -1887,6 +1892,7 @@ async def create_workspace_for_user(user_id: str, user_name: str, company_name:
         {"id": user_id},
         {"$set": {"workspace_id": workspace_id}}
     )
+    await invalidate_user(user_id)
     
     return workspace
 
@@ -1906,7 +1912,7 @@ async def get_current_user_with_workspace(
     # Get user's workspace
     workspace_id = user.get("workspace_id")
     if workspace_id:
-        workspace = await db.workspaces.find_one({"id": workspace_id}, {"_id": 0})
+        workspace = await get_cached_workspace(db, workspace_id)
         user["workspace"] = workspace
         user["workspace_id"] = workspace_id
     else:
@@ -1972,6 +1978,7 @@ async def activate_free_addons_for_user(user_id: str):
                     "is_free": True
                 }
                 await db.user_addons.insert_one(user_addon_doc)
+                await invalidate_entitlements(user_id)
                 logger.info(f"Gratis addon '{addon_slug}' geactiveerd voor user {user_id}")
     except Exception as e:
         logger.error(f"Fout bij activeren gratis addons: {e}")
@@ -2216,6 +2223,7 @@ async def update_user_profile(
             {"id": user_id},
             {"$set": update_data}
         )
+        await invalidate_user(user_id)
     
     return {"message": "Profiel bijgewerkt", "success": True}
 
@@ -2269,6 +2277,7 @@ async def upload_profile_photo(
                 "updated_at": datetime.now(timezone.utc)
             }}
         )
+        await invalidate_user(user_id)
         
         return {"photo_url": photo_url, "message": "Foto geüpload"}
         
@@ -2347,6 +2356,7 @@ async def update_workspace_branding(
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await invalidate_workspace(workspace_id)
     
     return {"message": "Branding bijgewerkt"}
 
@@ -2512,6 +2522,7 @@ async def update_workspace_settings(
             update_data["domain.subdomain"] = slug
     
     await db.workspaces.update_one({"id": workspace_id}, {"$set": update_data})
+    await invalidate_workspace(workspace_id)
     
     return {"message": "Workspace instellingen bijgewerkt"}
 
@@ -2598,6 +2609,7 @@ async def update_workspace_domain(
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await invalidate_workspace(workspace_id)
     
     return {
         "message": "Domein instellingen bijgewerkt",
@@ -2655,6 +2667,7 @@ async def verify_workspace_domain(current_user: dict = Depends(get_current_user)
                         "updated_at": datetime.now(timezone.utc).isoformat()
                     }}
                 )
+                await invalidate_workspace(workspace_id)
                 
                 if ssl_success:
                     return {
@@ -2690,6 +2703,7 @@ async def verify_workspace_domain(current_user: dict = Depends(get_current_user)
                         "updated_at": datetime.now(timezone.utc).isoformat()
                     }}
                 )
+                await invalidate_workspace(workspace_id)
                 return {
                     "success": True,
                     "message": f"DNS geverifieerd! Handmatige server configuratie nodig.",
@@ -2774,6 +2788,7 @@ async def create_user_workspace(
     # Remove MongoDB _id to prevent serialization errors
     workspace.pop("_id", None)
     await db.users.update_one({"id": current_user["id"]}, {"$set": {"workspace_id": workspace_id}})
+    await invalidate_user(current_user["id"])
     
     return {
         "message": "Workspace aangemaakt",
@@ -2922,6 +2937,7 @@ async def reset_password(request: ResetPasswordRequest):
         {"$set": {"password": hashed_password},
          "$unset": {"reset_token": "", "reset_token_expiry": ""}}
     )
+    await invalidate_user(user["id"])
     
     return {"message": "Wachtwoord succesvol gewijzigd"}
 
@@ -4157,67 +4173,62 @@ async def get_dashboard(current_user: dict = Depends(get_current_active_user)):
     # Get tenant count
     total_tenants = await db.tenants.count_documents({"user_id": user_id})
     
-    # Get this month's income - based on payment_date in current month
     now = datetime.now(timezone.utc)
-    now.replace(day=1, hour=0, minute=0, second=0, microsecond=0).strftime("%Y-%m-%d")
+    current_month_str = now.strftime("%Y-%m")
     
-    # Get all payments and filter by payment_date in current month
-    all_payments_cursor = await db.payments.find({
-        "user_id": user_id
-    }, {"_id": 0}).to_list(1000)
+    # All payment totals in one aggregation (no document cap, summed in MongoDB)
+    payment_facets = await db.payments.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$facet": {
+            "all": [{"$group": {"_id": None, "total": {"$sum": "$amount"}}}],
+            # Income this month based on payment_date
+            "this_month": [
+                {"$match": {"payment_date": {"$regex": f"^{current_month_str}"}}},
+                {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+            ],
+            # Rent paid for this month's period, per apartment
+            "rent_period": [
+                {"$match": {"payment_type": "rent", "period_month": now.month, "period_year": now.year}},
+                {"$group": {"_id": "$apartment_id", "total": {"$sum": "$amount"}}}
+            ],
+            "loans": [
+                {"$match": {"payment_type": "loan", "loan_id": {"$nin": [None, ""]}}},
+                {"$group": {"_id": "$loan_id", "total": {"$sum": "$amount"}}}
+            ]
+        }}
+    ]).to_list(1)
+    payment_facets = payment_facets[0] if payment_facets else {}
     
-    # Calculate income this month based on payment_date
-    current_month_str = now.strftime("%Y-%m")
-    total_income = sum(
-        p["amount"] for p in all_payments_cursor 
-        if p.get("payment_date", "").startswith(current_month_str)
-    )
+    def _facet_total(name):
+        rows = payment_facets.get(name) or []
+        return rows[0]["total"] if rows else 0
     
-    # Get rent payments only for calculating outstanding
-    rent_payments = [p for p in all_payments_cursor if p.get("payment_type") == "rent"]
+    total_income = _facet_total("this_month")
+    total_all_payments = _facet_total("all")
+    rent_paid_by_apartment = {r["_id"]: r["total"] for r in payment_facets.get("rent_period", [])}
+    loan_payments_by_id = {r["_id"]: r["total"] for r in payment_facets.get("loans", [])}
     
     # Calculate outstanding (rent due - payments made this month for occupied apartments)
     occupied_apts = await db.apartments.find(
         {"user_id": user_id, "status": "occupied"},
-        {"_id": 0}
-    ).to_list(1000)
+        {"_id": 0, "id": 1, "name": 1, "rent_amount": 1, "tenant_id": 1}
+    ).to_list(None)
     
     # Calculate total rent due for current month
-    total_rent_due = sum(apt["rent_amount"] for apt in occupied_apts)
+    total_rent_due = sum(apt.get("rent_amount") or 0 for apt in occupied_apts)
     
     # Calculate paid rent for this month's period
-    rent_paid_this_month = sum(
-        p["amount"] for p in rent_payments 
-        if p.get("period_month") == now.month and p.get("period_year") == now.year
-    )
+    rent_paid_this_month = sum(rent_paid_by_apartment.values())
     total_outstanding = max(0, total_rent_due - rent_paid_this_month)
     
     # Calculate outstanding loans
-    loans = await db.loans.find({"user_id": user_id}, {"_id": 0}).to_list(1000)
-    
-    # Get loan payments
-    loan_payments = await db.payments.find(
-        {"user_id": user_id, "payment_type": "loan"},
-        {"_id": 0, "loan_id": 1, "amount": 1}
-    ).to_list(1000)
-    
-    loan_payments_by_id = {}
-    for lp in loan_payments:
-        lid = lp.get("loan_id")
-        if lid:
-            loan_payments_by_id[lid] = loan_payments_by_id.get(lid, 0) + (lp.get("amount") or 0)
-    
+    loans = await db.loans.find({"user_id": user_id}, {"_id": 0, "id": 1, "amount": 1}).to_list(None)
     total_outstanding_loans = 0
     for loan in loans:
-        try:
-            loan_id = loan.get("id")
-            loan_amount = loan.get("amount") or 0
-            if loan_id:
-                paid = loan_payments_by_id.get(loan_id, 0)
-                total_outstanding_loans += max(0, loan_amount - paid)
-        except Exception as e:
-            logger.error(f"Error calculating loan outstanding: {e}")
-            continue
+        loan_id = loan.get("id")
+        if loan_id:
+            paid = loan_payments_by_id.get(loan_id, 0)
+            total_outstanding_loans += max(0, (loan.get("amount") or 0) - paid)
     
     # Batch fetch tenant names for occupied apartments (used in reminders)
     occupied_tenant_ids = [apt["tenant_id"] for apt in occupied_apts if apt.get("tenant_id")]
@@ -4225,11 +4236,11 @@ async def get_dashboard(current_user: dict = Depends(get_current_active_user)):
     occupied_tenant_map = {t["id"]: t["name"] for t in occupied_tenants}
     
     # Get total deposits held
-    deposits = await db.deposits.find(
-        {"user_id": user_id, "status": "held"},
-        {"_id": 0}
-    ).to_list(1000)
-    total_deposits = sum(d["amount"] for d in deposits)
+    deposits_agg = await db.deposits.aggregate([
+        {"$match": {"user_id": user_id, "status": "held"}},
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+    ]).to_list(1)
+    total_deposits = deposits_agg[0]["total"] if deposits_agg else 0
     
     # Get recent payments
     recent_payments_cursor = await db.payments.find(
@@ -4283,12 +4294,7 @@ async def get_dashboard(current_user: dict = Depends(get_current_active_user)):
             continue
         
         # Check if rent was paid this month
-        paid_this_month = any(
-            p["apartment_id"] == apt["id"] and 
-            p.get("period_month") == now.month and 
-            p.get("period_year") == now.year
-            for p in rent_payments
-        )
+        paid_this_month = apt["id"] in rent_paid_by_apartment
         
         if not paid_this_month:
             # Use user's rent due day setting
@@ -4318,20 +4324,35 @@ async def get_dashboard(current_user: dict = Depends(get_current_active_user)):
             ))
     
     # Calculate kasgeld balance
-    kasgeld_transactions = await db.kasgeld.find({"user_id": user_id}, {"_id": 0}).to_list(1000)
-    kasgeld_deposits = sum(t["amount"] for t in kasgeld_transactions if t["transaction_type"] == "deposit")
-    kasgeld_withdrawals = sum(t["amount"] for t in kasgeld_transactions if t["transaction_type"] == "withdrawal")
-    maintenance_costs = await db.maintenance.find({"user_id": user_id}, {"_id": 0, "cost": 1, "cost_type": 1}).to_list(1000)
+    kasgeld_by_type = {
+        r["_id"]: r["total"]
+        async for r in db.kasgeld.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$group": {"_id": "$transaction_type", "total": {"$sum": "$amount"}}}
+        ])
+    }
+    kasgeld_deposits = kasgeld_by_type.get("deposit", 0)
+    kasgeld_withdrawals = kasgeld_by_type.get("withdrawal", 0)
     # Only count maintenance where cost_type is 'kasgeld' (or not set for legacy data)
-    total_maintenance = sum(m["cost"] for m in maintenance_costs if m.get("cost_type", "kasgeld") == "kasgeld")
-    
-    # Get all payments (huurbetalingen) for kasgeld calculation
-    all_payments = await db.payments.find({"user_id": user_id}, {"_id": 0, "amount": 1}).to_list(1000)
-    total_all_payments = sum(p["amount"] for p in all_payments)
-    
-    # Get salary payments for kasgeld calculation
-    all_salaries = await db.salaries.find({"user_id": user_id}, {"_id": 0, "amount": 1, "period_month": 1, "period_year": 1}).to_list(1000)
-    total_all_salaries = sum(s["amount"] for s in all_salaries)
+    maintenance_agg = await db.maintenance.aggregate([
+        {"$match": {"user_id": user_id, "$or": [{"cost_type": "kasgeld"}, {"cost_type": {"$exists": False}}]}},
+        {"$group": {"_id": None, "total": {"$sum": "$cost"}}}
+    ]).to_list(1)
+    total_maintenance = maintenance_agg[0]["total"] if maintenance_agg else 0
+    
+    # Get salary payments for kasgeld calculation (all time + this month)
+    salaries_agg = await db.salaries.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": "$amount"},
+            "this_month": {"$sum": {"$cond": [
+                {"$and": [{"$eq": ["$period_month", now.month]}, {"$eq": ["$period_year", now.year]}]},
+                "$amount", 0
+            ]}}
+        }}
+    ]).to_list(1)
+    total_all_salaries = salaries_agg[0]["total"] if salaries_agg else 0
     
     # Total kasgeld = deposits + all payments - withdrawals - maintenance (kasgeld only) - salaries
     total_kasgeld = kasgeld_deposits + total_all_payments - kasgeld_withdrawals - total_maintenance - total_all_salaries
@@ -4340,10 +4361,7 @@ async def get_dashboard(current_user: dict = Depends(get_current_active_user)):
     total_employees = await db.employees.count_documents({"user_id": user_id, "status": "active"})
     
     # Salary this month
-    total_salary_this_month = sum(
-        s["amount"] for s in all_salaries 
-        if s.get("period_month") == now.month and s.get("period_year") == now.year
-    )
+    total_salary_this_month = salaries_agg[0]["this_month"] if salaries_agg else 0
     
     return DashboardStats(
         total_apartments=total_apartments,
@@ -7480,6 +7498,7 @@ async def update_addon(addon_id: str, addon_data: AddonUpdate, current_user: dic
     update_data = {k: v for k, v in addon_data.model_dump().items() if v is not None}
     if update_data:
         await db.addons.update_one({"id": addon_id}, {"$set": update_data})
+        await invalidate_all_entitlements()
     
     updated = await db.addons.find_one({"id": addon_id}, {"_id": 0})
     return AddonResponse(**updated)
@@ -7493,6 +7512,7 @@ async def delete_addon(addon_id: str, current_user: dict = Depends(get_superadmi
     
     # Also remove all user addons for this addon
     await db.user_addons.delete_many({"addon_id": addon_id})
+    await invalidate_all_entitlements()
     await db.addon_requests.delete_many({"addon_id": addon_id})
     
     return {"message": "Add-on verwijderd"}
@@ -7519,10 +7539,7 @@ async def get_my_addons(current_user: dict = Depends(get_current_user)):
             try:
                 end_dt = datetime.fromisoformat(end_date.replace("Z", "+00:00"))
                 if end_dt < now and ua.get("status") == "active":
-                    await db.user_addons.update_one(
-                        {"_id": ObjectId(ua_id)},
-                        {"$set": {"status": "expired"}}
-                    )
+                    # Reported as expired; the status itself is updated by the daily expiry job
                     ua["status"] = "expired"
             except Exception:
                 pass
@@ -7856,6 +7873,7 @@ async def create_user_module_order(
                     "reactivated_at": now.isoformat()
                 }}
             )
+            await invalidate_entitlements(current_user["id"])
         else:
             # Create new subscription with trial
             user_addon = {
@@ -7871,6 +7889,7 @@ async def create_user_module_order(
                 "created_at": now.isoformat()
             }
             await db.user_addons.insert_one(user_addon)
+            await invalidate_entitlements(current_user["id"])
         
         activated_modules.append({
             "addon_id": addon.get("id"),
@@ -8031,6 +8050,19 @@ async def get_email_logs(
 
 # ==================== SCHEDULED TASKS / CRON JOBS ====================
 
+@api_router.get("/admin/database/pool-stats")
+async def get_database_pool_stats(current_user: dict = Depends(get_superadmin)):
+    """MongoDB connection pool settings and counters of this API process"""
+    return mongo_pool_stats()
+
+@api_router.get("/admin/database/indexes")
+async def get_database_index_report(explain: bool = True, current_user: dict = Depends(get_superadmin)):
+    """Registered indexes and an explain() report of the registered queries (collection scans first)"""
+    return {
+        "indexes": registered_indexes(),
+        "queries": await explain_registered_queries(db) if explain else [],
+    }
+
 @api_router.get("/admin/scheduled-jobs/status")
 async def get_scheduled_jobs_status(current_user: dict = Depends(get_superadmin)):
     """Get status of scheduled jobs"""
@@ -8390,6 +8422,7 @@ async def admin_activate_user_modules(
                     "updated_at": now_str
                 }}
             )
+            await invalidate_entitlements(user_id)
         else:
             # Create new user addon
             user_addon = {
@@ -8404,6 +8437,7 @@ async def admin_activate_user_modules(
                 "created_at": now_str
             }
             await db.user_addons.insert_one(user_addon)
+            await invalidate_entitlements(user_id)
         
         activated_modules.append(addon.get("name"))
         total_amount += addon.get("price", 0) * data.months
@@ -8417,6 +8451,7 @@ async def admin_activate_user_modules(
             "updated_at": now_str
         }}
     )
+    await invalidate_user(user_id)
     
     # Record payment
     if total_amount > 0:
@@ -8581,6 +8616,7 @@ async def activate_user_addon(user_id: str, addon_data: UserAddonCreate, current
             {"id": existing["id"]},
             {"$set": {"end_date": end_date}}
         )
+        await invalidate_entitlements(user_id)
         
         updated = await db.user_addons.find_one({"id": existing["id"]}, {"_id": 0})
         return UserAddonResponse(
@@ -8613,6 +8649,7 @@ async def activate_user_addon(user_id: str, addon_data: UserAddonCreate, current
     }
     
     await db.user_addons.insert_one(user_addon_doc)
+    await invalidate_entitlements(user_id)
     
     # Remove any pending requests for this addon
     await db.addon_requests.delete_many({
@@ -8642,6 +8679,7 @@ async def deactivate_user_addon(user_id: str, addon_id: str, current_user: dict
         {"user_id": user_id, "addon_id": addon_id, "status": "active"},
         {"$set": {"status": "deactivated"}}
     )
+    await invalidate_entitlements(user_id)
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Actieve add-on niet gevonden voor deze gebruiker")
@@ -8713,6 +8751,7 @@ async def approve_addon_request(request_id: str, months: int = 1, current_user:
             "subscription_end_date": end_date
         }}
     )
+    await invalidate_user(request["user_id"])
     
     return {"message": "Add-on verzoek goedgekeurd en geactiveerd", "user_addon": result}
 
@@ -8890,6 +8929,7 @@ async def create_public_order(order_data: PublicOrderCreate):
             "created_at": now_str
         }
         await db.user_addons.insert_one(user_addon)
+        await invalidate_entitlements(user_id)
     
     # Create order record
     order_doc = {
@@ -9084,6 +9124,7 @@ async def check_payment_status(order_id: str):
                                 "subscription_end": trial_end
                             }}
                         )
+                        await invalidate_user(order["user_id"])
                         
                         # Activate the add-ons for the user
                         for addon_id in order.get("addon_ids", []):
@@ -9098,6 +9139,7 @@ async def check_payment_status(order_id: str):
                                 "end_date": (now + timedelta(days=30)).isoformat(),
                                 "created_at": now.isoformat()
                             })
+                            await invalidate_entitlements(order["user_id"])
                     
                     return {"status": "paid", "paid": True}
                 
@@ -9213,6 +9255,7 @@ async def mope_webhook(request: Request):
                         "subscription_end": trial_end
                     }}
                 )
+                await invalidate_user(order["user_id"])
                 
                 # Activate the add-ons for the user
                 for addon_id in order.get("addon_ids", []):
@@ -9235,6 +9278,7 @@ async def mope_webhook(request: Request):
                             "end_date": (now + timedelta(days=30)).isoformat(),
                             "created_at": now.isoformat()
                         })
+                        await invalidate_entitlements(order["user_id"])
                 
                 logger.info(f"User {order['user_id']} activated via Mope payment")
         
@@ -9808,6 +9852,17 @@ async def startup_event():
         from services.herinnering_scheduler import start_reminder_scheduler
         await start_reminder_scheduler(db)
         
+        # Indexes for the incremental grootboek saldo aggregates
+        from services.grootboek_saldi import ensure_saldo_indexes
+        await ensure_saldo_indexes(db)
+        
+        # Unique fingerprint index for bank statement import dedup
+        from services.bank_import import ensure_bank_import_indexes
+        await ensure_bank_import_indexes(db)
+        
+        # Indexes declared by the routers and above (services/indexes.py)
+        await ensure_registered_indexes(db)
+        
         logger.info("Startup tasks completed (including schedulers)")
     except Exception as e:
         logger.error(f"Startup error: {e}")
@@ -9961,6 +10016,7 @@ async def activate_subscription(sub_data: SubscriptionCreate, current_user: dict
             "is_trial": False
         }}
     )
+    await invalidate_user(sub_data.user_id)
     
     return SubscriptionResponse(
         **sub_doc,
@@ -10004,6 +10060,7 @@ async def deactivate_customer(user_id: str, current_user: dict = Depends(get_sup
             "is_trial": False
         }}
     )
+    await invalidate_user(user_id)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Klant niet gevonden")
@@ -10163,6 +10220,7 @@ async def delete_customer_permanent(user_id: str, current_user: dict = Depends(g
     
     # Delete all customer data
     await db.users.delete_one({"id": user_id})
+    await invalidate_user(user_id)
     await db.subscriptions.delete_many({"user_id": user_id})
     await db.subscription_requests.delete_many({"user_id": user_id})
     
@@ -10208,6 +10266,7 @@ async def delete_subscription_payment(subscription_id: str, current_user: dict =
         {"id": user_id},
         {"$set": {"subscription_end_date": new_end_date, "is_trial": False}}
     )
+    await invalidate_user(user_id)
     
     return {"message": "Abonnementsbetaling verwijderd"}
 
@@ -10509,6 +10568,7 @@ async def change_own_password(password_data: PasswordChange, current_user: dict
         {"id": current_user["id"]},
         {"$set": {"password": hash_password(password_data.new_password)}}
     )
+    await invalidate_user(current_user["id"])
     
     return {"message": "Wachtwoord succesvol gewijzigd"}
 
@@ -10541,6 +10601,7 @@ async def update_own_profile(profile_data: ProfileUpdate, current_user: dict = D
         {"id": current_user["id"]},
         {"$set": update_fields}
     )
+    await invalidate_user(current_user["id"])
     
     # Return updated user
     updated_user = await db.users.find_one({"id": current_user["id"]}, {"_id": 0, "password": 0})
@@ -10571,6 +10632,7 @@ async def upload_logo(logo_data: LogoUpload, current_user: dict = Depends(get_cu
         {"id": current_user["id"]},
         {"$set": {"logo": logo_data.logo_data}}
     )
+    await invalidate_user(current_user["id"])
     
     return {"message": "Logo succesvol geüpload", "logo": logo_data.logo_data}
 
@@ -10582,6 +10644,7 @@ async def delete_logo(current_user: dict = Depends(get_current_user)):
         {"id": current_user["id"]},
         {"$unset": {"logo": ""}}
     )
+    await invalidate_user(current_user["id"])
     
     return {"message": "Logo succesvol verwijderd"}
 
@@ -10616,6 +10679,7 @@ async def update_rent_settings(settings: RentSettings, current_user: dict = Depe
             "payment_deadline_month_offset": settings.payment_deadline_month_offset
         }}
     )
+    await invalidate_user(current_user["id"])
     
     return {"message": "Huurinstellingen opgeslagen"}
 
@@ -10640,6 +10704,7 @@ async def admin_reset_customer_password(user_id: str, password_data: AdminPasswo
         {"id": user_id, "role": "customer"},
         {"$set": {"password": hash_password(password_data.new_password)}}
     )
+    await invalidate_user(user_id)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Klant niet gevonden")
@@ -10675,6 +10740,7 @@ async def admin_update_customer_profile(user_id: str, profile_data: AdminCustome
         {"id": user_id, "role": "customer"},
         {"$set": update_fields}
     )
+    await invalidate_user(user_id)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Klant niet gevonden")
@@ -11191,16 +11257,8 @@ async def trigger_system_update(
                 )
                 details.append(f"Git: {result.stdout or result.stderr}")
             
-            # Update log with success
-            from motor.motor_asyncio import AsyncIOMotorClient
-            import asyncio
-            
-            # Use sync pymongo for background task
-            from pymongo import MongoClient
-            mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
-            db_name = os.environ.get("DB_NAME", "erp_db")
-            sync_client = MongoClient(mongo_url)
-            sync_db = sync_client[db_name]
+            # Update log with success (sync pymongo: this background task runs in a worker thread)
+            sync_db = get_sync_db()
             
             sync_db.deployment_logs.update_one(
                 {"id": log_id},
@@ -11219,15 +11277,10 @@ async def trigger_system_update(
                 }},
                 upsert=True
             )
-            sync_client.close()
             
         except subprocess.TimeoutExpired:
             details.append("❌ Timeout tijdens update (max 10 min)")
-            from pymongo import MongoClient
-            mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
-            db_name = os.environ.get("DB_NAME", "erp_db")
-            sync_client = MongoClient(mongo_url)
-            sync_db = sync_client[db_name]
+            sync_db = get_sync_db()
             sync_db.deployment_logs.update_one(
                 {"id": log_id},
                 {"$set": {"status": "failed", "message": "Timeout", "details": details}}
@@ -11235,14 +11288,9 @@ async def trigger_system_update(
             sync_db.deployment_settings.update_one(
                 {}, {"$set": {"last_update_status": "failed"}}, upsert=True
             )
-            sync_client.close()
         except Exception as e:
             details.append(f"❌ Fout: {str(e)}")
-            from pymongo import MongoClient
-            mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
-            db_name = os.environ.get("DB_NAME", "erp_db")
-            sync_client = MongoClient(mongo_url)
-            sync_db = sync_client[db_name]
+            sync_db = get_sync_db()
             sync_db.deployment_logs.update_one(
                 {"id": log_id},
                 {"$set": {"status": "failed", "message": str(e), "details": details}}
@@ -11250,7 +11298,6 @@ async def trigger_system_update(
             sync_db.deployment_settings.update_one(
                 {}, {"$set": {"last_update_status": "failed"}}, upsert=True
             )
-            sync_client.close()
     
     # Add to background tasks
     background_tasks.add_task(run_update_script)
@@ -11547,6 +11594,7 @@ async def update_workspace(workspace_id: str, workspace_data: WorkspaceUpdate, c
             update_data["status"] = "pending"
     
     await db.workspaces.update_one({"id": workspace_id}, {"$set": update_data})
+    await invalidate_workspace(workspace_id)
     
     # Get updated workspace
     updated = await db.workspaces.find_one({"id": workspace_id}, {"_id": 0})
@@ -11569,6 +11617,7 @@ async def delete_workspace(workspace_id: str, current_user: dict = Depends(get_s
     
     # Delete workspace and all related data
     await db.workspaces.delete_one({"id": workspace_id})
+    await invalidate_workspace(workspace_id)
     await db.workspace_users.delete_many({"workspace_id": workspace_id})
     await db.workspace_logs.delete_many({"workspace_id": workspace_id})
     
@@ -11609,6 +11658,7 @@ async def verify_workspace_dns(workspace_id: str, current_user: dict = Depends(g
                     "error_message": None
                 }}
             )
+            await invalidate_workspace(workspace_id)
             
             # Log success
             await db.workspace_logs.insert_one({
@@ -11657,6 +11707,7 @@ async def activate_workspace_ssl(workspace_id: str, current_user: dict = Depends
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await invalidate_workspace(workspace_id)
     
     return {"message": "SSL geactiveerd"}
 
@@ -11853,6 +11904,7 @@ async def invite_workspace_user(invite: WorkspaceUserInvite, current_user: dict
             {"id": existing_user["id"]},
             {"$set": {"workspace_id": workspace_id}}
         )
+        await invalidate_user(existing_user["id"])
     
     return WorkspaceUserResponse(**invitation)
 
@@ -11917,6 +11969,7 @@ async def remove_workspace_user(user_id: str, current_user: dict = Depends(get_c
         {"id": user_id, "workspace_id": workspace_id},
         {"$set": {"workspace_id": None}}
     )
+    await invalidate_user(user_id)
     
     return {"message": "Gebruiker verwijderd"}
 
@@ -12812,193 +12865,148 @@ async def ai_get_kasgeld(user_id: str):
     
     return {"balance": kasgeld.get("balance", 0), "recent_transactions": transactions}
 
-# Main AI processing function
-async def process_ai_command(user_id: str, message: str, session_id: str):
-    """Process user message with AI and execute commands for ALL modules"""
-    
-    # Use the existing function to get active addon slugs
-    active_modules = await get_user_active_addons(user_id)
-    
-    logger.info(f"AI Assistant - User {user_id} has active modules: {active_modules}")
+async def _ai_context_vastgoed(user_id: str) -> str:
+    """AI context: Vastgoed Beheer"""
+    stats, tenants, apartments = await asyncio.gather(
+        ai_get_dashboard_stats(user_id), ai_list_tenants(user_id), ai_list_apartments(user_id)
+    )
     
-    # Build context based on active modules
-    context_parts = []
-    available_actions = []
+    tenant_list = ", ".join([t["name"] for t in tenants[:10]]) if tenants else "Geen huurders"
+    apartment_list = ", ".join([f"{a['name']} (SRD {a['rent_amount']})" for a in apartments[:10]]) if apartments else "Geen appartementen"
     
-    # VASTGOED BEHEER MODULE
-    if "vastgoed_beheer" in active_modules:
-        stats = await ai_get_dashboard_stats(user_id)
-        tenants = await ai_list_tenants(user_id)
-        apartments = await ai_list_apartments(user_id)
-        
-        tenant_list = ", ".join([t["name"] for t in tenants[:10]]) if tenants else "Geen huurders"
-        apartment_list = ", ".join([f"{a['name']} (SRD {a['rent_amount']})" for a in apartments[:10]]) if apartments else "Geen appartementen"
-        
-        context_parts.append(f"""
+    return f"""
 📦 VASTGOED BEHEER MODULE:
 - Totaal huurders: {stats['total_tenants']}
 - Totaal appartementen: {stats['total_apartments']}
 - Maandinkomen: SRD {stats['monthly_income']:,.2f}
 - Huurders: {tenant_list}
-- Appartementen: {apartment_list}""")
-        
-        available_actions.extend([
-            "HUURDER_TOEVOEGEN: Nieuwe huurder aanmaken (params: name, phone, email, address)",
-            "APPARTEMENT_TOEVOEGEN: Nieuw appartement (params: name, address, rent_amount)",
-            "BETALING_REGISTREREN: Betaling registreren (params: tenant_name, amount)",
-            "SALDO_OPVRAGEN: Saldo bekijken (params: tenant_name)",
-            "LENING_AANMAKEN: Lening aanmaken (params: tenant_name, amount)",
-            "VASTGOED_OVERZICHT: Overzicht van verhuur data",
-            "HUURDER_ZOEKEN: Zoek een huurder (params: search_term)",
-            "OPENSTAANDE_BETALINGEN: Toon openstaande betalingen",
-            "CONTRACTEN_OVERZICHT: Toon alle contracten"
-        ])
+- Appartementen: {apartment_list}"""
+
+
+async def _ai_context_hrm(user_id: str) -> str:
+    """AI context: HRM"""
+    employees, departments, leave_requests = await asyncio.gather(
+        db.hrm_employees.find({"user_id": user_id}, {"_id": 0}).to_list(50),
+        db.hrm_departments.find({"user_id": user_id}, {"_id": 0}).to_list(20),
+        db.hrm_leave_requests.find({"user_id": user_id, "status": "pending"}, {"_id": 0}).to_list(20),
+    )
     
-    # HRM MODULE
-    if "hrm" in active_modules:
-        employees = await db.hrm_employees.find({"user_id": user_id}, {"_id": 0}).to_list(50)
-        departments = await db.hrm_departments.find({"user_id": user_id}, {"_id": 0}).to_list(20)
-        leave_requests = await db.hrm_leave_requests.find({"user_id": user_id, "status": "pending"}, {"_id": 0}).to_list(20)
-        
-        emp_count = len(employees)
-        dept_count = len(departments)
-        pending_leave = len(leave_requests)
-        emp_names = ", ".join([e.get("name", "Onbekend") for e in employees[:8]]) if employees else "Geen werknemers"
-        dept_names = ", ".join([d.get("name", "") for d in departments[:5]]) if departments else "Geen afdelingen"
-        
-        # Calculate total salary
-        total_salary = sum([e.get("salary", 0) for e in employees])
-        
-        context_parts.append(f"""
+    emp_count = len(employees)
+    dept_count = len(departments)
+    pending_leave = len(leave_requests)
+    emp_names = ", ".join([e.get("name", "Onbekend") for e in employees[:8]]) if employees else "Geen werknemers"
+    dept_names = ", ".join([d.get("name", "") for d in departments[:5]]) if departments else "Geen afdelingen"
+    
+    # Calculate total salary
+    total_salary = sum([e.get("salary", 0) for e in employees])
+    
+    return f"""
 📦 HRM MODULE:
 - Totaal werknemers: {emp_count}
 - Afdelingen: {dept_count} ({dept_names})
 - Openstaande verlofaanvragen: {pending_leave}
 - Totale loonsom: SRD {total_salary:,.2f}/maand
-- Werknemers: {emp_names}""")
-        
-        available_actions.extend([
-            "WERKNEMER_TOEVOEGEN: Nieuwe werknemer (params: name, email, department, position, salary)",
-            "WERKNEMER_ZOEKEN: Zoek werknemer (params: search_term)",
-            "VERLOF_GOEDKEUREN: Verlofaanvraag goedkeuren (params: employee_name)",
-            "VERLOF_AFWIJZEN: Verlofaanvraag afwijzen (params: employee_name, reason)",
-            "HRM_OVERZICHT: Overzicht van personeel en verlof",
-            "AFDELING_TOEVOEGEN: Nieuwe afdeling (params: name, description)",
-            "AANWEZIGHEID_OVERZICHT: Toon aanwezigheid van vandaag",
-            "SALARIS_OVERZICHT: Toon salaris overzicht",
-            "VERLOF_OVERZICHT: Toon alle verlofaanvragen"
-        ])
+- Werknemers: {emp_names}"""
+
+
+async def _ai_context_autodealer(user_id: str) -> str:
+    """AI context: Auto Dealer"""
+    vehicles, customers, sales = await asyncio.gather(
+        db.autodealer_vehicles.find({"user_id": user_id}, {"_id": 0}).to_list(50),
+        db.autodealer_customers.find({"user_id": user_id}, {"_id": 0}).to_list(50),
+        db.autodealer_sales.find({"user_id": user_id}, {"_id": 0}).to_list(50),
+    )
     
-    # AUTO DEALER MODULE
-    if "autodealer" in active_modules:
-        vehicles = await db.autodealer_vehicles.find({"user_id": user_id}, {"_id": 0}).to_list(50)
-        customers = await db.autodealer_customers.find({"user_id": user_id}, {"_id": 0}).to_list(50)
-        sales = await db.autodealer_sales.find({"user_id": user_id}, {"_id": 0}).to_list(50)
-        
-        available_count = len([v for v in vehicles if v.get("status") == "beschikbaar"])
-        total_vehicles = len(vehicles)
-        customer_count = len(customers)
-        sales_count = len(sales)
-        
-        # Calculate total sales value
-        total_sales_value = sum([s.get("price", 0) for s in sales])
-        
-        vehicle_list = ", ".join([f"{v.get('brand', '')} {v.get('model', '')}" for v in vehicles[:5]]) if vehicles else "Geen voertuigen"
-        
-        context_parts.append(f"""
+    available_count = len([v for v in vehicles if v.get("status") == "beschikbaar"])
+    total_vehicles = len(vehicles)
+    customer_count = len(customers)
+    sales_count = len(sales)
+    
+    # Calculate total sales value
+    total_sales_value = sum([s.get("price", 0) for s in sales])
+    
+    vehicle_list = ", ".join([f"{v.get('brand', '')} {v.get('model', '')}" for v in vehicles[:5]]) if vehicles else "Geen voertuigen"
+    
+    return f"""
 📦 AUTO DEALER MODULE:
 - Totaal voertuigen: {total_vehicles} ({available_count} beschikbaar)
 - Klanten: {customer_count}
 - Verkopen: {sales_count} (totaal SRD {total_sales_value:,.2f})
-- Voertuigen: {vehicle_list}""")
-        
-        available_actions.extend([
-            "VOERTUIG_TOEVOEGEN: Nieuw voertuig (params: brand, model, year, price_srd, license_plate)",
-            "VOERTUIG_ZOEKEN: Zoek voertuig (params: search_term)",
-            "KLANT_TOEVOEGEN: Nieuwe klant (params: name, phone, email, type)",
-            "VERKOOP_REGISTREREN: Verkoop registreren (params: vehicle, customer_name, price)",
-            "AUTODEALER_OVERZICHT: Overzicht van voertuigen en verkopen",
-            "BESCHIKBARE_VOERTUIGEN: Toon beschikbare voertuigen",
-            "VERKOPEN_OVERZICHT: Toon recente verkopen"
-        ])
+- Voertuigen: {vehicle_list}"""
+
+
+async def _ai_context_beautyspa(user_id: str) -> str:
+    """AI context: Beauty & Spa"""
+    appointments, services, spa_customers = await asyncio.gather(
+        db.spa_appointments.find({"user_id": user_id}, {"_id": 0}).to_list(50),
+        db.spa_services.find({"user_id": user_id}, {"_id": 0}).to_list(50),
+        db.spa_customers.find({"user_id": user_id}, {"_id": 0}).to_list(50),
+    )
     
-    # BEAUTY & SPA MODULE
-    if "beauty" in active_modules or "beautyspa" in active_modules:
-        appointments = await db.spa_appointments.find({"user_id": user_id}, {"_id": 0}).to_list(50)
-        services = await db.spa_services.find({"user_id": user_id}, {"_id": 0}).to_list(50)
-        spa_customers = await db.spa_customers.find({"user_id": user_id}, {"_id": 0}).to_list(50)
-        
-        today = datetime.now().strftime("%Y-%m-%d")
-        today_appointments = len([a for a in appointments if a.get("date", "").startswith(today)])
-        pending_appointments = len([a for a in appointments if a.get("status") == "pending"])
-        
-        context_parts.append(f"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    today_appointments = len([a for a in appointments if a.get("date", "").startswith(today)])
+    pending_appointments = len([a for a in appointments if a.get("status") == "pending"])
+    
+    return f"""
 📦 BEAUTY & SPA MODULE:
 - Totaal afspraken: {len(appointments)} ({today_appointments} vandaag)
 - Behandelingen: {len(services)}
 - Klanten: {len(spa_customers)}
-- Openstaande afspraken: {pending_appointments}""")
-        
-        available_actions.extend([
-            "SPA_AFSPRAAK_MAKEN: Nieuwe afspraak (params: customer_name, service, date, time)",
-            "SPA_DIENST_TOEVOEGEN: Nieuwe behandeling (params: name, price, duration)",
-            "SPA_KLANT_TOEVOEGEN: Nieuwe klant (params: name, phone, email)",
-            "SPA_OVERZICHT: Overzicht van afspraken en diensten",
-            "VANDAAG_AFSPRAKEN: Toon afspraken van vandaag"
-        ])
+- Openstaande afspraken: {pending_appointments}"""
+
+
+async def _ai_context_pompstation(user_id: str) -> str:
+    """AI context: Pompstation"""
+    fuel_sales, fuel_inventory = await asyncio.gather(
+        db.fuel_sales.find({"user_id": user_id}, {"_id": 0}).to_list(100),
+        db.fuel_inventory.find({"user_id": user_id}, {"_id": 0}).to_list(10),
+    )
     
-    # POMPSTATION MODULE
-    if "pompstation" in active_modules:
-        fuel_sales = await db.fuel_sales.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-        fuel_inventory = await db.fuel_inventory.find({"user_id": user_id}, {"_id": 0}).to_list(10)
-        
-        today = datetime.now().strftime("%Y-%m-%d")
-        today_sales = [s for s in fuel_sales if s.get("date", "").startswith(today)]
-        today_revenue = sum([s.get("total", 0) for s in today_sales])
-        
-        context_parts.append(f"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    today_sales = [s for s in fuel_sales if s.get("date", "").startswith(today)]
+    today_revenue = sum([s.get("total", 0) for s in today_sales])
+    
+    return f"""
 📦 POMPSTATION MODULE:
 - Verkopen vandaag: {len(today_sales)} (SRD {today_revenue:,.2f})
-- Brandstof types in voorraad: {len(fuel_inventory)}""")
-        
-        available_actions.extend([
-            "BRANDSTOF_VERKOOP: Registreer verkoop (params: fuel_type, liters, price_per_liter)",
-            "POMPSTATION_OVERZICHT: Overzicht van verkopen",
-            "VOORRAAD_OVERZICHT: Toon brandstof voorraad"
-        ])
-    
-    # BOEKHOUDING MODULE
-    if "boekhouding" in active_modules:
-        # Get invoices
-        invoices = await db.verkoopfacturen.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-        purchase_invoices = await db.inkoopfacturen.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-        debtors = await db.debiteuren.find({"user_id": user_id}, {"_id": 0}).to_list(50)
-        creditors = await db.crediteuren.find({"user_id": user_id}, {"_id": 0}).to_list(50)
-        btw_aangiftes = await db.btw_aangiftes.find({"user_id": user_id}, {"_id": 0}).to_list(20)
-        grootboekrekeningen = await db.grootboekrekeningen.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-        journaalposten = await db.journaalposten.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-        bank_transactions = await db.bank_transactions.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-        
-        # Calculate statistics
-        open_invoices = [i for i in invoices if i.get("status") in ["openstaand", "verzonden", "concept"]]
-        paid_invoices = [i for i in invoices if i.get("status") == "betaald"]
-        total_revenue = sum([i.get("totaal", 0) for i in paid_invoices])
-        total_outstanding = sum([i.get("totaal", 0) for i in open_invoices])
-        
-        # BTW calculation
-        btw_te_betalen = sum([b.get("btw_te_betalen", 0) for b in btw_aangiftes if b.get("status") != "ingediend"])
-        btw_te_ontvangen = sum([b.get("btw_te_ontvangen", 0) for b in btw_aangiftes if b.get("status") != "ingediend"])
-        btw_saldo = btw_te_ontvangen - btw_te_betalen
-        
-        # Recent invoices
-        recent_invoices = sorted(invoices, key=lambda x: x.get("datum", ""), reverse=True)[:5]
-        invoice_list = ", ".join([f"{i.get('factuurnummer', 'N/A')} (SRD {i.get('totaal', 0):,.2f})" for i in recent_invoices]) if recent_invoices else "Geen facturen"
-        
-        # Debtor/Creditor names
-        debtor_names = ", ".join([d.get("naam", d.get("name", "")) for d in debtors[:5]]) if debtors else "Geen debiteuren"
-        creditor_names = ", ".join([c.get("naam", c.get("name", "")) for c in creditors[:5]]) if creditors else "Geen crediteuren"
-        
-        context_parts.append(f"""
+- Brandstof types in voorraad: {len(fuel_inventory)}"""
+
+
+async def _ai_context_boekhouding(user_id: str) -> str:
+    """AI context: Boekhouding"""
+    # Get invoices, relations and ledger data concurrently
+    (invoices, purchase_invoices, debtors, creditors, btw_aangiftes,
+     grootboekrekeningen, journaalposten, bank_transactions) = await asyncio.gather(
+        db.verkoopfacturen.find({"user_id": user_id}, {"_id": 0}).to_list(100),
+        db.inkoopfacturen.find({"user_id": user_id}, {"_id": 0}).to_list(100),
+        db.debiteuren.find({"user_id": user_id}, {"_id": 0}).to_list(50),
+        db.crediteuren.find({"user_id": user_id}, {"_id": 0}).to_list(50),
+        db.btw_aangiftes.find({"user_id": user_id}, {"_id": 0}).to_list(20),
+        db.grootboekrekeningen.find({"user_id": user_id}, {"_id": 0}).to_list(100),
+        db.journaalposten.find({"user_id": user_id}, {"_id": 0}).to_list(100),
+        db.bank_transactions.find({"user_id": user_id}, {"_id": 0}).to_list(100),
+    )
+    
+    # Calculate statistics
+    open_invoices = [i for i in invoices if i.get("status") in ["openstaand", "verzonden", "concept"]]
+    paid_invoices = [i for i in invoices if i.get("status") == "betaald"]
+    total_revenue = sum([i.get("totaal", 0) for i in paid_invoices])
+    total_outstanding = sum([i.get("totaal", 0) for i in open_invoices])
+    
+    # BTW calculation
+    btw_te_betalen = sum([b.get("btw_te_betalen", 0) for b in btw_aangiftes if b.get("status") != "ingediend"])
+    btw_te_ontvangen = sum([b.get("btw_te_ontvangen", 0) for b in btw_aangiftes if b.get("status") != "ingediend"])
+    btw_saldo = btw_te_ontvangen - btw_te_betalen
+    
+    # Recent invoices
+    recent_invoices = sorted(invoices, key=lambda x: x.get("datum", ""), reverse=True)[:5]
+    invoice_list = ", ".join([f"{i.get('factuurnummer', 'N/A')} (SRD {i.get('totaal', 0):,.2f})" for i in recent_invoices]) if recent_invoices else "Geen facturen"
+    
+    # Debtor/Creditor names
+    debtor_names = ", ".join([d.get("naam", d.get("name", "")) for d in debtors[:5]]) if debtors else "Geen debiteuren"
+    creditor_names = ", ".join([c.get("naam", c.get("name", "")) for c in creditors[:5]]) if creditors else "Geen crediteuren"
+    
+    return f"""
 📦 BOEKHOUDING MODULE:
 - Totaal verkoopfacturen: {len(invoices)} ({len(open_invoices)} openstaand, {len(paid_invoices)} betaald)
 - Openstaand bedrag: SRD {total_outstanding:,.2f}
@@ -13010,9 +13018,121 @@ async def process_ai_command(user_id: str, message: str, session_id: str):
 - Grootboekrekeningen: {len(grootboekrekeningen)}
 - Journaalposten: {len(journaalposten)}
 - Bank transacties: {len(bank_transactions)}
-- Recente facturen: {invoice_list}""")
-        
-        available_actions.extend([
+- Recente facturen: {invoice_list}"""
+
+
+async def _ai_context_schuldbeheer(user_id: str) -> str:
+    """AI context: Schuldbeheer"""
+    # Get debts/loans
+    personal_debts = await db.personal_debts.find({"user_id": user_id}, {"_id": 0}).to_list(50)
+    
+    total_debt = sum([d.get("amount", 0) - d.get("paid", 0) for d in personal_debts if d.get("status") != "paid"])
+    active_debts = len([d for d in personal_debts if d.get("status") != "paid"])
+    
+    return f"""
+📦 SCHULDBEHEER MODULE:
+- Totale openstaande schuld: SRD {total_debt:,.2f}
+- Actieve leningen/schulden: {active_debts}
+- Totaal geregistreerd: {len(personal_debts)}"""
+
+
+async def _ai_context_suribet(user_id: str) -> str:
+    """AI context: Suribet Retailer"""
+    suribet_tickets = await db.suribet_tickets.find({"user_id": user_id}, {"_id": 0}).to_list(100)
+    
+    today = datetime.now().strftime("%Y-%m-%d")
+    today_tickets = len([t for t in suribet_tickets if t.get("date", "").startswith(today)])
+    today_revenue = sum([t.get("amount", 0) for t in suribet_tickets if t.get("date", "").startswith(today)])
+    
+    return f"""
+📦 SURIBET RETAILER MODULE:
+- Tickets verkocht vandaag: {today_tickets}
+- Omzet vandaag: SRD {today_revenue:,.2f}
+- Totaal tickets: {len(suribet_tickets)}"""
+
+
+# Modules the AI assistant knows about: data summary (cached, see services/ai_context.py)
+# and the actions the assistant may execute
+AI_MODULES = [
+    {
+        "module": "vastgoed_beheer",
+        "slugs": ['vastgoed_beheer'],
+        "name": "Vastgoed Beheer",
+        "context": _ai_context_vastgoed,
+        "actions": [
+            "HUURDER_TOEVOEGEN: Nieuwe huurder aanmaken (params: name, phone, email, address)",
+            "APPARTEMENT_TOEVOEGEN: Nieuw appartement (params: name, address, rent_amount)",
+            "BETALING_REGISTREREN: Betaling registreren (params: tenant_name, amount)",
+            "SALDO_OPVRAGEN: Saldo bekijken (params: tenant_name)",
+            "LENING_AANMAKEN: Lening aanmaken (params: tenant_name, amount)",
+            "VASTGOED_OVERZICHT: Overzicht van verhuur data",
+            "HUURDER_ZOEKEN: Zoek een huurder (params: search_term)",
+            "OPENSTAANDE_BETALINGEN: Toon openstaande betalingen",
+            "CONTRACTEN_OVERZICHT: Toon alle contracten",
+        ],
+    },
+    {
+        "module": "hrm",
+        "slugs": ['hrm'],
+        "name": "HRM",
+        "context": _ai_context_hrm,
+        "actions": [
+            "WERKNEMER_TOEVOEGEN: Nieuwe werknemer (params: name, email, department, position, salary)",
+            "WERKNEMER_ZOEKEN: Zoek werknemer (params: search_term)",
+            "VERLOF_GOEDKEUREN: Verlofaanvraag goedkeuren (params: employee_name)",
+            "VERLOF_AFWIJZEN: Verlofaanvraag afwijzen (params: employee_name, reason)",
+            "HRM_OVERZICHT: Overzicht van personeel en verlof",
+            "AFDELING_TOEVOEGEN: Nieuwe afdeling (params: name, description)",
+            "AANWEZIGHEID_OVERZICHT: Toon aanwezigheid van vandaag",
+            "SALARIS_OVERZICHT: Toon salaris overzicht",
+            "VERLOF_OVERZICHT: Toon alle verlofaanvragen",
+        ],
+    },
+    {
+        "module": "autodealer",
+        "slugs": ['autodealer'],
+        "name": "Auto Dealer",
+        "context": _ai_context_autodealer,
+        "actions": [
+            "VOERTUIG_TOEVOEGEN: Nieuw voertuig (params: brand, model, year, price_srd, license_plate)",
+            "VOERTUIG_ZOEKEN: Zoek voertuig (params: search_term)",
+            "KLANT_TOEVOEGEN: Nieuwe klant (params: name, phone, email, type)",
+            "VERKOOP_REGISTREREN: Verkoop registreren (params: vehicle, customer_name, price)",
+            "AUTODEALER_OVERZICHT: Overzicht van voertuigen en verkopen",
+            "BESCHIKBARE_VOERTUIGEN: Toon beschikbare voertuigen",
+            "VERKOPEN_OVERZICHT: Toon recente verkopen",
+        ],
+    },
+    {
+        "module": "beautyspa",
+        "slugs": ['beauty', 'beautyspa'],
+        "name": "Beauty & Spa",
+        "context": _ai_context_beautyspa,
+        "actions": [
+            "SPA_AFSPRAAK_MAKEN: Nieuwe afspraak (params: customer_name, service, date, time)",
+            "SPA_DIENST_TOEVOEGEN: Nieuwe behandeling (params: name, price, duration)",
+            "SPA_KLANT_TOEVOEGEN: Nieuwe klant (params: name, phone, email)",
+            "SPA_OVERZICHT: Overzicht van afspraken en diensten",
+            "VANDAAG_AFSPRAKEN: Toon afspraken van vandaag",
+        ],
+    },
+    {
+        "module": "pompstation",
+        "slugs": ['pompstation'],
+        "name": "Pompstation",
+        "context": _ai_context_pompstation,
+        "actions": [
+            "BRANDSTOF_VERKOOP: Registreer verkoop (params: fuel_type, liters, price_per_liter)",
+            "POMPSTATION_OVERZICHT: Overzicht van verkopen",
+            "VOORRAAD_OVERZICHT: Toon brandstof voorraad",
+        ],
+    },
+    {
+        "module": "boekhouding",
+        "slugs": ['boekhouding'],
+        "name": "Boekhouding",
+        "context": _ai_context_boekhouding,
+        "actions": [
             "BTW_OVERZICHT: Bekijk BTW saldo en aangiftes",
             "OMZET_OVERZICHT: Bekijk omzet statistieken",
             "OPENSTAANDE_FACTUREN: Toon openstaande verkoopfacturen",
@@ -13022,51 +13142,42 @@ async def process_ai_command(user_id: str, message: str, session_id: str):
             "BANK_OVERZICHT: Toon bank transacties en saldo",
             "FACTUUR_ZOEKEN: Zoek een factuur (params: search_term)",
             "DEBITEUR_ZOEKEN: Zoek een debiteur (params: search_term)",
-            "BOEKHOUDING_RAPPORTAGE: Genereer boekhouding rapportage"
-        ])
-    
-    # SCHULDBEHEER MODULE
-    if "schuldbeheer" in active_modules:
-        # Get debts/loans
-        personal_debts = await db.personal_debts.find({"user_id": user_id}, {"_id": 0}).to_list(50)
-        debt_payments = await db.debt_payments.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-        
-        total_debt = sum([d.get("amount", 0) - d.get("paid", 0) for d in personal_debts if d.get("status") != "paid"])
-        active_debts = len([d for d in personal_debts if d.get("status") != "paid"])
-        
-        context_parts.append(f"""
-📦 SCHULDBEHEER MODULE:
-- Totale openstaande schuld: SRD {total_debt:,.2f}
-- Actieve leningen/schulden: {active_debts}
-- Totaal geregistreerd: {len(personal_debts)}""")
-        
-        available_actions.extend([
+            "BOEKHOUDING_RAPPORTAGE: Genereer boekhouding rapportage",
+        ],
+    },
+    {
+        "module": "schuldbeheer",
+        "slugs": ['schuldbeheer'],
+        "name": "Schuldbeheer",
+        "context": _ai_context_schuldbeheer,
+        "actions": [
             "SCHULDEN_OVERZICHT: Bekijk alle schulden en leningen",
             "SCHULD_TOEVOEGEN: Nieuwe schuld registreren (params: name, amount, creditor, due_date)",
             "AFLOSSING_REGISTREREN: Aflossing registreren (params: debt_name, amount)",
-            "VOLGENDE_AFLOSSING: Wanneer is de volgende aflossing?"
-        ])
-    
-    # SURIBET MODULE
-    if "suribet" in active_modules:
-        suribet_tickets = await db.suribet_tickets.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-        suribet_payouts = await db.suribet_payouts.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-        
-        today = datetime.now().strftime("%Y-%m-%d")
-        today_tickets = len([t for t in suribet_tickets if t.get("date", "").startswith(today)])
-        today_revenue = sum([t.get("amount", 0) for t in suribet_tickets if t.get("date", "").startswith(today)])
-        
-        context_parts.append(f"""
-📦 SURIBET RETAILER MODULE:
-- Tickets verkocht vandaag: {today_tickets}
-- Omzet vandaag: SRD {today_revenue:,.2f}
-- Totaal tickets: {len(suribet_tickets)}""")
-        
-        available_actions.extend([
+            "VOLGENDE_AFLOSSING: Wanneer is de volgende aflossing?",
+        ],
+    },
+    {
+        "module": "suribet",
+        "slugs": ['suribet'],
+        "name": "Suribet Retailer",
+        "context": _ai_context_suribet,
+        "actions": [
             "SURIBET_OVERZICHT: Bekijk Suribet verkopen",
             "TICKET_VERKOOP: Registreer ticket verkoop (params: amount)",
-            "UITBETALING_REGISTREREN: Registreer uitbetaling (params: ticket_number, amount)"
-        ])
+            "UITBETALING_REGISTREREN: Registreer uitbetaling (params: ticket_number, amount)",
+        ],
+    },
+]
+
+# Main AI processing function
+async def process_ai_command(user_id: str, message: str, session_id: str):
+    """Process user message with AI and execute commands for ALL modules"""
+    
+    # Use the existing function to get active addon slugs
+    active_modules = await get_user_active_addons(user_id)
+    
+    logger.info(f"AI Assistant - User {user_id} has active modules: {active_modules}")
     
     # If no modules active
     if not active_modules:
@@ -13076,28 +13187,22 @@ async def process_ai_command(user_id: str, message: str, session_id: str):
             "action_result": None
         }
     
+    # Only the modules this message is about get a data summary (cached per user);
+    # the list of actions always covers every active module
+    ai_modules = [m for m in AI_MODULES if any(slug in active_modules for slug in m["slugs"])]
+    wanted = modules_for_message(message, [m["module"] for m in ai_modules])
+    contexts = await get_module_contexts(
+        user_id, {m["module"]: m["context"] for m in ai_modules if m["module"] in wanted}
+    )
+    context_parts = [contexts[m["module"]] for m in ai_modules if m["module"] in contexts]
+    available_actions = [action for m in ai_modules for action in m["actions"]]
+    
     # Build system prompt
     context_text = "\n".join(context_parts) if context_parts else "Geen module data beschikbaar"
     actions_text = "\n".join([f"- {a}" for a in available_actions]) if available_actions else "Geen acties beschikbaar"
     
     # Get active module names for clarity
-    module_names = []
-    if "vastgoed_beheer" in active_modules:
-        module_names.append("Vastgoed Beheer")
-    if "hrm" in active_modules:
-        module_names.append("HRM")
-    if "autodealer" in active_modules:
-        module_names.append("Auto Dealer")
-    if "beauty" in active_modules or "beautyspa" in active_modules:
-        module_names.append("Beauty & Spa")
-    if "pompstation" in active_modules:
-        module_names.append("Pompstation")
-    if "boekhouding" in active_modules:
-        module_names.append("Boekhouding")
-    if "schuldbeheer" in active_modules:
-        module_names.append("Schuldbeheer")
-    if "suribet" in active_modules:
-        module_names.append("Suribet Retailer")
+    module_names = [m["name"] for m in ai_modules]
     
     active_module_list = ", ".join(module_names) if module_names else "Geen"
     
@@ -13693,6 +13798,10 @@ Als gevraagd wordt over andere modules, leg uit dat deze eerst geactiveerd moete
     except Exception as e:
         logger.error(f"AI action error: {e}")
     
+    if action_result is not None:
+        # The next message must see what this action changed
+        await invalidate_ai_context(user_id)
+    
     return {
         "response": final_response,
         "action_executed": action_result is not None,
@@ -14625,4 +14734,11 @@ async def shutdown_db_client():
     except:
         pass
     
-    client.close()
+    # Stop PDF batch workers
+    try:
+        from services.pdf_generator import shutdown_pdf_pool
+        shutdown_pdf_pool()
+    except ImportError:
+        pass
+    
+    close_database()
@@ -0,0 +1,72 @@
+"""
+AI context cache - Module summaries for the AI assistant
+========================================================
+The assistant's system prompt contains a short data summary per active module
+(tenants, employees, invoices, ...). Building a summary costs a handful of MongoDB
+reads, so summaries are cached per user and module:
+
+- Entries expire after AI_CONTEXT_TTL seconds (default 60), so changes made outside
+  the assistant show up within a minute.
+- Actions executed by the assistant itself call `invalidate_ai_context(user_id)`, so
+  the next message sees its own writes.
+- `modules_for_message` picks the modules a message is about (keyword match). Only
+  those summaries are built; a message that names no module (e.g. "ja, doe maar")
+  gets all active modules, which are usually still cached from the previous message.
+- Missing summaries are built concurrently.
+"""
+
+import asyncio
+import os
+import re
+from typing import Awaitable, Callable, Dict, Iterable, List
+
+from services.cache import Cache, MemoryBackend
+
+AI_CONTEXT_TTL = int(os.environ.get("AI_CONTEXT_TTL", "60"))
+
+ai_context_cache = Cache(
+    "ai_context", default_ttl=AI_CONTEXT_TTL,
+    backend=MemoryBackend(int(os.environ.get("AI_CONTEXT_MAX_ENTRIES", "2000"))),
+)
+
+# Words that tie a chat message to a module (lowercase, matched on word prefix)
+MODULE_KEYWORDS: Dict[str, List[str]] = {
+    "vastgoed_beheer": ["huur", "appartement", "vastgoed", "betaling", "saldo", "lening", "contract", "woning"],
+    "hrm": ["werknemer", "personeel", "medewerker", "afdeling", "verlof", "salaris", "loon", "aanwezig", "hrm"],
+    "autodealer": ["auto", "voertuig", "dealer", "wagen"],
+    "beautyspa": ["spa", "beauty", "behandeling", "afspra", "salon"],
+    "pompstation": ["pomp", "brandstof", "benzine", "diesel", "liter", "tank"],
+    "boekhouding": ["factu", "btw", "omzet", "debiteur", "crediteur", "grootboek", "journaal", "bank", "boekhoud"],
+    "schuldbeheer": ["schuld", "aflossing", "lening"],
+    "suribet": ["suribet", "ticket", "uitbetaling"],
+}
+
+
+def modules_for_message(message: str, active_modules: Iterable[str]) -> List[str]:
+    """Active modules the message refers to; all active modules if it names none."""
+    active = list(active_modules)
+    words = re.findall(r"\w+", (message or "").lower())
+    matched = [
+        module for module in active
+        if any(word.startswith(keyword) for keyword in MODULE_KEYWORDS.get(module, []) for word in words)
+    ]
+    return matched or active
+
+
+async def get_module_contexts(
+    user_id: str, builders: Dict[str, Callable[[str], Awaitable[str]]]
+) -> Dict[str, str]:
+    """Cached summary per module, building the missing ones concurrently.
+    `builders` maps a module slug to an async function user_id -> summary text."""
+    modules = list(builders)
+    texts = await asyncio.gather(*(
+        ai_context_cache.get_or_load(
+            f"{user_id}:{module}", lambda module=module: builders[module](user_id), tags=(f"user:{user_id}",)
+        )
+        for module in modules
+    ))
+    return dict(zip(modules, texts))
+
+
+async def invalidate_ai_context(*user_ids: str):
+    await ai_context_cache.invalidate(*(f"user:{u}" for u in user_ids if u))
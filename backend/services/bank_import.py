@@ -0,0 +1,119 @@
+"""
+Bank Import - Bulk import van banktransacties met duplicaatdetectie
+===================================================================
+Transacties uit CSV- en MT940-bestanden worden per batch met `insert_many(ordered=False)`
+weggeschreven. Elke transactie krijgt een vingerafdruk (bankrekening, datum, bedrag,
+referentie/omschrijving, volgnummer binnen het bestand) met een unieke index, zodat het
+opnieuw importeren van hetzelfde afschrift geen dubbele boekingen oplevert.
+"""
+
+import hashlib
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator
+
+from pymongo.errors import BulkWriteError
+
+BATCH_SIZE = 1000
+
+
+async def ensure_bank_import_indexes(db):
+    # Partial: handmatig aangemaakte transacties hebben geen vingerafdruk
+    await db.boekhouding_banktransacties.create_index(
+        [("user_id", 1), ("fingerprint", 1)],
+        unique=True,
+        partialFilterExpression={"fingerprint": {"$type": "string"}},
+    )
+
+
+def upload_regels(fileobj) -> Iterator[str]:
+    """Lees een upload regel voor regel (utf-8, met latin-1 als terugval per regel)."""
+    fileobj.seek(0)
+    for raw in fileobj:
+        try:
+            yield raw.decode('utf-8')
+        except UnicodeDecodeError:
+            yield raw.decode('latin-1')
+
+
+def csv_transacties(regels: Iterable[str]) -> Iterator[Dict]:
+    """CSV met kopregel en kolommen datum;omschrijving;bedrag. Ongeldige regels leveren None."""
+    regels = iter(regels)
+    next(regels, None)  # Skip header
+    for line in regels:
+        if not line.strip():
+            continue
+        parts = line.split(';')
+        try:
+            if len(parts) < 3:
+                raise ValueError(line)
+            yield {
+                "datum": parts[0].strip(),
+                "omschrijving": parts[1].strip(),
+                "bedrag": float(parts[2].strip().replace(',', '.')),
+            }
+        except ValueError:
+            yield None
+
+
+def _fingerprint(user_id: str, bank_id: str, tx: Dict, volgnr: int) -> str:
+    sleutel = "|".join([
+        user_id, bank_id, str(tx.get("datum", "")), f"{float(tx.get('bedrag', 0)):.2f}",
+        str(tx.get("referentie") or tx.get("omschrijving") or ""), str(volgnr),
+    ])
+    return hashlib.sha1(sleutel.encode('utf-8')).hexdigest()
+
+
+async def _schrijf_batch(db, batch: list, rapport: Dict):
+    try:
+        result = await db.boekhouding_banktransacties.insert_many(batch, ordered=False)
+        rapport["imported"] += len(result.inserted_ids)
+    except BulkWriteError as e:
+        details = e.details or {}
+        rapport["imported"] += details.get("nInserted", 0)
+        for err in details.get("writeErrors", []):
+            if err.get("code") == 11000:
+                rapport["duplicaten"] += 1
+            else:
+                rapport["fouten"] += 1
+
+
+async def importeer_banktransacties(
+    db, user_id: str, bank_id: str, transacties: Iterable, bron: str, batch_size: int = BATCH_SIZE
+) -> Dict:
+    """Importeer transacties (dicts met datum, omschrijving, bedrag en optionele extra velden).
+    `None` in de invoer telt als onleesbare regel. Geeft een importrapport terug."""
+    rapport = {"totaal": 0, "imported": 0, "duplicaten": 0, "fouten": 0}
+    # Identieke transacties binnen één bestand (zelfde dag, bedrag, omschrijving) zijn legitiem:
+    # tel ze door zodat alleen een herhaalde import als duplicaat wordt gezien
+    gezien: Dict[str, int] = {}
+    batch = []
+    now = datetime.now(timezone.utc)
+    for tx in transacties:
+        rapport["totaal"] += 1
+        if tx is None:
+            rapport["fouten"] += 1
+            continue
+        basis = _fingerprint(user_id, bank_id, tx, 0)
+        volgnr = gezien.get(basis, 0)
+        gezien[basis] = volgnr + 1
+        batch.append({
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "bankrekening_id": bank_id,
+            **tx,
+            "status": "nieuw",
+            "import_bron": bron,
+            "fingerprint": basis if volgnr == 0 else _fingerprint(user_id, bank_id, tx, volgnr),
+            "created_at": now,
+        })
+        if len(batch) >= batch_size:
+            await _schrijf_batch(db, batch, rapport)
+            batch = []
+    if batch:
+        await _schrijf_batch(db, batch, rapport)
+    rapport["message"] = (
+        f"{rapport['imported']} transacties geïmporteerd, "
+        f"{rapport['duplicaten']} duplicaten overgeslagen, {rapport['fouten']} fouten"
+    )
+    return rapport
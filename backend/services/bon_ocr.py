@@ -0,0 +1,325 @@
+"""
+Bon OCR - Suribet receipt scanning as a persisted job queue
+===========================================================
+Receipt images are not sent to the vision model inside the upload request. Instead:
+
+- `enqueue_bon` stores the image in `suribet_ocr_jobs` and returns the job at once.
+  Identical images (same SHA-256) of the same user are deduplicated: while a job for
+  that image is queued, running or finished (within OCR_RETENTION_DAYS) the existing
+  job is returned instead of calling the model again.
+- `bon_ocr_worker` runs in every API process, claims queued jobs atomically
+  (find_one_and_update), so any number of uvicorn workers can share the queue, and
+  calls the model with at most OCR_CONCURRENCY requests in flight per process.
+  Transient failures (network errors, HTTP 429/5xx) are retried with backoff; a job
+  claimed by a process that died is picked up again after CLAIM_TIMEOUT.
+- Clients poll the job (`get_job`) or, for the QR flow, the upload session. A job keeps
+  every session it was uploaded through in `session_ids` (a duplicate image from a second
+  session joins the existing job), and all of them get the result.
+
+Mobile upload sessions live in `suribet_upload_sessions` with a TTL index, so a session
+created by one worker can be polled and uploaded to through any other and expires after
+UPLOAD_SESSION_TTL seconds.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import aiohttp
+from pymongo import IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from services.indexes import register_indexes
+
+logger = logging.getLogger(__name__)
+
+OCR_CONCURRENCY = int(os.environ.get("OCR_CONCURRENCY", "3"))
+OCR_MAX_ATTEMPTS = int(os.environ.get("OCR_MAX_ATTEMPTS", "3"))
+OCR_RETENTION_DAYS = int(os.environ.get("OCR_RETENTION_DAYS", "7"))
+UPLOAD_SESSION_TTL = int(os.environ.get("SURIBET_UPLOAD_SESSION_TTL", "900"))
+CLAIM_TIMEOUT = timedelta(minutes=5)
+BACKOFF_BASE_SECONDS = 10
+
+OCR_MODEL = "gemini/gemini-2.0-flash"
+OCR_URL = "https://integrations.emergentagent.com/llm/chat/completions"
+
+BON_PROMPT = """Extract ALL data from this Suribet receipt. Return ONLY valid JSON:
+{
+  "receipt_date": "YYYY-MM-DD",
+  "pos_sales": [{"product": "SB", "total_bets": 0.00, "comm_percentage": 0.00, "commission": 0.00}],
+  "pos_sales_total": 0.00,
+  "pos_sales_commission": 0.00,
+  "pos_payout": [{"product": "PT", "total_paid": 0.00, "comm_percentage": 0.00, "commission": 0.00}],
+  "pos_payout_total": 0.00,
+  "pos_payout_commission": 0.00,
+  "playable_ticket": [],
+  "playable_ticket_total": 0.00,
+  "playable_ticket_commission": 0.00,
+  "total_sales": 0.00,
+  "kiosk_cash_in": 0.00,
+  "kiosk_commission": 0.00,
+  "total_pc_sales": 0.00,
+  "total_payout": 0.00,
+  "total_pt_pos_cancel_bets": 0.00,
+  "total_pos_commission": 0.00,
+  "balance": 0.00
+}
+IMPORTANT: Extract the date from the receipt and put it in receipt_date field (format: YYYY-MM-DD).
+Product codes: SB, SF, VSF, Topup, PT, S2W, VSB, WDR, WDRNC. Return ONLY JSON."""
+
+register_indexes(
+    "suribet_ocr_jobs",
+    IndexModel("id", unique=True),
+    IndexModel("dedup_key", unique=True, sparse=True),
+    [("status", 1), ("next_attempt_at", 1)],
+    IndexModel("expires_at", expireAfterSeconds=0),
+)
+register_indexes(
+    "suribet_upload_sessions",
+    IndexModel("id", unique=True),
+    IndexModel("expires_at", expireAfterSeconds=0),
+)
+
+_ocr_wakeup = asyncio.Event()
+
+# Fields returned to clients (never the image itself)
+JOB_PROJECTION = {"_id": 0, "id": 1, "status": 1, "bon_data": 1, "error": 1, "created_at": 1, "finished_at": 1}
+
+
+class _TransientError(Exception):
+    """The model call failed but may succeed on a later attempt."""
+
+
+class BonParseError(Exception):
+    """The model answered, but not with usable receipt data."""
+
+
+# ============== MODEL CALL ==============
+
+def parse_bon_response(response_text: str) -> dict:
+    json_str = response_text.strip()
+    if json_str.startswith("```"):
+        json_str = re.sub(r'^```(?:json)?\n?', '', json_str)
+        json_str = re.sub(r'\n?```$', '', json_str)
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        json_match = re.search(r'\{[\s\S]*\}', response_text)
+        if json_match:
+            try:
+                return json.loads(json_match.group())
+            except json.JSONDecodeError:
+                pass
+    raise BonParseError("Could not parse receipt data")
+
+
+async def extract_bon_data(contents: bytes) -> dict:
+    """Send one receipt image to the vision model and return the parsed receipt data."""
+    api_key = os.environ.get('EMERGENT_LLM_KEY')
+    if not api_key:
+        raise RuntimeError("EMERGENT_LLM_KEY not configured")
+
+    base64_image = base64.b64encode(contents).decode('utf-8')
+    mime_type = "image/jpeg" if base64_image.startswith('/9j/') else "image/png"
+    payload = {
+        "model": OCR_MODEL,
+        "messages": [{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": BON_PROMPT},
+                {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}},
+            ],
+        }],
+    }
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                OCR_URL, json=payload, headers=headers, timeout=aiohttp.ClientTimeout(total=120)
+            ) as resp:
+                if resp.status == 429 or resp.status >= 500:
+                    raise _TransientError(f"AI API error {resp.status}: {(await resp.text())[:200]}")
+                if resp.status != 200:
+                    raise RuntimeError(f"AI API error {resp.status}: {(await resp.text())[:200]}")
+                result = await resp.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise _TransientError(str(e) or type(e).__name__)
+
+    return parse_bon_response(result["choices"][0]["message"]["content"])
+
+
+# ============== JOBS ==============
+
+async def enqueue_bon(db, user_id: str, contents: bytes, session_id: Optional[str] = None) -> dict:
+    """Queue a receipt image for OCR. Returns the job (without the image); for an image
+    that was queued or scanned before, that existing job."""
+    now = datetime.now(timezone.utc)
+    image_hash = hashlib.sha256(contents).hexdigest()
+    dedup_key = f"{user_id}:{image_hash}"
+    job = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "image_hash": image_hash,
+        "dedup_key": dedup_key,
+        "image": contents,
+        "session_ids": [session_id] if session_id else [],
+        "status": "queued",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+        # Safety net; finished jobs get a new expiry (the dedup window)
+        "expires_at": now + timedelta(days=OCR_RETENTION_DAYS),
+    }
+    try:
+        await db.suribet_ocr_jobs.insert_one(job)
+    except DuplicateKeyError:
+        if session_id:
+            # Recorded on the job itself, so _process_job also updates this session if it finishes now
+            existing = await db.suribet_ocr_jobs.find_one_and_update(
+                {"dedup_key": dedup_key}, {"$addToSet": {"session_ids": session_id}},
+                projection=JOB_PROJECTION, return_document=ReturnDocument.AFTER,
+            )
+        else:
+            existing = await db.suribet_ocr_jobs.find_one({"dedup_key": dedup_key}, JOB_PROJECTION)
+        if existing:
+            logger.info(f"Bon OCR: duplicate image for user {user_id}, reusing job {existing['id']}")
+            if session_id:
+                await _update_session(db, session_id, existing)
+            return existing
+        # The earlier job failed and released its dedup key in the meantime
+        job["id"] = str(uuid.uuid4())
+        job.pop("_id", None)
+        await db.suribet_ocr_jobs.insert_one(job)
+    if session_id:
+        await _update_session(db, session_id, job)
+    _ocr_wakeup.set()
+    return {k: job.get(k) for k in JOB_PROJECTION if k != "_id"}
+
+
+async def get_job(db, user_id: str, job_id: str) -> Optional[dict]:
+    return await db.suribet_ocr_jobs.find_one({"id": job_id, "user_id": user_id}, JOB_PROJECTION)
+
+
+async def _claim_job(db):
+    now = datetime.now(timezone.utc)
+    return await db.suribet_ocr_jobs.find_one_and_update(
+        {"$or": [
+            {"status": "queued", "next_attempt_at": {"$lte": now}},
+            {"status": "processing", "claimed_at": {"$lt": now - CLAIM_TIMEOUT}},
+        ]},
+        {"$set": {"status": "processing", "claimed_at": now}, "$inc": {"attempts": 1}},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _process_job(db, job: dict):
+    now = datetime.now(timezone.utc)
+    try:
+        bon_data = await extract_bon_data(job["image"])
+    except _TransientError as e:
+        if job["attempts"] < OCR_MAX_ATTEMPTS:
+            delay = BACKOFF_BASE_SECONDS * 2 ** (job["attempts"] - 1)
+            await db.suribet_ocr_jobs.update_one({"id": job["id"]}, {"$set": {
+                "status": "queued", "next_attempt_at": now + timedelta(seconds=delay), "error": str(e)[:500],
+            }})
+            return
+        update = {"status": "failed", "error": str(e)[:500]}
+    except Exception as e:
+        logger.error(f"Bon OCR job {job['id']} failed: {e}")
+        update = {"status": "failed", "error": str(e)[:500]}
+    else:
+        update = {"status": "completed", "bon_data": bon_data}
+
+    update.update({"finished_at": now, "expires_at": now + timedelta(days=OCR_RETENTION_DAYS)})
+    unset = {"image": ""}
+    if update["status"] == "failed":
+        unset["dedup_key"] = ""  # the same image may be submitted again
+    done = await db.suribet_ocr_jobs.find_one_and_update(
+        {"id": job["id"]}, {"$set": update, "$unset": unset},
+        projection={"_id": 0, "session_ids": 1}, return_document=ReturnDocument.AFTER,
+    )
+    for session_id in (done or job).get("session_ids") or []:
+        await _update_session(db, session_id, {**update, "id": job["id"]})
+
+
+async def process_ocr_queue(db, limit: int = 100) -> int:
+    """Process up to `limit` due jobs with OCR_CONCURRENCY parallel model calls. Returns jobs handled."""
+    handled = 0
+
+    async def runner():
+        nonlocal handled
+        while handled < limit:
+            job = await _claim_job(db)
+            if not job:
+                return
+            handled += 1
+            try:
+                await _process_job(db, job)
+            except Exception as e:
+                logger.error(f"Bon OCR job {job.get('id')} crashed: {e}")
+
+    await asyncio.gather(*(runner() for _ in range(OCR_CONCURRENCY)))
+    return handled
+
+
+async def bon_ocr_worker(db):
+    """Background loop: process queued receipts; wakes up immediately when one is enqueued here."""
+    while True:
+        try:
+            _ocr_wakeup.clear()
+            if await process_ocr_queue(db):
+                continue
+        except Exception as e:
+            logger.error(f"Bon OCR worker error: {e}")
+        try:
+            await asyncio.wait_for(_ocr_wakeup.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            pass
+
+
+# ============== MOBILE UPLOAD SESSIONS ==============
+
+async def create_upload_session(db, user_id: str) -> dict:
+    now = datetime.now(timezone.utc)
+    session = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "status": "pending",
+        "job_id": None,
+        "bon_data": None,
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=UPLOAD_SESSION_TTL),
+    }
+    await db.suribet_upload_sessions.insert_one(session)
+    return session
+
+
+async def get_upload_session(db, session_id: str) -> Optional[dict]:
+    """The session, or None if it does not exist or has expired (the TTL monitor only
+    removes expired documents about once a minute)."""
+    session = await db.suribet_upload_sessions.find_one({"id": session_id}, {"_id": 0})
+    if not session:
+        return None
+    expires_at = session["expires_at"]
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return session if expires_at > datetime.now(timezone.utc) else None
+
+
+async def _update_session(db, session_id: str, job: dict):
+    status = {"queued": "processing"}.get(job["status"], job["status"])
+    query = {"id": session_id}
+    if status == "processing":
+        # A duplicate upload may write "processing" after _process_job already stored the result
+        query["$nor"] = [{"job_id": job["id"], "status": {"$in": ["completed", "failed"]}}]
+    await db.suribet_upload_sessions.update_one(query, {"$set": {
+        "status": status, "job_id": job["id"], "bon_data": job.get("bon_data"), "error": job.get("error"),
+    }})
@@ -0,0 +1,262 @@
+"""
+Cache - Bounded, instrumented cache with tag-based invalidation
+===============================================================
+`Cache` is a namespaced facade over a backend:
+
+- MemoryBackend (default): per-process LRU with TTL per entry and a maximum number of
+  entries. Tags are kept in a reverse index, so invalidating a tag only touches the keys
+  that carry it.
+- MongoBackend: shared store in the `cache_entries` collection (TTL index on
+  `expires_at`). Every worker sees the same entries and invalidations; use it when running
+  several API processes (CACHE_BACKEND=mongo). Values must be BSON-serialisable.
+
+Every cache tracks hits, misses, sets, evictions (LRU) and expirations (TTL); `cache_stats()`
+returns the counters of all registered caches.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger("cache")
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "5000"))
+_MISSING = object()
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags: Dict[str, set] = {}
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            for tag in entry[2]:
+                keys = self._tags.get(tag)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._tags[tag]
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return _MISSING
+        if entry[0] < time.monotonic():
+            self._drop(key)
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[1]
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        self._drop(key)
+        tags = tuple(tags)
+        self._entries[key] = (time.monotonic() + ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        self.stats["sets"] += 1
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.stats["evictions"] += 1
+
+    async def delete(self, key: str):
+        self._drop(key)
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self._drop(key)
+                removed += 1
+        self.stats["invalidations"] += removed
+        return removed
+
+    async def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class MongoBackend:
+    """Shared cache in MongoDB. `db_getter` returns the database (resolved lazily so the
+    cache can be created at import time, before the connection is configured)."""
+
+    def __init__(self, db_getter: Callable[[], Any], namespace: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self._db_getter = db_getter
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._indexes_ready = False
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @property
+    def _col(self):
+        return self._db_getter().cache_entries
+
+    def _id(self, key: str) -> str:
+        return f"{self.namespace}|{key}"
+
+    async def _ensure_indexes(self):
+        if not self._indexes_ready:
+            self._indexes_ready = True
+            await self._col.create_index("expires_at", expireAfterSeconds=0)
+            await self._col.create_index([("ns", 1), ("tags", 1)])
+            await self._col.create_index([("ns", 1), ("used_at", 1)])
+
+    async def get(self, key: str):
+        now = datetime.now(timezone.utc)
+        doc = await self._col.find_one_and_update(
+            {"_id": self._id(key)}, {"$set": {"used_at": now}}, projection={"value": 1, "expires_at": 1}
+        )
+        if doc is None:
+            self.stats["misses"] += 1
+            return _MISSING
+        expires_at = doc["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        if expires_at < now:  # the TTL monitor only runs once a minute
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return _MISSING
+        self.stats["hits"] += 1
+        return doc["value"]
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        await self._ensure_indexes()
+        now = datetime.now(timezone.utc)
+        await self._col.replace_one(
+            {"_id": self._id(key)},
+            {"ns": self.namespace, "value": value, "tags": list(tags),
+             "expires_at": now + timedelta(seconds=ttl), "used_at": now},
+            upsert=True,
+        )
+        self.stats["sets"] += 1
+        # Bound the namespace: evict the least recently used entries beyond max_entries
+        if self.stats["sets"] % 100 == 0:
+            overflow = await self._col.count_documents({"ns": self.namespace}) - self.max_entries
+            if overflow > 0:
+                oldest = await self._col.find({"ns": self.namespace}, {"_id": 1}).sort("used_at", 1).limit(overflow).to_list(None)
+                await self._col.delete_many({"_id": {"$in": [d["_id"] for d in oldest]}})
+                self.stats["evictions"] += len(oldest)
+
+    async def delete(self, key: str):
+        await self._col.delete_one({"_id": self._id(key)})
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        result = await self._col.delete_many({"ns": self.namespace, "tags": {"$in": list(tags)}})
+        self.stats["invalidations"] += result.deleted_count
+        return result.deleted_count
+
+    async def clear(self):
+        await self._col.delete_many({"ns": self.namespace})
+
+    def size(self) -> Optional[int]:
+        return None  # not tracked locally
+
+
+_registry: Dict[str, "Cache"] = {}
+
+
+class Cache:
+    """Namespaced cache. Backend selection: explicit `backend`, else CACHE_BACKEND
+    ('memory' or 'mongo'; 'mongo' needs `db_getter`)."""
+
+    def __init__(self, namespace: str, default_ttl: float = 60, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 backend=None, db_getter: Optional[Callable[[], Any]] = None):
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        if backend is None:
+            if os.environ.get("CACHE_BACKEND", "memory").lower() == "mongo" and db_getter is not None:
+                backend = MongoBackend(db_getter, namespace, max_entries)
+            else:
+                backend = MemoryBackend(max_entries)
+        self.backend = backend
+        self._loading: Dict[str, asyncio.Future] = {}
+        _registry[namespace] = self
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:  # a cache failure must never fail the request
+            logger.warning(f"[cache:{self.namespace}] get failed: {e}")
+            return default
+        return default if value is _MISSING else value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None, tags: Iterable[str] = ()):
+        try:
+            await self.backend.set(key, value, self.default_ttl if ttl is None else ttl, tags)
+        except Exception as e:
+            logger.warning(f"[cache:{self.namespace}] set failed: {e}")
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]],
+                          ttl: Optional[float] = None, tags: Iterable[str] = ()) -> Any:
+        """Return the cached value or load, store and return it. Concurrent misses for the
+        same key in this process share one load. `None` results are not cached."""
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"[cache:{self.namespace}] get failed: {e}")
+            value = _MISSING
+        if value is not _MISSING:
+            return value
+        pending = self._loading.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await loader()
+            if value is not None:
+                await self.set(key, value, ttl, tags)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            if not future.done():  # loader cancelled
+                future.cancel()
+            self._loading.pop(key, None)
+
+    async def delete(self, key: str):
+        try:
+            await self.backend.delete(key)
+        except Exception as e:
+            logger.warning(f"[cache:{self.namespace}] delete failed: {e}")
+
+    async def invalidate(self, *tags: str) -> int:
+        try:
+            return await self.backend.invalidate_tags(tags)
+        except Exception as e:
+            logger.warning(f"[cache:{self.namespace}] invalidate failed: {e}")
+            return 0
+
+    async def clear(self):
+        await self.backend.clear()
+
+    def stats(self) -> dict:
+        s = dict(self.backend.stats)
+        lookups = s["hits"] + s["misses"]
+        s["hit_ratio"] = round(s["hits"] / lookups, 3) if lookups else None
+        s["size"] = self.backend.size()
+        s["max_entries"] = self.backend.max_entries
+        s["backend"] = type(self.backend).__name__
+        return s
+
+
+def cache_stats() -> Dict[str, dict]:
+    return {name: cache.stats() for name, cache in _registry.items()}
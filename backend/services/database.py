@@ -0,0 +1,147 @@
+"""
+Database - One pooled MongoDB client per process
+================================================
+Every router and service uses the client created here instead of opening its own.
+Pool and timeout settings come from the environment:
+
+- MONGO_MAX_POOL_SIZE / MONGO_MIN_POOL_SIZE: connections per server (default 100 / 0)
+- MONGO_MAX_IDLE_TIME_MS: close pooled connections idle for longer than this
+- MONGO_SERVER_SELECTION_TIMEOUT_MS: fail fast when no server is reachable (default 5000)
+- MONGO_CONNECT_TIMEOUT_MS / MONGO_SOCKET_TIMEOUT_MS
+- MONGO_REPORTING_READ_PREFERENCE: read preference of `reporting_db`, used by read-only
+  reporting/export endpoints (default secondaryPreferred; on a standalone server this
+  simply reads from the primary)
+
+`pool_stats()` returns connection pool counters collected through a pymongo
+ConnectionPoolListener, for monitoring.
+"""
+
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient, ReadPreference, monitoring
+
+load_dotenv(Path(__file__).parent.parent / '.env')
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'surirentals')
+
+
+def _int_env(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+CLIENT_OPTIONS = {
+    "maxPoolSize": _int_env("MONGO_MAX_POOL_SIZE", 100),
+    "minPoolSize": _int_env("MONGO_MIN_POOL_SIZE", 0),
+    "maxIdleTimeMS": _int_env("MONGO_MAX_IDLE_TIME_MS", None),
+    "serverSelectionTimeoutMS": _int_env("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+    "connectTimeoutMS": _int_env("MONGO_CONNECT_TIMEOUT_MS", 10000),
+    "socketTimeoutMS": _int_env("MONGO_SOCKET_TIMEOUT_MS", None),
+}
+REPORTING_READ_PREFERENCE = os.environ.get("MONGO_REPORTING_READ_PREFERENCE", "secondaryPreferred")
+
+_READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts pool events per server. Called from pymongo's threads, hence the lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = defaultdict(lambda: defaultdict(int))
+
+    def _inc(self, event, **deltas):
+        server = f"{event.address[0]}:{event.address[1]}"
+        with self._lock:
+            for key, delta in deltas.items():
+                self._servers[server][key] += delta
+
+    def pool_created(self, event):
+        self._inc(event, pools_created=1)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._inc(event, pools_cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._inc(event, open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._inc(event, open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        self._inc(event, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._inc(event, waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._inc(event, waiting=-1, in_use=1, checkouts=1)
+
+    def connection_checked_in(self, event):
+        self._inc(event, in_use=-1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {server: dict(counters) for server, counters in self._servers.items()}
+
+
+_pool_listener = PoolStatsListener()
+_options = {k: v for k, v in CLIENT_OPTIONS.items() if v is not None}
+
+client = AsyncIOMotorClient(MONGO_URL, event_listeners=[_pool_listener], **_options)
+db = client[DB_NAME]
+reporting_db = client.get_database(DB_NAME, read_preference=_READ_PREFERENCES[REPORTING_READ_PREFERENCE])
+
+_sync_client: Optional[MongoClient] = None
+_sync_lock = threading.Lock()
+
+
+def get_sync_db():
+    """Synchronous (pymongo) handle on the same database, for code running in worker threads.
+    The client is created once and shares the pool settings and statistics."""
+    global _sync_client
+    with _sync_lock:
+        if _sync_client is None:
+            _sync_client = MongoClient(MONGO_URL, event_listeners=[_pool_listener], **_options)
+    return _sync_client[DB_NAME]
+
+
+def pool_stats() -> dict:
+    return {
+        "db_name": DB_NAME,
+        "options": CLIENT_OPTIONS,
+        "reporting_read_preference": REPORTING_READ_PREFERENCE,
+        "servers": _pool_listener.snapshot(),
+    }
+
+
+def close():
+    """Close the pooled clients (application shutdown)."""
+    global _sync_client
+    client.close()
+    with _sync_lock:
+        if _sync_client is not None:
+            _sync_client.close()
+            _sync_client = None
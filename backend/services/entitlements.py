@@ -0,0 +1,98 @@
+"""
+Entitlements - Active add-ons per user
+======================================
+Resolves which add-ons (modules) a user may use with one aggregation
+(`user_addons` joined with `addons` via $lookup) and caches the result per user.
+
+- Reads never write: an add-on whose end_date has passed counts as inactive straight
+  away; flipping its status to "expired" is done by the daily
+  ScheduledTasks.check_expired_modules job.
+- The cached rows keep their end_date and are filtered against the current time on
+  every check, so an add-on that expires while cached is denied immediately.
+- Every write to `user_addons` calls `invalidate_entitlements(user_id)`; changes to the
+  `addons` catalogue call `invalidate_all_entitlements()`. Other API workers pick up
+  changes when their entry expires (ENTITLEMENTS_TTL seconds).
+"""
+
+import logging
+import os
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from services.cache import Cache, MemoryBackend
+
+logger = logging.getLogger(__name__)
+
+ENTITLEMENTS_TTL = int(os.environ.get("ENTITLEMENTS_TTL", "60"))
+
+entitlements_cache = Cache(
+    "entitlements", default_ttl=ENTITLEMENTS_TTL,
+    backend=MemoryBackend(int(os.environ.get("ENTITLEMENTS_MAX_ENTRIES", "5000"))),
+)
+
+
+def _parse_end_date(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+    except (TypeError, ValueError):
+        return None  # unparseable end dates never expired an add-on before either
+
+
+async def _load_entitlements(db, user_id: str) -> list:
+    """All active/trial add-on rows of the user: [{"slug", "status", "addon_active", "end_date"}]."""
+    rows = await db.user_addons.aggregate([
+        {"$match": {"user_id": user_id, "status": {"$in": ["active", "trial"]}}},
+        {"$lookup": {"from": "addons", "localField": "addon_id", "foreignField": "id", "as": "addon"}},
+        {"$unwind": {"path": "$addon", "preserveNullAndEmptyArrays": True}},
+        {"$project": {
+            "_id": 0, "status": 1, "end_date": 1,
+            "slug": {"$ifNull": ["$addon.slug", ""]},
+            "has_addon": {"$gt": ["$addon", None]},
+            "addon_active": {"$ifNull": ["$addon.is_active", True]},
+        }},
+    ]).to_list(None)
+    for row in rows:
+        row["end_date"] = _parse_end_date(row.get("end_date"))
+    return rows
+
+
+async def _entitlements(db, user_id: str) -> list:
+    return await entitlements_cache.get_or_load(
+        f"{db.name}:{user_id}", lambda: _load_entitlements(db, user_id), tags=(f"user:{user_id}",)
+    )
+
+
+def _current(rows: list) -> list:
+    now = datetime.now(timezone.utc)
+    return [r for r in rows if r["end_date"] is None or r["end_date"] >= now]
+
+
+async def get_active_addon_slugs(db, user_id: str) -> List[str]:
+    """Slugs of the user's active (not trial), unexpired add-ons whose catalogue entry is active."""
+    return [
+        r["slug"] for r in _current(await _entitlements(db, user_id))
+        if r["status"] == "active" and r.get("has_addon") and r["addon_active"]
+    ]
+
+
+async def has_addon(db, user_id: str, addon_slug: str) -> bool:
+    return addon_slug in await get_active_addon_slugs(db, user_id)
+
+
+async def has_any_entitlement(db, user_id: str) -> bool:
+    """True if the user has at least one unexpired active or trial add-on."""
+    return bool(_current(await _entitlements(db, user_id)))
+
+
+async def invalidate_entitlements(*user_ids: str):
+    await entitlements_cache.invalidate(*(f"user:{u}" for u in user_ids if u))
+
+
+async def invalidate_all_entitlements():
+    await entitlements_cache.clear()
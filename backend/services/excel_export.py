@@ -1,12 +1,69 @@
 """
 Excel Export Module - Export van boekhouding data naar Excel
+
+Lijst-exports (grootboek, debiteuren, crediteuren) worden gestreamd: `stream_excel_export`
+leest de MongoDB cursors batch voor batch, schrijft met een write-only workbook naar een
+tijdelijk bestand en `excel_streaming_response` stuurt dat bestand in blokken terug.
+Geheugengebruik blijft begrensd, ongeacht het aantal regels, en er wordt niets afgekapt.
+Kolombreedtes worden bepaald op de eerste WIDTH_SAMPLE_ROWS regels.
 """
+import asyncio
 import io
-from typing import List, Dict, Any, Optional
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 from datetime import datetime
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
 from openpyxl.utils import get_column_letter
+from fastapi.responses import StreamingResponse
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+WIDTH_SAMPLE_ROWS = int(os.environ.get("EXCEL_WIDTH_SAMPLE_ROWS", "200"))
+EXPORT_BATCH_SIZE = int(os.environ.get("EXCEL_EXPORT_BATCH_SIZE", "1000"))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Kolomdefinities: (kop, veld, standaardwaarde)
+Column = Tuple[str, str, Any]
+
+REKENING_COLUMNS: List[Column] = [
+    ("Code", "code", ""), ("Naam", "naam", ""), ("Type", "type", ""),
+    ("Categorie", "categorie", ""), ("Valuta", "valuta", "SRD"), ("Saldo", "saldo", 0),
+]
+JOURNAALPOST_COLUMNS: List[Column] = [
+    ("Volgnummer", "volgnummer", ""), ("Datum", "datum", ""), ("Dagboek", "dagboek_code", ""),
+    ("Omschrijving", "omschrijving", ""), ("Debet", "totaal_debet", 0), ("Credit", "totaal_credit", 0),
+    ("Status", "status", ""),
+]
+RELATIE_COLUMNS: List[Column] = [
+    ("Nummer", "nummer", ""), ("Naam", "naam", ""), ("Adres", "adres", ""), ("Plaats", "plaats", ""),
+    ("Telefoon", "telefoon", ""), ("Email", "email", ""), ("Valuta", "valuta", "SRD"),
+    ("Openstaand", "openstaand_bedrag", 0),
+]
+VERKOOPFACTUUR_COLUMNS: List[Column] = [
+    ("Factuurnummer", "factuurnummer", ""), ("Datum", "factuurdatum", ""), ("Klant", "debiteur_naam", ""),
+    ("Vervaldatum", "vervaldatum", ""), ("Subtotaal", "subtotaal", 0), ("BTW", "btw_bedrag", 0),
+    ("Totaal", "totaal_incl_btw", 0), ("Openstaand", "openstaand_bedrag", 0), ("Status", "status", ""),
+]
+INKOOPFACTUUR_COLUMNS: List[Column] = [
+    ("Intern Nr", "intern_nummer", ""), ("Extern Nr", "extern_factuurnummer", ""),
+    ("Datum", "factuurdatum", ""), ("Leverancier", "crediteur_naam", ""), ("Vervaldatum", "vervaldatum", ""),
+    ("Subtotaal", "subtotaal", 0), ("BTW", "btw_bedrag", 0), ("Totaal", "totaal_incl_btw", 0),
+    ("Openstaand", "openstaand_bedrag", 0), ("Status", "status", ""),
+]
+
+
+def columns_projection(columns: Sequence[Column]) -> Dict[str, int]:
+    """MongoDB projectie met alleen de velden die geexporteerd worden"""
+    projection = {"_id": 0}
+    projection.update({field: 1 for _, field, _ in columns})
+    return projection
+
+
+def row_values(doc: Dict[str, Any], columns: Sequence[Column]) -> list:
+    return [doc.get(field, default) for _, field, default in columns]
 
 
 def create_styled_workbook() -> Workbook:
@@ -27,169 +84,168 @@ def style_header_row(ws, row: int = 1, num_cols: int = 10):
         cell.alignment = header_alignment
 
 
+def _column_width(values) -> int:
+    max_length = max((len(str(v)) for v in values if v not in (None, "")), default=0)
+    return min(max_length + 2, 50)
+
+
 def auto_column_width(ws):
-    """Pas kolombreedte automatisch aan"""
-    for column_cells in ws.columns:
-        max_length = 0
+    """Pas kolombreedte automatisch aan (op basis van de eerste WIDTH_SAMPLE_ROWS rijen)"""
+    max_row = min(ws.max_row, WIDTH_SAMPLE_ROWS)
+    for column_cells in ws.iter_cols(min_row=1, max_row=max_row):
         column = column_cells[0].column_letter
-        for cell in column_cells:
-            try:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column].width = adjusted_width
+        ws.column_dimensions[column].width = _column_width(cell.value for cell in column_cells)
+
+
+def _fill_sheet(ws, columns: Sequence[Column], docs: List[Dict[str, Any]]):
+    """Schrijf kopregel en rijen naar een gewoon (niet write-only) werkblad"""
+    for col, (header, _, _) in enumerate(columns, 1):
+        ws.cell(row=1, column=col, value=header)
+    style_header_row(ws, 1, len(columns))
+    for doc in docs:
+        ws.append(row_values(doc, columns))
+    auto_column_width(ws)
+
+
+# ==================== STREAMING EXPORT ====================
+
+@dataclass
+class ExportSheet:
+    """Een werkblad van een streaming export: de rijen komen uit een MongoDB cursor"""
+    title: str
+    columns: Sequence[Column]
+    cursor: Any
+
+
+def _header_cells(ws, columns: Sequence[Column]) -> list:
+    cells = []
+    for header, _, _ in columns:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color="1e293b", end_color="1e293b", fill_type="solid")
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+        cells.append(cell)
+    return cells
+
+
+def _append_rows(ws, rows: List[list]):
+    for row in rows:
+        ws.append(row)
+
+
+async def _write_sheet(wb: Workbook, sheet: ExportSheet) -> int:
+    ws = wb.create_sheet(sheet.title)
+    batch, started, count = [], False, 0
+    async for doc in sheet.cursor:
+        batch.append(row_values(doc, sheet.columns))
+        if len(batch) >= (EXPORT_BATCH_SIZE if started else WIDTH_SAMPLE_ROWS):
+            if not started:
+                # Kolombreedtes moeten vastliggen voordat de eerste rij geschreven wordt
+                _start_sheet(ws, sheet.columns, batch)
+                started = True
+            await asyncio.to_thread(_append_rows, ws, batch)
+            count += len(batch)
+            batch = []
+    if not started:
+        _start_sheet(ws, sheet.columns, batch)
+    await asyncio.to_thread(_append_rows, ws, batch)
+    return count + len(batch)
+
+
+def _start_sheet(ws, columns: Sequence[Column], sample: List[list]):
+    for index, (header, _, _) in enumerate(columns):
+        values = [header] + [row[index] for row in sample]
+        ws.column_dimensions[get_column_letter(index + 1)].width = _column_width(values)
+    ws.append(_header_cells(ws, columns))
+
+
+async def stream_excel_export(sheets: Sequence[ExportSheet]):
+    """Schrijf de werkbladen naar een tijdelijk bestand (write-only workbook).
+    Geeft het geopende bestand terug, klaar om gestreamd te worden."""
+    wb = Workbook(write_only=True)
+    for sheet in sheets:
+        await _write_sheet(wb, sheet)
+    output = tempfile.TemporaryFile()
+    try:
+        await asyncio.to_thread(wb.save, output)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+
+def excel_streaming_response(output, filename: str) -> StreamingResponse:
+    """Stream een bestand van `stream_excel_export` in blokken; het bestand wordt daarna gesloten"""
+    size = output.seek(0, io.SEEK_END)
+    output.seek(0)
+
+    def chunks():
+        try:
+            while True:
+                chunk = output.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            output.close()
+
+    return StreamingResponse(
+        chunks(),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(size),
+        },
+    )
 
 
 def export_grootboek_excel(rekeningen: List[Dict[str, Any]], journaalposten: List[Dict[str, Any]]) -> bytes:
     """Export grootboek naar Excel"""
     wb = create_styled_workbook()
     
-    # Rekeningen sheet
     ws1 = wb.active
     ws1.title = "Rekeningschema"
+    _fill_sheet(ws1, REKENING_COLUMNS, rekeningen)
     
-    headers = ["Code", "Naam", "Type", "Categorie", "Valuta", "Saldo"]
-    for col, header in enumerate(headers, 1):
-        ws1.cell(row=1, column=col, value=header)
-    style_header_row(ws1, 1, len(headers))
-    
-    for row, rek in enumerate(rekeningen, 2):
-        ws1.cell(row=row, column=1, value=rek.get('code', ''))
-        ws1.cell(row=row, column=2, value=rek.get('naam', ''))
-        ws1.cell(row=row, column=3, value=rek.get('type', ''))
-        ws1.cell(row=row, column=4, value=rek.get('categorie', ''))
-        ws1.cell(row=row, column=5, value=rek.get('valuta', 'SRD'))
-        ws1.cell(row=row, column=6, value=rek.get('saldo', 0))
-    
-    auto_column_width(ws1)
-    
-    # Journaalposten sheet
     ws2 = wb.create_sheet("Journaalposten")
-    headers2 = ["Volgnummer", "Datum", "Dagboek", "Omschrijving", "Debet", "Credit", "Status"]
-    for col, header in enumerate(headers2, 1):
-        ws2.cell(row=1, column=col, value=header)
-    style_header_row(ws2, 1, len(headers2))
-    
-    for row, post in enumerate(journaalposten, 2):
-        ws2.cell(row=row, column=1, value=post.get('volgnummer', ''))
-        ws2.cell(row=row, column=2, value=post.get('datum', ''))
-        ws2.cell(row=row, column=3, value=post.get('dagboek_code', ''))
-        ws2.cell(row=row, column=4, value=post.get('omschrijving', ''))
-        ws2.cell(row=row, column=5, value=post.get('totaal_debet', 0))
-        ws2.cell(row=row, column=6, value=post.get('totaal_credit', 0))
-        ws2.cell(row=row, column=7, value=post.get('status', ''))
-    
-    auto_column_width(ws2)
+    _fill_sheet(ws2, JOURNAALPOST_COLUMNS, journaalposten)
     
     # Save to bytes
     buffer = io.BytesIO()
     wb.save(buffer)
     return buffer.getvalue()
 
-
 def export_debiteuren_excel(debiteuren: List[Dict[str, Any]], facturen: List[Dict[str, Any]]) -> bytes:
     """Export debiteuren en verkoopfacturen naar Excel"""
     wb = create_styled_workbook()
     
-    # Debiteuren sheet
     ws1 = wb.active
     ws1.title = "Debiteuren"
+    _fill_sheet(ws1, RELATIE_COLUMNS, debiteuren)
     
-    headers = ["Nummer", "Naam", "Adres", "Plaats", "Telefoon", "Email", "Valuta", "Openstaand"]
-    for col, header in enumerate(headers, 1):
-        ws1.cell(row=1, column=col, value=header)
-    style_header_row(ws1, 1, len(headers))
-    
-    for row, deb in enumerate(debiteuren, 2):
-        ws1.cell(row=row, column=1, value=deb.get('nummer', ''))
-        ws1.cell(row=row, column=2, value=deb.get('naam', ''))
-        ws1.cell(row=row, column=3, value=deb.get('adres', ''))
-        ws1.cell(row=row, column=4, value=deb.get('plaats', ''))
-        ws1.cell(row=row, column=5, value=deb.get('telefoon', ''))
-        ws1.cell(row=row, column=6, value=deb.get('email', ''))
-        ws1.cell(row=row, column=7, value=deb.get('valuta', 'SRD'))
-        ws1.cell(row=row, column=8, value=deb.get('openstaand_bedrag', 0))
-    
-    auto_column_width(ws1)
-    
-    # Facturen sheet
     ws2 = wb.create_sheet("Verkoopfacturen")
-    headers2 = ["Factuurnummer", "Datum", "Klant", "Vervaldatum", "Subtotaal", "BTW", "Totaal", "Openstaand", "Status"]
-    for col, header in enumerate(headers2, 1):
-        ws2.cell(row=1, column=col, value=header)
-    style_header_row(ws2, 1, len(headers2))
-    
-    for row, fact in enumerate(facturen, 2):
-        ws2.cell(row=row, column=1, value=fact.get('factuurnummer', ''))
-        ws2.cell(row=row, column=2, value=fact.get('factuurdatum', ''))
-        ws2.cell(row=row, column=3, value=fact.get('debiteur_naam', ''))
-        ws2.cell(row=row, column=4, value=fact.get('vervaldatum', ''))
-        ws2.cell(row=row, column=5, value=fact.get('subtotaal', 0))
-        ws2.cell(row=row, column=6, value=fact.get('btw_bedrag', 0))
-        ws2.cell(row=row, column=7, value=fact.get('totaal_incl_btw', 0))
-        ws2.cell(row=row, column=8, value=fact.get('openstaand_bedrag', 0))
-        ws2.cell(row=row, column=9, value=fact.get('status', ''))
-    
-    auto_column_width(ws2)
+    _fill_sheet(ws2, VERKOOPFACTUUR_COLUMNS, facturen)
     
     buffer = io.BytesIO()
     wb.save(buffer)
     return buffer.getvalue()
 
-
 def export_crediteuren_excel(crediteuren: List[Dict[str, Any]], facturen: List[Dict[str, Any]]) -> bytes:
     """Export crediteuren en inkoopfacturen naar Excel"""
     wb = create_styled_workbook()
     
-    # Crediteuren sheet
     ws1 = wb.active
     ws1.title = "Crediteuren"
+    _fill_sheet(ws1, RELATIE_COLUMNS, crediteuren)
     
-    headers = ["Nummer", "Naam", "Adres", "Plaats", "Telefoon", "Email", "Valuta", "Openstaand"]
-    for col, header in enumerate(headers, 1):
-        ws1.cell(row=1, column=col, value=header)
-    style_header_row(ws1, 1, len(headers))
-    
-    for row, cred in enumerate(crediteuren, 2):
-        ws1.cell(row=row, column=1, value=cred.get('nummer', ''))
-        ws1.cell(row=row, column=2, value=cred.get('naam', ''))
-        ws1.cell(row=row, column=3, value=cred.get('adres', ''))
-        ws1.cell(row=row, column=4, value=cred.get('plaats', ''))
-        ws1.cell(row=row, column=5, value=cred.get('telefoon', ''))
-        ws1.cell(row=row, column=6, value=cred.get('email', ''))
-        ws1.cell(row=row, column=7, value=cred.get('valuta', 'SRD'))
-        ws1.cell(row=row, column=8, value=cred.get('openstaand_bedrag', 0))
-    
-    auto_column_width(ws1)
-    
-    # Facturen sheet
     ws2 = wb.create_sheet("Inkoopfacturen")
-    headers2 = ["Intern Nr", "Extern Nr", "Datum", "Leverancier", "Vervaldatum", "Subtotaal", "BTW", "Totaal", "Openstaand", "Status"]
-    for col, header in enumerate(headers2, 1):
-        ws2.cell(row=1, column=col, value=header)
-    style_header_row(ws2, 1, len(headers2))
-    
-    for row, fact in enumerate(facturen, 2):
-        ws2.cell(row=row, column=1, value=fact.get('intern_nummer', ''))
-        ws2.cell(row=row, column=2, value=fact.get('extern_factuurnummer', ''))
-        ws2.cell(row=row, column=3, value=fact.get('factuurdatum', ''))
-        ws2.cell(row=row, column=4, value=fact.get('crediteur_naam', ''))
-        ws2.cell(row=row, column=5, value=fact.get('vervaldatum', ''))
-        ws2.cell(row=row, column=6, value=fact.get('subtotaal', 0))
-        ws2.cell(row=row, column=7, value=fact.get('btw_bedrag', 0))
-        ws2.cell(row=row, column=8, value=fact.get('totaal_incl_btw', 0))
-        ws2.cell(row=row, column=9, value=fact.get('openstaand_bedrag', 0))
-        ws2.cell(row=row, column=10, value=fact.get('status', ''))
-    
-    auto_column_width(ws2)
+    _fill_sheet(ws2, INKOOPFACTUUR_COLUMNS, facturen)
     
     buffer = io.BytesIO()
     wb.save(buffer)
     return buffer.getvalue()
 
-
 def export_btw_aangifte_excel(rapport: Dict[str, Any]) -> bytes:
     """Export BTW aangifte naar Excel"""
     wb = create_styled_workbook()
@@ -0,0 +1,333 @@
+"""
+Grootboek Saldi - Incrementele saldo-aggregaten per rekening per periode
+========================================================================
+Houdt per gebruiker, rekeningcode en maand (YYYY-MM) de debet/credit totalen bij
+in `boekhouding_saldo_perioden`. Elke journaalpost die de status "geboekt" krijgt
+wordt hier met één bulk_write verwerkt, zodat saldi, proefbalans en
+periode-rapportages O(rekeningen) rijen lezen in plaats van alle journaalposten.
+
+De aggregaten kunnen altijd opnieuw worden opgebouwd uit de journaalposten
+(`herbouw_saldo_aggregaat`), bijvoorbeeld na handmatige correcties in de database.
+
+Herbouw en incrementele mutaties sluiten elkaar uit via het statusdocument per
+gebruiker in `boekhouding_saldo_status`:
+
+- Een herbouw neemt een lease (`herbouw_tot`) en verhoogt `versie`. Een tweede
+  herbouw voor dezelfde gebruiker wacht op de lopende in plaats van ook te schrijven.
+- Een mutatie die tijdens een herbouw valt, voert geen $inc uit maar zet `opnieuw`.
+  De herbouw maakt dan nog een ronde, die de journaalpost alsnog meetelt.
+- Valt een herbouw tussen de controle en de $inc van een mutatie (`versie` is
+  veranderd), dan is onbekend of de post in de herbouw zat: de mutatie laat dan
+  opnieuw herbouwen.
+- Zonder statusdocument is er nog geen aggregaat; mutaties slaan de $inc over en de
+  eerste lezing bouwt het aggregaat op.
+"""
+
+import asyncio
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from services.rekeningschema import get_rekeningschema, invalideer_rekeningschema
+
+SALDO_COLLECTION = "boekhouding_saldo_perioden"
+STATUS_COLLECTION = "boekhouding_saldo_status"
+
+# Journaalposten die meetellen: geboekt, plus oude entries zonder status
+GEBOEKT_FILTER = {"$or": [{"status": "geboekt"}, {"status": {"$exists": False}}]}
+
+HERBOUW_LEASE = timedelta(minutes=10)  # een gecrashte herbouw blokkeert niet langer dan dit
+HERBOUW_POLL_SECONDS = 0.2
+
+T = TypeVar("T")
+
+
+def periode_van(datum) -> str:
+    """Boekingsdatum (date/datetime/ISO-string) -> periode 'YYYY-MM'."""
+    if isinstance(datum, (date, datetime)):
+        return datum.strftime("%Y-%m")
+    if datum:
+        return str(datum)[:7]
+    return datetime.now(timezone.utc).strftime("%Y-%m")
+
+
+def saldo_voor_type(rekening_type: str, debet: float, credit: float) -> float:
+    """Bij activa en kosten: debet - credit. Bij passiva en opbrengsten: credit - debet."""
+    if (rekening_type or "").lower() in ["activa", "kosten"]:
+        return debet - credit
+    return credit - debet
+
+
+async def ensure_saldo_indexes(db):
+    await db[SALDO_COLLECTION].create_index(
+        [("user_id", 1), ("rekening_code", 1), ("periode", 1)], unique=True
+    )
+    await db[STATUS_COLLECTION].create_index("user_id", unique=True)
+
+
+def _mutaties_voor_post(journaalpost: dict) -> Dict[str, Dict[str, float]]:
+    """Tel debet/credit per rekeningcode op voor één journaalpost."""
+    mutaties: Dict[str, Dict[str, float]] = {}
+    for regel in journaalpost.get("regels", []):
+        code = regel.get("rekening_code") or regel.get("grootboek_code")
+        if not code:
+            continue
+        m = mutaties.setdefault(code, {"debet": 0.0, "credit": 0.0})
+        m["debet"] += float(regel.get("debet", 0) or 0)
+        m["credit"] += float(regel.get("credit", 0) or 0)
+    return mutaties
+
+
+def herbouw_actief(status: Optional[dict]) -> bool:
+    """Of het statusdocument een lopende herbouw (niet-verlopen lease `herbouw_tot`) heeft."""
+    tot = (status or {}).get("herbouw_tot")
+    if tot is None:
+        return False
+    if tot.tzinfo is None:
+        tot = tot.replace(tzinfo=timezone.utc)
+    return tot > datetime.now(timezone.utc)
+
+
+async def boek_saldo_mutaties(db, user_id: str, journaalpost: dict, teken: int = 1, session=None):
+    """Verwerk een geboekte journaalpost in de periode-aggregaten (teken=-1 om terug te draaien).
+    Botst de mutatie met een herbouw, dan telt de herbouw de post mee (zie module-docstring)."""
+    # Schrijven (niet alleen lezen) op het statusdocument: in een transactie botst een
+    # gelijktijdige lease-aanvraag van een herbouw dan als WriteConflict met deze boeking.
+    status = await db[STATUS_COLLECTION].find_one_and_update(
+        {"user_id": user_id}, {"$set": {"laatste_mutatie": datetime.now(timezone.utc)}},
+        projection={"_id": 0, "versie": 1, "herbouw_tot": 1}, session=session,
+    )
+    if status is None:
+        return  # Nog geen aggregaat: de eerste lezing bouwt het volledig op
+    if herbouw_actief(status):
+        await _vraag_herbouw_aan(db, user_id, session)
+        return
+
+    periode = periode_van(journaalpost.get("datum"))
+    now = datetime.now(timezone.utc)
+    ops = [
+        UpdateOne(
+            {"user_id": user_id, "rekening_code": code, "periode": periode},
+            {"$inc": {"debet": teken * m["debet"], "credit": teken * m["credit"], "aantal_regels": teken},
+             "$set": {"updated_at": now}},
+            upsert=True,
+        )
+        for code, m in _mutaties_voor_post(journaalpost).items()
+    ]
+    if not ops:
+        return
+    await db[SALDO_COLLECTION].bulk_write(ops, ordered=False, session=session)
+
+    if session is None:
+        # Zonder transactie kan een herbouw tussen controle en $inc zijn begonnen of klaar zijn
+        na = await db[STATUS_COLLECTION].find_one({"user_id": user_id}, {"_id": 0, "versie": 1, "herbouw_tot": 1})
+        if herbouw_actief(na) or (na or {}).get("versie") != status.get("versie"):
+            await _vraag_herbouw_aan(db, user_id, session)
+
+
+async def _vraag_herbouw_aan(db, user_id: str, session=None):
+    """Laat de lopende herbouw nog een ronde maken; loopt er geen (meer), herbouw dan zelf."""
+    result = await db[STATUS_COLLECTION].update_one(
+        {"user_id": user_id, "herbouw_tot": {"$gt": datetime.now(timezone.utc)}},
+        {"$set": {"opnieuw": True}},
+        session=session,
+    )
+    if result.matched_count == 0 and session is None:
+        await herbouw_saldo_aggregaat(db, user_id)
+    # In een transactie geeft een lease die net is vrijgegeven een WriteConflict op het
+    # statusdocument, waarna de transactie opnieuw wordt uitgevoerd.
+
+
+async def boek_rekening_saldi(db, user_id: str, regels: List[dict], teken: int = 1, session=None):
+    """Werk `saldo` van alle geraakte rekeningen bij met één bulk_write.
+    Rekeningen die niet bestaan worden overgeslagen, net als in update_rekening_saldo."""
+    mutaties = _mutaties_voor_post({"regels": regels})
+    if not mutaties:
+        return
+    schema = await get_rekeningschema(db, user_id)
+    if any(schema.by_code(code) is None for code in mutaties):
+        # Mogelijk net aangemaakt via een andere worker: schema één keer verversen
+        invalideer_rekeningschema(user_id)
+        schema = await get_rekeningschema(db, user_id)
+    types = {code: schema.type_van(code) for code in mutaties if schema.by_code(code)}
+    ops = [
+        UpdateOne(
+            {"user_id": user_id, "code": code},
+            {"$inc": {"saldo": teken * saldo_voor_type(types[code], m["debet"], m["credit"])}},
+        )
+        for code, m in mutaties.items() if code in types
+    ]
+    if ops:
+        await db.boekhouding_rekeningen.bulk_write(ops, ordered=False, session=session)
+
+
+async def verwerk_geboekte_journaalpost(db, user_id: str, journaalpost: dict, session=None):
+    """Periode-aggregaten en rekeningsaldi bijwerken voor een geboekte journaalpost."""
+    await boek_saldo_mutaties(db, user_id, journaalpost, session=session)
+    await boek_rekening_saldi(db, user_id, journaalpost.get("regels", []), session=session)
+
+
+_transacties_ondersteund: Optional[bool] = None
+
+
+async def _ondersteunt_transacties(db) -> bool:
+    """Transacties vereisen een replica set of mongos; standalone servers niet."""
+    global _transacties_ondersteund
+    if _transacties_ondersteund is None:
+        try:
+            hello = await db.client.admin.command("hello")
+            _transacties_ondersteund = bool(hello.get("setName") or hello.get("msg") == "isdbgrid")
+        except Exception:
+            _transacties_ondersteund = False
+    return _transacties_ondersteund
+
+
+async def in_boekings_transactie(db, werk: Callable[[Any], Awaitable[T]]) -> T:
+    """Voer `await werk(session)` uit in een transactie als de deployment dat ondersteunt,
+    anders met session=None. Gelijktijdige boekingen op dezelfde saldo-rijen laten een
+    transactie afbreken met TransientTransactionError (WriteConflict); with_transaction
+    voert `werk` dan opnieuw uit en herhaalt een commit met UnknownTransactionCommitResult.
+    `werk` kan dus meerdere keren draaien en mag alleen database-schrijfacties via de
+    sessie doen. Gebruik:
+
+        async def boek(session):
+            await db.boekhouding_journaalposten.insert_one(doc, session=session)
+        await in_boekings_transactie(db, boek)
+    """
+    if not await _ondersteunt_transacties(db):
+        return await werk(None)
+    async with await db.client.start_session() as session:
+        return await session.with_transaction(werk)
+
+
+async def _bereken_saldo_rijen(db, user_id: str) -> Dict[tuple, dict]:
+    """Debet/credit/aantal per (rekeningcode, periode) uit alle geboekte journaalposten.
+    Geen limiet op het aantal journaalposten: de optelling gebeurt in MongoDB."""
+    pipeline = [
+        {"$match": {"user_id": user_id, **GEBOEKT_FILTER}},
+        {"$unwind": "$regels"},
+        {"$project": {
+            "code": {"$ifNull": ["$regels.rekening_code", "$regels.grootboek_code"]},
+            "periode": {"$substrBytes": [{"$toString": "$datum"}, 0, 7]},
+            "debet": {"$toDouble": {"$ifNull": ["$regels.debet", 0]}},
+            "credit": {"$toDouble": {"$ifNull": ["$regels.credit", 0]}},
+        }},
+        {"$match": {"code": {"$nin": [None, ""]}}},
+        {"$group": {
+            "_id": {"code": "$code", "periode": "$periode"},
+            "debet": {"$sum": "$debet"},
+            "credit": {"$sum": "$credit"},
+            "aantal_regels": {"$sum": 1},
+        }},
+    ]
+    return {
+        (r["_id"]["code"], r["_id"]["periode"]): {
+            "debet": r["debet"], "credit": r["credit"], "aantal_regels": r["aantal_regels"],
+        }
+        async for r in db.boekhouding_journaalposten.aggregate(pipeline, allowDiskUse=True)
+    }
+
+
+async def _wacht_op_herbouw(db, user_id: str):
+    """Wacht tot een lopende herbouw klaar is (of zijn lease is verlopen)."""
+    while herbouw_actief(await db[STATUS_COLLECTION].find_one({"user_id": user_id}, {"_id": 0, "herbouw_tot": 1})):
+        await asyncio.sleep(HERBOUW_POLL_SECONDS)
+
+
+async def herbouw_saldo_aggregaat(db, user_id: str) -> int:
+    """Bouw de periode-aggregaten voor een gebruiker opnieuw op uit alle geboekte journaalposten.
+    Rijen worden per sleutel met $set geschreven; rijen die niet meer voorkomen worden
+    verwijderd. Loopt er al een herbouw voor deze gebruiker, dan wordt daarop gewacht.
+    Geeft het aantal aggregaat-rijen terug."""
+    token = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+    try:
+        await db[STATUS_COLLECTION].find_one_and_update(
+            {"user_id": user_id, "herbouw_tot": {"$not": {"$gt": now}}},
+            {"$set": {"herbouw_tot": now + HERBOUW_LEASE, "herbouw_token": token, "opnieuw": False},
+             "$inc": {"versie": 1}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # Een andere worker herbouwt al: diens resultaat gebruiken
+        await _wacht_op_herbouw(db, user_id)
+        return await db[SALDO_COLLECTION].count_documents({"user_id": user_id})
+
+    try:
+        return await _herbouw_rondes(db, user_id, token)
+    except BaseException:
+        # Lease direct vrijgeven zodat wachtende lezers en mutaties niet tot het einde
+        # van de lease blijven hangen; de volgende lezing herbouwt opnieuw.
+        await db[STATUS_COLLECTION].update_one(
+            {"user_id": user_id, "herbouw_token": {"$exists": True}},
+            {"$unset": {"herbouw_tot": "", "herbouw_token": "", "herbouwd_op": ""}},
+        )
+        raise
+
+
+async def _herbouw_rondes(db, user_id: str, token: str) -> int:
+    while True:
+        rijen = await _bereken_saldo_rijen(db, user_id)
+        now = datetime.now(timezone.utc)
+        ops = [
+            UpdateOne(
+                {"user_id": user_id, "rekening_code": code, "periode": periode},
+                {"$set": {**waarden, "herbouw_token": token, "updated_at": now}},
+                upsert=True,
+            )
+            for (code, periode), waarden in rijen.items()
+        ]
+        if ops:
+            await db[SALDO_COLLECTION].bulk_write(ops, ordered=False)
+        await db[SALDO_COLLECTION].delete_many({"user_id": user_id, "herbouw_token": {"$ne": token}})
+
+        # Lease alleen vrijgeven als er geen mutatie tussendoor is gevallen
+        klaar = await db[STATUS_COLLECTION].find_one_and_update(
+            {"user_id": user_id, "herbouw_token": token, "opnieuw": False},
+            {"$set": {"herbouwd_op": now, "rijen": len(rijen)}, "$unset": {"herbouw_tot": "", "herbouw_token": ""}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if klaar is not None:
+            return len(rijen)
+        # Nieuwe ronde met een nieuw token, zodat rijen van deze ronde niet als actueel gelden
+        vorig_token, token = token, str(uuid.uuid4())
+        bijgewerkt = await db[STATUS_COLLECTION].update_one(
+            {"user_id": user_id, "herbouw_token": vorig_token},
+            {"$set": {"opnieuw": False, "herbouw_token": token, "herbouw_tot": now + HERBOUW_LEASE},
+             "$inc": {"versie": 1}},
+        )
+        if bijgewerkt.matched_count == 0:
+            return len(rijen)  # Lease verlopen en door een andere herbouw overgenomen
+
+
+async def get_saldi_per_rekening(
+    db, user_id: str, van: Optional[str] = None, tot: Optional[str] = None
+) -> Dict[str, Dict[str, float]]:
+    """Debet/credit totalen per rekeningcode, optioneel beperkt tot periodes van..tot (YYYY-MM).
+    Bouwt het aggregaat eenmalig op voor gebruikers die nog geen aggregaat hebben."""
+    projectie = {"_id": 0, "herbouwd_op": 1, "herbouw_tot": 1}
+    status = await db[STATUS_COLLECTION].find_one({"user_id": user_id}, projectie)
+    if herbouw_actief(status):
+        await _wacht_op_herbouw(db, user_id)
+        status = await db[STATUS_COLLECTION].find_one({"user_id": user_id}, projectie)
+    if not status or not status.get("herbouwd_op"):
+        await herbouw_saldo_aggregaat(db, user_id)
+
+    match = {"user_id": user_id}
+    if van or tot:
+        match["periode"] = {}
+        if van:
+            match["periode"]["$gte"] = van[:7]
+        if tot:
+            match["periode"]["$lte"] = tot[:7]
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$rekening_code", "debet": {"$sum": "$debet"}, "credit": {"$sum": "$credit"}}},
+    ]
+    return {
+        r["_id"]: {"debet": r["debet"], "credit": r["credit"]}
+        async for r in db[SALDO_COLLECTION].aggregate(pipeline)
+    }
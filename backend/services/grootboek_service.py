@@ -9,6 +9,10 @@ from typing import Dict, Optional
 import uuid
 from fastapi import HTTPException
 
+from services.grootboek_saldi import verwerk_geboekte_journaalpost, in_boekings_transactie
+from services.nummer_reeksen import volgend_volgnummer
+from services.rekeningschema import get_rekeningschema
+
 # MongoDB connection is injected from the router
 db = None
 
@@ -57,67 +61,9 @@ async def get_rekening_by_code(user_id: str, code: str) -> dict:
 
 
 async def get_rekening_voor_type(user_id: str, rekening_type: str) -> str:
-    """Zoek een geschikte rekeningcode voor een bepaald type boeking"""
-    
-    # Type mapping met verwacht grootboek type en zoektermen
-    type_mapping = {
-        "debiteuren": ("activa", ["debiteur"]),
-        "crediteuren": ("passiva", ["crediteur"]),
-        "btw_verkoop": ("passiva", ["btw te betalen", "btw af te dragen"]),
-        "btw_inkoop": ("activa", ["btw te vorderen", "voorbelasting", "btw voorheffing"]),
-        "omzet": ("omzet", ["omzet verkop", "omzet dienst", "omzet export"]),
-        "inkoop": ("kosten", ["inkoop", "inkoopwaarde"]),
-        "bank": ("activa", ["bank"]),
-        "kas": ("activa", ["kas"]),
-        "voorraad": ("activa", ["voorraad"])
-    }
-    
-    # STAP 1: Zoek eerst op basis van naam EN type (meest nauwkeurig)
-    if rekening_type in type_mapping:
-        verwacht_type, zoekterms = type_mapping[rekening_type]
-        for term in zoekterms:
-            rekening = await db.boekhouding_rekeningen.find_one({
-                "user_id": user_id, 
-                "naam": {"$regex": term, "$options": "i"},
-                "type": verwacht_type
-            })
-            if rekening:
-                return rekening.get("code")
-    
-    # STAP 2: Probeer de standaard code (werkt alleen als rekening bestaat)
-    standaard_code = DEFAULT_REKENINGEN.get(rekening_type)
-    if standaard_code:
-        rekening = await get_rekening_by_code(user_id, standaard_code)
-        if rekening:
-            # Controleer of het type klopt
-            if rekening_type in type_mapping:
-                verwacht_type = type_mapping[rekening_type][0]
-                if rekening.get("type") == verwacht_type:
-                    return standaard_code
-    
-    # STAP 3: Probeer alternatieve codes
-    alternatieven = ALTERNATIEVE_CODES.get(rekening_type, [])
-    for code in alternatieven:
-        rekening = await get_rekening_by_code(user_id, code)
-        if rekening:
-            # Controleer of het type klopt
-            if rekening_type in type_mapping:
-                verwacht_type = type_mapping[rekening_type][0]
-                if rekening.get("type") == verwacht_type:
-                    return code
-    
-    # STAP 4: Fallback - zoek op type alleen
-    if rekening_type in type_mapping:
-        verwacht_type = type_mapping[rekening_type][0]
-        rekening = await db.boekhouding_rekeningen.find_one({
-            "user_id": user_id, 
-            "type": verwacht_type
-        })
-        if rekening:
-            return rekening.get("code")
-    
-    # Laatste fallback
-    return standaard_code
+    """Zoek een geschikte rekeningcode voor een bepaald type boeking (via het gecachte rekeningschema)"""
+    schema = await get_rekeningschema(db, user_id)
+    return schema.voor_type(rekening_type, DEFAULT_REKENINGEN, ALTERNATIEVE_CODES)
 
 
 async def update_rekening_saldo(user_id: str, code: str, bedrag: float, is_debet: bool = True):
@@ -168,8 +114,7 @@ async def create_auto_journaalpost(
         raise HTTPException(status_code=400, detail=f"Journaalpost niet in balans: debet={totaal_debet}, credit={totaal_credit}")
     
     # Genereer volgnummer
-    count = await db.boekhouding_journaalposten.count_documents({"user_id": user_id, "dagboek_code": dagboek_code})
-    volgnummer = f"{dagboek_code}{datetime.now().year}-{count + 1:05d}"
+    volgnummer = await volgend_volgnummer(db, user_id, dagboek_code)
     
     journaalpost = {
         "id": str(uuid.uuid4()),
@@ -187,18 +132,12 @@ async def create_auto_journaalpost(
         "auto_generated": True
     }
     
-    await db.boekhouding_journaalposten.insert_one(journaalpost)
-    
-    # Update rekening saldi als auto_boeken
-    if auto_boeken:
-        for regel in regels:
-            code = regel.get("rekening_code")
-            debet = regel.get("debet", 0)
-            credit = regel.get("credit", 0)
-            if debet > 0:
-                await update_rekening_saldo(user_id, code, debet, is_debet=True)
-            if credit > 0:
-                await update_rekening_saldo(user_id, code, credit, is_debet=False)
+    # Journaalpost + saldi in één transactie (indien ondersteund), saldi met één bulk_write
+    async def boek(session):
+        await db.boekhouding_journaalposten.insert_one(journaalpost, session=session)
+        if auto_boeken:
+            await verwerk_geboekte_journaalpost(db, user_id, journaalpost, session=session)
+    await in_boekings_transactie(db, boek)
     
     return journaalpost
 
@@ -0,0 +1,139 @@
+"""
+Index registry - Declarative MongoDB indexes per collection
+===========================================================
+Modules declare the indexes their queries need next to the code that runs them:
+
+    register_indexes("suribet_dagstaten", [("user_id", 1), ("date", -1)])
+    register_query("suribet dagstaten per periode", "suribet_dagstaten",
+                   {"user_id": "x", "date": {"$gte": "2024-01-01"}}, sort=[("date", -1)])
+
+`ensure_registered_indexes(db)` creates everything at startup. It is idempotent (an
+existing index with the same keys is a no-op) and an index that conflicts with an
+existing one is logged and skipped instead of failing startup.
+
+`explain_registered_queries(db)` runs explain() (queryPlanner, the query is not executed)
+for every registered query and flags collection scans and in-memory sorts.
+
+CLI:
+    python -m services.indexes apply     # create the registered indexes
+    python -m services.indexes explain   # report collection scans
+"""
+
+import asyncio
+import importlib
+import logging
+import sys
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+IndexKeys = Sequence[Tuple[str, int]]
+
+_indexes: "OrderedDict[str, List[IndexModel]]" = OrderedDict()
+_queries: List[dict] = []
+
+
+def register_indexes(collection: str, *indexes):
+    """Declare indexes for a collection. Each index is a key list (`[("user_id", 1), ("date", -1)]`),
+    a single field name, or an IndexModel for indexes with options."""
+    models = _indexes.setdefault(collection, [])
+    existing = {tuple(m.document["key"].items()) for m in models}
+    for index in indexes:
+        if not isinstance(index, IndexModel):
+            index = IndexModel([(index, 1)] if isinstance(index, str) else list(index))
+        if tuple(index.document["key"].items()) not in existing:
+            existing.add(tuple(index.document["key"].items()))
+            models.append(index)
+
+
+def register_query(name: str, collection: str, query_filter: dict, sort: Optional[IndexKeys] = None):
+    """Declare a representative query for the explain() report. Values only need the right shape."""
+    _queries.append({"name": name, "collection": collection, "filter": query_filter, "sort": list(sort or [])})
+
+
+def registered_indexes() -> Dict[str, List[dict]]:
+    return {coll: [dict(m.document["key"]) for m in models] for coll, models in _indexes.items()}
+
+
+async def ensure_registered_indexes(db) -> dict:
+    """Create all registered indexes. Returns {"created": n, "failed": [..]}."""
+    created, failed = 0, []
+    for collection, models in _indexes.items():
+        for model in models:
+            try:
+                await db[collection].create_indexes([model])
+                created += 1
+            except OperationFailure as e:
+                # Usually an existing index on the same keys with another name or options
+                failed.append({"collection": collection, "keys": dict(model.document["key"]), "error": str(e)})
+                logger.warning(f"Index {collection} {dict(model.document['key'])} skipped: {e}")
+    logger.info(f"Registered indexes ensured: {created} ok, {len(failed)} skipped")
+    return {"created": created, "failed": failed}
+
+
+def _plan_stages(plan: dict) -> List[dict]:
+    stages = [plan]
+    for child in plan.get("inputStages", []) + [plan[k] for k in ("inputStage", "queryPlan") if k in plan]:
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+async def explain_query(db, query: dict) -> dict:
+    command = {"find": query["collection"], "filter": query["filter"]}
+    if query["sort"]:
+        command["sort"] = dict(query["sort"])
+    result = {"name": query["name"], "collection": query["collection"]}
+    try:
+        explained = await db.command("explain", command, verbosity="queryPlanner")
+    except OperationFailure as e:
+        return {**result, "error": str(e)}
+    stages = _plan_stages(explained["queryPlanner"]["winningPlan"])
+    names = [s.get("stage") for s in stages]
+    return {
+        **result,
+        "stages": names,
+        "indexes": [s["indexName"] for s in stages if s.get("indexName")],
+        "collscan": "COLLSCAN" in names,
+        "in_memory_sort": "SORT" in names,
+    }
+
+
+async def explain_registered_queries(db) -> List[dict]:
+    """explain() every registered query; collection scans first."""
+    report = [await explain_query(db, q) for q in _queries]
+    return sorted(report, key=lambda r: (not r.get("collscan"), not r.get("in_memory_sort"), r["name"]))
+
+
+def _load_declarations():
+    """Import the modules that register indexes (they declare them at import time)."""
+    importlib.import_module("server")  # imports all routers
+
+
+async def _main(command: str) -> int:
+    from services.database import db
+    _load_declarations()
+    if command == "apply":
+        result = await ensure_registered_indexes(db)
+        print(f"{result['created']} indexes ensured, {len(result['failed'])} skipped")
+        for f in result["failed"]:
+            print(f"  SKIPPED {f['collection']} {f['keys']}: {f['error']}")
+        return 1 if result["failed"] else 0
+    report = await explain_registered_queries(db)
+    for r in report:
+        if "error" in r:
+            flag = "ERROR"
+        else:
+            flag = "COLLSCAN" if r["collscan"] else ("SORT" if r["in_memory_sort"] else "ok")
+        print(f"{flag:9s} {r['collection']:32s} {r['name']}  {r.get('indexes') or r.get('error', '')}")
+    return 1 if any(r.get("collscan") for r in report) else 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ("apply", "explain"):
+        print("Gebruik: python -m services.indexes apply|explain")
+        sys.exit(2)
+    sys.exit(asyncio.run(_main(sys.argv[1])))
@@ -3,10 +3,12 @@ MT940 Parser Module - Verbeterde bankimport parsing
 """
 import re
 from datetime import datetime, date
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator
 from dataclasses import dataclass
 import mt940
 
+from services.reconciliatie import score_match
+
 
 @dataclass
 class MT940Transaction:
@@ -119,21 +121,49 @@ def parse_mt940_manual(content: bytes) -> List[MT940Statement]:
     except:
         content_str = content.decode('latin-1')
     
-    statements = []
+    return list(iter_mt940_statements(content_str.split('\n')))
+
+
+def iter_mt940_statements(lines: Iterable[str]) -> Iterator[MT940Statement]:
+    """
+    Incrementele handmatige MT940 parser: leest regel voor regel en levert elk
+    afschrift zodra het volgende begint, zodat grote bestanden niet in hun geheel
+    als tekst in het geheugen hoeven te staan.
+    """
     current_statement = None
     current_transactions = []
+    tx_data = None          # :61: regel die nog op zijn :86: omschrijving wacht
+    omschrijving = None     # verzamelde :86: regels
     
-    lines = content_str.split('\n')
-    i = 0
+    def flush_tx():
+        nonlocal tx_data, omschrijving
+        if tx_data is not None:
+            transactie = _parse_61(tx_data, " ".join(omschrijving or []))
+            if transactie:
+                current_transactions.append(transactie)
+        tx_data = None
+        omschrijving = None
     
-    while i < len(lines):
-        line = lines[i].strip()
+    for raw in lines:
+        line = raw.strip()
+        
+        # Vervolgregels van een :86: omschrijving
+        if omschrijving is not None and not line.startswith(':'):
+            omschrijving.append(line)
+            continue
+        
+        # :86: direct na een :61: hoort bij die transactie
+        if line.startswith(':86:') and tx_data is not None and omschrijving is None:
+            omschrijving = [line[4:]]
+            continue
+        
+        flush_tx()
         
         # Begin nieuw statement
         if line.startswith(':20:'):
             if current_statement:
                 current_statement.transacties = current_transactions
-                statements.append(current_statement)
+                yield current_statement
             current_statement = MT940Statement(
                 rekeningnummer="",
                 valuta="SRD",
@@ -174,72 +204,67 @@ def parse_mt940_manual(content: bytes) -> List[MT940Statement]:
                 except:
                     pass
         
-        # Transactie
+        # Transactie (omschrijving volgt mogelijk op de volgende regel)
         elif line.startswith(':61:'):
             tx_data = line[4:]
-            omschrijving = ""
-            
-            # Kijk naar volgende regel voor omschrijving
-            if i + 1 < len(lines) and lines[i + 1].strip().startswith(':86:'):
-                i += 1
-                omschrijving = lines[i].strip()[4:]
-                # Verzamel meerdere regels
-                while i + 1 < len(lines) and not lines[i + 1].strip().startswith(':'):
-                    i += 1
-                    omschrijving += " " + lines[i].strip()
-            
-            try:
-                # Parse transactie: YYMMDD[YYMMDD]C/D bedrag N...
-                datum_str = tx_data[:6]
-                datum = datetime.strptime(f"20{datum_str}", "%Y%m%d").date()
-                
-                # Vind C/D indicator
-                cd_pos = 6
-                if len(tx_data) > 12 and tx_data[6:12].isdigit():
-                    cd_pos = 12  # Valutadatum aanwezig
-                
-                sign = 1 if tx_data[cd_pos] == 'C' else -1
-                
-                # Parse bedrag
-                bedrag_match = re.search(r'[CD](\d+[,.]?\d*)', tx_data[cd_pos:])
-                bedrag = 0
-                if bedrag_match:
-                    bedrag = sign * float(bedrag_match.group(1).replace(',', '.'))
-                
-                # Parse tegenrekening uit omschrijving
-                tegenrekening = None
-                tegenpartij = None
-                iban_match = re.search(r'([A-Z]{2}\d{2}[A-Z0-9]{4,30})', omschrijving)
-                if iban_match:
-                    tegenrekening = iban_match.group(1)
-                
-                naam_match = re.search(r'(?:NAME:|NAAM:)\s*([^/]+)', omschrijving, re.IGNORECASE)
-                if naam_match:
-                    tegenpartij = naam_match.group(1).strip()
-                
-                transactie = MT940Transaction(
-                    datum=datum,
-                    valutadatum=None,
-                    bedrag=bedrag,
-                    omschrijving=omschrijving.strip(),
-                    tegenrekening=tegenrekening,
-                    tegenpartij=tegenpartij,
-                    referentie=None,
-                    boekcode=None,
-                    raw_data=tx_data
-                )
-                current_transactions.append(transactie)
-            except Exception as e:
-                pass
-        
-        i += 1
+    
+    flush_tx()
     
     # Laatste statement toevoegen
     if current_statement:
         current_statement.transacties = current_transactions
-        statements.append(current_statement)
-    
-    return statements
+        yield current_statement
+
+
+def _parse_61(tx_data: str, omschrijving: str) -> Optional[MT940Transaction]:
+    """Parse een :61: regel: YYMMDD[MMDD]C/D bedrag N... [klantreferentie][//bankreferentie]"""
+    try:
+        datum_str = tx_data[:6]
+        datum = datetime.strptime(f"20{datum_str}", "%Y%m%d").date()
+        
+        # Vind C/D indicator (na de optionele 4-cijferige boekdatum MMDD)
+        cd_pos = 6
+        if tx_data[6:10].isdigit():
+            cd_pos = 10
+        
+        sign = 1 if tx_data[cd_pos] == 'C' else -1
+        
+        # Parse bedrag
+        bedrag_match = re.search(r'[CD](\d+[,.]?\d*)', tx_data[cd_pos:])
+        bedrag = 0
+        referentie = None
+        if bedrag_match:
+            bedrag = sign * float(bedrag_match.group(1).replace(',', '.'))
+            # Klantreferentie: na de 4-tekens transactiecode (bijv. NTRF) tot '//'
+            rest = tx_data[cd_pos + bedrag_match.end():]
+            ref_match = re.match(r'[A-Z]\w{3}([^/]*)', rest)
+            if ref_match and ref_match.group(1).strip() and ref_match.group(1).strip() != 'NONREF':
+                referentie = ref_match.group(1).strip()
+        
+        # Parse tegenrekening uit omschrijving
+        tegenrekening = None
+        tegenpartij = None
+        iban_match = re.search(r'([A-Z]{2}\d{2}[A-Z0-9]{4,30})', omschrijving)
+        if iban_match:
+            tegenrekening = iban_match.group(1)
+        
+        naam_match = re.search(r'(?:NAME:|NAAM:)\s*([^/]+)', omschrijving, re.IGNORECASE)
+        if naam_match:
+            tegenpartij = naam_match.group(1).strip()
+        
+        return MT940Transaction(
+            datum=datum,
+            valutadatum=None,
+            bedrag=bedrag,
+            omschrijving=omschrijving.strip(),
+            tegenrekening=tegenrekening,
+            tegenpartij=tegenpartij,
+            referentie=referentie,
+            boekcode=None,
+            raw_data=tx_data
+        )
+    except Exception:
+        return None
 
 
 def suggest_reconciliation(
@@ -261,51 +286,9 @@ def suggest_reconciliation(
     suggestions = []
     
     for factuur in openstaande_facturen:
-        confidence = 0
-        match_details = []
-        
-        factuur_bedrag = factuur.get('openstaand_bedrag', 0)
-        tx_bedrag = abs(transactie.bedrag)
-        
-        # Bedrag matching (0-50 punten)
-        if abs(factuur_bedrag - tx_bedrag) <= tolerantie:
-            confidence += 50
-            match_details.append("Exact bedrag match")
-        elif abs(factuur_bedrag - tx_bedrag) <= factuur_bedrag * 0.01:  # 1% tolerantie
-            confidence += 40
-            match_details.append("Bedrag binnen 1%")
-        elif abs(factuur_bedrag - tx_bedrag) <= factuur_bedrag * 0.05:  # 5% tolerantie
-            confidence += 20
-            match_details.append("Bedrag binnen 5%")
-        
-        # Factuurnummer in omschrijving (0-30 punten)
-        factuurnummer = factuur.get('factuurnummer', '') or factuur.get('intern_nummer', '')
-        if factuurnummer and factuurnummer.lower() in transactie.omschrijving.lower():
-            confidence += 30
-            match_details.append(f"Factuurnummer '{factuurnummer}' gevonden")
-        
-        # Klantnaam/leveranciersnaam matching (0-20 punten)
-        naam = factuur.get('debiteur_naam') or factuur.get('crediteur_naam', '')
-        if naam:
-            naam_lower = naam.lower()
-            if transactie.tegenpartij and naam_lower in transactie.tegenpartij.lower():
-                confidence += 20
-                match_details.append(f"Naam '{naam}' match in tegenpartij")
-            elif naam_lower in transactie.omschrijving.lower():
-                confidence += 15
-                match_details.append(f"Naam '{naam}' gevonden in omschrijving")
-        
-        # Alleen suggesties met minimaal 30% confidence
-        if confidence >= 30:
-            suggestions.append({
-                "factuur_id": factuur.get('id'),
-                "factuurnummer": factuurnummer,
-                "factuur_bedrag": factuur_bedrag,
-                "transactie_bedrag": tx_bedrag,
-                "confidence": min(confidence, 100),
-                "match_details": match_details,
-                "type": factuur.get('type', 'verkoop')
-            })
+        match = score_match(transactie.bedrag, transactie.omschrijving, transactie.tegenpartij, factuur, tolerantie)
+        if match:
+            suggestions.append(match)
     
     # Sorteer op confidence
     suggestions.sort(key=lambda x: x['confidence'], reverse=True)
@@ -0,0 +1,85 @@
+"""
+Nummer Reeksen - Atomische volgnummers voor journaalposten en documenten
+========================================================================
+Eén teller-document per (gebruiker, prefix) in `boekhouding_nummer_reeksen`.
+De prefix bevat dagboek/documentsoort en jaar (bijv. "VK2026-", "VF2026-"),
+zodat elke reeks per jaar opnieuw begint. Een nummer uitgeven is één
+`find_one_and_update` met `$inc`: geen count_documents meer en geen dubbele
+nummers bij gelijktijdige boekingen.
+
+Bestaande gebruikers: bij het eerste gebruik van een reeks wordt de teller
+gezaaid met het hoogste bestaande nummer met dezelfde prefix.
+"""
+
+import re
+from datetime import datetime
+from typing import List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+REEKS_COLLECTION = "boekhouding_nummer_reeksen"
+BREEDTE = 5
+
+
+async def _hoogste_bestaande(db, user_id: str, prefix: str, collectie: str, veld: str) -> int:
+    """Hoogste numerieke suffix van bestaande documenten met deze prefix (0 als er geen zijn)."""
+    laatste = await db[collectie].find_one(
+        {"user_id": user_id, veld: {"$regex": f"^{re.escape(prefix)}"}},
+        {"_id": 0, veld: 1},
+        sort=[(veld, -1)],
+    )
+    if not laatste:
+        return 0
+    try:
+        return int(str(laatste[veld])[len(prefix):])
+    except ValueError:
+        return 0
+
+
+async def reserveer_nummers(
+    db, user_id: str, prefix: str, collectie: str, veld: str, aantal: int = 1, breedte: int = BREEDTE
+) -> List[str]:
+    """Reserveer `aantal` opeenvolgende nummers uit de reeks `prefix` in één atomische stap.
+
+    `collectie`/`veld` wijzen naar de documenten die deze nummers dragen; ze worden
+    alleen gebruikt om een nieuwe teller te zaaien.
+    """
+    if aantal < 1:
+        return []
+    key = f"{user_id}|{prefix}"
+    for _ in range(2):
+        teller = await db[REEKS_COLLECTION].find_one_and_update(
+            {"_id": key},
+            {"$inc": {"waarde": aantal}, "$set": {"updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if teller:
+            einde = teller["waarde"]
+            return [f"{prefix}{n:0{breedte}d}" for n in range(einde - aantal + 1, einde + 1)]
+        # Eerste gebruik: zaai de teller; bij een gelijktijdige zaaiing wint de eerste
+        start = await _hoogste_bestaande(db, user_id, prefix, collectie, veld)
+        try:
+            await db[REEKS_COLLECTION].insert_one({
+                "_id": key, "user_id": user_id, "prefix": prefix, "waarde": start,
+                "updated_at": datetime.utcnow(),
+            })
+        except DuplicateKeyError:
+            pass
+    raise RuntimeError(f"Nummerreeks {prefix} kon niet worden opgehaald")
+
+
+async def volgend_nummer(db, user_id: str, prefix: str, collectie: str, veld: str, breedte: int = BREEDTE) -> str:
+    return (await reserveer_nummers(db, user_id, prefix, collectie, veld, 1, breedte))[0]
+
+
+async def reserveer_volgnummers(db, user_id: str, dagboek_code: str, aantal: int = 1, jaar: Optional[int] = None) -> List[str]:
+    """Blok journaalpost-volgnummers voor een dagboek, bijv. VK2026-00001 .. VK2026-00050."""
+    jaar = jaar or datetime.now().year
+    return await reserveer_nummers(
+        db, user_id, f"{dagboek_code}{jaar}-", "boekhouding_journaalposten", "volgnummer", aantal
+    )
+
+
+async def volgend_volgnummer(db, user_id: str, dagboek_code: str, jaar: Optional[int] = None) -> str:
+    return (await reserveer_volgnummers(db, user_id, dagboek_code, 1, jaar))[0]
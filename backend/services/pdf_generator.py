@@ -2,10 +2,23 @@
 PDF Generator Module - Professionele factuur PDFs
 Met moderne, clean design gebaseerd op Nederlandse facturatiestandaarden
 Inclusief decoratieve diagonale strepen in groen/donkerblauw thema
+
+Batch: `stream_invoice_pdf_zip` rendert veel facturen parallel in een process pool
+(PDF_BATCH_WORKERS processen) en streamt ze als ZIP-archief terug terwijl ze klaar komen.
+Hoogstens PDF_BATCH_MAX_REQUESTS batch-downloads tegelijk; daarboven PdfBatchBusy.
 """
+import asyncio
 import io
+import multiprocessing
+import os
+import re
+import weakref
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Dict, Any, Optional, AsyncIterable, AsyncIterator, Tuple
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -83,53 +96,12 @@ class InvoicePDFCanvas(canvas.Canvas):
         self.drawPath(p2, fill=1, stroke=0)
 
 
-def generate_invoice_pdf(
-    factuur: Dict[str, Any],
-    bedrijf: Dict[str, Any],
-    debiteur: Optional[Dict[str, Any]] = None,
-    template_settings: Optional[Dict[str, Any]] = None
-) -> bytes:
-    """
-    Genereer professionele factuur PDF met modern design
-    
-    Design kenmerken:
-    - Logo met initialen in groene cirkel
-    - Bedrijfsnaam naast logo
-    - FACTUUR titel prominent
-    - Donkerblauwe diagonale streep rechtsboven
-    - Groene diagonale streep rechtsonder
-    - Tabel met groene header
-    - Betalingsvoorwaarden sectie
-    - Totaal met groene achtergrond
-    - Handtekening sectie
-    """
-    buffer = io.BytesIO()
-    
-    # Get template settings with defaults
-    settings = template_settings or {}
-    
-    # Brand kleuren
-    accent_color = settings.get('factuur_primaire_kleur', BRAND_GREEN)
-    secondary_color = settings.get('factuur_secundaire_kleur', BRAND_NAVY)
-    
-    # Setup document met custom canvas
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=15*mm,
-        leftMargin=15*mm,
-        topMargin=15*mm,
-        bottomMargin=20*mm
-    )
-    
-    # Custom canvas builder
-    def make_canvas(*args, **kwargs):
-        return InvoicePDFCanvas(*args, accent_color=accent_color, secondary_color=secondary_color, **kwargs)
-    
-    # Styles
+@lru_cache(maxsize=64)
+def _invoice_styles(accent_color: str) -> Dict[str, ParagraphStyle]:
+    """Paragraph styles van de factuur, eenmaal opgebouwd per huisstijl (accentkleur).
+    De styles worden alleen gelezen tijdens het renderen en kunnen dus gedeeld worden."""
     styles = getSampleStyleSheet()
     
-    # Custom styles
     company_name_style = ParagraphStyle(
         'CompanyName',
         parent=styles['Normal'],
@@ -224,6 +196,92 @@ def generate_invoice_pdf(
         leading=12
     )
     
+    return {
+        'company_name': company_name_style,
+        'company_info': company_info_style,
+        'title': title_style,
+        'section_label': section_label_style,
+        'value': value_style,
+        'value_right': ParagraphStyle('Right', parent=value_style, alignment=TA_RIGHT),
+        'small_label': small_label_style,
+        'client_name': client_name_style,
+        'client_info': client_info_style,
+        'table_header': table_header_style,
+        'table_header_right': ParagraphStyle('RightHeader', parent=table_header_style, alignment=TA_RIGHT),
+        'table_header_center': ParagraphStyle('RightHeader', parent=table_header_style, alignment=TA_CENTER),
+        'table_cell': table_cell_style,
+        'table_cell_right': ParagraphStyle('RightCell', parent=table_cell_style, alignment=TA_RIGHT),
+        'table_cell_center': ParagraphStyle('CenterCell', parent=table_cell_style, alignment=TA_CENTER),
+        'total_label': total_label_style,
+        'logo': ParagraphStyle('Logo', alignment=TA_CENTER),
+        'grand_total_label': ParagraphStyle('TotalLabel', fontSize=10, textColor=colors.white),
+        'grand_total_value': ParagraphStyle('TotalValue', fontSize=12, textColor=colors.white, alignment=TA_RIGHT),
+        'footer': ParagraphStyle(
+            'FooterInfo',
+            parent=styles['Normal'],
+            fontSize=7,
+            textColor=colors.HexColor(TEXT_LIGHT),
+            alignment=TA_CENTER
+        ),
+    }
+
+
+def generate_invoice_pdf(
+    factuur: Dict[str, Any],
+    bedrijf: Dict[str, Any],
+    debiteur: Optional[Dict[str, Any]] = None,
+    template_settings: Optional[Dict[str, Any]] = None
+) -> bytes:
+    """
+    Genereer professionele factuur PDF met modern design
+    
+    Design kenmerken:
+    - Logo met initialen in groene cirkel
+    - Bedrijfsnaam naast logo
+    - FACTUUR titel prominent
+    - Donkerblauwe diagonale streep rechtsboven
+    - Groene diagonale streep rechtsonder
+    - Tabel met groene header
+    - Betalingsvoorwaarden sectie
+    - Totaal met groene achtergrond
+    - Handtekening sectie
+    """
+    buffer = io.BytesIO()
+    
+    # Get template settings with defaults
+    settings = template_settings or {}
+    
+    # Brand kleuren
+    accent_color = settings.get('factuur_primaire_kleur', BRAND_GREEN)
+    secondary_color = settings.get('factuur_secundaire_kleur', BRAND_NAVY)
+    
+    # Setup document met custom canvas
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=15*mm,
+        leftMargin=15*mm,
+        topMargin=15*mm,
+        bottomMargin=20*mm
+    )
+    
+    # Custom canvas builder
+    def make_canvas(*args, **kwargs):
+        return InvoicePDFCanvas(*args, accent_color=accent_color, secondary_color=secondary_color, **kwargs)
+    
+    # Styles (gecached per accentkleur)
+    st = _invoice_styles(accent_color)
+    company_name_style = st['company_name']
+    title_style = st['title']
+    section_label_style = st['section_label']
+    value_style = st['value']
+    small_label_style = st['small_label']
+    client_name_style = st['client_name']
+    client_info_style = st['client_info']
+    table_header_style = st['table_header']
+    table_cell_style = st['table_cell']
+    total_label_style = st['total_label']
+    
     # Build content
     content = []
     
@@ -233,8 +291,7 @@ def generate_invoice_pdf(
     
     # Logo als cirkel met initialen (gesimuleerd met tabel)
     logo_circle = Table(
-        [[Paragraph(f"<font color='white' size='14'><b>{initialen}</b></font>", 
-                   ParagraphStyle('Logo', alignment=TA_CENTER))]],
+        [[Paragraph(f"<font color='white' size='14'><b>{initialen}</b></font>", st['logo'])]],
         colWidths=[12*mm],
         rowHeights=[12*mm]
     )
@@ -322,10 +379,10 @@ def generate_invoice_pdf(
     # Header met groene achtergrond
     table_header = [
         Paragraph("OMSCHRIJVING", table_header_style),
-        Paragraph("PRIJS", ParagraphStyle('RightHeader', parent=table_header_style, alignment=TA_RIGHT)),
-        Paragraph("AANTAL", ParagraphStyle('RightHeader', parent=table_header_style, alignment=TA_CENTER)),
-        Paragraph("BTW", ParagraphStyle('RightHeader', parent=table_header_style, alignment=TA_CENTER)),
-        Paragraph("TOTAAL", ParagraphStyle('RightHeader', parent=table_header_style, alignment=TA_RIGHT)),
+        Paragraph("PRIJS", st['table_header_right']),
+        Paragraph("AANTAL", st['table_header_center']),
+        Paragraph("BTW", st['table_header_center']),
+        Paragraph("TOTAAL", st['table_header_right']),
     ]
     
     regels_data = [table_header]
@@ -347,10 +404,10 @@ def generate_invoice_pdf(
         
         regels_data.append([
             Paragraph(omschrijving, table_cell_style),
-            Paragraph(format_currency(prijs, valuta), ParagraphStyle('RightCell', parent=table_cell_style, alignment=TA_RIGHT)),
-            Paragraph(str(aantal), ParagraphStyle('CenterCell', parent=table_cell_style, alignment=TA_CENTER)),
-            Paragraph(f"{btw_perc}%", ParagraphStyle('CenterCell', parent=table_cell_style, alignment=TA_CENTER)),
-            Paragraph(format_currency(bedrag_incl, valuta), ParagraphStyle('RightCell', parent=table_cell_style, alignment=TA_RIGHT)),
+            Paragraph(format_currency(prijs, valuta), st['table_cell_right']),
+            Paragraph(str(aantal), st['table_cell_center']),
+            Paragraph(f"{btw_perc}%", st['table_cell_center']),
+            Paragraph(format_currency(bedrag_incl, valuta), st['table_cell_right']),
         ])
     
     # Tabel styling met groene header
@@ -410,9 +467,9 @@ def generate_invoice_pdf(
     # Totalen rechts
     totaal_rows = [
         [Paragraph("Subtotaal", total_label_style), 
-         Paragraph(format_currency(subtotaal, valuta), ParagraphStyle('Right', parent=value_style, alignment=TA_RIGHT))],
+         Paragraph(format_currency(subtotaal, valuta), st['value_right'])],
         [Paragraph("BTW", total_label_style), 
-         Paragraph(format_currency(btw_bedrag, valuta), ParagraphStyle('Right', parent=value_style, alignment=TA_RIGHT))],
+         Paragraph(format_currency(btw_bedrag, valuta), st['value_right'])],
     ]
     
     totaal_subtable = Table(totaal_rows, colWidths=[40*mm, 40*mm])
@@ -424,8 +481,8 @@ def generate_invoice_pdf(
     
     # Groot totaal met groene achtergrond
     grand_total_cell = Table(
-        [[Paragraph(f"<b>TOTAAL</b>", ParagraphStyle('TotalLabel', fontSize=10, textColor=colors.white)),
-          Paragraph(f"<b>{format_currency(totaal, valuta)}</b>", ParagraphStyle('TotalValue', fontSize=12, textColor=colors.white, alignment=TA_RIGHT))]],
+        [[Paragraph(f"<b>TOTAAL</b>", st['grand_total_label']),
+          Paragraph(f"<b>{format_currency(totaal, valuta)}</b>", st['grand_total_value'])]],
         colWidths=[40*mm, 40*mm]
     )
     grand_total_cell.setStyle(TableStyle([
@@ -490,14 +547,7 @@ def generate_invoice_pdf(
     if footer_info:
         content.append(Spacer(1, 10*mm))
         footer_text = ' | '.join(footer_info)
-        footer_style = ParagraphStyle(
-            'FooterInfo',
-            parent=styles['Normal'],
-            fontSize=7,
-            textColor=colors.HexColor(TEXT_LIGHT),
-            alignment=TA_CENTER
-        )
-        content.append(Paragraph(footer_text, footer_style))
+        content.append(Paragraph(footer_text, st['footer']))
     
     # Build PDF met custom canvas
     doc.build(content, canvasmaker=make_canvas)
@@ -646,3 +696,162 @@ def generate_reminder_pdf(
     doc.build(content)
     
     return buffer.getvalue()
+
+
+# ==================== BATCH (ZIP) ====================
+
+PDF_BATCH_WORKERS = int(os.environ.get("PDF_BATCH_WORKERS", "0")) or os.cpu_count() or 1
+PDF_BATCH_MAX_REQUESTS = max(1, int(os.environ.get("PDF_BATCH_MAX_REQUESTS", "2")))
+
+_batch_requests = 0
+
+
+class PdfBatchBusy(Exception):
+    """Er lopen al PDF_BATCH_MAX_REQUESTS batch-downloads; de client moet het later opnieuw proberen."""
+
+
+class _BatchSlot:
+    """Een plaats in de batch-limiet; `release` mag vaker worden aangeroepen."""
+
+    def __init__(self):
+        global _batch_requests
+        if _batch_requests >= PDF_BATCH_MAX_REQUESTS:
+            raise PdfBatchBusy()
+        _batch_requests += 1
+        self._vrij = False
+
+    def release(self):
+        global _batch_requests
+        if not self._vrij:
+            self._vrij = True
+            _batch_requests -= 1
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    # spawn i.p.v. fork: de workers hoeven alleen deze module te laden, niet de
+    # event loop en MongoDB client van het API proces
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(
+            max_workers=PDF_BATCH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pdf_pool
+
+
+def shutdown_pdf_pool():
+    """Stop de worker processen (application shutdown)"""
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
+
+
+def invoice_pdf_filename(factuur: Dict[str, Any]) -> str:
+    nummer = factuur.get('factuurnummer') or factuur.get('nummer') or factuur.get('id') or 'CONCEPT'
+    return f"factuur_{re.sub(r'[^A-Za-z0-9._-]+', '_', str(nummer))}.pdf"
+
+
+def _render_invoice_job(job: Dict[str, Any]) -> Tuple[str, Optional[bytes], Optional[str]]:
+    """Draait in een worker proces; de style cache blijft per worker warm.
+    Geeft (bestandsnaam, pdf, None) of bij een fout (bestandsnaam, None, foutmelding)."""
+    name = invoice_pdf_filename(job['factuur'])
+    try:
+        return name, generate_invoice_pdf(
+            job['factuur'], job['bedrijf'], job.get('debiteur'), job.get('template_settings')
+        ), None
+    except Exception as e:
+        return name, None, str(e)
+
+
+async def render_invoice_pdfs(
+    jobs: AsyncIterable[Dict[str, Any]]
+) -> AsyncIterator[Tuple[str, Optional[bytes], Optional[str]]]:
+    """Render facturen parallel. Een job is {"factuur", "bedrijf", "debiteur", "template_settings"}
+    (picklebaar, dus zonder `_id`). Hoogstens 2 x PDF_BATCH_WORKERS jobs tegelijk in behandeling,
+    resultaten komen terug in de volgorde waarin ze klaar zijn."""
+    global _pdf_pool
+    loop = asyncio.get_running_loop()
+    pool = _get_pdf_pool()
+    pending = set()
+    try:
+        async for job in jobs:
+            pending.add(loop.run_in_executor(pool, _render_invoice_job, job))
+            if len(pending) >= PDF_BATCH_WORKERS * 2:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    except BrokenProcessPool:
+        # Een worker is gecrasht; de volgende batch start met een nieuwe pool
+        if _pdf_pool is pool:
+            _pdf_pool = None
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+class _ZipChunks(io.RawIOBase):
+    """Niet-seekbare buffer: zipfile schrijft dan data descriptors en het archief kan
+    gestreamd worden zonder het eerst volledig op te bouwen"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.extend(data)
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def stream_invoice_pdf_zip(jobs: AsyncIterable[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """ZIP-archief met een PDF per factuur, in blokken voor een StreamingResponse.
+    Facturen die niet gerenderd konden worden staan in fouten.txt. Raises PdfBatchBusy
+    direct (vóór de response begint) als de batch-limiet bereikt is."""
+    slot = _BatchSlot()
+    stream = _zip_stream(jobs, slot)
+    # Ook een stream die nooit gestart wordt (client weg vóór de eerste chunk) geeft zijn plaats terug
+    weakref.finalize(stream, slot.release)
+    return stream
+
+
+async def _zip_stream(jobs: AsyncIterable[Dict[str, Any]], slot: _BatchSlot) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in _zip_chunks(jobs):
+            yield chunk
+    finally:
+        slot.release()
+
+
+async def _zip_chunks(jobs: AsyncIterable[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    chunks = _ZipChunks()
+    names = set()
+    fouten = []
+    with zipfile.ZipFile(chunks, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        async for name, pdf, fout in render_invoice_pdfs(jobs):
+            if fout:
+                fouten.append(f"{name}: {fout}")
+                continue
+            base, teller = name, 1
+            while name in names:
+                teller += 1
+                name = base.replace('.pdf', f'_{teller}.pdf')
+            names.add(name)
+            archive.writestr(name, pdf)
+            yield chunks.drain()
+        if fouten:
+            archive.writestr("fouten.txt", "\n".join(fouten))
+    yield chunks.drain()
+
@@ -0,0 +1,228 @@
+"""
+PDF Render Pool - WeasyPrint/pikepdf rendering in a dedicated process pool
+==========================================================================
+HTML -> PDF rendering is CPU- and memory-heavy. Running it via asyncio.to_thread
+shares the default executor with Motor callbacks, push sends and SSL checks, so a
+month-end burst of downloads slows down every other request.
+
+This module renders in its own ProcessPoolExecutor (PDF_RENDER_WORKERS processes)
+behind a bounded queue:
+- per-tenant (company) FIFO queues, served round-robin so one company's bulk
+  download cannot starve the others;
+- backpressure: when the queue (PDF_RENDER_QUEUE_MAX) or a company's share
+  (PDF_RENDER_QUEUE_PER_KEY) is full, `render_pdf` raises RenderQueueFull;
+- a render that exceeds PDF_RENDER_TIMEOUT fails the caller with RenderTimeout, but
+  its dispatcher slot stays occupied until the worker process is actually done, so
+  hung renders cannot push more than WORKERS jobs into the pool;
+- timing metrics (queue wait, render time) via `render_stats()`.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+logger = logging.getLogger("pdf_render_pool")
+
+WORKERS = max(1, int(os.environ.get("PDF_RENDER_WORKERS", str(min(2, os.cpu_count() or 1)))))
+QUEUE_MAX = int(os.environ.get("PDF_RENDER_QUEUE_MAX", "100"))
+QUEUE_PER_KEY = int(os.environ.get("PDF_RENDER_QUEUE_PER_KEY", "20"))
+RENDER_TIMEOUT = float(os.environ.get("PDF_RENDER_TIMEOUT", "60"))
+
+
+class RenderUnavailable(Exception):
+    """WeasyPrint (or its system libraries) cannot be loaded in the render process."""
+
+
+class RenderQueueFull(Exception):
+    """Too many PDFs waiting; the caller should retry later."""
+
+
+class RenderTimeout(Exception):
+    """The render took longer than PDF_RENDER_TIMEOUT; the caller should retry later."""
+
+
+# ---------------------------------------------------------------------------
+# Runs inside the worker process
+# ---------------------------------------------------------------------------
+
+def _render_in_worker(html_str: str, base_url: str, encrypt: bool):
+    """Returns (pdf_bytes, encrypted, render_seconds)."""
+    started = time.perf_counter()
+    try:
+        from weasyprint import HTML
+    except Exception as e:  # ImportError or libpango missing
+        raise RenderUnavailable(str(e))
+    pdf_bytes = HTML(string=html_str, base_url=base_url).write_pdf()
+    if not encrypt:
+        return pdf_bytes, False, time.perf_counter() - started
+    try:
+        import io
+        import secrets
+        import pikepdf
+    except ImportError:
+        return pdf_bytes, False, time.perf_counter() - started
+    try:
+        out_buf = io.BytesIO()
+        with pikepdf.open(io.BytesIO(pdf_bytes)) as pdf:
+            with pdf.open_metadata() as meta:
+                meta["dc:creator"] = "Vastgoed Kiosk ERP"
+                meta["pdf:Producer"] = "facturatie.sr"
+            perms = pikepdf.Permissions(
+                extract=False,
+                modify_annotation=False,
+                modify_assembly=False,
+                modify_form=False,
+                modify_other=False,
+                print_lowres=True,
+                print_highres=True,
+            )
+            pdf.save(
+                out_buf,
+                encryption=pikepdf.Encryption(owner=secrets.token_urlsafe(32), user="", R=6, allow=perms),
+                linearize=True,
+            )
+        return out_buf.getvalue(), True, time.perf_counter() - started
+    except Exception:
+        return pdf_bytes, False, time.perf_counter() - started
+
+
+# ---------------------------------------------------------------------------
+# Runs in the API process
+# ---------------------------------------------------------------------------
+
+_executor: Optional[ProcessPoolExecutor] = None
+_queues: "OrderedDict[str, deque]" = OrderedDict()  # fairness key -> pending jobs
+_queued = 0
+_wakeup: Optional[asyncio.Event] = None
+_dispatchers: list = []
+
+_stats = {
+    "rendered": 0,
+    "failed": 0,
+    "rejected": 0,
+    "timed_out": 0,
+    "unencrypted": 0,
+    "render_seconds_total": 0.0,
+    "render_seconds_max": 0.0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+}
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: the API process runs threads (Motor, schedulers); forking those is unsafe
+        _executor = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def _next_job():
+    """Round-robin over fairness keys: take one job from the first key, move the key to the back."""
+    global _queued
+    while _queues:
+        key, jobs = next(iter(_queues.items()))
+        _queues.move_to_end(key)
+        if jobs:
+            _queued -= 1
+            job = jobs.popleft()
+            if not jobs:
+                del _queues[key]
+            return job
+        del _queues[key]
+    return None
+
+
+async def _dispatcher():
+    global _executor
+    loop = asyncio.get_running_loop()
+    while True:
+        job = _next_job()
+        if job is None:
+            _wakeup.clear()
+            await _wakeup.wait()
+            continue
+        future, enqueued_at, args = job
+        if future.cancelled():
+            continue
+        wait = time.perf_counter() - enqueued_at
+        _stats["wait_seconds_total"] += wait
+        _stats["wait_seconds_max"] = max(_stats["wait_seconds_max"], wait)
+        try:
+            rendering = loop.run_in_executor(_get_executor(), _render_in_worker, *args)
+            try:
+                pdf_bytes, encrypted, seconds = await asyncio.wait_for(asyncio.shield(rendering), RENDER_TIMEOUT)
+            except asyncio.TimeoutError:
+                _stats["timed_out"] += 1
+                logger.warning(f"[pdf-render] render exceeded {RENDER_TIMEOUT:g}s, waiting for the worker")
+                if not future.done():
+                    future.set_exception(RenderTimeout())
+                # The worker process keeps rendering: hold this slot until it is done
+                await asyncio.wait([rendering])
+                if not rendering.cancelled() and rendering.exception() is not None:
+                    raise rendering.exception()
+                continue
+            _stats["rendered"] += 1
+            _stats["render_seconds_total"] += seconds
+            _stats["render_seconds_max"] = max(_stats["render_seconds_max"], seconds)
+            if args[2] and not encrypted:
+                _stats["unencrypted"] += 1
+            if not future.done():
+                future.set_result((pdf_bytes, encrypted))
+        except BrokenProcessPool as e:
+            _stats["failed"] += 1
+            logger.error(f"[pdf-render] worker pool broken, restarting: {e}")
+            _executor = None
+            if not future.done():
+                future.set_exception(e)
+        except Exception as e:
+            _stats["failed"] += 1
+            if not future.done():
+                future.set_exception(e)
+
+
+def _ensure_dispatchers():
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    alive = [t for t in _dispatchers if not t.done()]
+    _dispatchers[:] = alive
+    for _ in range(WORKERS - len(alive)):
+        _dispatchers.append(asyncio.create_task(_dispatcher()))
+
+
+async def render_pdf(html_str: str, base_url: str = "", fairness_key: str = "-", encrypt: bool = True):
+    """Render HTML to PDF in the render pool. Returns (pdf_bytes, encrypted).
+    Raises RenderQueueFull under backpressure, RenderTimeout when the render takes longer than
+    RENDER_TIMEOUT and RenderUnavailable without WeasyPrint."""
+    global _queued
+    _ensure_dispatchers()
+    jobs = _queues.get(fairness_key)
+    if _queued >= QUEUE_MAX or (jobs is not None and len(jobs) >= QUEUE_PER_KEY):
+        _stats["rejected"] += 1
+        raise RenderQueueFull()
+    future = asyncio.get_running_loop().create_future()
+    _queues.setdefault(fairness_key, deque()).append((future, time.perf_counter(), (html_str, base_url, encrypt)))
+    _queued += 1
+    _wakeup.set()
+    return await future
+
+
+def render_stats() -> dict:
+    rendered = _stats["rendered"] or 1
+    return {
+        **_stats,
+        "render_seconds_avg": _stats["render_seconds_total"] / rendered,
+        "wait_seconds_avg": _stats["wait_seconds_total"] / rendered,
+        "workers": WORKERS,
+        "queued": _queued,
+        "queued_per_key": {k: len(v) for k, v in _queues.items()},
+        "queue_max": QUEUE_MAX,
+        "queue_per_key": QUEUE_PER_KEY,
+    }
@@ -0,0 +1,162 @@
+"""
+Reconciliatie - Batch matching van banktransacties aan openstaande facturen
+===========================================================================
+Bouwt één keer per run een index over alle openstaande facturen (bedrag-buckets,
+prefixen van factuurnummers en namen) en zoekt daarmee per transactie alleen de
+kandidaten op die kunnen scoren. De score zelf is dezelfde als bij de losse
+suggesties (`score_match`), zodat batch en enkelvoudige suggesties overeenkomen.
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional
+
+MIN_CONFIDENCE = 30
+MAX_SUGGESTIES = 5
+
+PREFIX = 3  # nummers en namen worden geïndexeerd op hun eerste PREFIX tekens
+
+
+def score_match(
+    bedrag: float, omschrijving: str, tegenpartij: Optional[str], factuur: Dict, tolerantie: float = 0.01
+) -> Optional[Dict[str, Any]]:
+    """Score één factuur tegen één transactie; None onder MIN_CONFIDENCE."""
+    confidence = 0
+    match_details = []
+    omschrijving_lower = (omschrijving or "").lower()
+
+    factuur_bedrag = factuur.get('openstaand_bedrag', 0)
+    tx_bedrag = abs(bedrag)
+
+    # Bedrag matching (0-50 punten)
+    if abs(factuur_bedrag - tx_bedrag) <= tolerantie:
+        confidence += 50
+        match_details.append("Exact bedrag match")
+    elif abs(factuur_bedrag - tx_bedrag) <= factuur_bedrag * 0.01:  # 1% tolerantie
+        confidence += 40
+        match_details.append("Bedrag binnen 1%")
+    elif abs(factuur_bedrag - tx_bedrag) <= factuur_bedrag * 0.05:  # 5% tolerantie
+        confidence += 20
+        match_details.append("Bedrag binnen 5%")
+
+    # Factuurnummer in omschrijving (0-30 punten)
+    factuurnummer = factuur.get('factuurnummer', '') or factuur.get('intern_nummer', '')
+    if factuurnummer and factuurnummer.lower() in omschrijving_lower:
+        confidence += 30
+        match_details.append(f"Factuurnummer '{factuurnummer}' gevonden")
+
+    # Klantnaam/leveranciersnaam matching (0-20 punten)
+    naam = factuur.get('debiteur_naam') or factuur.get('crediteur_naam', '')
+    if naam:
+        naam_lower = naam.lower()
+        if tegenpartij and naam_lower in tegenpartij.lower():
+            confidence += 20
+            match_details.append(f"Naam '{naam}' match in tegenpartij")
+        elif naam_lower in omschrijving_lower:
+            confidence += 15
+            match_details.append(f"Naam '{naam}' gevonden in omschrijving")
+
+    if confidence < MIN_CONFIDENCE:
+        return None
+    return {
+        "factuur_id": factuur.get('id'),
+        "factuurnummer": factuurnummer,
+        "factuur_bedrag": factuur_bedrag,
+        "transactie_bedrag": tx_bedrag,
+        "confidence": min(confidence, 100),
+        "match_details": match_details,
+        "type": factuur.get('type', 'verkoop')
+    }
+
+
+def _voeg_toe(prefixen: Dict[str, List[int]], kort: List[tuple], waarde: str, i: int):
+    if len(waarde) >= PREFIX:
+        prefixen.setdefault(waarde[:PREFIX], []).append(i)
+    elif waarde:
+        kort.append((waarde, i))
+
+
+def _zoek(prefixen: Dict[str, List[int]], kort: List[tuple], tekst: str, gevonden: set):
+    """Voeg alle facturen toe waarvan de waarde mogelijk als substring in `tekst` staat."""
+    for prefix in {tekst[p:p + PREFIX] for p in range(len(tekst) - PREFIX + 1)}:
+        gevonden.update(prefixen.get(prefix, ()))
+    for waarde, i in kort:
+        if waarde in tekst:
+            gevonden.add(i)
+
+
+class FactuurIndex:
+    """Opzoekstructuren over een vaste set openstaande facturen."""
+
+    def __init__(self, facturen: List[Dict]):
+        self.facturen = facturen
+        # Bedrag-buckets: gesorteerd op openstaand bedrag voor bereik-zoeken
+        paren = sorted((f.get('openstaand_bedrag', 0) or 0, i) for i, f in enumerate(facturen))
+        self._bedragen = [b for b, _ in paren]
+        self._bedrag_idx = [i for _, i in paren]
+        # Nummers en namen: score_match zoekt ze als substring (ook midden in een woord,
+        # "2024-001" in "f2024-001"), dus index op hun eerste tekens; alles wat in de tekst
+        # staat begint op een van diens posities. Kortere waarden via een substring-lijst.
+        self._nummers: Dict[str, List[int]] = {}
+        self._korte_nummers: List[tuple] = []
+        self._namen: Dict[str, List[int]] = {}
+        self._korte_namen: List[tuple] = []
+        for i, f in enumerate(facturen):
+            nummer = (f.get('factuurnummer', '') or f.get('intern_nummer', '')).lower()
+            _voeg_toe(self._nummers, self._korte_nummers, nummer, i)
+            naam = (f.get('debiteur_naam') or f.get('crediteur_naam', '') or '').lower()
+            _voeg_toe(self._namen, self._korte_namen, naam, i)
+
+    def kandidaten(self, bedrag: float, omschrijving: str, tegenpartij: Optional[str], tolerantie: float) -> set:
+        tx_bedrag = abs(bedrag)
+        # Alleen op bedrag haalt een factuur de drempel pas vanaf 1% verschil
+        # (|f - t| <= 1% van f  <=>  t/1.01 <= f <= t/0.99); ruimere bedrag-matches
+        # tellen alleen mee samen met een nummer- of naam-match, en die komen hieronder binnen
+        lo = bisect_left(self._bedragen, tx_bedrag / 1.01 - tolerantie)
+        hi = bisect_right(self._bedragen, tx_bedrag / 0.99 + tolerantie)
+        gevonden = set(self._bedrag_idx[lo:hi])
+
+        tekst = (omschrijving or "").lower()
+        _zoek(self._nummers, self._korte_nummers, tekst, gevonden)
+        for bron in (tekst, (tegenpartij or "").lower()):
+            _zoek(self._namen, self._korte_namen, bron, gevonden)
+        return gevonden
+
+    def suggesties(self, bedrag: float, omschrijving: str, tegenpartij: Optional[str],
+                   tolerantie: float = 0.01, limit: int = MAX_SUGGESTIES) -> List[Dict]:
+        resultaat = []
+        for i in self.kandidaten(bedrag, omschrijving, tegenpartij, tolerantie):
+            match = score_match(bedrag, omschrijving, tegenpartij, self.facturen[i], tolerantie)
+            if match:
+                resultaat.append(match)
+        resultaat.sort(key=lambda x: x['confidence'], reverse=True)
+        return resultaat[:limit]
+
+
+def match_transacties(
+    transacties: List[Dict], verkoop_index: FactuurIndex, inkoop_index: FactuurIndex,
+    drempel: Optional[int] = None, tolerantie: float = 0.01
+) -> List[Dict]:
+    """Suggesties voor alle transacties. Met een drempel wordt per transactie de beste match
+    boven de drempel als `koppeling` gemarkeerd, mits die eenduidig is (geen tweede factuur met
+    dezelfde score) en de factuur in deze run nog niet aan een andere transactie is toegewezen."""
+    resultaten = []
+    toegewezen = set()
+    for tx in transacties:
+        bedrag = tx.get('bedrag', 0) or 0
+        index = verkoop_index if bedrag > 0 else inkoop_index
+        suggesties = index.suggesties(bedrag, tx.get('omschrijving', ''), tx.get('tegenpartij'), tolerantie)
+        koppeling = None
+        if drempel is not None and suggesties:
+            beste = suggesties[0]
+            eenduidig = len(suggesties) == 1 or suggesties[1]['confidence'] < beste['confidence']
+            if beste['confidence'] >= drempel and eenduidig and beste['factuur_id'] not in toegewezen:
+                toegewezen.add(beste['factuur_id'])
+                koppeling = beste
+        resultaten.append({
+            "transactie_id": tx.get('id'),
+            "transactie_bedrag": bedrag,
+            "transactie_omschrijving": tx.get('omschrijving', ''),
+            "suggesties": suggesties,
+            "koppeling": koppeling,
+        })
+    return resultaten
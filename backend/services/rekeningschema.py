@@ -0,0 +1,102 @@
+"""
+Rekeningschema Cache - Grootboekrekeningen per gebruiker in het geheugen
+========================================================================
+Automatische boekingen vragen per regel een rekeningcode op (`get_rekening_voor_type`)
+en per journaalpost de rekeningtypes van alle geraakte codes. Zonder cache is dat een
+keten van find_one's per boeking; met deze cache leest een bulk-run (boek-alle-verzonden,
+boek-alle-geboekt) het rekeningschema één keer.
+
+Alleen code/naam/type worden gecachet (geen saldo). Wijzigingen via de rekeningen-
+endpoints roepen `invalideer_rekeningschema` aan; andere workers zien de wijziging
+uiterlijk na SCHEMA_TTL seconden.
+"""
+
+import time
+from typing import Dict, List, Optional
+
+SCHEMA_TTL = 300  # seconden
+
+# Boekingssoort -> (verwacht grootboektype, zoektermen in de rekeningnaam)
+TYPE_MAPPING = {
+    "debiteuren": ("activa", ["debiteur"]),
+    "crediteuren": ("passiva", ["crediteur"]),
+    "btw_verkoop": ("passiva", ["btw te betalen", "btw af te dragen"]),
+    "btw_inkoop": ("activa", ["btw te vorderen", "voorbelasting", "btw voorheffing"]),
+    "omzet": ("omzet", ["omzet verkop", "omzet dienst", "omzet export"]),  # Type moet 'omzet' zijn (niet 'opbrengsten')
+    "inkoop": ("kosten", ["inkoop", "inkoopwaarde"]),
+    "bank": ("activa", ["bank"]),
+    "kas": ("activa", ["kas"]),
+    "voorraad": ("activa", ["voorraad"])
+}
+
+
+class Rekeningschema:
+    """Momentopname van de rekeningen van één gebruiker (volgorde zoals in de database)."""
+
+    def __init__(self, rekeningen: List[dict]):
+        self.rekeningen = rekeningen
+        self.geladen_op = time.time()
+        self._per_code: Dict[str, dict] = {}
+        for r in rekeningen:
+            self._per_code.setdefault(r.get("code"), r)
+        self._voor_type: Dict[tuple, Optional[str]] = {}
+
+    def by_code(self, code: str) -> Optional[dict]:
+        return self._per_code.get(code)
+
+    def type_van(self, code: str) -> Optional[str]:
+        r = self._per_code.get(code)
+        return r.get("type", "") if r else None
+
+    def voor_type(self, rekening_type: str, standaard_codes: dict, alternatieve_codes: dict) -> Optional[str]:
+        """Zelfde zoekvolgorde als de oorspronkelijke find_one-keten:
+        naam+type, standaardcode, alternatieve codes, eerste rekening van het type."""
+        standaard_code = standaard_codes.get(rekening_type)
+        alternatieven = alternatieve_codes.get(rekening_type, [])
+        key = (rekening_type, standaard_code, tuple(alternatieven))
+        if key not in self._voor_type:
+            self._voor_type[key] = self._zoek(rekening_type, standaard_code, alternatieven)
+        return self._voor_type[key]
+
+    def _zoek(self, rekening_type: str, standaard_code: Optional[str], alternatieven: list) -> Optional[str]:
+        verwacht_type = TYPE_MAPPING.get(rekening_type, (None, []))[0]
+
+        # STAP 1: naam EN type (meest nauwkeurig)
+        if verwacht_type:
+            for term in TYPE_MAPPING[rekening_type][1]:
+                for r in self.rekeningen:
+                    if r.get("type") == verwacht_type and term in (r.get("naam") or "").lower():
+                        return r.get("code")
+
+        # STAP 2 + 3: standaard code, dan alternatieven (alleen als het type klopt)
+        for code in ([standaard_code] if standaard_code else []) + list(alternatieven):
+            r = self._per_code.get(code)
+            if r and verwacht_type and r.get("type") == verwacht_type:
+                return code
+
+        # STAP 4: eerste rekening van het verwachte type
+        if verwacht_type:
+            for r in self.rekeningen:
+                if r.get("type") == verwacht_type:
+                    return r.get("code")
+
+        # Laatste fallback
+        return standaard_code
+
+
+_schemas: Dict[str, Rekeningschema] = {}
+
+
+async def get_rekeningschema(db, user_id: str) -> Rekeningschema:
+    schema = _schemas.get(user_id)
+    if schema is None or time.time() - schema.geladen_op >= SCHEMA_TTL:
+        rekeningen = await db.boekhouding_rekeningen.find(
+            {"user_id": user_id}, {"_id": 0, "code": 1, "naam": 1, "type": 1}
+        ).to_list(None)
+        schema = Rekeningschema(rekeningen)
+        _schemas[user_id] = schema
+    return schema
+
+
+def invalideer_rekeningschema(user_id: str):
+    _schemas.pop(user_id, None)
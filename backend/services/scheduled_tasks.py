@@ -10,6 +10,8 @@ from typing import List, Dict
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
+from services.entitlements import invalidate_entitlements
+
 logger = logging.getLogger(__name__)
 
 class ScheduledTasks:
@@ -256,6 +258,7 @@ class ScheduledTasks:
                                     "expired_at": now.isoformat()
                                 }}
                             )
+                            await invalidate_entitlements(user["id"])
                             modules_updated += 1
                             
                             # Get addon details
@@ -0,0 +1,249 @@
+"""
+Suribet Saldi - Lopende totalen per gebruiker voor openstaand-totaal
+====================================================================
+Houdt per gebruiker één document bij in `suribet_saldi` met de componenten van
+GET /suribet/openstaand-totaal:
+
+- openstaand_balance / openstaand_aantal: som van bon_data.balance en aantal van
+  de niet-uitbetaalde dagstaten
+- commissie_dagstaten: som van bon_data.total_pos_commission over alle dagstaten
+- kasboek_netto: inkomsten - uitgaven in het kasboek (excl. categorie "commissie",
+  die komt al uit de dagstaten)
+- naar_suribet / naar_commissie: som van de saldo-aanpassingen per type
+
+Elke schrijfactie op dagstaten, kasboek of saldo-aanpassingen loopt via
+`suribet_mutatie`: de bijdrage van de geraakte documenten wordt vóór en na de
+schrijfactie in MongoDB opgeteld en het verschil met $inc verwerkt, in dezelfde
+transactie als de schrijfactie (indien de deployment transacties ondersteunt).
+Zo leest het totaal-endpoint één document in plaats van de hele historie.
+
+Het aggregaat kan altijd opnieuw worden opgebouwd (`herbouw_suribet_saldi`),
+bijvoorbeeld na handmatige correcties in de database. Opbouw en mutaties sluiten
+elkaar uit zoals bij de grootboek-saldi (services/grootboek_saldi.py):
+
+- De opbouw maakt het document eerst atomair aan of neemt de lease (`herbouw_tot`)
+  en verhoogt `versie`; pas daarna worden de totalen opgeteld.
+- Een mutatie onthoudt `versie` vóór de schrijfactie en verwerkt haar $inc alleen als
+  er sindsdien geen opbouw is begonnen. Anders zet ze `opnieuw`, waarna de lopende
+  opbouw nog een ronde maakt, of laat ze (zonder lopende opbouw) opnieuw opbouwen.
+- Zo gaat een mutatie die tijdens de opbouw valt niet verloren en telt ze niet dubbel.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from pymongo import IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from services.grootboek_saldi import HERBOUW_LEASE, HERBOUW_POLL_SECONDS, herbouw_actief, in_boekings_transactie
+from services.indexes import register_indexes
+
+SALDI_COLLECTION = "suribet_saldi"
+
+register_indexes(SALDI_COLLECTION, IndexModel("user_id", unique=True))
+
+T = TypeVar("T")
+
+VELDEN = (
+    "openstaand_balance", "openstaand_aantal", "commissie_dagstaten",
+    "kasboek_netto", "naar_suribet", "naar_commissie",
+)
+
+
+def _bedrag(veld: str) -> dict:
+    return {"$ifNull": [veld, 0]}
+
+
+def _als(voorwaarde, waarde) -> dict:
+    return {"$sum": {"$cond": [voorwaarde, waarde, 0]}}
+
+
+# Bijdrage per collectie aan de velden hierboven, als $group-velden
+_BIJDRAGEN = {
+    "suribet_dagstaten": (
+        {},
+        {
+            "openstaand_balance": _als({"$ne": ["$is_paid", True]}, _bedrag("$bon_data.balance")),
+            "openstaand_aantal": _als({"$ne": ["$is_paid", True]}, 1),
+            "commissie_dagstaten": {"$sum": _bedrag("$bon_data.total_pos_commission")},
+        },
+    ),
+    "suribet_kasboek": (
+        {"category": {"$ne": "commissie"}},
+        {
+            "kasboek_netto": {"$sum": {"$switch": {
+                "branches": [
+                    {"case": {"$eq": ["$transaction_type", "income"]}, "then": _bedrag("$amount")},
+                    {"case": {"$eq": ["$transaction_type", "expense"]}, "then": {"$multiply": [-1, _bedrag("$amount")]}},
+                ],
+                "default": 0,
+            }}},
+        },
+    ),
+    "suribet_saldo_adjustments": (
+        {},
+        {
+            "naar_suribet": _als({"$eq": ["$type", "saldo_naar_suribet"]}, _bedrag("$amount")),
+            "naar_commissie": _als({"$eq": ["$type", "saldo_naar_commissie"]}, _bedrag("$amount")),
+        },
+    ),
+}
+
+
+async def bijdrage(db, collectie: str, filter: dict, session=None) -> Dict[str, float]:
+    """Bijdrage van de documenten in `collectie` die aan `filter` voldoen (filter bevat user_id)."""
+    extra_filter, velden = _BIJDRAGEN[collectie]
+    pipeline = [
+        {"$match": {"$and": [filter, extra_filter]} if extra_filter else filter},
+        {"$group": {"_id": None, **velden}},
+    ]
+    rows = await db[collectie].aggregate(pipeline, session=session).to_list(1)
+    if not rows:
+        return {veld: 0 for veld in velden}
+    return {veld: rows[0][veld] for veld in velden}
+
+
+async def boek_suribet_saldi(db, user_id: str, mutaties: Dict[str, float], status: Optional[dict], session=None):
+    """Verwerk mutaties in het aggregaat. `status` is het aggregaat (of None) zoals gelezen
+    vóór de schrijfactie; is er sindsdien een opbouw begonnen, dan telt die de schrijfactie
+    mee in plaats van de $inc (zie module-docstring)."""
+    inc = {veld: waarde for veld, waarde in mutaties.items() if waarde}
+    if not inc:
+        return
+    if status is not None and not herbouw_actief(status):
+        result = await db[SALDI_COLLECTION].update_one(
+            {"user_id": user_id, "versie": status.get("versie"), "herbouw_token": {"$exists": False}},
+            {"$inc": inc, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            session=session,
+        )
+        if result.matched_count:
+            return
+    elif status is None and not await db[SALDI_COLLECTION].find_one({"user_id": user_id}, {"_id": 1}, session=session):
+        return  # Nog geen aggregaat: de opbouw begint na deze schrijfactie en telt haar mee
+    await _vraag_herbouw_aan(db, user_id, session)
+
+
+async def _vraag_herbouw_aan(db, user_id: str, session=None):
+    """Laat de lopende opbouw nog een ronde maken; loopt er geen (meer), bouw dan zelf op."""
+    result = await db[SALDI_COLLECTION].update_one(
+        {"user_id": user_id, "herbouw_tot": {"$gt": datetime.now(timezone.utc)}},
+        {"$set": {"opnieuw": True}},
+        session=session,
+    )
+    if result.matched_count == 0 and session is None:
+        await herbouw_suribet_saldi(db, user_id)
+    # In een transactie botst een opbouw die intussen klaar is als WriteConflict op het
+    # aggregaat, waarna de transactie opnieuw wordt uitgevoerd.
+
+
+async def suribet_mutatie(db, user_id: str, schrijf: Callable[[Any], Awaitable[T]], *geraakt: Tuple[str, dict]) -> T:
+    """Voer `await schrijf(session)` uit (schrijfacties op dagstaten/kasboek/saldo-aanpassingen)
+    en werk het aggregaat bij. `geraakt` zijn (collectie, filter) paren die de geraakte
+    documenten vóór én na de schrijfactie selecteren; user_id wordt aan elk filter
+    toegevoegd. Bij een WriteConflict wordt alles opnieuw uitgevoerd (zie
+    in_boekings_transactie). Gebruik:
+
+        async def schrijf(session):
+            await db.suribet_kasboek.insert_one(entry, session=session)
+        await suribet_mutatie(db, user_id, schrijf, ("suribet_kasboek", {"id": entry["id"]}))
+    """
+    geraakt = [(collectie, {**filter, "user_id": user_id}) for collectie, filter in geraakt]
+
+    async def werk(session):
+        status = await db[SALDI_COLLECTION].find_one(
+            {"user_id": user_id}, {"_id": 0, "versie": 1, "herbouw_tot": 1}, session=session
+        )
+        voor = [await bijdrage(db, collectie, filter, session) for collectie, filter in geraakt]
+        resultaat = await schrijf(session)
+        mutaties: Dict[str, float] = {}
+        for (collectie, filter), oud in zip(geraakt, voor):
+            nieuw = await bijdrage(db, collectie, filter, session)
+            for veld in nieuw:
+                mutaties[veld] = mutaties.get(veld, 0) + nieuw[veld] - oud[veld]
+        await boek_suribet_saldi(db, user_id, mutaties, status, session=session)
+        return resultaat
+
+    return await in_boekings_transactie(db, werk)
+
+
+async def _wacht_op_herbouw(db, user_id: str):
+    """Wacht tot een lopende opbouw klaar is (of zijn lease is verlopen)."""
+    while herbouw_actief(await db[SALDI_COLLECTION].find_one({"user_id": user_id}, {"_id": 0, "herbouw_tot": 1})):
+        await asyncio.sleep(HERBOUW_POLL_SECONDS)
+
+
+async def herbouw_suribet_saldi(db, user_id: str) -> dict:
+    """Bouw het aggregaat voor een gebruiker opnieuw op uit alle dagstaten, kasboek entries
+    en saldo-aanpassingen. De optelling gebeurt in MongoDB. Loopt er al een opbouw voor
+    deze gebruiker, dan wordt daarop gewacht."""
+    token = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+    try:
+        # Document (of lease) eerst: mutaties vanaf nu zien de opbouw en zetten `opnieuw`
+        await db[SALDI_COLLECTION].update_one(
+            {"user_id": user_id, "herbouw_tot": {"$not": {"$gt": now}}},
+            {"$set": {"herbouw_tot": now + HERBOUW_LEASE, "herbouw_token": token, "opnieuw": False},
+             "$inc": {"versie": 1}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        await _wacht_op_herbouw(db, user_id)
+        saldi = await db[SALDI_COLLECTION].find_one({"user_id": user_id}, {"_id": 0}) or {}
+        return {veld: saldi.get(veld, 0) for veld in VELDEN}
+
+    try:
+        while True:
+            saldi = {veld: 0 for veld in VELDEN}
+            for collectie in _BIJDRAGEN:
+                saldi.update(await bijdrage(db, collectie, {"user_id": user_id}))
+            now = datetime.now(timezone.utc)
+            # Alleen vastleggen als er geen mutatie tussendoor is gevallen
+            klaar = await db[SALDI_COLLECTION].find_one_and_update(
+                {"user_id": user_id, "herbouw_token": token, "opnieuw": False},
+                {"$set": {**saldi, "updated_at": now, "herbouwd_op": now},
+                 "$unset": {"herbouw_tot": "", "herbouw_token": ""}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if klaar is not None:
+                return saldi
+            bijgewerkt = await db[SALDI_COLLECTION].update_one(
+                {"user_id": user_id, "herbouw_token": token},
+                {"$set": {"opnieuw": False, "herbouw_tot": now + HERBOUW_LEASE}},
+            )
+            if bijgewerkt.matched_count == 0:
+                return saldi  # Lease verlopen en door een andere opbouw overgenomen
+    except BaseException:
+        # Lease vrijgeven; zonder herbouwd_op bouwt de volgende lezing opnieuw op
+        await db[SALDI_COLLECTION].update_one(
+            {"user_id": user_id, "herbouw_token": token},
+            {"$unset": {"herbouw_tot": "", "herbouw_token": "", "herbouwd_op": ""}},
+        )
+        raise
+
+
+async def get_suribet_saldi(db, user_id: str) -> dict:
+    """Het aggregaat van de gebruiker; wordt eenmalig opgebouwd als het nog niet bestaat."""
+    saldi = await db[SALDI_COLLECTION].find_one({"user_id": user_id}, {"_id": 0})
+    if herbouw_actief(saldi):
+        await _wacht_op_herbouw(db, user_id)
+        saldi = await db[SALDI_COLLECTION].find_one({"user_id": user_id}, {"_id": 0})
+    if not saldi or not saldi.get("herbouwd_op"):
+        saldi = await herbouw_suribet_saldi(db, user_id)
+    return saldi
+
+
+def openstaand_totaal(saldi: dict) -> dict:
+    """Response van openstaand-totaal uit het aggregaat."""
+    total_commission = (
+        saldi.get("commissie_dagstaten", 0) + saldi.get("kasboek_netto", 0)
+        - saldi.get("naar_suribet", 0) + saldi.get("naar_commissie", 0)
+    )
+    total_suribet = saldi.get("openstaand_balance", 0) + saldi.get("naar_suribet", 0)
+    return {
+        "total_balance": saldi.get("openstaand_balance", 0),
+        "total_commission": max(0, total_commission),
+        "total_suribet": max(0, total_suribet),
+        "unpaid_count": saldi.get("openstaand_aantal", 0),
+    }
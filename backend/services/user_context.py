@@ -0,0 +1,59 @@
+"""
+User context cache
+==================
+Every authenticated request resolves the user from the JWT (and, for workspace routes, the
+user's workspace). `get_current_user` in server.py, routers/deps.py and the boekhouding
+router all read through this per-process cache instead of querying MongoDB each time.
+
+- Users are cached under the tag "user:<user_id>", workspaces under "workspace:<workspace_id>".
+- Every write to a user or workspace document calls `invalidate_user` / `invalidate_workspace`,
+  so the process that handles the change never serves a stale copy. Other API workers pick
+  up the change when the entry expires (USER_CONTEXT_TTL seconds).
+- The subscription status is computed per request from the cached document, because it
+  depends on the current time.
+- Callers get a shallow copy and may add or overwrite keys freely.
+"""
+
+import os
+from typing import Optional
+
+from services.cache import Cache, MemoryBackend
+
+USER_CONTEXT_TTL = int(os.environ.get("USER_CONTEXT_TTL", "30"))
+
+user_context_cache = Cache(
+    "user_context", default_ttl=USER_CONTEXT_TTL,
+    backend=MemoryBackend(int(os.environ.get("USER_CONTEXT_MAX_ENTRIES", "5000"))),
+)
+
+
+async def get_cached_user(db, user_id: str) -> Optional[dict]:
+    """User document without `_id`, or None if the user does not exist."""
+    if not user_id:
+        return None
+    user = await user_context_cache.get_or_load(
+        f"user:{db.name}:{user_id}",
+        lambda: db.users.find_one({"id": user_id}, {"_id": 0}),
+        tags=(f"user:{user_id}",),
+    )
+    return dict(user) if user else None
+
+
+async def get_cached_workspace(db, workspace_id: str) -> Optional[dict]:
+    """Workspace document without `_id`, or None if it does not exist."""
+    if not workspace_id:
+        return None
+    workspace = await user_context_cache.get_or_load(
+        f"workspace:{db.name}:{workspace_id}",
+        lambda: db.workspaces.find_one({"id": workspace_id}, {"_id": 0}),
+        tags=(f"workspace:{workspace_id}",),
+    )
+    return dict(workspace) if workspace else None
+
+
+async def invalidate_user(*user_ids: str):
+    await user_context_cache.invalidate(*(f"user:{u}" for u in user_ids if u))
+
+
+async def invalidate_workspace(*workspace_ids: str):
+    await user_context_cache.invalidate(*(f"workspace:{w}" for w in workspace_ids if w))
@@ -36,20 +36,13 @@ async def sync_cme_rates_for_all_users():
     Synchroniseer CME koersen voor alle actieve gebruikers.
     Deze functie wordt aangeroepen door de scheduler.
     """
-    from motor.motor_asyncio import AsyncIOMotorClient
     from services.cme_scraper import fetch_cme_exchange_rates
-    import os
+    from services.database import db
     import uuid
     
     logger.info("🔄 Starting scheduled CME rate sync...")
     
     try:
-        # Database connectie
-        mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-        db_name = os.environ.get('DB_NAME', 'erp_db')
-        client = AsyncIOMotorClient(mongo_url)
-        db = client[db_name]
-        
         # Haal koersen op van CME
         result = await fetch_cme_exchange_rates()
         
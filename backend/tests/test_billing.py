@@ -1,10 +1,10 @@
 """
-Regression tests for auto-billing engine in kiosk.py
-Tests the list_tenants endpoint's billing side-effects.
+Regression tests for the kiosk auto-billing engine (routers/kiosk/billing.py).
+Billing is triggered via POST /admin/billing/run; GET /admin/tenants is a pure read.
 """
 import pytest
 import jwt
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pymongo import MongoClient
 import requests
 import os
@@ -64,7 +64,14 @@ def create_test_tenant(db, company_id, name, monthly_rent, outstanding_rent, fin
     return tenant_id
 
 
+def run_billing(token):
+    resp = requests.post(f"{API_URL}/api/kiosk/admin/billing/run", headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 200
+    return resp.json()
+
+
 def call_list_tenants(token):
+    run_billing(token)
     resp = requests.get(f"{API_URL}/api/kiosk/admin/tenants", headers={"Authorization": f"Bearer {token}"})
     assert resp.status_code == 200
     return resp.json()
@@ -73,6 +80,8 @@ def call_list_tenants(token):
 def cleanup(db, company_id):
     db.kiosk_tenants.delete_many({"company_id": company_id})
     db.kiosk_companies.delete_many({"company_id": company_id})
+    db.kiosk_billing_effects.delete_many({"company_id": company_id})
+    db.kiosk_outbox.delete_many({"company_id": company_id})
 
 
 class TestBillingDezelfdeMaand:
@@ -128,6 +137,56 @@ class TestBillingDezelfdeMaand:
         assert r1[0]["rent_billed_through"] == r2[0]["rent_billed_through"]
 
 
+class TestBillingEngine:
+    """The tenants list must not mutate; side effects are queued once per (tenant, month)."""
+
+    def setup_method(self):
+        self.db = get_db()
+        self.company_id = create_test_company(self.db, billing_day=24, billing_next_month=False, fine_amount=250.0)
+        self.token = make_token(self.company_id)
+
+    def teardown_method(self):
+        cleanup(self.db, self.company_id)
+
+    def test_list_tenants_is_read_only(self):
+        create_test_tenant(self.db, self.company_id, "R1", 1000.0, 500.0, 0.0, "2026-02")
+        resp = requests.get(f"{API_URL}/api/kiosk/admin/tenants", headers={"Authorization": f"Bearer {self.token}"})
+        assert resp.status_code == 200
+        t = resp.json()[0]
+        assert t["outstanding_rent"] == 500.0
+        assert t["rent_billed_through"] == "2026-02"
+
+    def test_effects_queued_once(self):
+        tenant_id = create_test_tenant(self.db, self.company_id, "R2", 1000.0, 500.0, 0.0, "2026-02")
+        self.db.kiosk_tenants.update_one({"tenant_id": tenant_id}, {"$set": {"telefoon": "8000000"}})
+        run_billing(self.token)
+        run_billing(self.token)
+        kinds = sorted(e["kind"] for e in self.db.kiosk_billing_effects.find({"tenant_id": tenant_id}))
+        assert kinds == ["fine_applied", "new_invoice"]
+
+    def test_failing_effect_is_backed_off_without_blocking_queue(self):
+        now = datetime.now(timezone.utc)
+        base = {"company_id": self.company_id, "tenant_name": "", "status": "pending", "attempts": 0, "period": "2026-03"}
+        # Missing phone -> the effect raises; it is older, so it is claimed first
+        self.db.kiosk_billing_effects.insert_one({
+            **base, "effect_id": f"{self.company_id}:bad", "tenant_id": "bad", "kind": "new_invoice",
+            "payload": {"message": "x"}, "next_attempt_at": now - timedelta(minutes=2), "created_at": now - timedelta(minutes=2),
+        })
+        self.db.kiosk_billing_effects.insert_one({
+            **base, "effect_id": f"{self.company_id}:good", "tenant_id": "good", "kind": "new_invoice",
+            "payload": {"phone": "8000000", "message": "x"}, "next_attempt_at": now, "created_at": now,
+        })
+        effects = run_billing(self.token)["effects"]
+        assert effects == {"done": 1, "failed": 1}
+        bad = self.db.kiosk_billing_effects.find_one({"effect_id": f"{self.company_id}:bad"})
+        good = self.db.kiosk_billing_effects.find_one({"effect_id": f"{self.company_id}:good"})
+        assert good["status"] == "done"
+        assert bad["status"] == "pending" and bad["attempts"] == 1
+        assert bad["next_attempt_at"].replace(tzinfo=timezone.utc) > now
+        # Not due yet: the next run leaves it alone
+        assert run_billing(self.token)["effects"] == {"done": 0, "failed": 0}
+
+
 class TestBillingVolgendeMaand:
     """Tests for billing_next_month=True (Volgende maand)
     Due date for a period = next month's billing_day.
@@ -0,0 +1,56 @@
+"""
+Proefbalans / Saldo-aggregaten API Tests
+Tests for incremental per-account, per-period balances:
+- GET /api/boekhouding/rapportages/proefbalans
+- GET /api/boekhouding/rekeningen/met-saldi?van=&tot=
+- POST /api/boekhouding/rekeningen/herbereken-saldi
+"""
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://vastgoed-admin-v2.preview.emergentagent.com').rstrip('/')
+
+TEST_EMAIL = "demo@facturatie.sr"
+TEST_PASSWORD = "demo2024"
+
+
+@pytest.fixture(scope="module")
+def headers():
+    response = requests.post(f"{BASE_URL}/api/auth/login", json={
+        "email": TEST_EMAIL,
+        "password": TEST_PASSWORD
+    })
+    assert response.status_code == 200, f"Login failed: {response.text}"
+    data = response.json()
+    token = data.get("access_token") or data.get("token")
+    return {"Authorization": f"Bearer {token}"}
+
+
+class TestProefbalans:
+    def test_proefbalans_is_in_balans(self, headers):
+        response = requests.get(f"{BASE_URL}/api/boekhouding/rapportages/proefbalans", headers=headers)
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert "regels" in data
+        assert data["in_balans"] is True
+        assert abs(data["totaal_debet"] - data["totaal_credit"]) < 0.01
+        print(f"✓ Proefbalans: {len(data['regels'])} rekeningen, debet={data['totaal_debet']}")
+
+    def test_herbereken_matches_aggregate(self, headers):
+        before = requests.get(f"{BASE_URL}/api/boekhouding/rapportages/proefbalans", headers=headers).json()
+        response = requests.post(f"{BASE_URL}/api/boekhouding/rekeningen/herbereken-saldi", headers=headers)
+        assert response.status_code == 200, response.text
+        after = requests.get(f"{BASE_URL}/api/boekhouding/rapportages/proefbalans", headers=headers).json()
+        assert abs(before["totaal_debet"] - after["totaal_debet"]) < 0.01
+        assert abs(before["totaal_credit"] - after["totaal_credit"]) < 0.01
+
+    def test_met_saldi_periode_filter(self, headers):
+        response = requests.get(
+            f"{BASE_URL}/api/boekhouding/rekeningen/met-saldi",
+            params={"van": "1900-01", "tot": "1900-12"},
+            headers=headers
+        )
+        assert response.status_code == 200, response.text
+        for rek in response.json():
+            assert rek.get("saldo", 0) == 0
@@ -5,6 +5,7 @@ Tests for: Machines, Werknemers, Kasboek, Loonbetalingen, Dashboard Stats
 import pytest
 import requests
 import os
+import time
 from datetime import datetime
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
@@ -593,5 +594,172 @@ class TestSuribetDagstaten(TestSuribetAuth):
             )
 
 
+class TestSuribetOpenstaandTotaal(TestSuribetAuth):
+    """Test running totals behind /api/suribet/openstaand-totaal"""
+
+    def _totaal(self, auth_headers):
+        response = requests.get(f"{BASE_URL}/api/suribet/openstaand-totaal", headers=auth_headers)
+        assert response.status_code == 200, f"Failed: {response.text}"
+        return response.json()
+
+    def _herbouw(self, auth_headers):
+        response = requests.post(f"{BASE_URL}/api/suribet/openstaand-totaal/herbouw", headers=auth_headers)
+        assert response.status_code == 200, f"Failed: {response.text}"
+        return response.json()
+
+    def _assert_gelijk_aan_herbouw(self, auth_headers):
+        """The running totals equal a full rebuild; returns them"""
+        totaal = self._totaal(auth_headers)
+        herbouwd = self._herbouw(auth_headers)
+        for key in ("total_balance", "total_commission", "total_suribet", "unpaid_count"):
+            assert totaal[key] == pytest.approx(herbouwd[key]), key
+        return totaal
+
+    def _assert_delta(self, voor, na, **delta):
+        for key in ("total_balance", "total_commission", "total_suribet", "unpaid_count"):
+            assert na[key] == pytest.approx(voor[key] + delta.get(key, 0)), key
+
+    def test_kasboek_entry_updates_commission(self, auth_headers):
+        """Kasboek writes change the commission by exactly their amount; category commissie does not count"""
+        # Start from a consistent aggregate
+        self._herbouw(auth_headers)
+        voor = self._totaal(auth_headers)
+
+        entry_ids = []
+        try:
+            for category, amount in (("overig", 25.0), ("commissie", 40.0)):
+                response = requests.post(
+                    f"{BASE_URL}/api/suribet/kasboek",
+                    headers=auth_headers,
+                    json={
+                        "date": datetime.now().strftime("%Y-%m-%d"),
+                        "transaction_type": "income",
+                        "category": category,
+                        "amount": amount,
+                        "description": "TEST_openstaand_totaal"
+                    }
+                )
+                assert response.status_code == 200, f"Failed: {response.text}"
+                entry_ids.append(response.json()["id"])
+
+            # Commissie comes from the dagstaten, so only the "overig" entry counts
+            na = self._assert_gelijk_aan_herbouw(auth_headers)
+            self._assert_delta(voor, na, total_commission=25.0)
+
+            response = requests.put(
+                f"{BASE_URL}/api/suribet/kasboek/{entry_ids[0]}", headers=auth_headers, json={"amount": 60.0}
+            )
+            assert response.status_code == 200, f"Failed: {response.text}"
+            self._assert_delta(voor, self._assert_gelijk_aan_herbouw(auth_headers), total_commission=60.0)
+        finally:
+            for entry_id in entry_ids:
+                requests.delete(f"{BASE_URL}/api/suribet/kasboek/{entry_id}", headers=auth_headers)
+
+        self._assert_delta(voor, self._assert_gelijk_aan_herbouw(auth_headers))
+
+    def test_dagstaat_payout_and_reset_match_rebuild(self, auth_headers):
+        """Dagstaat create/update, payout and saldo reset keep the totals equal to a rebuild"""
+        # Reset first: a payout also pays out pending saldo-naar-suribet adjustments
+        response = requests.post(f"{BASE_URL}/api/suribet/reset-saldo-data", headers=auth_headers)
+        assert response.status_code == 200, f"Failed: {response.text}"
+        voor = self._assert_gelijk_aan_herbouw(auth_headers)
+
+        response = requests.post(
+            f"{BASE_URL}/api/suribet/dagstaten",
+            headers=auth_headers,
+            json={
+                "machine_id": "TEST-OPENSTAAND",
+                "date": datetime.now().strftime("%Y-%m-%d"),
+                "bon_data": {"balance": 500.0, "total_pos_commission": 40.0},
+                "notes": "TEST_openstaand_totaal"
+            }
+        )
+        assert response.status_code == 200, f"Failed: {response.text}"
+        dagstaat_id = response.json()["id"]
+        uitbetaling_id = None
+
+        try:
+            self._assert_delta(voor, self._assert_gelijk_aan_herbouw(auth_headers),
+                               total_balance=500.0, total_suribet=500.0, total_commission=40.0, unpaid_count=1)
+
+            response = requests.put(
+                f"{BASE_URL}/api/suribet/dagstaten/{dagstaat_id}",
+                headers=auth_headers,
+                json={"bon_data": {"balance": 650.0, "total_pos_commission": 55.0}}
+            )
+            assert response.status_code == 200, f"Failed: {response.text}"
+            self._assert_delta(voor, self._assert_gelijk_aan_herbouw(auth_headers),
+                               total_balance=650.0, total_suribet=650.0, total_commission=55.0, unpaid_count=1)
+
+            # Paid out: no longer outstanding, the commission stays
+            response = requests.post(
+                f"{BASE_URL}/api/suribet/uitbetalingen",
+                headers=auth_headers,
+                json={"dagstaat_ids": [dagstaat_id], "amount": 650.0}
+            )
+            assert response.status_code == 200, f"Failed: {response.text}"
+            uitbetaling_id = response.json()["id"]
+            self._assert_delta(voor, self._assert_gelijk_aan_herbouw(auth_headers), total_commission=55.0)
+
+            response = requests.post(
+                f"{BASE_URL}/api/suribet/saldo-naar-suribet", headers=auth_headers, json={"amount": 10.0}
+            )
+            assert response.status_code == 200, f"Failed: {response.text}"
+            # +10 to Suribet, -10 from the commission (adjustment) and -10 (kasboek expense)
+            self._assert_delta(voor, self._assert_gelijk_aan_herbouw(auth_headers),
+                               total_suribet=10.0, total_commission=55.0 - 20.0)
+
+            response = requests.post(f"{BASE_URL}/api/suribet/reset-saldo-data", headers=auth_headers)
+            assert response.status_code == 200, f"Failed: {response.text}"
+            self._assert_delta(voor, self._assert_gelijk_aan_herbouw(auth_headers), total_commission=55.0)
+        finally:
+            if uitbetaling_id:
+                requests.delete(f"{BASE_URL}/api/suribet/uitbetalingen/{uitbetaling_id}", headers=auth_headers)
+            requests.delete(f"{BASE_URL}/api/suribet/dagstaten/{dagstaat_id}", headers=auth_headers)
+
+        self._assert_delta(voor, self._assert_gelijk_aan_herbouw(auth_headers))
+
+
+class TestSuribetMobileUpload(TestSuribetAuth):
+    """The same receipt uploaded through two QR sessions: both sessions get the scan result"""
+
+    def _wacht_op_resultaat(self, headers, session_id, timeout=60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            response = requests.get(f"{BASE_URL}/api/suribet/mobile-upload/status/{session_id}", headers=headers)
+            assert response.status_code == 200, f"Failed: {response.text}"
+            if response.json()["status"] in ("completed", "failed"):
+                return response.json()
+            time.sleep(1)
+        pytest.fail(f"Session {session_id} has no scan result after {timeout}s")
+
+    def test_duplicate_upload_from_second_session(self, auth_token, auth_headers):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        # Unique per run, so the first upload starts a new job and the second is the duplicate
+        image = b"\x89PNG\r\n\x1a\n" + os.urandom(64)
+
+        sessions, job_ids = [], []
+        for _ in range(2):
+            response = requests.post(f"{BASE_URL}/api/suribet/mobile-upload/create-session", headers=auth_headers)
+            assert response.status_code == 200, f"Failed: {response.text}"
+            sessions.append(response.json()["session_id"])
+        for session_id in sessions:
+            response = requests.post(
+                f"{BASE_URL}/api/suribet/mobile-upload",
+                headers=headers,
+                params={"session_id": session_id},
+                files={"file": ("bon.png", image, "image/png")},
+            )
+            assert response.status_code == 200, f"Failed: {response.text}"
+            job_ids.append(response.json()["job_id"])
+
+        resultaten = [self._wacht_op_resultaat(headers, session_id) for session_id in sessions]
+        for job_id, resultaat in zip(job_ids, resultaten):
+            response = requests.get(f"{BASE_URL}/api/suribet/ocr-jobs/{job_id}", headers=headers)
+            assert response.status_code == 200, f"Failed: {response.text}"
+            assert resultaat["status"] == response.json()["status"]
+            assert resultaat["bon_data"] == response.json().get("bon_data")
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "--tb=short"])
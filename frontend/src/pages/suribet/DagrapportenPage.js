@@ -169,6 +169,22 @@ export default function DagrapportenPage() {
     await Promise.all([fetchData(), fetchTotals()]);
   };
 
+  // Wacht op het resultaat van een bon scan (max 2 minuten)
+  const waitForOcrJob = async (jobId, token) => {
+    const deadline = Date.now() + 120000;
+    while (Date.now() < deadline) {
+      await new Promise(resolve => setTimeout(resolve, 2000));
+      const response = await fetch(`${API_URL}/api/suribet/ocr-jobs/${jobId}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      if (!response.ok) continue;
+      const job = await response.json();
+      if (job.status === 'completed' && job.bon_data) return job.bon_data;
+      if (job.status === 'failed') throw new Error(job.error || 'Fout bij scannen bon');
+    }
+    throw new Error('Timeout - probeer opnieuw');
+  };
+
   // Bon scanner functie
   const handleBonUpload = async (e) => {
     const file = e.target.files?.[0];
@@ -207,13 +223,15 @@ export default function DagrapportenPage() {
       });
 
       if (result.success) {
-        setBonData(result.bon_data);
+        // De bon wordt op de achtergrond gescand: poll de scan-job tot hij klaar is
+        const bonData = result.bon_data || await waitForOcrJob(result.job_id, token);
+        setBonData(bonData);
         // Update form with bon data including date if available
         setFormData(prev => ({
           ...prev,
-          bon_data: result.bon_data,
+          bon_data: bonData,
           // Auto-fill date from receipt if available
-          date: result.bon_data.receipt_date || prev.date
+          date: bonData.receipt_date || prev.date
         }));
         toast.success('Bon succesvol gescand!');
       } else {
@@ -282,6 +300,10 @@ export default function DagrapportenPage() {
             toast.success('Bon succesvol ontvangen via telefoon!');
             stopQrPolling();
             setShowQrModal(false);
+          } else if (data.status === 'failed') {
+            toast.error(data.error || 'Fout bij scannen bon');
+            stopQrPolling();
+            setShowQrModal(false);
           } else if (data.status === 'expired') {
             toast.error('QR sessie verlopen');
             stopQrPolling();